@@ -1,33 +1,21 @@
 #!/usr/bin/env python3
+import time
+
+_PROCESS_START = time.perf_counter()
+
 import asyncio
 import logging
+import os
 from telegram import Update, BotCommand, MenuButtonCommands
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
     CallbackQueryHandler, InlineQueryHandler, ContextTypes, filters,
-    PreCheckoutQueryHandler
+    PreCheckoutQueryHandler, TypeHandler
 )
 
 from telegram.error import Forbidden
 from src.config import config
-from src.handlers import (
-    start_handler, help_handler, clear_handler, menu_handler,
-    price_handler, portfolio_handler, contact_handler, calc_handler,
-    message_handler, callback_handler, voice_handler, video_handler, photo_handler, error_handler,
-    leads_handler, stats_handler, export_handler, reviews_handler,
-    history_handler, hot_handler, tag_handler, priority_handler,
-    referral_handler, payment_handler, contract_handler, bonus_handler,
-    followup_handler, broadcast_handler, privacy_handler, inline_query_handler,
-    faq_handler, promo_handler, testimonials_handler,
-    promo_create_handler, promo_list_handler, promo_off_handler,
-    generate_daily_digest, handoff_handler, mystatus_handler, brief_handler, consult_handler, crm_handler,
-    get_emoji_id_handler, sticker_emoji_handler,
-    propensity_dashboard_handler, ab_results_handler,
-    ab_detail_handler, feedback_insights_handler,
-    health_handler, qa_handler, advanced_stats_handler,
-    export_csv_handler, export_analytics_handler, webhook_handler,
-    triggers_handler,
-)
+from src.handlers import deferred, warm_up
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -38,6 +26,22 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
+_first_update_seen = False
+
+
+def _record_startup_phase(phase: str) -> None:
+    from src.metrics import registry
+    elapsed = time.perf_counter() - _PROCESS_START
+    registry.set_gauge("startup_seconds", elapsed, phase=phase)
+    logger.info(f"Startup: {phase} after {elapsed:.2f}s")
+
+
+async def _first_update_probe(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global _first_update_seen
+    if not _first_update_seen:
+        _first_update_seen = True
+        _record_startup_phase("first_update")
+
 
 async def post_init(application) -> None:
     """Set up bot commands menu after initialization."""
@@ -106,6 +110,36 @@ async def post_init(application) -> None:
         )
         logger.info("Metrics save job scheduled (every 15 min)")
 
+        from src.monitoring import start_metrics_endpoint
+        await start_metrics_endpoint()
+
+        from src.webhook_delivery import webhook_delivery
+        webhook_delivery.start()
+
+        from src.feedback_loop import periodic_feedback_refresh
+        application.job_queue.run_repeating(
+            periodic_feedback_refresh,
+            interval=300,
+            first=30
+        )
+        logger.info("Feedback snapshot refresh scheduled (every 5 min)")
+
+        from src.content_registry import CONTENT_RELOAD_INTERVAL, periodic_content_reload
+        application.job_queue.run_repeating(
+            periodic_content_reload,
+            interval=CONTENT_RELOAD_INTERVAL,
+            first=CONTENT_RELOAD_INTERVAL
+        )
+        logger.info(f"Content reload check scheduled (every {CONTENT_RELOAD_INTERVAL} s)")
+
+        from src.response_cache import VERSION_CHECK_INTERVAL, periodic_version_refresh
+        application.job_queue.run_repeating(
+            periodic_version_refresh,
+            interval=VERSION_CHECK_INTERVAL,
+            first=1
+        )
+        logger.info(f"Reply cache version check scheduled (every {VERSION_CHECK_INTERVAL} s)")
+
         application.job_queue.run_repeating(
             process_proactive_triggers,
             interval=180,
@@ -113,6 +147,14 @@ async def post_init(application) -> None:
         )
         logger.info("Proactive engagement job scheduled (every 3 min)")
 
+        from src.lead_scoring import LEAD_RESCORE_INTERVAL, periodic_lead_rescore
+        application.job_queue.run_repeating(
+            periodic_lead_rescore,
+            interval=LEAD_RESCORE_INTERVAL,
+            first=600
+        )
+        logger.info(f"Lead rescoring scheduled (every {LEAD_RESCORE_INTERVAL} s)")
+
         from src.rate_limiter import rate_limiter
         async def cleanup_rate_limiter(context):
             rate_limiter.cleanup()
@@ -124,6 +166,11 @@ async def post_init(application) -> None:
     else:
         logger.warning("JobQueue not available, background jobs disabled")
 
+    if os.environ.get("HANDLER_WARMUP", "1") != "0":
+        application.create_task(warm_up())
+
+    _record_startup_phase("ready")
+
 
 async def send_daily_digest(context: ContextTypes.DEFAULT_TYPE) -> None:
     import os
@@ -131,6 +178,7 @@ async def send_daily_digest(context: ContextTypes.DEFAULT_TYPE) -> None:
     if not manager_id:
         return
     try:
+        from src.handlers import generate_daily_digest
         await generate_daily_digest(context.bot, int(manager_id))
     except Exception as e:
         logger.error(f"Daily digest error: {e}")
@@ -183,9 +231,8 @@ async def _generate_voice_supplement(text_message: str, msg_type: str = "followu
 
     try:
         from google.genai import types as genai_types
-        from src.config import config as app_config, get_gemini_client
-
-        client = get_gemini_client()
+        from src.ai_scheduler import Priority, ai_scheduler
+        from src.config import config as app_config
 
         prompt = (
             "Ты — Алекс, живой консультант WEB4TG Studio. Записываешь КОРОТКОЕ голосовое к текстовому сообщению.\n\n"
@@ -217,14 +264,14 @@ async def _generate_voice_supplement(text_message: str, msg_type: str = "followu
             "Верни ТОЛЬКО текст для озвучки."
         )
 
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model=app_config.model_name,
-            contents=[prompt],
-            config=genai_types.GenerateContentConfig(
+        response = await ai_scheduler.generate(
+            app_config.model_name,
+            [prompt],
+            genai_types.GenerateContentConfig(
                 max_output_tokens=120,
                 temperature=0.7
-            )
+            ),
+            priority=Priority.BACKGROUND,
         )
 
         if response.text:
@@ -320,6 +367,7 @@ async def _send_voice_supplement(bot, user_id: int, text_message: str) -> bool:
         if not config.elevenlabs_api_key:
             return False
         from src.handlers.media import generate_voice_response
+        from src.tts_cache import send_voice
         from telegram.constants import ChatAction
 
         voice_text = await _generate_voice_supplement(text_message)
@@ -334,7 +382,7 @@ async def _send_voice_supplement(bot, user_id: int, text_message: str) -> bool:
                 if not voice_audio or len(voice_audio) < 100:
                     raise RuntimeError(f"Voice supplement audio too small: {len(voice_audio) if voice_audio else 0} bytes")
 
-                await bot.send_voice(chat_id=user_id, voice=voice_audio)
+                await send_voice(bot.send_voice, voice_audio, chat_id=user_id)
                 logger.info(f"Voice supplement SENT to {user_id} ({len(voice_audio)} bytes, attempt {_vs_attempt+1})")
                 return True
             except Exception as e:
@@ -405,8 +453,9 @@ async def process_follow_ups(context: ContextTypes.DEFAULT_TYPE) -> None:
 
                 follow_up_manager.mark_sent(fu['id'], message, ab_variant=ab_variant)
 
+                from src.conversation_log import conversation_log
                 from src.leads import lead_manager
-                lead_manager.save_message(fu['user_id'], "assistant", message)
+                conversation_log.append(fu['user_id'], "assistant", message, kind="followup", in_context=False)
                 lead_manager.log_event("followup_sent", fu['user_id'], {
                     "followup_number": fu['follow_up_number'],
                     "voice": voice_sent,
@@ -497,8 +546,9 @@ async def process_proactive_triggers(context: ContextTypes.DEFAULT_TYPE) -> None
                     trigger["score"], message
                 )
 
+                from src.conversation_log import conversation_log
                 from src.leads import lead_manager
-                lead_manager.save_message(user_id, "assistant", message)
+                conversation_log.append(user_id, "assistant", message, kind="proactive", in_context=False)
                 lead_manager.log_event("proactive_trigger", user_id, {
                     "trigger_type": trigger["trigger_type"],
                     "score": trigger["score"],
@@ -557,72 +607,96 @@ async def successful_payment_handler(update: Update, context: ContextTypes.DEFAU
             pass
 
 
+async def post_shutdown(application) -> None:
+    import sys
+    kp_generator = sys.modules.get("src.kp_generator")
+    if kp_generator is not None:
+        kp_generator.shutdown_pdf_pool()
+    webhook_module = sys.modules.get("src.webhook_delivery")
+    if webhook_module is not None and webhook_module.webhook_delivery.initialized:
+        await webhook_module.webhook_delivery.stop()
+
+
 def main() -> None:
-    application = Application.builder().token(config.telegram_token).post_init(post_init).build()
+    import sys
+    if any(arg.startswith("--profile-startup") for arg in sys.argv[1:]):
+        from src.startup_profile import main as profile_startup
+        sys.exit(profile_startup(sys.argv[1:]))
+
+    _record_startup_phase("imports")
+    if os.environ.get("MIGRATIONS_ON_STARTUP", "1") != "0":
+        from src.migrations import run_migrations
+        run_migrations()
+        _record_startup_phase("migrations")
+
+    application = Application.builder().token(config.telegram_token).post_init(post_init).post_shutdown(post_shutdown).build()
     
-    application.add_handler(CommandHandler("start", start_handler))
-    application.add_handler(CommandHandler("help", help_handler))
-    application.add_handler(CommandHandler("clear", clear_handler))
-    application.add_handler(CommandHandler("menu", menu_handler))
-    application.add_handler(CommandHandler("price", price_handler))
-    application.add_handler(CommandHandler("portfolio", portfolio_handler))
-    application.add_handler(CommandHandler("contact", contact_handler))
-    application.add_handler(CommandHandler("calc", calc_handler))
-    application.add_handler(CommandHandler("leads", leads_handler))
-    application.add_handler(CommandHandler("stats", stats_handler))
-    application.add_handler(CommandHandler("export", export_handler))
-    application.add_handler(CommandHandler("reviews", reviews_handler))
-    application.add_handler(CommandHandler("history", history_handler))
-    application.add_handler(CommandHandler("hot", hot_handler))
-    application.add_handler(CommandHandler("tag", tag_handler))
-    application.add_handler(CommandHandler("priority", priority_handler))
-    application.add_handler(CommandHandler("referral", referral_handler))
-    application.add_handler(CommandHandler("bonus", bonus_handler))
-    application.add_handler(CommandHandler("payment", payment_handler))
-    application.add_handler(CommandHandler("contract", contract_handler))
-    application.add_handler(CommandHandler("faq", faq_handler))
-    application.add_handler(CommandHandler("promo", promo_handler))
-    application.add_handler(CommandHandler("testimonials", testimonials_handler))
-    application.add_handler(CommandHandler("promo_create", promo_create_handler))
-    application.add_handler(CommandHandler("promo_list", promo_list_handler))
-    application.add_handler(CommandHandler("promo_off", promo_off_handler))
-    application.add_handler(CommandHandler("followup", followup_handler))
-    application.add_handler(CommandHandler("broadcast", broadcast_handler))
-    application.add_handler(CommandHandler("privacy", privacy_handler))
-    application.add_handler(CommandHandler("manager", handoff_handler))
-    application.add_handler(CommandHandler("mystatus", mystatus_handler))
-    application.add_handler(CommandHandler("brief", brief_handler))
-    application.add_handler(CommandHandler("consult", consult_handler))
-    application.add_handler(CommandHandler("crm", crm_handler))
-    application.add_handler(CommandHandler("get_emoji_id", get_emoji_id_handler))
-    application.add_handler(CommandHandler("propensity", propensity_dashboard_handler))
-    application.add_handler(CommandHandler("ab_results", ab_results_handler))
-    application.add_handler(CommandHandler("ab_detail", ab_detail_handler))
-    application.add_handler(CommandHandler("feedback", feedback_insights_handler))
-    application.add_handler(CommandHandler("health", health_handler))
-    application.add_handler(CommandHandler("qa", qa_handler))
-    application.add_handler(CommandHandler("analytics", advanced_stats_handler))
-    application.add_handler(CommandHandler("export_csv", export_csv_handler))
-    application.add_handler(CommandHandler("export_analytics", export_analytics_handler))
-    application.add_handler(CommandHandler("webhook", webhook_handler))
-    application.add_handler(CommandHandler("triggers", triggers_handler))
+    application.add_handler(TypeHandler(Update, _first_update_probe), group=-100)
+    application.add_handler(CommandHandler("start", deferred("start_handler")))
+    application.add_handler(CommandHandler("help", deferred("help_handler")))
+    application.add_handler(CommandHandler("clear", deferred("clear_handler")))
+    application.add_handler(CommandHandler("menu", deferred("menu_handler")))
+    application.add_handler(CommandHandler("price", deferred("price_handler")))
+    application.add_handler(CommandHandler("portfolio", deferred("portfolio_handler")))
+    application.add_handler(CommandHandler("contact", deferred("contact_handler")))
+    application.add_handler(CommandHandler("calc", deferred("calc_handler")))
+    application.add_handler(CommandHandler("leads", deferred("leads_handler")))
+    application.add_handler(CommandHandler("stats", deferred("stats_handler")))
+    application.add_handler(CommandHandler("export", deferred("export_handler")))
+    application.add_handler(CommandHandler("reviews", deferred("reviews_handler")))
+    application.add_handler(CommandHandler("history", deferred("history_handler")))
+    application.add_handler(CommandHandler("hot", deferred("hot_handler")))
+    application.add_handler(CommandHandler("tag", deferred("tag_handler")))
+    application.add_handler(CommandHandler("priority", deferred("priority_handler")))
+    application.add_handler(CommandHandler("referral", deferred("referral_handler")))
+    application.add_handler(CommandHandler("bonus", deferred("bonus_handler")))
+    application.add_handler(CommandHandler("payment", deferred("payment_handler")))
+    application.add_handler(CommandHandler("contract", deferred("contract_handler")))
+    application.add_handler(CommandHandler("faq", deferred("faq_handler")))
+    application.add_handler(CommandHandler("promo", deferred("promo_handler")))
+    application.add_handler(CommandHandler("testimonials", deferred("testimonials_handler")))
+    application.add_handler(CommandHandler("promo_create", deferred("promo_create_handler")))
+    application.add_handler(CommandHandler("promo_list", deferred("promo_list_handler")))
+    application.add_handler(CommandHandler("promo_off", deferred("promo_off_handler")))
+    application.add_handler(CommandHandler("followup", deferred("followup_handler")))
+    application.add_handler(CommandHandler("broadcast", deferred("broadcast_handler")))
+    application.add_handler(CommandHandler("privacy", deferred("privacy_handler")))
+    application.add_handler(CommandHandler("manager", deferred("handoff_handler")))
+    application.add_handler(CommandHandler("mystatus", deferred("mystatus_handler")))
+    application.add_handler(CommandHandler("brief", deferred("brief_handler")))
+    application.add_handler(CommandHandler("consult", deferred("consult_handler")))
+    application.add_handler(CommandHandler("crm", deferred("crm_handler")))
+    application.add_handler(CommandHandler("get_emoji_id", deferred("get_emoji_id_handler")))
+    application.add_handler(CommandHandler("propensity", deferred("propensity_dashboard_handler")))
+    application.add_handler(CommandHandler("ab_results", deferred("ab_results_handler")))
+    application.add_handler(CommandHandler("ab_detail", deferred("ab_detail_handler")))
+    application.add_handler(CommandHandler("feedback", deferred("feedback_insights_handler")))
+    application.add_handler(CommandHandler("health", deferred("health_handler")))
+    application.add_handler(CommandHandler("reload_content", deferred("reload_content_handler")))
+    application.add_handler(CommandHandler("traces", deferred("traces_handler")))
+    application.add_handler(CommandHandler("qa", deferred("qa_handler")))
+    application.add_handler(CommandHandler("analytics", deferred("advanced_stats_handler")))
+    application.add_handler(CommandHandler("export_csv", deferred("export_csv_handler")))
+    application.add_handler(CommandHandler("export_analytics", deferred("export_analytics_handler")))
+    application.add_handler(CommandHandler("webhook", deferred("webhook_handler")))
+    application.add_handler(CommandHandler("triggers", deferred("triggers_handler")))
     
     application.add_handler(PreCheckoutQueryHandler(pre_checkout_handler))
-    application.add_handler(InlineQueryHandler(inline_query_handler))
-    application.add_handler(CallbackQueryHandler(callback_handler))
+    application.add_handler(InlineQueryHandler(deferred("inline_query_handler")))
+    application.add_handler(CallbackQueryHandler(deferred("callback_handler")))
     
     application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, successful_payment_handler))
-    application.add_handler(MessageHandler(filters.Sticker.ALL, sticker_emoji_handler), group=1)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, sticker_emoji_handler), group=2)
-    application.add_handler(MessageHandler(filters.VOICE, voice_handler))
-    application.add_handler(MessageHandler(filters.VIDEO | filters.VIDEO_NOTE, video_handler))
-    application.add_handler(MessageHandler(filters.PHOTO, photo_handler))
+    application.add_handler(MessageHandler(filters.Sticker.ALL, deferred("sticker_emoji_handler")), group=1)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, deferred("sticker_emoji_handler")), group=2)
+    application.add_handler(MessageHandler(filters.VOICE, deferred("voice_handler")))
+    application.add_handler(MessageHandler(filters.VIDEO | filters.VIDEO_NOTE, deferred("video_handler")))
+    application.add_handler(MessageHandler(filters.PHOTO, deferred("photo_handler")))
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND,
-        message_handler
+        deferred("message_handler")
     ))
     
-    application.add_error_handler(error_handler)
+    application.add_error_handler(deferred("error_handler"))
     
     from src.bot_api import get_api_version
     logger.info("WEB4TG Studio AI Agent starting...")
@@ -5,6 +5,8 @@ from typing import Optional, Dict, Any
 from dataclasses import dataclass
 from datetime import datetime
 from src.database import get_connection, is_available as db_available, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -124,10 +126,8 @@ WELCOME_VARIANTS = {
 
 
 class ABTestingSystem:
-    def __init__(self):
-        self._init_db()
-    
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
         
@@ -491,4 +491,5 @@ class ABTestingSystem:
         return "\n".join(lines)
 
 
-ab_testing = ABTestingSystem()
+ab_testing = LazySingleton(ABTestingSystem)
+register_schema("ab_testing", 1, ABTestingSystem._init_db)
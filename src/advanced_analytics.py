@@ -5,15 +5,15 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
 
 class AdvancedAnalytics:
-    def __init__(self):
-        self._init_db()
-
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
         try:
@@ -570,4 +570,5 @@ class AdvancedAnalytics:
         return text
 
 
-advanced_analytics = AdvancedAnalytics()
+advanced_analytics = LazySingleton(AdvancedAnalytics)
+register_schema("advanced_analytics", 1, AdvancedAnalytics._init_db)
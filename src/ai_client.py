@@ -1,16 +1,24 @@
+from __future__ import annotations
+
 import asyncio
 import logging
 import re
+import time
 from typing import Any, List, Dict, Optional, Tuple
-from google import genai
-from google.genai import types
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
+from src.ai_scheduler import TokenBudgetExceeded, ai_scheduler
 from src.config import config
-from src.knowledge_base import SYSTEM_PROMPT
+from src.content_registry import content
+from src.lazy import LazyModule, LazySingleton
+from src.metrics import registry
+from src.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# google.genai is the heaviest import on the startup path; load it with the first request.
+types = LazyModule("google.genai.types")
+
 
 def is_rate_limit_error(exc: BaseException) -> bool:
     exc_str = str(exc).lower()
@@ -186,50 +194,83 @@ def _compute_adaptive_word_limit(user_message: str, query_context: str = "") ->
     return 120
 
 
-def check_response_quality(response_text: str, user_message: str, query_context: str = "") -> str:
-    if not response_text or not response_text.strip():
-        return response_text
-
-    cleaned = response_text.strip()
-
-    fluff_openers = [
-        "Конечно!", "Конечно,", "Безусловно!", "Безусловно,",
-        "Разумеется!", "Разумеется,", "Несомненно!", "Несомненно,",
-        "С удовольствием!", "С удовольствием,",
-        "Отличный вопрос!", "Отличный вопрос,",
-        "Хороший вопрос!", "Хороший вопрос,",
-        "Спасибо за вопрос!", "Спасибо за вопрос,",
-        "Рад, что вы спросили!", "Рад, что спросили!",
-        "Здравствуйте!", "Добрый день!",
-        "Благодарю за обращение!", "Благодарю!",
-    ]
-    for opener in fluff_openers:
-        if cleaned.startswith(opener):
-            rest = cleaned[len(opener):].strip()
+_FLUFF_OPENERS = (
+    "Конечно!", "Конечно,", "Безусловно!", "Безусловно,",
+    "Разумеется!", "Разумеется,", "Несомненно!", "Несомненно,",
+    "С удовольствием!", "С удовольствием,",
+    "Отличный вопрос!", "Отличный вопрос,",
+    "Хороший вопрос!", "Хороший вопрос,",
+    "Спасибо за вопрос!", "Спасибо за вопрос,",
+    "Рад, что вы спросили!", "Рад, что спросили!",
+    "Здравствуйте!", "Добрый день!",
+    "Благодарю за обращение!", "Благодарю!",
+)
+
+_BOT_PHRASES = (
+    "Чем я могу вам помочь?", "Чем могу помочь?",
+    "Обращайтесь, если будут вопросы!",
+    "Я всегда готов помочь!", "Всегда рад помочь!",
+    "Не стесняйтесь обращаться!",
+    "Если у вас есть ещё вопросы, не стесняйтесь задавать!",
+)
+
+_CTA_PATTERNS = (
+    r'давайте', r'напишите', r'попробуйте', r'посмотрите',
+    r'расскажите', r'выбирайте', r'закажите', r'записывайтесь',
+    r'свяжитесь', r'обращайтесь', r'звоните', r'пишите',
+    r'/\w+', r'хотите\s', r'готовы\s', r'начнём',
+    r'\?$', r'могу\s', r'предлагаю', r'начать',
+    r'удобно\s', r'интересно\?',
+)
+
+_DEFAULT_CTA = "\n\nРасскажите подробнее о вашем проекте — подберу оптимальное решение)"
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+def _strip_fluff_opener(text: str) -> str:
+    for opener in _FLUFF_OPENERS:
+        if text.startswith(opener):
+            rest = text[len(opener):].strip()
             if rest:
-                cleaned = rest
                 logger.debug(f"Removed fluff opener: '{opener}'")
+                return rest
             break
+    return text
 
-    bot_phrases = [
-        "Чем я могу вам помочь?", "Чем могу помочь?",
-        "Обращайтесь, если будут вопросы!",
-        "Я всегда готов помочь!", "Всегда рад помочь!",
-        "Не стесняйтесь обращаться!",
-        "Если у вас есть ещё вопросы, не стесняйтесь задавать!",
-    ]
-    for phrase in bot_phrases:
-        if cleaned.endswith(phrase):
-            rest = cleaned[:-len(phrase)].strip()
+
+def _strip_bot_phrases(text: str) -> str:
+    for phrase in _BOT_PHRASES:
+        if text.endswith(phrase):
+            rest = text[:-len(phrase)].strip()
             if rest:
-                cleaned = rest
+                text = rest
                 logger.debug(f"Removed bot phrase: '{phrase}'")
+    return text
+
+
+def _append_cta(text: str) -> str:
+    if len(text.split()) > 40:
+        has_cta = any(re.search(pat, text.lower()) for pat in _CTA_PATTERNS)
+        if not has_cta:
+            if "?" not in text[-100:]:
+                text += _DEFAULT_CTA
+                logger.debug("Added CTA to response without call-to-action")
+    return text
+
+
+def check_response_quality(response_text: str, user_message: str, query_context: str = "") -> str:
+    if not response_text or not response_text.strip():
+        return response_text
+
+    cleaned = _strip_fluff_opener(response_text.strip())
+    cleaned = _strip_bot_phrases(cleaned)
 
     response_words = len(cleaned.split())
 
     max_words = _compute_adaptive_word_limit(user_message, query_context)
     if response_words > max_words:
-        sentences = re.split(r'(?<=[.!?])\s+', cleaned)
+        sentences = _SENTENCE_SPLIT.split(cleaned)
         trimmed = []
         word_count = 0
         for sent in sentences:
@@ -242,31 +283,123 @@ def check_response_quality(response_text: str, user_message: str, query_context:
             cleaned = " ".join(trimmed)
             logger.debug(f"Adaptive trim: {response_words} → {word_count} words (limit={max_words})")
 
-    if len(cleaned.split()) > 40:
-        cta_patterns = [
-            r'давайте', r'напишите', r'попробуйте', r'посмотрите',
-            r'расскажите', r'выбирайте', r'закажите', r'записывайтесь',
-            r'свяжитесь', r'обращайтесь', r'звоните', r'пишите',
-            r'/\w+', r'хотите\s', r'готовы\s', r'начнём',
-            r'\?$', r'могу\s', r'предлагаю', r'начать',
-            r'удобно\s', r'интересно\?',
-        ]
-        has_cta = any(re.search(pat, cleaned.lower()) for pat in cta_patterns)
-        if not has_cta:
-            if "?" not in cleaned[-100:]:
-                cleaned += "\n\nРасскажите подробнее о вашем проекте — подберу оптимальное решение)"
-                logger.debug("Added CTA to response without call-to-action")
-
-    return cleaned
+    return _append_cta(cleaned)
+
+
+class StreamingPostProcessor:
+    """Applies validate_response and check_response_quality sentence by sentence.
+
+    ``feed`` takes the accumulated model output and returns the text that is
+    safe to show as a draft: complete sentences only, each validated, with
+    the fluff opener removed and sentences that are bare bot phrases held
+    back until something follows them. Once the next sentence would push
+    the reply past the adaptive word limit, ``done`` is set and the caller
+    stops generation. ``finish`` adds the unterminated tail, strips closing
+    bot phrases, appends the CTA and re-attaches a trailing ``[BUTTONS: ...]``
+    block, so the final reply starts with the last draft.
+
+    Unlike the post-hoc trim, paragraph breaks between kept sentences are
+    preserved and the buttons block does not count towards the limit.
+    """
+
+    _BUTTONS_MARKER = "[BUTTONS:"
+
+    def __init__(self, user_message: str, query_context: str = ""):
+        self.max_words = _compute_adaptive_word_limit(user_message, query_context)
+        self.done = False
+        self.is_valid = True
+        self._consumed = 0
+        self._parts: List[str] = []
+        self._held: List[Tuple[str, str]] = []
+        self._words = 0
+        self._opener: Optional[str] = None
+        self._draft = ""
+
+    @property
+    def words(self) -> int:
+        return self._words
+
+    def _body(self, raw: str) -> str:
+        marker = raw.find(self._BUTTONS_MARKER)
+        return raw if marker < 0 else raw[:marker]
+
+    def _accept(self, sentence: str, sep: str) -> None:
+        if self.done:
+            return
+        is_valid, sentence = validate_response(sentence)
+        self.is_valid = self.is_valid and is_valid
+        sentence = sentence.strip()
+        if not self._parts and not self._held:
+            if self._opener is None:
+                stripped = sentence.lstrip()
+                for opener in _FLUFF_OPENERS:
+                    if stripped == opener:
+                        self._opener = opener
+                        return
+                sentence = _strip_fluff_opener(stripped)
+                self._opener = ""
+        if not sentence:
+            return
+        sep = re.sub(r'\n{3,}', '\n\n', sep) if "\n" in sep else " "
+        if sentence in _BOT_PHRASES:
+            self._held.append((sentence, sep))
+            return
+        pending = self._held + [(sentence, sep)]
+        words = sum(len(s.split()) for s, _ in pending)
+        if self._words + words > self.max_words and (self._parts or self._held):
+            self.done = True
+            self._held = []
+            logger.debug(f"Stream stopped at {self._words} words (limit={self.max_words})")
+            return
+        for s, p in pending:
+            self._parts.extend((s, p))
+        self._held = []
+        self._words += words
+
+    def feed(self, raw: str) -> str:
+        """Draft text for the accumulated output ``raw``."""
+        if self.done:
+            return self._draft
+        body = self._body(raw)
+        pending = body[self._consumed:]
+        start = 0
+        for match in _SENTENCE_SPLIT.finditer(pending):
+            if match.end() == len(pending) and len(body) == len(raw):
+                break
+            self._accept(pending[start:match.start()], match.group())
+            start = match.end()
+            if self.done:
+                break
+        self._consumed += start
+        self._draft = "".join(self._parts[:-1])
+        return self._draft
+
+    def finish(self, raw: str) -> str:
+        """Final reply for the complete output ``raw``."""
+        self.feed(raw)
+        body = self._body(raw)
+        if not self.done:
+            tail = body[self._consumed:].strip()
+            if tail:
+                self._accept(tail, "")
+        self._consumed = len(body)
+        for sentence, sep in self._held:
+            self._parts.extend((sentence, sep))
+        self._held = []
+        text = "".join(self._parts[:-1]).strip()
+        if not text:
+            return self._opener or raw.strip()
+        text = _append_cta(_strip_bot_phrases(text))
+        if not self.done:
+            buttons = raw[len(body):].strip()
+            if buttons:
+                text += "\n" + buttons
+        return text
 
 
 class AIClient:
-    def __init__(self):
-        from src.config import get_gemini_client
-        self._client = get_gemini_client()
-
     def select_model_and_config(self, query_context: Optional[str] = None, dynamic_system_prompt: Optional[str] = None) -> Tuple[str, types.GenerateContentConfig]:
-        sys_prompt = dynamic_system_prompt or SYSTEM_PROMPT
+        sys_prompt = dynamic_system_prompt or content.current.system_prompt
 
         if not query_context:
             return config.fast_model_name, types.GenerateContentConfig(
@@ -374,7 +507,7 @@ class AIClient:
         elif thinking_level == "high":
             model = config.thinking_model_name
             gen_config = types.GenerateContentConfig(
-                system_instruction=dynamic_system_prompt or SYSTEM_PROMPT,
+                system_instruction=dynamic_system_prompt or content.current.system_prompt,
                 max_output_tokens=config.max_tokens,
                 temperature=config.temperature,
                 thinking_config=types.ThinkingConfig(thinking_budget=4096)
@@ -382,7 +515,7 @@ class AIClient:
         else:
             model = config.fast_model_name
             gen_config = types.GenerateContentConfig(
-                system_instruction=dynamic_system_prompt or SYSTEM_PROMPT,
+                system_instruction=dynamic_system_prompt or content.current.system_prompt,
                 max_output_tokens=config.max_tokens,
                 temperature=config.temperature
             )
@@ -399,58 +532,69 @@ class AIClient:
 
         for attempt in range(max_retries + 1):
             try:
-                import queue
-                chunk_queue = queue.Queue()
                 stream_error: list[Optional[Exception]] = [None]
+                chunk_queue: asyncio.Queue = asyncio.Queue()
+                stop_requested = asyncio.Event()
+                processor = StreamingPostProcessor(user_message, query_context or "")
 
-                def _stream_in_thread():
+                async def _read_stream() -> str:
                     full = ""
+                    started = time.perf_counter()
                     try:
-                        stream = self._client.models.generate_content_stream(
-                            model=model,
-                            contents=messages,  # type: ignore[arg-type]
-                            config=gen_config
-                        )
-                        for chunk in stream:
-                            if chunk.text:
-                                full += chunk.text
-                                chunk_queue.put(full)
+                        async with ai_scheduler.stream(model, messages, gen_config) as chunks:
+                            async for chunk in chunks:
+                                if stop_requested.is_set():
+                                    break
+                                if chunk.text:
+                                    if not full:
+                                        registry.observe("ai_time_to_first_token_seconds",
+                                                         time.perf_counter() - started, model=model)
+                                    full += chunk.text
+                                    chunk_queue.put_nowait(full)
                     except Exception as e:
                         stream_error[0] = e
+                        registry.inc("ai_errors_total", model=model, operation="stream")
                         logger.warning(f"Stream error (attempt {attempt+1}/{max_retries+1}): {type(e).__name__}: {e}")
                     finally:
-                        chunk_queue.put(None)
+                        registry.observe("ai_latency_seconds", time.perf_counter() - started,
+                                         model=model, operation="stream")
+                        chunk_queue.put_nowait(None)
                     return full
 
-                stream_task = asyncio.get_event_loop().run_in_executor(None, _stream_in_thread)
+                with span("ai.stream", model=model, attempt=attempt + 1) as current_stream_span:
+                    stream_task = asyncio.ensure_future(_read_stream())
 
-                full_text = ""
-                while True:
-                    try:
-                        partial = await asyncio.to_thread(chunk_queue.get, timeout=0.3)
-                        if partial is None:
-                            break
-                        full_text = partial
-                        if on_chunk:
+                    full_text = ""
+                    draft = ""
+
+                    async def _on_partial(partial: str) -> None:
+                        nonlocal draft
+                        text = processor.feed(partial)
+                        if processor.done and not stop_requested.is_set():
+                            stop_requested.set()
+                            registry.inc("ai_stream_early_stop_total", model=model)
+                        if on_chunk and text != draft:
+                            draft = text
                             try:
-                                await on_chunk(full_text)
+                                await on_chunk(draft)
                             except Exception:
                                 pass
-                    except Exception:
-                        if stream_task.done():
-                            while not chunk_queue.empty():
-                                item = chunk_queue.get_nowait()
-                                if item is None:
-                                    break
-                                full_text = item
-                                if on_chunk:
-                                    try:
-                                        await on_chunk(full_text)
-                                    except Exception:
-                                        pass
-                            break
-
-                result = await stream_task
+
+                    try:
+                        while True:
+                            partial = await chunk_queue.get()
+                            if partial is None:
+                                break
+                            if not full_text:
+                                current_stream_span.set("ttft_ms", round(current_stream_span.duration * 1000))
+                            full_text = partial
+                            await _on_partial(full_text)
+                        result = await stream_task
+                    finally:
+                        if not stream_task.done():
+                            stream_task.cancel()
+                    current_stream_span.set("chars", len(result or full_text))
+                    current_stream_span.set("stopped_early", processor.done)
                 if result:
                     full_text = result
 
@@ -484,10 +628,11 @@ class AIClient:
                         continue
 
                 if full_text:
-                    is_valid, cleaned = validate_response(full_text)
-                    if not is_valid:
+                    final = processor.finish(full_text)
+                    if not processor.is_valid:
                         logger.warning("Response validation found issues, using cleaned version")
-                    return check_response_quality(cleaned, user_message, query_context=query_context or "")
+                    registry.observe("ai_stream_reply_words", processor.words, model=model)
+                    return final
 
             except Exception as e:
                 error_type = type(e).__name__
@@ -528,7 +673,7 @@ class AIClient:
         elif thinking_level == "high":
             model = config.thinking_model_name
             gen_config = types.GenerateContentConfig(
-                system_instruction=dynamic_system_prompt or SYSTEM_PROMPT,
+                system_instruction=dynamic_system_prompt or content.current.system_prompt,
                 max_output_tokens=config.max_tokens,
                 temperature=config.temperature,
                 thinking_config=types.ThinkingConfig(thinking_budget=4096)
@@ -536,7 +681,7 @@ class AIClient:
         else:
             model = config.fast_model_name
             gen_config = types.GenerateContentConfig(
-                system_instruction=dynamic_system_prompt or SYSTEM_PROMPT,
+                system_instruction=dynamic_system_prompt or content.current.system_prompt,
                 max_output_tokens=config.max_tokens,
                 temperature=config.temperature
             )
@@ -561,12 +706,16 @@ class AIClient:
             reraise=True
         )
         async def _generate():
-            response = await asyncio.to_thread(
-                self._client.models.generate_content,
-                model=current_model,
-                contents=messages,  # type: ignore[arg-type]
-                config=current_config
-            )
+            started = time.perf_counter()
+            try:
+                with span("ai.generate", model=current_model):
+                    response = await ai_scheduler.generate(current_model, messages, current_config)
+            except Exception:
+                registry.inc("ai_errors_total", model=current_model, operation="generate")
+                raise
+            finally:
+                registry.observe("ai_latency_seconds", time.perf_counter() - started,
+                                 model=current_model, operation="generate")
             return response
         
         try:
@@ -581,6 +730,8 @@ class AIClient:
                 logger.warning("Empty response from Gemini")
                 return "Извините, не удалось сформировать ответ. Попробуйте переформулировать вопрос."
                 
+        except TokenBudgetExceeded:
+            raise
         except Exception as e:
             error_type = type(e).__name__
             error_msg = str(e)
@@ -619,7 +770,7 @@ class AIClient:
     ) -> dict:
         """Returns {"text": str, "tool_calls": list[dict], "all_tool_calls": list}"""
         try:
-            sys_prompt = dynamic_system_prompt or SYSTEM_PROMPT
+            sys_prompt = dynamic_system_prompt or content.current.system_prompt
             if query_context and query_context in ("objection", "complex", "sales", "closing", "decision"):
                 model = config.thinking_model_name
             elif thinking_level == "high":
@@ -638,12 +789,13 @@ class AIClient:
                 )
             )
 
-            response = await asyncio.to_thread(
-                self._client.models.generate_content,
-                model=model,
-                contents=messages,  # type: ignore[arg-type]
-                config=gen_config
-            )
+            started = time.perf_counter()
+            try:
+                with span("ai.tools_call", model=model):
+                    response = await ai_scheduler.generate(model, messages, gen_config, operation="tools")
+            finally:
+                registry.observe("ai_latency_seconds", time.perf_counter() - started,
+                                 model=model, operation="tools")
 
             tool_calls = []
             if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
@@ -661,6 +813,8 @@ class AIClient:
             text = response.text if response.text else None
             return {"text": text, "tool_calls": [], "all_tool_calls": []}
 
+        except TokenBudgetExceeded:
+            raise
         except Exception as e:
             logger.warning(f"Tool calling failed, falling back to regular response: {e}")
             fallback = await self.generate_response(messages, thinking_level)
@@ -707,7 +861,8 @@ class AIClient:
             step_tool_results = []
             for tc in result["tool_calls"]:
                 try:
-                    tool_result = await tool_executor(tc["name"], tc["args"])
+                    with span(f"tool.{tc['name']}", step=step + 1):
+                        tool_result = await tool_executor(tc["name"], tc["args"])
                 except Exception as e:
                     tool_result = f"Ошибка вызова инструмента {tc['name']}: {e}"
                     logger.error(f"Tool executor error for {tc['name']}: {e}")
@@ -1084,4 +1239,4 @@ TOOL_DECLARATIONS = [
 ]
 
 
-ai_client = AIClient()
+ai_client = LazySingleton(AIClient)
@@ -0,0 +1,501 @@
+"""Scheduler for Gemini requests: per-model slots, priorities, hedging, token budgets.
+
+All Gemini calls go through ``ai_scheduler`` and use the SDK's async client
+(``client.aio``), so a slow model call no longer holds a thread of the
+default executor that typing indicators, DB lookups and TTS also use.
+
+Each model has AI_CONCURRENCY slots. ``AI_CONCURRENCY_<MODEL>`` overrides
+the limit for one model, with the model name upper-cased and every other
+character replaced by ``_``, e.g. ``AI_CONCURRENCY_GEMINI_2_5_PRO=4``.
+Requests beyond the limit wait in a priority queue:
+
+* ``INTERACTIVE``: a user is waiting for the reply.
+* ``AUXILIARY``: side work triggered by a message, such as summaries,
+  insight extraction and QA scoring.
+* ``BACKGROUND``: follow-ups, proactive messages and broadcasts.
+
+AI_INTERACTIVE_RESERVE slots per model are only handed to interactive
+requests, so a burst of follow-ups cannot take every slot. The priority
+comes from the ``ai_priority`` context variable unless it is passed
+explicitly. Code that runs outside a user's message wraps its calls in
+``with ai_priority(Priority.BACKGROUND):``.
+
+Hedging is enabled with AI_HEDGE=1. An interactive ``generate`` that has
+not returned after the p95 latency of recent calls to the same model and
+operation gets a second, identical request, if a slot is free. The first
+response wins and the other request is cancelled. The p95 is computed over
+the last LATENCY_WINDOW calls and used once AI_HEDGE_MIN_SAMPLES are
+recorded. Tokens of a cancelled request are not reported by the API and
+are not counted.
+
+Prompt, output and thinking tokens from ``usage_metadata`` are counted per
+model and priority. AI_TOKEN_BUDGET_AUXILIARY and AI_TOKEN_BUDGET_BACKGROUND
+set daily limits (UTC, 0 = none). Once a limit is spent, requests of that
+class raise ``TokenBudgetExceeded`` until midnight. Interactive requests
+have no budget.
+
+GEMINI_BASE_URL (read by ``config.get_gemini_client``) points the client at
+another endpoint. ``python -m src.ai_scheduler`` starts a local fake model
+server and runs a mixed-priority load against it through the scheduler.
+
+Every request logs its prompt, output and thinking token counts with its
+latency, and reports it to ``monitor`` as an external ``gemini`` call.
+
+Metrics: ``ai_queue_wait_seconds{model,priority}``, ``ai_inflight{model}``,
+``ai_queued{model}``, ``ai_hedge_total{model,result}``,
+``ai_tokens_total{model,priority,kind}``, ``ai_prompt_tokens{model,operation}``,
+``ai_budget_rejected_total{priority}``.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from src.lazy import LazySingleton
+from src.metrics import registry
+from src.tracing import set_attribute
+
+logger = logging.getLogger(__name__)
+
+AI_CONCURRENCY = int(os.environ.get("AI_CONCURRENCY", "8"))
+AI_INTERACTIVE_RESERVE = int(os.environ.get("AI_INTERACTIVE_RESERVE", "2"))
+AI_HEDGE = os.environ.get("AI_HEDGE", "0") == "1"
+AI_HEDGE_MIN_SAMPLES = int(os.environ.get("AI_HEDGE_MIN_SAMPLES", "20"))
+AI_HEDGE_MIN_DELAY = float(os.environ.get("AI_HEDGE_MIN_DELAY", "1.0"))
+LATENCY_WINDOW = 200
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    AUXILIARY = 1
+    BACKGROUND = 2
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+
+_TOKEN_BUDGETS = {
+    Priority.AUXILIARY: int(os.environ.get("AI_TOKEN_BUDGET_AUXILIARY", "0")),
+    Priority.BACKGROUND: int(os.environ.get("AI_TOKEN_BUDGET_BACKGROUND", "0")),
+}
+
+_current_priority: ContextVar[Priority] = ContextVar("ai_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def ai_priority(priority: Priority) -> Iterator[None]:
+    """Run the Gemini calls made inside the block at ``priority``."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+
+def _model_limit(model: str, default: int) -> int:
+    key = "AI_CONCURRENCY_" + re.sub(r"[^A-Z0-9]", "_", model.upper())
+    return max(1, int(os.environ.get(key, str(default))))
+
+
+class _ModelSlots:
+    """Counting semaphore that admits waiters by priority, then arrival order."""
+
+    def __init__(self, model: str, limit: int, reserve: int):
+        self.model = model
+        self.limit = limit
+        self.reserve = max(0, min(reserve, limit - 1))
+        self.in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def _cap(self, priority: Priority) -> int:
+        return self.limit if priority == Priority.INTERACTIVE else self.limit - self.reserve
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def try_acquire(self, priority: Priority) -> bool:
+        # A waiter that fits under this cap would already have been admitted
+        # by _wake, so there is nobody ahead to jump.
+        if self.in_use < self._cap(priority):
+            self.in_use += 1
+            return True
+        return False
+
+    async def acquire(self, priority: Priority) -> None:
+        if self.try_acquire(priority):
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), fut))
+        registry.set_gauge("ai_queued", self.queued, model=self.model)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_use -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            priority, _, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_use >= self._cap(Priority(priority)):
+                break
+            heapq.heappop(self._waiters)
+            self.in_use += 1
+            fut.set_result(None)
+        registry.set_gauge("ai_queued", self.queued, model=self.model)
+
+
+class _LatencyWindow:
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class AIScheduler:
+    def __init__(self, client=None, concurrency: int = AI_CONCURRENCY, reserve: int = AI_INTERACTIVE_RESERVE,
+                 hedge: bool = AI_HEDGE, budgets: Optional[Dict[Priority, int]] = None):
+        self._explicit_client = client
+        self.concurrency = concurrency
+        self.reserve = reserve
+        self.hedge = hedge
+        self.budgets = dict(_TOKEN_BUDGETS if budgets is None else budgets)
+        self._slots: Dict[str, _ModelSlots] = {}
+        self._latency: Dict[Tuple[str, str], _LatencyWindow] = {}
+        self._spent: Dict[Priority, Tuple[str, int]] = {}
+        self._hedges = {"launched": 0, "won": 0}
+
+    def _client(self):
+        if self._explicit_client is not None:
+            return self._explicit_client
+        from src.config import get_gemini_client
+        return get_gemini_client()
+
+    def _slots_for(self, model: str) -> _ModelSlots:
+        slots = self._slots.get(model)
+        if slots is None:
+            slots = self._slots[model] = _ModelSlots(model, _model_limit(model, self.concurrency), self.reserve)
+        return slots
+
+    @staticmethod
+    def _resolve(priority: Optional[Priority]) -> Priority:
+        return _current_priority.get() if priority is None else Priority(priority)
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: Optional[Priority] = None) -> AsyncIterator[None]:
+        """Hold one of ``model``'s slots for the block."""
+        priority = self._resolve(priority)
+        slots = self._slots_for(model)
+        queued_at = time.perf_counter()
+        await slots.acquire(priority)
+        registry.observe("ai_queue_wait_seconds", time.perf_counter() - queued_at,
+                         model=model, priority=priority.label)
+        registry.set_gauge("ai_inflight", slots.in_use, model=model)
+        try:
+            yield
+        finally:
+            slots.release()
+            registry.set_gauge("ai_inflight", slots.in_use, model=model)
+
+    def _today(self) -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime())
+
+    def spent_today(self, priority: Priority) -> int:
+        day, tokens = self._spent.get(priority, ("", 0))
+        return tokens if day == self._today() else 0
+
+    def _check_budget(self, priority: Priority) -> None:
+        budget = self.budgets.get(priority, 0)
+        if budget and self.spent_today(priority) >= budget:
+            registry.inc("ai_budget_rejected_total", priority=priority.label)
+            raise TokenBudgetExceeded(f"Daily {priority.label} token budget of {budget} is spent")
+
+    def _account(self, model: str, priority: Priority, usage, operation: str, seconds: float) -> None:
+        if usage is None:
+            return
+        counts = {
+            "prompt": getattr(usage, "prompt_token_count", 0) or 0,
+            "output": getattr(usage, "candidates_token_count", 0) or 0,
+            "thinking": getattr(usage, "thoughts_token_count", 0) or 0,
+        }
+        for kind, count in counts.items():
+            if count:
+                registry.inc("ai_tokens_total", count, model=model, priority=priority.label, kind=kind)
+        self._spent[priority] = (self._today(), self.spent_today(priority) + sum(counts.values()))
+        registry.observe("ai_prompt_tokens", counts["prompt"], model=model, operation=operation)
+        set_attribute("prompt_tokens", counts["prompt"])
+        logger.info(f"Gemini {operation} on {model} ({priority.label}): {counts['prompt']} prompt, "
+                    f"{counts['output']} output, {counts['thinking']} thinking tokens in {seconds:.2f}s")
+
+    @staticmethod
+    def _track(model: str, operation: str, seconds: float, success: bool) -> None:
+        from src.monitoring import monitor
+        monitor.track_external("gemini", seconds, success=success, operation=operation)
+        if success:
+            monitor.track_ai_latency(seconds, model=model, operation=operation)
+
+    def hedge_delay(self, model: str, operation: str) -> Optional[float]:
+        window = self._latency.get((model, operation))
+        p95 = window.p95(AI_HEDGE_MIN_SAMPLES) if window else None
+        return None if p95 is None else max(p95, AI_HEDGE_MIN_DELAY)
+
+    def _record_latency(self, model: str, operation: str, seconds: float) -> None:
+        window = self._latency.get((model, operation))
+        if window is None:
+            window = self._latency[(model, operation)] = _LatencyWindow()
+        window.add(seconds)
+
+    async def _hedged(self, model: str, call: Callable[[], Awaitable[Any]], delay: float) -> Any:
+        primary = asyncio.ensure_future(call())
+        backup = None
+        slots = self._slots_for(model)
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            if not slots.try_acquire(Priority.INTERACTIVE):
+                registry.inc("ai_hedge_total", model=model, result="no_slot")
+                return await primary
+            try:
+                registry.inc("ai_hedge_total", model=model, result="launched")
+                self._hedges["launched"] += 1
+                backup = asyncio.ensure_future(call())
+                pending = {primary, backup}
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            won = task is backup
+                            registry.inc("ai_hedge_total", model=model, result="won" if won else "lost")
+                            self._hedges["won"] += won
+                            return task.result()
+                return primary.result()
+            finally:
+                if backup is not None and not backup.done():
+                    backup.cancel()
+                slots.release()
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def generate(self, model: str, contents, config, priority: Optional[Priority] = None,
+                       operation: str = "generate", hedge: Optional[bool] = None):
+        """``generate_content`` on ``model`` in its slot, hedged for interactive calls when enabled."""
+        priority = self._resolve(priority)
+        client = self._client()
+
+        def call():
+            return client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+        if hedge is None:
+            hedge = self.hedge and priority == Priority.INTERACTIVE
+        async with self.slot(model, priority):
+            self._check_budget(priority)
+            started = time.perf_counter()
+            delay = self.hedge_delay(model, operation) if hedge else None
+            try:
+                response = await (call() if delay is None else self._hedged(model, call, delay))
+            except Exception:
+                self._track(model, operation, time.perf_counter() - started, success=False)
+                raise
+            elapsed = time.perf_counter() - started
+            self._record_latency(model, operation, elapsed)
+            self._track(model, operation, elapsed, success=True)
+        self._account(model, priority, getattr(response, "usage_metadata", None), operation, elapsed)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, model: str, contents, config,
+                     priority: Optional[Priority] = None) -> AsyncIterator[AsyncIterator[Any]]:
+        """``generate_content_stream`` on ``model``; yields the chunk iterator.
+
+        The slot is held until the block exits, and leaving the block early
+        closes the stream.
+        """
+        priority = self._resolve(priority)
+        async with self.slot(model, priority):
+            self._check_budget(priority)
+            started = time.perf_counter()
+            try:
+                response = await self._client().aio.models.generate_content_stream(
+                    model=model, contents=contents, config=config
+                )
+            except Exception:
+                self._track(model, "stream", time.perf_counter() - started, success=False)
+                raise
+            usage = []
+            failed = False
+
+            async def chunks():
+                async for chunk in response:
+                    if getattr(chunk, "usage_metadata", None) is not None:
+                        usage[:] = [chunk.usage_metadata]
+                    yield chunk
+
+            iterator = chunks()
+            try:
+                yield iterator
+            except Exception:
+                failed = True
+                raise
+            finally:
+                await iterator.aclose()
+                aclose = getattr(response, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+                elapsed = time.perf_counter() - started
+                self._track(model, "stream", elapsed, success=not failed)
+                self._account(model, priority, usage[0] if usage else None, "stream", elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "models": {
+                model: {"limit": s.limit, "in_use": s.in_use, "queued": s.queued}
+                for model, s in self._slots.items()
+            },
+            "tokens_today": {p.label: self.spent_today(p) for p in Priority},
+            "budgets": {p.label: budget for p, budget in self.budgets.items() if budget},
+            "hedges_launched": self._hedges["launched"],
+            "hedges_won": self._hedges["won"],
+        }
+
+
+ai_scheduler = LazySingleton(AIScheduler)
+
+
+def _serve_fake_model(latency: Callable[[], float]):
+    """Local HTTP server answering ``:generateContent`` like the Gemini API."""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency())
+            payload = json.dumps({
+                "candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": 1,
+                                  "totalTokenCount": len(body) // 4 + 1},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _RawAsyncModels:
+    """Minimal stand-in for ``client.aio.models`` speaking HTTP to the fake server,
+    for running the load check where google-genai is not installed."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    async def generate_content(self, model, contents, config=None):
+        import json
+        import urllib.request
+        from types import SimpleNamespace
+
+        def post():
+            request = urllib.request.Request(
+                f"{self.base_url}/v1beta/models/{model}:generateContent",
+                data=json.dumps({"contents": contents}).encode(), headers={"Content-Type": "application/json"},
+            )
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+
+        payload = await asyncio.to_thread(post)
+        usage = payload["usageMetadata"]
+        return SimpleNamespace(
+            text=payload["candidates"][0]["content"]["parts"][0]["text"],
+            usage_metadata=SimpleNamespace(prompt_token_count=usage["promptTokenCount"],
+                                           candidates_token_count=usage["candidatesTokenCount"]),
+        )
+
+
+async def _load_check(requests: int = 90, concurrency: int = 4) -> None:
+    import random
+    from types import SimpleNamespace
+
+    server = _serve_fake_model(lambda: 0.2 if random.random() < 0.96 else 2.5)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        from google import genai
+        from google.genai import types
+        client = genai.Client(api_key="fake", http_options=types.HttpOptions(base_url=base_url))
+        backend = "google-genai"
+    except ImportError:
+        client = SimpleNamespace(aio=SimpleNamespace(models=_RawAsyncModels(base_url)))
+        backend = "raw HTTP"
+
+    scheduler = AIScheduler(client=client, concurrency=concurrency, reserve=1, hedge=True,
+                            budgets={Priority.BACKGROUND: 500})
+    latencies: Dict[Priority, List[float]] = {p: [] for p in Priority}
+    outcomes: Dict[str, int] = {}
+
+    async def one(i: int) -> None:
+        priority = Priority(i % 3)
+        await asyncio.sleep(i * 0.02)
+        started = time.perf_counter()
+        try:
+            await scheduler.generate("fake-model", f"request {i} " * 20, None, priority=priority)
+            latencies[priority].append(time.perf_counter() - started)
+            outcome = "ok"
+        except TokenBudgetExceeded:
+            outcome = "over budget"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    for i in range(AI_HEDGE_MIN_SAMPLES):
+        await scheduler.generate("fake-model", "warm-up", None, hedge=False)
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    server.shutdown()
+
+    print(f"{requests} requests through {backend}, {concurrency} slots: {outcomes}")
+    for priority, values in latencies.items():
+        if values:
+            values.sort()
+            print(f"  {priority.label:<12} n={len(values):<3} p50={values[len(values) // 2]:.2f}s "
+                  f"max={values[-1]:.2f}s")
+    print(f"  hedge delay {scheduler.hedge_delay('fake-model', 'generate'):.2f}s, {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_load_check())
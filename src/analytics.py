@@ -7,6 +7,8 @@ from typing import Optional, Dict, Any
 from enum import Enum
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -36,10 +38,8 @@ class FunnelEvent(Enum):
 class Analytics:
     """Analytics tracking for funnel and user behavior."""
     
-    def __init__(self):
-        self._init_db()
-    
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         """Initialize analytics tables."""
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, analytics disabled")
@@ -206,4 +206,5 @@ class Analytics:
         return text
 
 
-analytics = Analytics()
+analytics = LazySingleton(Analytics)
+register_schema("analytics", 1, Analytics._init_db)
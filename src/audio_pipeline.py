@@ -0,0 +1,290 @@
+"""Audio transcoding and fallback racing for the voice pipeline.
+
+``ogg_to_wav`` runs ffmpeg as an asyncio subprocess over stdin/stdout pipes:
+no temp files, nothing blocking the event loop, and at most
+AUDIO_TRANSCODE_CONCURRENCY transcodes at once. ffmpeg emits raw 16 kHz mono
+PCM and the WAV header is written here, because ffmpeg cannot patch the RIFF
+sizes on a pipe.
+
+``concat_ogg_opus`` joins Ogg Opus clips into one stream without
+re-encoding: the packets are copied as is onto renumbered pages of a single
+logical stream with recomputed granule positions.
+
+``first_success`` runs the primary attempt alone and, only if it fails,
+races the fallbacks and returns the first usable result.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import struct
+import time
+import wave
+from typing import Awaitable, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_TIMEOUT = float(os.environ.get("AUDIO_TRANSCODE_TIMEOUT", "15"))
+TRANSCODE_CONCURRENCY = int(os.environ.get("AUDIO_TRANSCODE_CONCURRENCY", str(os.cpu_count() or 2)))
+SAMPLE_RATE = 16000
+
+_transcode_slots: Optional[asyncio.Semaphore] = None
+_ffmpeg_missing = False
+
+
+async def _ffmpeg(args: Sequence[str], data: bytes) -> bytes:
+    """Run ffmpeg reading ``data`` from stdin; returns stdout, b"" on failure."""
+    global _transcode_slots, _ffmpeg_missing
+    if _ffmpeg_missing:
+        return b""
+    if _transcode_slots is None:
+        _transcode_slots = asyncio.Semaphore(max(1, TRANSCODE_CONCURRENCY))
+    async with _transcode_slots:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *args, "pipe:1",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            _ffmpeg_missing = True
+            logger.warning("ffmpeg not found; audio will be sent untranscoded")
+            return b""
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(data), TRANSCODE_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.warning(f"ffmpeg timed out after {TRANSCODE_TIMEOUT:.0f}s on {len(data)} bytes")
+            return b""
+        except BaseException:
+            proc.kill()
+            await proc.wait()
+            raise
+    if proc.returncode != 0:
+        logger.warning(f"ffmpeg exited with {proc.returncode}: {err[:200].decode(errors='replace')}")
+        return b""
+    return out
+
+
+def _wav_from_pcm(pcm: bytes, rate: int = SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+async def ogg_to_wav(ogg_bytes: bytes) -> bytes:
+    """16 kHz mono WAV for an OGG/Opus voice note, or b"" if ffmpeg is unavailable or fails."""
+    start = time.perf_counter()
+    pcm = await _ffmpeg(["-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "s16le"], bytes(ogg_bytes))
+    if not pcm:
+        registry.inc("audio_transcode_total", result="error")
+        return b""
+    wav = _wav_from_pcm(pcm)
+    registry.observe("audio_transcode_seconds", time.perf_counter() - start)
+    registry.inc("audio_transcode_total", result="ok")
+    logger.info(f"Converted OGG ({len(ogg_bytes)} bytes) to WAV ({len(wav)} bytes) via ffmpeg pipe")
+    return wav
+
+
+_OGG_HEADER = struct.Struct("<4sBBqIIIB")
+_OGG_CONTINUED, _OGG_BOS, _OGG_EOS = 0x01, 0x02, 0x04
+_NO_GRANULE = -1
+
+
+def _ogg_crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+
+_CRC_TABLE = _ogg_crc_table()
+
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    table = _CRC_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[((crc >> 24) ^ b) & 0xFF]
+    return crc
+
+
+class _OggPage(NamedTuple):
+    flags: int
+    granule: int
+    serial: int
+    lacing: bytes
+    body: bytes
+
+
+def _ogg_pages(data: bytes) -> Iterator[_OggPage]:
+    pos = 0
+    while pos < len(data):
+        if len(data) - pos < _OGG_HEADER.size:
+            raise ValueError("truncated Ogg page header")
+        magic, version, flags, granule, serial, _seq, _crc, nsegs = _OGG_HEADER.unpack_from(data, pos)
+        if magic != b"OggS" or version != 0:
+            raise ValueError(f"not an Ogg page at offset {pos}")
+        lacing_at = pos + _OGG_HEADER.size
+        lacing = data[lacing_at:lacing_at + nsegs]
+        body_at = lacing_at + nsegs
+        body_end = body_at + sum(lacing)
+        if len(lacing) != nsegs or body_end > len(data):
+            raise ValueError("truncated Ogg page")
+        yield _OggPage(flags, granule, serial, bytes(lacing), data[body_at:body_end])
+        pos = body_end
+
+
+def _ogg_page_bytes(page: _OggPage, seq: int) -> bytes:
+    header = _OGG_HEADER.pack(b"OggS", 0, page.flags, page.granule, page.serial, seq, 0, len(page.lacing))
+    raw = bytearray(header + page.lacing + page.body)
+    struct.pack_into("<I", raw, 22, _ogg_crc(raw))
+    return bytes(raw)
+
+
+_FRAME_SAMPLES_48K = (
+    [480, 960, 1920, 2880] * 3      # SILK-only: 10/20/40/60 ms
+    + [480, 960] * 2                # hybrid: 10/20 ms
+    + [120, 240, 480, 960] * 4      # CELT-only: 2.5/5/10/20 ms
+)
+
+
+def _opus_packet_samples(packet: bytes) -> int:
+    """Samples at 48 kHz in one Opus packet (RFC 6716, section 3.1)."""
+    if not packet:
+        return 0
+    toc = packet[0]
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        if len(packet) < 2:
+            raise ValueError("malformed Opus packet")
+        frames = packet[1] & 0x3F
+    return frames * _FRAME_SAMPLES_48K[toc >> 3]
+
+
+def _page_packet_ends(page: _OggPage) -> List[Tuple[int, int]]:
+    """(start, end) body offsets of the packet pieces on a page that end there."""
+    ends, start, offset = [], 0, 0
+    for value in page.lacing:
+        offset += value
+        if value < 255:
+            ends.append((start, offset))
+            start = offset
+    return ends
+
+
+def concat_ogg_opus(clips: Sequence[bytes]) -> bytes:
+    """Join Ogg Opus clips into one playable stream without re-encoding.
+
+    The first clip's OpusHead/OpusTags pages are kept and the later clips'
+    header pages dropped; every page is moved onto the first clip's serial
+    number with consecutive sequence numbers. Granule positions are
+    recomputed from the packet TOC bytes, and the last clip's end trimming
+    is preserved. Later clips' encoder pre-skip (a few ms) is played, which
+    is inaudible between sentences. Raises ValueError on input that is not
+    Ogg Opus.
+    """
+    if not clips:
+        raise ValueError("no clips to join")
+    if len(clips) == 1:
+        return clips[0]
+
+    out = bytearray()
+    serial = None
+    seq = 0
+    total = 0
+    for index, clip in enumerate(clips):
+        pages = list(_ogg_pages(clip))
+        if not pages or not pages[0].body.startswith(b"OpusHead"):
+            raise ValueError(f"clip {index} is not Ogg Opus")
+        if serial is None:
+            serial = pages[0].serial
+        last_clip = index == len(clips) - 1
+        clip_start = total
+        header_packets = 0
+        pending = b""
+        for page_index, page in enumerate(pages):
+            ends = _page_packet_ends(page)
+            if header_packets < 2:
+                header_packets += len(ends)
+                if index == 0:
+                    out += _ogg_page_bytes(page._replace(serial=serial), seq)
+                    seq += 1
+                continue
+            for start, end in ends:
+                piece = page.body[start:end]
+                total += _opus_packet_samples(pending + piece if start == 0 else piece)
+                pending = b""
+            pending += page.body[ends[-1][1]:] if ends else page.body
+            granule = total if ends else _NO_GRANULE
+            flags = page.flags & ~(_OGG_BOS | _OGG_EOS)
+            if last_clip and page_index == len(pages) - 1:
+                flags |= _OGG_EOS
+                if page.granule != _NO_GRANULE:
+                    granule = min(total, clip_start + page.granule)
+            out += _ogg_page_bytes(page._replace(flags=flags, granule=granule, serial=serial), seq)
+            seq += 1
+    return bytes(out)
+
+
+Attempt = Tuple[str, Callable[[], Awaitable[Optional[T]]]]
+
+
+async def first_success(attempts: List[Attempt], metric: str) -> Tuple[Optional[str], Optional[T]]:
+    """Run ``attempts[0]``; if it fails (raises or returns a falsy value),
+    race the remaining attempts and return the first truthy result.
+
+    Returns ``(name, result)`` or ``(None, None)`` when everything failed.
+    Each attempt is counted in ``<metric>{strategy,result}``.
+    """
+    async def run(name: str, attempt) -> Tuple[str, Optional[T]]:
+        start = time.perf_counter()
+        try:
+            result = await attempt()
+        except asyncio.CancelledError:
+            registry.inc(metric, strategy=name, result="cancelled")
+            raise
+        except Exception as e:
+            logger.warning(f"[{name}] failed: {type(e).__name__}: {e}")
+            result = None
+        registry.inc(metric, strategy=name, result="ok" if result else "error")
+        registry.observe(f"{metric.removesuffix('_total')}_seconds", time.perf_counter() - start, strategy=name)
+        return name, result
+
+    if not attempts:
+        return None, None
+    name, result = await run(*attempts[0])
+    if result:
+        return name, result
+
+    pending = {asyncio.ensure_future(run(n, a)) for n, a in attempts[1:]}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, result = task.result()
+                if result:
+                    return name, result
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None
@@ -14,6 +14,9 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from src.bot_api import styled_button_api_kwargs
 
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+
 logger = logging.getLogger(__name__)
 
 
@@ -108,9 +111,9 @@ class BriefState:
 class BriefGenerator:
     def __init__(self):
         self._states: Dict[int, BriefState] = {}
-        self._init_db()
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         try:
             from src.database import get_connection
             with get_connection() as conn:
@@ -317,4 +320,5 @@ class BriefGenerator:
         return "\n".join(lines)
 
 
-brief_generator = BriefGenerator()
+brief_generator = LazySingleton(BriefGenerator)
+register_schema("brief_generator", 1, BriefGenerator._init_db)
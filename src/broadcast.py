@@ -4,25 +4,25 @@ from datetime import datetime
 from typing import Dict, List, Optional
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 from psycopg2.extras import RealDictCursor
 
 logger = logging.getLogger(__name__)
 
 
 class BroadcastManager:
-    def __init__(self):
-        self._init_db()
-
     def _get_connection(self):
         return get_connection()
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, broadcast will not work")
             return
 
         try:
-            with self._get_connection() as conn:
+            with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS bot_users (
@@ -382,6 +382,7 @@ class BroadcastManager:
                     voice_text = await _generate_broadcast_voice_supplement(broadcast_text)
                     if voice_text:
                         from src.handlers.media import generate_voice_response
+                        from src.tts_cache import send_voice
                         for _bc_attempt in range(2):
                             try:
                                 audio = await generate_voice_response(voice_text, voice_profile="greeting")
@@ -425,7 +426,7 @@ class BroadcastManager:
 
                 if voice_supplement_audio:
                     try:
-                        await bot.send_voice(chat_id=user_id, voice=voice_supplement_audio)
+                        await send_voice(bot.send_voice, voice_supplement_audio, chat_id=user_id)
                     except Exception as ve:
                         logger.debug(f"Voice supplement to {user_id} failed: {ve}")
 
@@ -528,9 +529,8 @@ async def _generate_broadcast_voice_supplement(text_message: str) -> str:
 
     try:
         from google.genai import types as genai_types
-        from src.config import config as app_config, get_gemini_client
-
-        client = get_gemini_client()
+        from src.ai_scheduler import Priority, ai_scheduler
+        from src.config import config as app_config
 
         prompt = (
             "Ты — Алекс, живой консультант WEB4TG Studio. Записываешь КОРОТКОЕ голосовое к рассылке.\n\n"
@@ -563,14 +563,14 @@ async def _generate_broadcast_voice_supplement(text_message: str) -> str:
             "Верни ТОЛЬКО текст для озвучки."
         )
 
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model=app_config.model_name,
-            contents=[prompt],
-            config=genai_types.GenerateContentConfig(
+        response = await ai_scheduler.generate(
+            app_config.model_name,
+            [prompt],
+            genai_types.GenerateContentConfig(
                 max_output_tokens=120,
                 temperature=0.7
-            )
+            ),
+            priority=Priority.BACKGROUND,
         )
 
         if response.text:
@@ -593,4 +593,5 @@ async def _generate_broadcast_voice_supplement(text_message: str) -> str:
     return random.choice(_bc_fallbacks)
 
 
-broadcast_manager = BroadcastManager()
+broadcast_manager = LazySingleton(BroadcastManager)
+register_schema("broadcast", 1, BroadcastManager._init_db)
@@ -1,6 +1,8 @@
 import logging
 from datetime import datetime, timedelta, date, time
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -19,14 +21,9 @@ class CalendarBooking:
     def __init__(self):
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set — CalendarBooking disabled")
-            return
-        try:
-            self._create_tables()
-            self._seed_default_availability()
-        except Exception as e:
-            logger.error(f"CalendarBooking init error: {e}")
 
-    def _create_tables(self):
+    @staticmethod
+    def _create_tables():
         with get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
@@ -68,7 +65,8 @@ class CalendarBooking:
                     END $$;
                 """)
 
-    def _seed_default_availability(self):
+    @staticmethod
+    def _seed_default_availability():
         with get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM availability_slots")
@@ -331,8 +329,6 @@ class CalendarBooking:
             return "✅ Вы записаны на консультацию!"
 
 
-try:
-    calendar_booking = CalendarBooking()
-except Exception as e:
-    logger.error(f"Failed to initialize CalendarBooking: {e}")
-    calendar_booking = CalendarBooking.__new__(CalendarBooking)
+calendar_booking = LazySingleton(CalendarBooking)
+register_schema("calendar_booking", 1, CalendarBooking._create_tables)
+register_schema("calendar_availability_seed", 1, CalendarBooking._seed_default_availability)
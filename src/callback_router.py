@@ -0,0 +1,184 @@
+"""Table-driven routing for inline-button callback_data.
+
+Handlers register against an exact key or a prefix::
+
+    router = CallbackRouter()
+
+    @router.exact("menu_back")
+    async def _menu_back(cb: CallbackRequest) -> None: ...
+
+    @router.prefix("mod_approve_", parse=int)
+    async def _approve(cb: CallbackRequest) -> None:
+        review_id = cb.payload
+
+Resolution is one dict lookup for exact keys, then a walk of a character
+trie that returns the longest registered prefix, so cost does not depend on
+the number of routes or their registration order. ``parse`` turns the text
+after the prefix into a typed payload; a ValueError from it marks the
+callback as malformed and the handler is not called.
+
+The router answers the callback query before the handler runs, except for
+routes registered with ``alerts=True``: those answer through
+``cb.answer(...)`` themselves (a query can only be answered once, so an
+early empty answer would swallow their alerts), and the router answers
+afterwards if they did not. Routes may carry a per-user rate limit
+``rate=(calls, seconds)``. Every dispatch records
+``callback_route_seconds{route}``.
+"""
+
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from src.metrics import registry
+from src.tracing import set_attribute
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_TEXT = "⏳ Слишком часто. Подождите немного и попробуйте снова."
+
+_RATE_STATE_MAX = 10_000
+
+
+@dataclass
+class CallbackRequest:
+    update: Any
+    context: Any
+    query: Any
+    user_id: int
+    data: str
+    route: str
+    payload: Any = None
+    answered: bool = False
+
+    async def answer(self, text: Optional[str] = None, show_alert: bool = False) -> None:
+        if self.answered:
+            return
+        self.answered = True
+        await self.query.answer(text, show_alert=show_alert)
+
+
+Handler = Callable[[CallbackRequest], Awaitable[None]]
+
+
+@dataclass
+class Route:
+    name: str
+    handler: Handler
+    prefix: bool = False
+    parse: Optional[Callable[[str], Any]] = None
+    alerts: bool = False
+    rate: Optional[Tuple[int, float]] = None
+
+
+@dataclass
+class _TrieNode:
+    children: Dict[str, "_TrieNode"] = field(default_factory=dict)
+    route: Optional[Route] = None
+
+
+class CallbackRouter:
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._trie = _TrieNode()
+        self._calls: Dict[Tuple[str, int], Deque[float]] = {}
+
+    def exact(self, *keys: str, alerts: bool = False,
+              rate: Optional[Tuple[int, float]] = None) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for key in keys:
+                if key in self._exact:
+                    raise ValueError(f"Callback route {key!r} registered twice")
+                self._exact[key] = Route(key, handler, alerts=alerts, rate=rate)
+            return handler
+        return register
+
+    def prefix(self, *prefixes: str, parse: Optional[Callable[[str], Any]] = None,
+               alerts: bool = False, rate: Optional[Tuple[int, float]] = None) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            for prefix in prefixes:
+                node = self._trie
+                for ch in prefix:
+                    node = node.children.setdefault(ch, _TrieNode())
+                if node.route is not None:
+                    raise ValueError(f"Callback prefix {prefix!r} registered twice")
+                node.route = Route(f"{prefix}*", handler, prefix=True, parse=parse, alerts=alerts, rate=rate)
+            return handler
+        return register
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], str]:
+        """The route for ``data`` and the unparsed remainder after its prefix."""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ""
+        best: Optional[Route] = None
+        best_len = 0
+        node = self._trie
+        for i, ch in enumerate(data):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.route is not None:
+                best, best_len = node.route, i + 1
+        return best, data[best_len:]
+
+    def _allow(self, route: Route, user_id: int) -> bool:
+        calls_allowed, window = route.rate
+        now = time.monotonic()
+        key = (route.name, user_id)
+        calls = self._calls.get(key)
+        if calls is None:
+            if len(self._calls) >= _RATE_STATE_MAX:
+                self._calls = {k: v for k, v in self._calls.items() if v and now - v[-1] < window}
+            calls = self._calls[key] = deque()
+        while calls and now - calls[0] >= window:
+            calls.popleft()
+        if len(calls) >= calls_allowed:
+            return False
+        calls.append(now)
+        return True
+
+    async def dispatch(self, update, context) -> Optional[str]:
+        """Route one callback query; returns the matched route name."""
+        query = update.callback_query
+        data = query.data or ""
+        user_id = query.from_user.id
+        route, remainder = self.resolve(data)
+        if route is None:
+            await query.answer()
+            registry.inc("callback_unknown_total")
+            logger.warning(f"Unknown callback_data: {data} from user {user_id}")
+            return None
+
+        set_attribute("route", route.name)
+        cb = CallbackRequest(update, context, query, user_id, data, route.name)
+        if route.rate and not self._allow(route, user_id):
+            registry.inc("callback_rate_limited_total", route=route.name)
+            await cb.answer(RATE_LIMITED_TEXT)
+            return route.name
+        if route.parse is not None:
+            try:
+                cb.payload = route.parse(remainder)
+            except (ValueError, KeyError) as e:
+                await cb.answer()
+                registry.inc("callback_malformed_total", route=route.name)
+                logger.warning(f"Malformed callback_data {data!r} for {route.name}: {e}")
+                return route.name
+        elif route.prefix:
+            cb.payload = remainder
+
+        if not route.alerts:
+            await cb.answer()
+        start = time.perf_counter()
+        try:
+            await route.handler(cb)
+        finally:
+            registry.observe("callback_route_seconds", time.perf_counter() - start, route=route.name)
+            if not cb.answered:
+                try:
+                    await cb.answer()
+                except Exception:
+                    pass
+        return route.name
@@ -97,5 +97,8 @@ def get_gemini_client():
     global _gemini_client
     if _gemini_client is None:
         from google import genai
-        _gemini_client = genai.Client(api_key=config.gemini_api_key)
+        from google.genai import types
+        base_url = os.environ.get("GEMINI_BASE_URL")
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        _gemini_client = genai.Client(api_key=config.gemini_api_key, http_options=http_options)
     return _gemini_client
@@ -0,0 +1,278 @@
+"""Prompt and knowledge content loaded from data files and reloaded at runtime.
+
+The system prompt, the blocks compose_system_prompt assembles, the FAQ
+answers and the knowledge-base seed live as JSON in CONTENT_DIR (``content/``
+in the project root):
+
+- ``prompts.json`` — prompt blocks; multi-line texts are lists of lines;
+- ``faq.json`` — FAQ buttons, ``{key: {"question", "answer"}}``;
+- ``knowledge.json`` — intent keywords for knowledge search and the chunks
+  that seed the ``knowledge_chunks`` table.
+
+Each load builds an immutable ``ContentSnapshot`` that holds everything
+derived from the files: joined texts, the sections compose_system_prompt
+appends to every prompt (``prompt_tail``, ``default_methodologies``, niche
+few-shots already followed by the general examples), per-block token
+estimates and a ``KnowledgeIndex`` over the chunks. ``version`` is a sha256
+of the three files.
+
+``content.reload()`` compares file mtimes and sizes and, when they changed,
+builds a new snapshot and swaps it in with one assignment. Readers take
+``content.current`` once per use, so a prompt is never assembled from two
+versions. A file that fails to parse or validate leaves the previous
+snapshot in place. Reloads run every CONTENT_RELOAD_INTERVAL seconds from
+the job queue and on /reload_content.
+
+With a database, knowledge search reads ``knowledge_chunks``. The file is
+the source for the rows it defines: after every reload check
+``knowledge_base_rag.sync_from_content`` upserts them by (category, title)
+and deletes the ones the file dropped, once per content version. Rows
+admins add in the table are kept. Without a database, or when the query
+fails, ``KnowledgeIndex.search`` answers from the file with the same scoring.
+
+Metrics: ``content_reloads_total{result}``, ``content_prompt_tokens{block}``.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.context_window import estimate_tokens
+from src.lazy import LazySingleton
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTENT_DIR = os.environ.get("CONTENT_DIR", os.path.join(_PROJECT_ROOT, "content"))
+CONTENT_RELOAD_INTERVAL = int(os.environ.get("CONTENT_RELOAD_INTERVAL", "30"))
+
+CONTENT_FILES = ("prompts.json", "faq.json", "knowledge.json")
+_TEXT_BLOCKS = ("system_prompt", "core_identity", "anthropomorphism", "pricing", "niche_pains", "few_shot_examples")
+_CHUNK_FIELDS = ("category", "title", "content", "tags", "priority")
+
+
+def _text(value, name: str) -> str:
+    if isinstance(value, list) and all(isinstance(line, str) for line in value):
+        return "\n".join(value)
+    if isinstance(value, str):
+        return value
+    raise ValueError(f"{name}: expected a string or a list of lines")
+
+
+@dataclass(frozen=True)
+class KnowledgeIndex:
+    chunks: Tuple[Dict, ...]
+    lowered: Tuple[Tuple[str, str], ...]
+    by_tag: Dict[str, Tuple[int, ...]]
+    intents: Dict[str, Tuple[str, ...]]
+
+    @classmethod
+    def build(cls, chunks: List[Dict], intents: Dict[str, List[str]]) -> "KnowledgeIndex":
+        by_tag: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            for tag in chunk["tags"]:
+                by_tag.setdefault(tag, []).append(i)
+        return cls(
+            chunks=tuple(chunks),
+            lowered=tuple((c["title"].lower(), c["content"].lower()) for c in chunks),
+            by_tag={tag: tuple(ids) for tag, ids in by_tag.items()},
+            intents={tag: tuple(keywords) for tag, keywords in intents.items()},
+        )
+
+    def detect_tags(self, query_lower: str) -> List[str]:
+        return [tag for tag, keywords in self.intents.items() if any(kw in query_lower for kw in keywords)]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Same scoring as KnowledgeBase.search over the table: priority,
+        +5 per matched intent tag, +2 per query word found, +3 for a title hit."""
+        query_lower = query.lower()
+        tags = self.detect_tags(query_lower)
+        scores: Dict[int, int] = {}
+        for tag in tags:
+            for i in self.by_tag.get(tag, ()):
+                if i not in scores:
+                    overlap = len(set(self.chunks[i]["tags"]) & set(tags))
+                    scores[i] = self.chunks[i]["priority"] + overlap * 5
+
+        words = [w for w in query_lower.split() if len(w) > 2]
+        if words:
+            for i, (title, text) in enumerate(self.lowered):
+                if not any(w in title or w in text for w in words[:5]):
+                    continue
+                word_hits = sum(1 for w in words if w in text or w in title)
+                title_bonus = 3 if any(w in title for w in words) else 0
+                scores[i] = scores.get(i, self.chunks[i]["priority"]) + word_hits * 2 + title_bonus
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], -self.chunks[i]["priority"]))
+        return [
+            {"title": self.chunks[i]["title"], "content": self.chunks[i]["content"], "category": self.chunks[i]["category"]}
+            for i in ranked[:limit]
+        ]
+
+
+@dataclass(frozen=True)
+class ContentSnapshot:
+    version: str
+    loaded_at: float
+    system_prompt: str
+    core_identity: str
+    anthropomorphism: str
+    pricing: str
+    niche_pains: str
+    few_shot_examples: str
+    methodology: Dict[str, str]
+    niche_few_shots: Dict[str, str]
+    faq: Dict[str, Dict[str, str]]
+    chunks: Tuple[Dict, ...]
+    default_methodologies: str
+    prompt_tail: str
+    few_shots: Dict[str, str]
+    tokens: Dict[str, int]
+    index: KnowledgeIndex
+
+    def few_shots_for(self, niche: Optional[str]) -> str:
+        return self.few_shots.get(niche or "", self.few_shot_examples)
+
+
+def build_snapshot(raw: Dict[str, bytes]) -> ContentSnapshot:
+    """Parse and validate the files and derive everything the readers need."""
+    digest = hashlib.sha256()
+    for name in CONTENT_FILES:
+        digest.update(name.encode())
+        digest.update(raw[name])
+    prompts = json.loads(raw["prompts.json"])
+    faq = json.loads(raw["faq.json"])
+    knowledge = json.loads(raw["knowledge.json"])
+
+    texts = {name: _text(prompts.get(name), name) for name in _TEXT_BLOCKS}
+    methodology = {k: _text(v, f"methodology.{k}") for k, v in prompts.get("methodology", {}).items()}
+    niche_few_shots = {k: _text(v, f"niche_few_shots.{k}") for k, v in prompts.get("niche_few_shots", {}).items()}
+    default_keys = prompts.get("default_methodologies") or []
+    missing = [k for k in default_keys if k not in methodology]
+    if not default_keys or missing:
+        raise ValueError(f"default_methodologies: unknown or empty {missing}")
+
+    for key, item in faq.items():
+        if not isinstance(item, dict) or not item.get("question") or not item.get("answer"):
+            raise ValueError(f"faq.{key}: question and answer are required")
+
+    chunks = knowledge.get("chunks") or []
+    for i, chunk in enumerate(chunks):
+        absent = [f for f in _CHUNK_FIELDS if f not in chunk]
+        if absent:
+            raise ValueError(f"knowledge.chunks[{i}]: missing {absent}")
+    intents = knowledge.get("intents") or {}
+
+    tokens = {name: estimate_tokens(text) for name, text in texts.items()}
+    tokens.update({f"methodology.{k}": estimate_tokens(v) for k, v in methodology.items()})
+    tokens.update({f"niche_few_shots.{k}": estimate_tokens(v) for k, v in niche_few_shots.items()})
+
+    return ContentSnapshot(
+        version=digest.hexdigest(),
+        loaded_at=time.time(),
+        methodology=methodology,
+        niche_few_shots=niche_few_shots,
+        faq=faq,
+        chunks=tuple(chunks),
+        default_methodologies="\n\n".join(methodology[k] for k in default_keys),
+        prompt_tail="\n\n".join([texts["pricing"], texts["niche_pains"], texts["anthropomorphism"]]),
+        few_shots={k: f"{v}\n\n{texts['few_shot_examples']}" for k, v in niche_few_shots.items()},
+        tokens=tokens,
+        index=KnowledgeIndex.build(chunks, intents),
+        **texts,
+    )
+
+
+class ContentRegistry:
+    def __init__(self, directory: str = CONTENT_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._signature = self._stat()
+        self._snapshot = build_snapshot(self._read())
+        self.last_error: Optional[str] = None
+        self._record_tokens()
+        logger.info(f"Content {self.version[:12]} loaded from {directory}")
+
+    @property
+    def current(self) -> ContentSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+
+    def _stat(self) -> Tuple:
+        signature = []
+        for name in CONTENT_FILES:
+            st = os.stat(os.path.join(self.directory, name))
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _read(self) -> Dict[str, bytes]:
+        raw = {}
+        for name in CONTENT_FILES:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                raw[name] = f.read()
+        return raw
+
+    def _record_tokens(self) -> None:
+        for block, tokens in self._snapshot.tokens.items():
+            registry.set_gauge("content_prompt_tokens", tokens, block=block)
+
+    def reload(self, force: bool = False) -> bool:
+        """Swap in the files' current content; True when the version changed."""
+        with self._lock:
+            try:
+                signature = self._stat()
+                if not force and signature == self._signature:
+                    return False
+                snapshot = build_snapshot(self._read())
+            except Exception as e:
+                self.last_error = str(e)
+                registry.inc("content_reloads_total", result="error")
+                logger.error(f"Content reload failed, keeping {self.version[:12]}: {e}")
+                return False
+            previous = self._snapshot
+            self._signature = signature
+            self.last_error = None
+            if snapshot.version == previous.version:
+                registry.inc("content_reloads_total", result="unchanged")
+                return False
+            self._snapshot = snapshot
+        self._record_tokens()
+        registry.inc("content_reloads_total", result="ok")
+        logger.info(f"Content reloaded: {previous.version[:12]} -> {snapshot.version[:12]}")
+        from src.response_cache import response_cache
+        if response_cache.initialized:
+            response_cache.invalidate()
+        return True
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version[:12],
+            "loaded_at": snapshot.loaded_at,
+            "system_prompt_tokens": snapshot.tokens["system_prompt"],
+            "faq": len(snapshot.faq),
+            "chunks": len(snapshot.chunks),
+            "last_error": self.last_error,
+        }
+
+
+content = LazySingleton(ContentRegistry)
+
+
+async def periodic_content_reload(context):
+    try:
+        await asyncio.to_thread(content.reload)
+        from src.rag import knowledge_base_rag
+        await asyncio.to_thread(knowledge_base_rag.sync_from_content)
+    except Exception as e:
+        logger.error(f"Content reload job failed: {e}")
@@ -10,8 +10,9 @@ _CACHE_TTL = 30
 
 def _cached_get(key, fetcher):
     now = time.time()
-    if key in _context_cache:
-        val, ts = _context_cache[key]
+    cached = _context_cache.get(key)
+    if cached is not None:
+        val, ts = cached
         if now - ts < _CACHE_TTL:
             return val
     try:
@@ -0,0 +1,156 @@
+"""Token-aware packing of session history into the model context.
+
+``estimate_tokens`` approximates Gemini's tokenizer at about four characters
+per token for ASCII text and 2.5 for Cyrillic and other scripts, plus a
+fixed overhead per message. A message's estimate is cached in its dict
+under ``_tokens`` together with the text length it was computed for.
+``pack`` returns plain ``{"role", "parts"}`` copies, so that key never
+reaches the API.
+
+``pack`` fills CONTEXT_TOKEN_BUDGET in this order:
+
+1. the newest message, cut to fit if it alone exceeds the budget;
+2. the summary of earlier conversation, capped at half the budget;
+3. the remaining messages, newest first, until the next one does not fit.
+
+Messages older than the last CONTEXT_KEEP_FULL_MESSAGES that exceed
+CONTEXT_MAX_OLD_MESSAGE_TOKENS (long pastes, voice transcripts, vision
+descriptions) are cut to their beginning and end. Later requests then do
+not carry them in full.
+
+Metrics: ``context_history_tokens``, ``context_messages_dropped_total``,
+``context_messages_truncated_total``.
+"""
+
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "8000"))
+CONTEXT_KEEP_FULL_MESSAGES = int(os.environ.get("CONTEXT_KEEP_FULL_MESSAGES", "4"))
+CONTEXT_MAX_OLD_MESSAGE_TOKENS = int(os.environ.get("CONTEXT_MAX_OLD_MESSAGE_TOKENS", "400"))
+MESSAGE_OVERHEAD_TOKENS = 4
+_ELLIPSIS = " […] "
+
+SUMMARY_PREFIX = "[РЕЗЮМЕ ПРЕДЫДУЩЕГО ДИАЛОГА]\n"
+SUMMARY_ACK = "Понял контекст из предыдущего диалога, продолжаю."
+
+
+def estimate_tokens(text: str) -> int:
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2.5)
+
+
+def _texts(msg: Dict) -> List[str]:
+    return [p["text"] for p in msg.get("parts") or [] if isinstance(p, dict) and p.get("text")]
+
+
+def message_tokens(msg: Dict) -> int:
+    texts = _texts(msg)
+    length = sum(len(t) for t in texts)
+    cached = msg.get("_tokens")
+    if cached is not None and cached[0] == length:
+        return cached[1]
+    tokens = MESSAGE_OVERHEAD_TOKENS + sum(estimate_tokens(t) for t in texts)
+    msg["_tokens"] = (length, tokens)
+    return tokens
+
+
+def _shorten(text: str, max_tokens: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(0, int(len(text) * max_tokens / tokens) - len(_ELLIPSIS))
+    head = keep * 2 // 3
+    tail = keep - head
+    return text[:head].rstrip() + _ELLIPSIS + (text[-tail:].lstrip() if tail else "")
+
+
+def _copy(msg: Dict, max_tokens: Optional[int] = None) -> Dict:
+    parts = msg.get("parts") or []
+    if max_tokens is not None:
+        texts = _texts(msg)
+        total = sum(estimate_tokens(t) for t in texts) or 1
+        budget = max(0, max_tokens - MESSAGE_OVERHEAD_TOKENS)
+        parts = [
+            {**p, "text": _shorten(p["text"], budget * estimate_tokens(p["text"]) // total)}
+            if isinstance(p, dict) and p.get("text") else p
+            for p in parts
+        ]
+    return {"role": msg.get("role"), "parts": parts}
+
+
+def summary_messages(summary: str) -> List[Dict]:
+    return [
+        {"role": "user", "parts": [{"text": SUMMARY_PREFIX + summary}]},
+        {"role": "model", "parts": [{"text": SUMMARY_ACK}]},
+    ]
+
+
+@dataclass
+class PackedContext:
+    messages: List[Dict] = field(default_factory=list)
+    tokens: int = 0
+    dropped: int = 0
+    truncated: int = 0
+
+
+def pack(messages: List[Dict], summary: Optional[str] = None, budget: int = CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    """History for one request, within ``budget`` estimated tokens."""
+    packed = PackedContext()
+    remaining = budget
+
+    newest: List[Dict] = []
+    if messages:
+        msg = messages[-1]
+        tokens = message_tokens(msg)
+        if tokens > remaining:
+            msg = _copy(msg, remaining)
+            tokens = message_tokens(msg)
+            packed.truncated += 1
+        else:
+            msg = _copy(msg)
+        newest.append(msg)
+        remaining -= tokens
+
+    head: List[Dict] = []
+    if summary:
+        head = summary_messages(summary)
+        tokens = sum(message_tokens(m) for m in head)
+        cap = min(budget // 2, remaining)
+        if tokens > cap:
+            head = summary_messages(_shorten(summary, max(0, cap - 2 * MESSAGE_OVERHEAD_TOKENS)))
+            tokens = sum(message_tokens(m) for m in head)
+            packed.truncated += 1
+        remaining -= tokens
+
+    older: List[Dict] = []
+    for age, msg in enumerate(reversed(messages[:-1]), start=1):
+        tokens = message_tokens(msg)
+        if age >= CONTEXT_KEEP_FULL_MESSAGES and tokens > CONTEXT_MAX_OLD_MESSAGE_TOKENS:
+            msg = _copy(msg, CONTEXT_MAX_OLD_MESSAGE_TOKENS)
+            tokens = message_tokens(msg)
+            packed.truncated += 1
+        else:
+            msg = _copy(msg)
+        if tokens > remaining:
+            packed.dropped = len(messages) - age
+            break
+        older.append(msg)
+        remaining -= tokens
+    older.reverse()
+
+    packed.messages = [{"role": m["role"], "parts": m["parts"]} for m in head + older + newest]
+    packed.tokens = budget - remaining
+    registry.observe("context_history_tokens", packed.tokens)
+    if packed.dropped:
+        registry.inc("context_messages_dropped_total", packed.dropped)
+    if packed.truncated:
+        registry.inc("context_messages_truncated_total", packed.truncated)
+    return packed
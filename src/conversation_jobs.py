@@ -0,0 +1,305 @@
+"""Background summarization and insight extraction, batched across users.
+
+After a reply is sent, the handlers call ``conversation_jobs.submit(user_id,
+session)``. It only checks the session's thresholds and records a job, so
+replies never wait on these model calls:
+
+- a summary job when the session asks for summarization, i.e. it holds
+  SUMMARIZATION_THRESHOLD messages;
+- an insight job every INSIGHT_EVERY messages from INSIGHT_MIN_MESSAGES on.
+
+Jobs are keyed by kind and user, so a user with a job pending is not queued
+twice. The job reads the session when it runs and sees the latest messages.
+One worker drains the queue. After the first job it waits BATCH_WINDOW
+seconds to collect more, then packs up to BATCH_SIZE users of one kind into
+a single structured-output call at AUXILIARY priority.
+
+A summary is stored with ``session.set_summary`` (conversation_summaries).
+Only the messages it covers are dropped, so messages that arrived while the
+job ran stay in the window. Insights become lead tags and client_profiles
+fields. Database writes run in a worker thread.
+
+Metrics: ``conversation_jobs_total{kind,result}``,
+``conversation_jobs_batch_size{kind}``, ``conversation_jobs_pending``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.lazy import LazySingleton
+from src.metrics import registry
+from src.session import KEEP_RECENT, UserSession
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW = float(os.environ.get("CONVERSATION_JOBS_BATCH_WINDOW", "5"))
+BATCH_SIZE = int(os.environ.get("CONVERSATION_JOBS_BATCH_SIZE", "8"))
+SUMMARY_MIN_MESSAGES = 20
+INSIGHT_MIN_MESSAGES = 6
+INSIGHT_EVERY = 5
+MIN_SUMMARY_LENGTH = 20
+
+SUMMARY = "summary"
+INSIGHTS = "insights"
+
+SUMMARY_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "INTEGER"}, "summary": {"type": "STRING"}},
+        "required": ["id", "summary"],
+        "property_ordering": ["id", "summary"],
+    },
+}
+
+INSIGHTS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "INTEGER"},
+            "business_type": {"type": "STRING", "nullable": True},
+            "budget": {"type": "STRING", "nullable": True},
+            "timeline": {"type": "STRING", "nullable": True},
+            "needs": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "ready_to_buy": {"type": "BOOLEAN"},
+        },
+        "required": ["id", "needs", "ready_to_buy"],
+        "property_ordering": ["id", "business_type", "budget", "timeline", "needs", "ready_to_buy"],
+    },
+}
+
+INDUSTRY_MAP = {
+    "магазин": "shop", "shop": "shop", "интернет-магазин": "shop", "ecommerce": "shop",
+    "ресторан": "restaurant", "restaurant": "restaurant", "кафе": "restaurant", "общепит": "restaurant",
+    "салон": "beauty", "beauty": "beauty", "красота": "beauty", "косметология": "beauty",
+    "фитнес": "fitness", "fitness": "fitness", "спорт": "fitness", "gym": "fitness",
+    "клиника": "medical", "medical": "medical", "медицина": "medical",
+    "образование": "education", "education": "education", "школа": "education", "курсы": "education", "обучение": "education",
+    "доставка еды": "delivery", "delivery": "delivery", "курьер": "delivery",
+    "услуги": "services", "services": "services", "сервис": "services", "клининг": "services", "ремонт": "services",
+}
+
+
+def _dialog_text(messages: List[Dict], max_chars: int) -> str:
+    lines = []
+    for msg in messages:
+        for part in msg.get("parts") or []:
+            if isinstance(part, dict) and part.get("text"):
+                lines.append(f"{msg['role']}: {part['text'][:max_chars]}")
+    return "\n".join(lines)
+
+
+def build_summary_prompt(dialogs: List[Tuple[int, str, str]]) -> str:
+    """``dialogs`` are (id, previous summary, dialog text)."""
+    blocks = []
+    for job_id, previous, text in dialogs:
+        block = f"=== Диалог {job_id} ===\n"
+        if previous:
+            block += f"Предыдущее резюме: {previous}\n"
+        blocks.append(block + f"Сообщения:\n{text}")
+    return (
+        "Сожми каждый диалог ниже в компактное резюме (максимум 200 слов). Сохрани ключевую "
+        "информацию: тип бизнеса, потребности, бюджет, решения, договорённости. Если у диалога "
+        "есть предыдущее резюме, объедини его с новыми сообщениями.\n"
+        "Верни JSON-массив: по одному объекту {\"id\", \"summary\"} на каждый диалог, "
+        "id — номер диалога.\n\n" + "\n\n".join(blocks)
+    )
+
+
+def build_insights_prompt(dialogs: List[Tuple[int, str]]) -> str:
+    """``dialogs`` are (id, dialog text)."""
+    blocks = [f"=== Диалог {job_id} ===\n{text}" for job_id, text in dialogs]
+    return (
+        "Проанализируй каждый диалог ниже и извлеки ключевые данные о клиенте: business_type "
+        "(тип бизнеса или null), budget (бюджет или null), timeline (желаемые сроки или null), "
+        "needs (список потребностей), ready_to_buy (готов ли купить).\n"
+        "Верни JSON-массив: по одному объекту на каждый диалог, id — номер диалога.\n\n"
+        + "\n\n".join(blocks)
+    )
+
+
+def apply_insights(user_id: int, insights: Dict) -> None:
+    """Lead tags and client profile fields from one user's extracted insights."""
+    from src.leads import lead_manager, LeadPriority
+    from src.session import save_client_profile
+
+    if insights.get("business_type"):
+        lead_manager.add_tag(user_id, insights["business_type"])
+    if insights.get("budget"):
+        lead_manager.add_tag(user_id, f"budget:{insights['budget']}")
+    if insights.get("needs"):
+        for need in insights["needs"][:3]:
+            lead_manager.add_tag(user_id, need[:30])
+    if insights.get("ready_to_buy"):
+        lead_manager.update_lead(user_id, priority=LeadPriority.HOT)
+        lead_manager.add_tag(user_id, "ready_to_buy")
+
+    try:
+        profile_data = {}
+        if insights.get("business_type"):
+            btype = insights["business_type"].lower()
+            for key, val in INDUSTRY_MAP.items():
+                if key in btype:
+                    profile_data["industry"] = val
+                    break
+            if "industry" not in profile_data:
+                profile_data["industry"] = insights["business_type"][:50]
+        if insights.get("budget"):
+            profile_data["budget_range"] = str(insights["budget"])[:50]
+        if insights.get("timeline"):
+            profile_data["timeline"] = str(insights["timeline"])[:50]
+        if insights.get("needs"):
+            profile_data["needs"] = ", ".join(insights["needs"][:5])[:200]
+        if profile_data:
+            save_client_profile(user_id, **profile_data)
+    except Exception as e:
+        logger.debug(f"Failed to save client profile: {e}")
+
+    logger.info(f"Extracted insights for user {user_id}: {insights}")
+
+
+def _by_id(payload) -> Dict[int, Dict]:
+    result = {}
+    for entry in payload if isinstance(payload, list) else []:
+        try:
+            result[int(entry["id"])] = entry
+        except (KeyError, TypeError, ValueError):
+            continue
+    return result
+
+
+class ConversationJobs:
+    def __init__(self):
+        self._pending: "OrderedDict[Tuple[str, int], UserSession]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, user_id: int, session: UserSession) -> None:
+        """Queue the jobs this session's thresholds call for."""
+        if session._needs_summarization and session.message_count >= SUMMARY_MIN_MESSAGES:
+            self._enqueue(SUMMARY, user_id, session)
+        if session.message_count >= INSIGHT_MIN_MESSAGES and session.message_count % INSIGHT_EVERY == 0:
+            self._enqueue(INSIGHTS, user_id, session)
+
+    def _enqueue(self, kind: str, user_id: int, session: UserSession) -> None:
+        key = (kind, user_id)
+        if key in self._pending:
+            registry.inc("conversation_jobs_total", kind=kind, result="deduplicated")
+        self._pending[key] = session
+        registry.set_gauge("conversation_jobs_pending", len(self._pending))
+        self.start()
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            logger.info("Conversation jobs worker started")
+
+    async def stop(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _take(self, kind: str) -> List[Tuple[int, UserSession]]:
+        keys = [key for key in self._pending if key[0] == kind][:BATCH_SIZE]
+        batch = [(key[1], self._pending.pop(key)) for key in keys]
+        registry.set_gauge("conversation_jobs_pending", len(self._pending))
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(BATCH_WINDOW)
+            self._wakeup.clear()
+            while self._pending:
+                for kind, process in ((SUMMARY, self._summarize), (INSIGHTS, self._extract_insights)):
+                    batch = self._take(kind)
+                    if not batch:
+                        continue
+                    try:
+                        await process(batch)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        registry.inc("conversation_jobs_total", len(batch), kind=kind, result="error")
+                        logger.warning(f"Conversation {kind} batch of {len(batch)} failed: {type(e).__name__}: {e}")
+
+    async def _generate(self, kind: str, prompt: str, schema: Dict, max_output_tokens: int, size: int):
+        from google.genai import types
+        from src.ai_scheduler import Priority, ai_scheduler
+        from src.config import config
+
+        registry.observe("conversation_jobs_batch_size", size, kind=kind)
+        response = await ai_scheduler.generate(
+            config.fast_model_name,
+            prompt,
+            types.GenerateContentConfig(
+                max_output_tokens=max_output_tokens,
+                temperature=0.2,
+                response_mime_type="application/json",
+                response_schema=schema,
+            ),
+            priority=Priority.AUXILIARY,
+            operation=f"batch_{kind}",
+        )
+        return _by_id(json.loads(response.text or "[]"))
+
+    async def _summarize(self, batch: List[Tuple[int, UserSession]]) -> None:
+        jobs = []
+        for job_id, (user_id, session) in enumerate(batch, 1):
+            covered = session.messages[:-KEEP_RECENT]
+            text = _dialog_text(covered, 150)
+            if session._needs_summarization and text:
+                jobs.append((job_id, user_id, session, covered, text))
+        if not jobs:
+            return
+
+        prompt = build_summary_prompt([(job_id, session._summary or "", text)
+                                       for job_id, _, session, _, text in jobs])
+        results = await self._generate(SUMMARY, prompt, SUMMARY_SCHEMA, 600 * len(jobs), len(jobs))
+        for job_id, user_id, session, covered, _ in jobs:
+            summary = str(results.get(job_id, {}).get("summary") or "").strip()
+            if len(summary) <= MIN_SUMMARY_LENGTH:
+                registry.inc("conversation_jobs_total", kind=SUMMARY, result="empty")
+                continue
+            covered_ids = {id(msg) for msg in covered}
+            session.messages = [msg for msg in session.messages if id(msg) not in covered_ids]
+            await asyncio.to_thread(session.set_summary, summary)
+            registry.inc("conversation_jobs_total", kind=SUMMARY, result="ok")
+            logger.info(f"Summarized conversation for user {user_id}: {len(summary)} chars")
+
+    async def _extract_insights(self, batch: List[Tuple[int, UserSession]]) -> None:
+        jobs = []
+        for job_id, (user_id, session) in enumerate(batch, 1):
+            text = _dialog_text(session.get_history()[-10:], 200)
+            if text:
+                jobs.append((job_id, user_id, text))
+        if not jobs:
+            return
+
+        prompt = build_insights_prompt([(job_id, text) for job_id, _, text in jobs])
+        results = await self._generate(INSIGHTS, prompt, INSIGHTS_SCHEMA, 300 * len(jobs), len(jobs))
+        for job_id, user_id, _ in jobs:
+            insights = results.get(job_id)
+            if not insights:
+                registry.inc("conversation_jobs_total", kind=INSIGHTS, result="empty")
+                continue
+            try:
+                await asyncio.to_thread(apply_insights, user_id, insights)
+                registry.inc("conversation_jobs_total", kind=INSIGHTS, result="ok")
+            except Exception as e:
+                registry.inc("conversation_jobs_total", kind=INSIGHTS, result="error")
+                logger.debug(f"Applying insights failed for user {user_id}: {e}")
+
+
+conversation_jobs = LazySingleton(ConversationJobs)
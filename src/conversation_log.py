@@ -0,0 +1,285 @@
+"""Single append-only conversation log.
+
+Every user/bot message is written once into ``conversation_log``. The AI
+session history and the CRM views (lead history, follow-up timing, manager
+coaching) read the same rows:
+
+  - ``recent()``          last N messages of a user (session or full CRM view)
+  - ``scan()``            time-ranged keyset scan, optionally per user/role
+  - ``response_times()``  bot message -> next user reply intervals
+
+``in_context`` marks rows that belong to the AI session history; clearing a
+session flips it off instead of deleting, so the CRM record is kept.
+``kind`` keeps the message origin (text, voice, photo, followup, proactive).
+
+The legacy ``conversation_history`` and ``conversations`` tables are migrated
+once on startup, renamed to ``*_legacy`` and replaced by compatibility views
+with their old column names.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+
+logger = logging.getLogger(__name__)
+
+SESSION_HISTORY_DAYS = 30
+MAX_CONTENT_LENGTH = 10000
+VOICE_PREFIX = "[Голосовое] "
+
+_MIGRATION_LOCK_ID = 731_001
+
+
+class ConversationLog:
+    @staticmethod
+    def _init_db():
+        if not DATABASE_URL:
+            return
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MIGRATION_LOCK_ID,))
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS conversation_log (
+                            id BIGSERIAL PRIMARY KEY,
+                            user_id BIGINT NOT NULL,
+                            role VARCHAR(20) NOT NULL,
+                            content TEXT NOT NULL,
+                            kind VARCHAR(16) NOT NULL DEFAULT 'text',
+                            in_context BOOLEAN NOT NULL DEFAULT TRUE,
+                            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+                        )
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_conversation_log_user_time
+                        ON conversation_log(user_id, created_at DESC, id DESC)
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_conversation_log_time_brin
+                        ON conversation_log USING BRIN(created_at)
+                    """)
+                    ConversationLog._migrate_legacy(cur)
+        except Exception as e:
+            logger.error(f"Failed to init conversation log: {e}")
+
+    @staticmethod
+    def _is_table(cur, name: str) -> bool:
+        cur.execute("""
+            SELECT c.relkind FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relname = %s AND n.nspname = current_schema()
+        """, (name,))
+        row = cur.fetchone()
+        return bool(row) and row[0] == "r"
+
+    @staticmethod
+    def _migrate_legacy(cur) -> None:
+        """One-time copy of the two legacy tables, then swap them for views.
+
+        ``conversations`` (CRM, never pruned) is the superset and is copied
+        whole; ``conversation_history`` (session, 30 days) only marks which of
+        those rows are still in the AI context, and contributes rows the CRM
+        copy is missing. Voice messages were stored with a text prefix in the
+        CRM table; it becomes ``kind = 'voice'``.
+        """
+        migrated = False
+        if ConversationLog._is_table(cur, "conversations"):
+            cur.execute("""
+                INSERT INTO conversation_log (user_id, role, content, kind, in_context, created_at)
+                SELECT user_id, role,
+                       CASE WHEN content LIKE %s THEN substr(content, %s) ELSE content END,
+                       CASE WHEN content LIKE %s THEN 'voice'
+                            WHEN content LIKE '[Фото:%%' THEN 'photo'
+                            ELSE 'text' END,
+                       FALSE, COALESCE(created_at, NOW())
+                FROM conversations
+                ORDER BY id
+            """, (VOICE_PREFIX + "%", len(VOICE_PREFIX) + 1, VOICE_PREFIX + "%"))
+            logger.info(f"Conversation log: migrated {cur.rowcount} rows from conversations")
+            cur.execute("ALTER TABLE conversations RENAME TO conversations_legacy")
+            migrated = True
+
+        if ConversationLog._is_table(cur, "conversation_history"):
+            cur.execute("""
+                UPDATE conversation_log l SET in_context = TRUE
+                FROM conversation_history h
+                WHERE l.user_id = h.telegram_id AND l.role = h.role AND l.content = h.content
+                  AND l.created_at BETWEEN h.created_at - INTERVAL '5 seconds'
+                                       AND h.created_at + INTERVAL '5 seconds'
+            """)
+            cur.execute("""
+                INSERT INTO conversation_log (user_id, role, content, kind, in_context, created_at)
+                SELECT h.telegram_id, h.role, h.content, 'text', TRUE, COALESCE(h.created_at, NOW())
+                FROM conversation_history h
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM conversation_log l
+                    WHERE l.user_id = h.telegram_id AND l.role = h.role AND l.content = h.content
+                      AND l.created_at BETWEEN h.created_at - INTERVAL '5 seconds'
+                                           AND h.created_at + INTERVAL '5 seconds'
+                )
+                ORDER BY h.id
+            """)
+            logger.info(f"Conversation log: added {cur.rowcount} session-only rows from conversation_history")
+            cur.execute("ALTER TABLE conversation_history RENAME TO conversation_history_legacy")
+            migrated = True
+
+        cur.execute("""
+            CREATE OR REPLACE VIEW conversations AS
+            SELECT id, user_id, role,
+                   CASE WHEN kind = 'voice' THEN %s || content ELSE content END AS content,
+                   created_at
+            FROM conversation_log
+        """, (VOICE_PREFIX,))
+        cur.execute("""
+            CREATE OR REPLACE VIEW conversation_history AS
+            SELECT id, user_id AS telegram_id, role, content, created_at
+            FROM conversation_log
+            WHERE in_context
+        """)
+        if migrated:
+            logger.info("Conversation log migration complete; legacy tables kept as *_legacy")
+
+    def append(self, user_id: int, role: str, content: str,
+               kind: str = "text", in_context: bool = True) -> None:
+        if not DATABASE_URL:
+            return
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO conversation_log (user_id, role, content, kind, in_context)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (user_id, role, content[:MAX_CONTENT_LENGTH], kind, in_context))
+        except Exception as e:
+            logger.error(f"Failed to append conversation message: {e}")
+
+    def clear_context(self, user_id: int) -> None:
+        """Drop a user's messages from the AI session history; CRM rows stay."""
+        if not DATABASE_URL:
+            return
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE conversation_log SET in_context = FALSE WHERE user_id = %s AND in_context",
+                        (user_id,)
+                    )
+        except Exception as e:
+            logger.error(f"Failed to clear conversation context: {e}")
+
+    def recent(self, user_id: int, limit: int = 50, session_only: bool = False) -> List[Dict]:
+        """Last ``limit`` messages of a user in chronological order.
+
+        ``session_only`` restricts to the AI session history of the last
+        SESSION_HISTORY_DAYS days.
+        """
+        if not DATABASE_URL:
+            return []
+        from psycopg2.extras import RealDictCursor
+        where = "user_id = %s"
+        if session_only:
+            where += f" AND in_context AND created_at > NOW() - INTERVAL '{SESSION_HISTORY_DAYS} days'"
+        try:
+            with get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        SELECT id, user_id, role, content, kind, created_at
+                        FROM conversation_log
+                        WHERE {where}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (user_id, limit))
+                    rows = cur.fetchall()
+            return [dict(r) for r in reversed(rows)]
+        except Exception as e:
+            logger.error(f"Failed to read conversation log: {e}")
+            return []
+
+    def scan(self, since: datetime, until: Optional[datetime] = None,
+             user_id: Optional[int] = None, roles: Optional[Sequence[str]] = None,
+             batch_size: int = 1000) -> Iterator[Dict]:
+        """Iterate messages in ``[since, until)`` in time order using keyset pages."""
+        if not DATABASE_URL:
+            return
+        from psycopg2.extras import RealDictCursor
+        conditions = ["(created_at, id) > (%s, %s)"]
+        base_params: List = []
+        if until is not None:
+            conditions.append("created_at < %s")
+            base_params.append(until)
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            base_params.append(user_id)
+        if roles:
+            conditions.append("role = ANY(%s)")
+            base_params.append(list(roles))
+        query = f"""
+            SELECT id, user_id, role, content, kind, created_at
+            FROM conversation_log
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at, id
+            LIMIT %s
+        """
+        cursor_at, cursor_id = since, 0
+        while True:
+            try:
+                with get_connection() as conn:
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute(query, (cursor_at, cursor_id, *base_params, batch_size))
+                        rows = cur.fetchall()
+            except Exception as e:
+                logger.error(f"Conversation log scan failed: {e}")
+                return
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            cursor_at, cursor_id = rows[-1]["created_at"], rows[-1]["id"]
+
+    def response_times(self, user_id: int, limit: int = 20,
+                       max_gap_days: int = 7) -> List[Tuple[datetime, float]]:
+        """(bot_message_at, seconds_until_user_reply) for the latest replied bot messages."""
+        if not DATABASE_URL:
+            return []
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT created_at, EXTRACT(EPOCH FROM (next_at - created_at))
+                        FROM (
+                            SELECT role, created_at,
+                                   LEAD(role) OVER w AS next_role,
+                                   LEAD(created_at) OVER w AS next_at
+                            FROM conversation_log
+                            WHERE user_id = %s
+                            WINDOW w AS (ORDER BY created_at, id)
+                        ) t
+                        WHERE role = 'assistant' AND next_role = 'user'
+                          AND next_at < created_at + %s * INTERVAL '1 day'
+                        ORDER BY created_at DESC
+                        LIMIT %s
+                    """, (user_id, max_gap_days, limit))
+                    return [(r[0], float(r[1])) for r in cur.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to compute response times: {e}")
+            return []
+
+    def avg_response_time(self, user_id: int, limit: int = 20) -> Optional[float]:
+        pairs = self.response_times(user_id, limit)
+        if not pairs:
+            return None
+        return sum(seconds for _, seconds in pairs) / len(pairs)
+
+    @staticmethod
+    def display_content(row: Dict) -> str:
+        """Content as shown in CRM views (voice messages keep their marker)."""
+        content = row.get("content") or ""
+        return VOICE_PREFIX + content if row.get("kind") == "voice" else content
+
+
+conversation_log = LazySingleton(ConversationLog)
+register_schema("conversation_log", 1, ConversationLog._init_db)
@@ -3,11 +3,12 @@
 import time
 import logging
 import os
-import asyncio
 from typing import Dict, Optional, List, Tuple
 from dataclasses import dataclass
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -50,9 +51,9 @@ class ConversationQAManager:
         self._session_scores: Dict[int, List[float]] = {}
         self._handoff_queue: Dict[int, dict] = {}
         self._eval_counters: Dict[int, int] = {}
-        self._init_db()
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
         try:
@@ -186,6 +187,7 @@ class ConversationQAManager:
 
         try:
             import google.genai as genai
+            from src.ai_scheduler import Priority, ai_scheduler
             from src.config import config
 
             eval_prompt = f"""Оцени качество ответа продажника (1-5 по каждому критерию).
@@ -197,15 +199,14 @@ class ConversationQAManager:
 Ответь СТРОГО в формате JSON:
 {{"directive_adherence": X, "cta_present": X, "methodology_match": X, "tone_natural": X, "personalization": X, "comment": "краткий комментарий"}}"""
 
-            client = genai.Client()
-            response = await asyncio.to_thread(
-                client.models.generate_content,
-                model=config.fast_model_name,
-                contents=eval_prompt,
-                config=genai.types.GenerateContentConfig(
+            response = await ai_scheduler.generate(
+                config.fast_model_name,
+                eval_prompt,
+                genai.types.GenerateContentConfig(
                     max_output_tokens=200,
                     temperature=0.1
-                )
+                ),
+                priority=Priority.AUXILIARY,
             )
 
             if response.text:
@@ -381,4 +382,5 @@ class ConversationQAManager:
             logger.error(f"Failed to notify manager about handoff: {e}")
 
 
-qa_manager = ConversationQAManager()
+qa_manager = LazySingleton(ConversationQAManager)
+register_schema("conversation_qa", 1, ConversationQAManager._init_db)
@@ -4,6 +4,7 @@ Provides admin-facing analytics: lead pipeline, revenue forecasting,
 client health scores, and actionable insights.
 """
 
+import html
 import logging
 import time
 from typing import Tuple, Dict, List
@@ -18,27 +19,15 @@ def get_crm_dashboard() -> Tuple[str, InlineKeyboardMarkup]:
     warm_leads = 0
     cold_leads = 0
     converted = 0
-    total_revenue = 0
-    avg_score = 0
 
     try:
         from src.leads import lead_manager
-        all_leads = lead_manager.get_all_leads() if hasattr(lead_manager, 'get_all_leads') else []
-        total_leads = len(all_leads)
-
-        for lead in all_leads:
-            p = getattr(lead, 'priority', None)
-            if p:
-                p_val = p.value if hasattr(p, 'value') else str(p)
-                if p_val == 'hot':
-                    hot_leads += 1
-                elif p_val == 'warm':
-                    warm_leads += 1
-                elif p_val == 'cold':
-                    cold_leads += 1
-            s = getattr(lead, 'status', '')
-            if s == 'converted':
-                converted += 1
+        counters = lead_manager.get_lead_counters()
+        total_leads = counters["total"]
+        hot_leads = counters["hot"]
+        warm_leads = counters["warm"]
+        cold_leads = counters["cold"]
+        converted = counters["converted"]
     except Exception as e:
         logger.debug(f"CRM leads data unavailable: {e}")
 
@@ -75,28 +64,39 @@ def get_crm_dashboard() -> Tuple[str, InlineKeyboardMarkup]:
     return text, keyboard
 
 
-def get_hot_leads_view() -> Tuple[str, InlineKeyboardMarkup]:
+HOT_LEADS_PAGE_SIZE = 10
+
+
+def get_hot_leads_view(after=None) -> Tuple[str, InlineKeyboardMarkup]:
+    """Hot leads page by page; ``after`` is the LeadCursor from ``crm_hot_<cursor>``."""
     text = "🔥 <b>Горячие лиды</b>\n\n"
+    next_cursor = None
 
     try:
-        from src.leads import lead_manager
-        hot = lead_manager.get_hot_leads() if hasattr(lead_manager, 'get_hot_leads') else []
-        if not hot:
-            text += "Нет горячих лидов."
+        from src.leads import lead_manager, LeadPriority
+        page = lead_manager.get_leads_page(priority=LeadPriority.HOT, after=after, limit=HOT_LEADS_PAGE_SIZE)
+        next_cursor = page.next_cursor
+        if not page.leads:
+            text += "Больше горячих лидов нет." if after else "Нет горячих лидов."
         else:
-            for i, lead in enumerate(hot[:10], 1):
-                name = getattr(lead, 'first_name', '') or f"User#{getattr(lead, 'user_id', '?')}"
-                username = getattr(lead, 'username', '')
-                score = getattr(lead, 'score', 0)
-                text += f"{i}. {name} (@{username or 'нет'}) — Score: {score}\n"
+            for lead in page.leads:
+                name = html.escape(lead.first_name or f"User#{lead.user_id}")
+                username = html.escape(lead.username or "нет")
+                text += f"• {name} (@{username}) — Score: {lead.score}\n"
     except Exception:
         text += "Данные недоступны."
 
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("◀️ CRM", callback_data="crm_dashboard")],
-    ])
+    rows = []
+    nav = []
+    if after is not None:
+        nav.append(InlineKeyboardButton("⏮ В начало", callback_data="crm_hot"))
+    if next_cursor is not None:
+        nav.append(InlineKeyboardButton("Далее ▶️", callback_data=f"crm_hot_{next_cursor.encode()}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton("◀️ CRM", callback_data="crm_dashboard")])
 
-    return text, keyboard
+    return text, InlineKeyboardMarkup(rows)
 
 
 def get_client_health_view() -> Tuple[str, InlineKeyboardMarkup]:
@@ -107,21 +107,12 @@ def get_client_health_view() -> Tuple[str, InlineKeyboardMarkup]:
 
     try:
         from src.leads import lead_manager
-        all_leads = lead_manager.get_all_leads() if hasattr(lead_manager, 'get_all_leads') else []
-        healthy = 0
-        at_risk = 0
-        churning = 0
-
-        for lead in all_leads:
-            score = getattr(lead, 'score', 0)
-            if score >= 50:
-                healthy += 1
-            elif score >= 20:
-                at_risk += 1
-            else:
-                churning += 1
-
-        total = max(1, len(all_leads))
+        counters = lead_manager.get_lead_counters()
+        healthy = counters["healthy"]
+        at_risk = counters["at_risk"]
+        churning = counters["churning"]
+
+        total = max(1, counters["total"])
         text += (
             f"✅ Здоровые (score≥50): {healthy} ({healthy/total*100:.0f}%)\n"
             f"⚠️ В зоне риска (20-49): {at_risk} ({at_risk/total*100:.0f}%)\n"
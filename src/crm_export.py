@@ -1,8 +1,5 @@
 """CRM integration and data export: webhooks, CSV/JSON export, auto-sync."""
 
-import csv
-import io
-import json
 import time
 import logging
 import asyncio
@@ -10,6 +7,9 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+from src.export_stream import ExportResult, export_document, export_query
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +17,9 @@ logger = logging.getLogger(__name__)
 class CRMExporter:
     def __init__(self):
         self._webhook_url = None
-        self._init_db()
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
         try:
@@ -47,89 +47,42 @@ class CRMExporter:
         except Exception as e:
             logger.error(f"Failed to init CRM tables: {e}")
 
-    def export_leads_csv(self, days: int = 30) -> Optional[str]:
+    _LEADS_EXPORT_QUERY = """
+        SELECT
+            user_id, username, first_name, phone,
+            business_type, budget, estimated_cost,
+            status, priority, score,
+            message_count, tags,
+            created_at, last_activity
+        FROM leads
+        WHERE created_at > NOW() - %s * INTERVAL '1 day'
+        ORDER BY created_at DESC
+    """
+
+    def export_leads(self, days: int = 30, fmt: str = "csv",
+                     compress: bool = False) -> Optional[ExportResult]:
+        """Stream leads of the last ``days`` into export parts (csv/ndjson/json/parquet)."""
         if not DATABASE_URL:
             return None
         try:
-            from psycopg2.extras import RealDictCursor
-            with get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT
-                            user_id, username, first_name, phone,
-                            business_type, budget, estimated_cost,
-                            status, priority, score,
-                            message_count, tags,
-                            created_at, last_activity
-                        FROM leads
-                        WHERE created_at > NOW() - %s * INTERVAL '1 day'
-                        ORDER BY created_at DESC
-                    """, (days,))
-                    rows = cur.fetchall()
-
-            if not rows:
+            result = export_query(self._LEADS_EXPORT_QUERY, (days,), f"leads_{days}d",
+                                  fmt=fmt, compress=compress)
+            if not result.rows:
+                result.close()
                 return None
-
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=rows[0].keys())
-            writer.writeheader()
-            for row in rows:
-                clean_row = {}
-                for k, v in row.items():
-                    if isinstance(v, (list, dict)):
-                        clean_row[k] = json.dumps(v, ensure_ascii=False)
-                    elif isinstance(v, datetime):
-                        clean_row[k] = v.isoformat()
-                    else:
-                        clean_row[k] = v
-                writer.writerow(clean_row)
-
-            self._log_export("csv", len(rows))
-            return output.getvalue()
+            self._log_export(fmt, result.rows)
+            return result
         except Exception as e:
-            logger.error(f"CSV export failed: {e}")
-            return None
-
-    def export_leads_json(self, days: int = 30) -> Optional[str]:
-        if not DATABASE_URL:
+            logger.error(f"{fmt.upper()} export failed: {e}")
             return None
-        try:
-            from psycopg2.extras import RealDictCursor
-            with get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT
-                            user_id, username, first_name, phone,
-                            business_type, budget, estimated_cost,
-                            status, priority, score,
-                            message_count, tags,
-                            created_at, last_activity
-                        FROM leads
-                        WHERE created_at > NOW() - %s * INTERVAL '1 day'
-                        ORDER BY created_at DESC
-                    """, (days,))
-                    rows = cur.fetchall()
-
-            if not rows:
-                return None
 
-            data = []
-            for row in rows:
-                item = {}
-                for k, v in row.items():
-                    if isinstance(v, datetime):
-                        item[k] = v.isoformat()
-                    else:
-                        item[k] = v
-                data.append(item)
+    def export_leads_csv(self, days: int = 30, compress: bool = False) -> Optional[ExportResult]:
+        return self.export_leads(days, "csv", compress)
 
-            self._log_export("json", len(data))
-            return json.dumps(data, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"JSON export failed: {e}")
-            return None
+    def export_leads_json(self, days: int = 30, compress: bool = False) -> Optional[ExportResult]:
+        return self.export_leads(days, "json", compress)
 
-    def export_analytics_json(self, days: int = 30) -> Optional[str]:
+    def export_analytics_json(self, days: int = 30, compress: bool = False) -> Optional[ExportResult]:
         if not DATABASE_URL:
             return None
         try:
@@ -145,36 +98,17 @@ class CRMExporter:
                 "segments": advanced_analytics.get_conversion_attribution(days),
                 "cohorts": advanced_analytics.get_cohort_analysis(days),
             }
+            result = export_document(data, f"analytics_{days}d", compress=compress)
             self._log_export("analytics_json", 1)
-            return json.dumps(data, ensure_ascii=False, indent=2, default=str)
+            return result
         except Exception as e:
             logger.error(f"Analytics export failed: {e}")
             return None
 
     async def send_webhook(self, event_type: str, data: dict):
-        webhooks = self._get_active_webhooks(event_type)
-        if not webhooks:
-            return
-
-        import aiohttp
-        payload = {
-            "event": event_type,
-            "timestamp": datetime.now().isoformat(),
-            "data": data,
-        }
-
-        async with aiohttp.ClientSession() as session:
-            for wh in webhooks:
-                try:
-                    async with session.post(
-                        wh["webhook_url"],
-                        json=payload,
-                        timeout=aiohttp.ClientTimeout(total=10)
-                    ) as resp:
-                        if resp.status >= 400:
-                            logger.warning(f"Webhook {event_type} to {wh['webhook_url']} returned {resp.status}")
-                except Exception as e:
-                    logger.error(f"Webhook {event_type} failed: {e}")
+        """Queue the event for durable, retried delivery to all subscribers."""
+        from src.webhook_delivery import webhook_delivery
+        await webhook_delivery.enqueue(event_type, data)
 
     async def on_new_lead(self, lead_data: dict):
         await self.send_webhook("new_lead", lead_data)
@@ -192,6 +126,7 @@ class CRMExporter:
                         INSERT INTO crm_webhooks (event_type, webhook_url)
                         VALUES (%s, %s)
                     """, (event_type, url))
+            self._invalidate_webhook_cache()
             return True
         except Exception as e:
             logger.error(f"Failed to add webhook: {e}")
@@ -207,24 +142,21 @@ class CRMExporter:
                         "UPDATE crm_webhooks SET active = FALSE WHERE id = %s",
                         (webhook_id,)
                     )
+            self._invalidate_webhook_cache()
             return True
         except Exception:
             return False
 
     def _get_active_webhooks(self, event_type: str) -> list:
-        if not DATABASE_URL:
-            return []
+        from src.webhook_delivery import webhook_delivery
+        return webhook_delivery.get_subscribers(event_type)
+
+    def _invalidate_webhook_cache(self):
         try:
-            from psycopg2.extras import RealDictCursor
-            with get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT * FROM crm_webhooks
-                        WHERE event_type = %s AND active = TRUE
-                    """, (event_type,))
-                    return [dict(r) for r in cur.fetchall()]
+            from src.webhook_delivery import webhook_delivery
+            webhook_delivery.invalidate_subscribers()
         except Exception:
-            return []
+            pass
 
     def _log_export(self, export_type: str, count: int):
         if not DATABASE_URL:
@@ -255,4 +187,5 @@ class CRMExporter:
             return []
 
 
-crm_exporter = CRMExporter()
+crm_exporter = LazySingleton(CRMExporter)
+register_schema("crm_export", 1, CRMExporter._init_db)
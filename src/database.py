@@ -1,102 +1,318 @@
-"""Shared database connection pool for all modules."""
+"""Shared database connection pool for all modules.
+
+One ThreadedConnectionPool serves the whole process. Checkouts wait on a
+semaphore sized to the pool instead of failing when it is exhausted, and a
+connection is only probed with ``SELECT 1`` when it has been idle longer
+than DB_IDLE_CHECK_SECONDS; connections that fail mid-use are discarded.
+Every statement is timed by the connection's cursor factory and statements
+slower than DB_SLOW_QUERY_MS are logged (text only, never parameters).
+
+The pool is sized to the worker concurrency: the default asyncio executor
+(``asyncio.to_thread``) plus the event loop thread, but never fewer than
+MIN_POOL_MAX connections; overridable with DB_POOL_MAX / WORKER_CONCURRENCY.
+
+Only worker threads wait for a slot (up to DB_POOL_TIMEOUT). A checkout on
+the event loop thread fails at once when the pool is exhausted, so a busy
+pool never stalls the bot. A nested get_connection() on a thread that
+already holds a slot outside single_transaction() does not wait either:
+the slot it would wait for may be its own.
+
+Benchmark checkout overhead with ``python -m src.database --bench [N]``.
+"""
+import asyncio
 import os
+import sys
 import logging
-from typing import Optional
+import threading
+import time
+from typing import Dict, Optional
 from contextlib import contextmanager
 import psycopg2
+import psycopg2.extensions
 from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 
+from src.metrics import registry
+
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ.get("RAILWAY_DATABASE_URL") or os.environ.get("DATABASE_URL")
 
+
+MIN_POOL_MAX = 15
+
+
+def _default_pool_max() -> int:
+    workers = int(os.environ.get("WORKER_CONCURRENCY", "0")) or min(32, (os.cpu_count() or 1) + 4)
+    return max(MIN_POOL_MAX, workers + 1)
+
+
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "0")) or _default_pool_max()
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+IDLE_CHECK_SECONDS = float(os.environ.get("DB_IDLE_CHECK_SECONDS", "30"))
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+
 _connection_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)
+_last_used: Dict[int, float] = {}
+_in_use = 0
+_in_use_lock = threading.Lock()
 
 MAX_CONN_RETRIES = 3
 
+_scope = threading.local()
+
+_wait_seconds = registry.histogram("db_pool_wait_seconds", "Time spent waiting for a free pool slot")
+_checkout_seconds = registry.histogram("db_checkout_seconds", "Pool checkout latency including liveness checks")
+_statement_seconds = registry.histogram("db_statement_seconds", "Statement execution time")
+_in_use_gauge = registry.gauge("db_pool_in_use", "Connections checked out of the pool")
+registry.set_gauge("db_pool_max", POOL_MAX)
+
+
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _observe_statement(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _observe_statement(query, time.perf_counter() - start)
+
+
+_timed_cursor_classes: Dict[type, type] = {}
+
+
+def _timed_cursor_class(base: type) -> type:
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        cls = type(f"Timed{base.__name__}", (_TimedCursorMixin, base), {})
+        _timed_cursor_classes[base] = cls
+    return cls
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors (of any ``cursor_factory``) time each statement."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _observe_statement(query, elapsed: float) -> None:
+    _statement_seconds.observe(elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.inc("db_slow_queries_total")
+        text = query.decode("utf-8", "replace") if isinstance(query, bytes) else str(query)
+        logger.warning(f"Slow query ({elapsed * 1000:.0f} ms): {' '.join(text.split())[:300]}")
+
 
 def get_connection_pool():
     """Get or create the shared connection pool."""
     global _connection_pool
     if _connection_pool is None and DATABASE_URL:
-        try:
-            _connection_pool = pool.ThreadedConnectionPool(
-                minconn=1,
-                maxconn=15,
-                dsn=DATABASE_URL
-            )
-            logger.info("Shared database connection pool created (1-15 connections)")
-        except Exception as e:
-            logger.error(f"Failed to create connection pool: {e}")
+        with _pool_lock:
+            if _connection_pool is None:
+                try:
+                    _connection_pool = pool.ThreadedConnectionPool(
+                        minconn=POOL_MIN,
+                        maxconn=POOL_MAX,
+                        dsn=DATABASE_URL,
+                        connection_factory=TimedConnection,
+                    )
+                    logger.info(f"Shared database connection pool created ({POOL_MIN}-{POOL_MAX} connections)")
+                except Exception as e:
+                    logger.error(f"Failed to create connection pool: {e}")
     return _connection_pool
 
 
 def close_pool():
     """Close all connections in the pool."""
     global _connection_pool
-    if _connection_pool:
-        _connection_pool.closeall()
-        _connection_pool = None
-        logger.info("Database connection pool closed")
+    with _pool_lock:
+        if _connection_pool:
+            _connection_pool.closeall()
+            _connection_pool = None
+            _last_used.clear()
+            logger.info("Database connection pool closed")
 
 
-@contextmanager
-def get_connection():
-    """Context manager for getting a connection from the pool."""
-    global _connection_pool
-    conn = None
-    pool_instance = None
+def pool_stats() -> Dict[str, float]:
+    return {
+        "max": POOL_MAX,
+        "in_use": _in_use,
+        "wait_p95_ms": _wait_seconds.quantile(0.95) * 1000,
+        "checkout_p95_ms": _checkout_seconds.quantile(0.95) * 1000,
+        "statement_p95_ms": _statement_seconds.quantile(0.95) * 1000,
+    }
+
+
+def _track_in_use(delta: int) -> None:
+    global _in_use
+    with _in_use_lock:
+        _in_use += delta
+        _in_use_gauge.set(_in_use)
+
+
+def _is_alive(conn) -> bool:
+    """Probe ``conn`` only if it is new to us or has been idle too long."""
+    if conn.closed:
+        return False
+    last = _last_used.get(id(conn))
+    if last is not None and time.monotonic() - last < IDLE_CHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        registry.inc("db_liveness_checks_total", result="ok")
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        registry.inc("db_liveness_checks_total", result="failed")
+        logger.warning(f"Connection liveness check failed: {e}")
+        return False
+
+
+def _release(pool_instance, conn, discard: bool = False) -> None:
+    if discard or conn.closed:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    try:
+        pool_instance.putconn(conn, close=discard or bool(conn.closed))
+    except Exception:
+        pass
+    _track_in_use(-1)
+    _slots.release()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _acquire_slot() -> None:
+    """Wait for a pool slot; fail fast on the loop thread or when nested."""
+    if _on_event_loop() or getattr(_scope, "held", 0):
+        if not _slots.acquire(blocking=False):
+            registry.inc("db_pool_timeouts_total")
+            raise Exception(f"Database connection pool exhausted ({POOL_MAX} in use)")
+        return
+    if not _slots.acquire(timeout=POOL_TIMEOUT):
+        registry.inc("db_pool_timeouts_total")
+        raise Exception(f"Database connection pool exhausted ({POOL_MAX} in use for {POOL_TIMEOUT:g}s)")
+
+
+def _checkout():
+    """Take a healthy connection from the pool; returns (pool, conn)."""
+    start = time.perf_counter()
+    _acquire_slot()
+    _wait_seconds.observe(time.perf_counter() - start)
+    _track_in_use(1)
 
     for attempt in range(1, MAX_CONN_RETRIES + 1):
         pool_instance = get_connection_pool()
         if not pool_instance:
-            raise Exception("Database connection pool not available")
-
+            break
         try:
             conn = pool_instance.getconn()
-        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError) as e:
             logger.warning(f"Pool getconn failed (attempt {attempt}/{MAX_CONN_RETRIES}): {e}")
-            _connection_pool = None
-            if attempt == MAX_CONN_RETRIES:
-                raise
             continue
-
+        if _is_alive(conn):
+            _checkout_seconds.observe(time.perf_counter() - start)
+            return pool_instance, conn
+        _last_used.pop(id(conn), None)
         try:
-            test_cur = conn.cursor()
-            test_cur.execute("SELECT 1")
-            test_cur.close()
-            break
-        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            logger.warning(f"Connection health check failed (attempt {attempt}/{MAX_CONN_RETRIES}): {e}")
-            try:
-                conn.close()
-            except Exception:
-                pass
-            try:
-                pool_instance.putconn(conn, close=True)
-            except Exception:
-                pass
-            conn = None
-            _connection_pool = None
-            if attempt == MAX_CONN_RETRIES:
-                raise Exception(f"Failed to get healthy database connection after {MAX_CONN_RETRIES} attempts")
+            pool_instance.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    _track_in_use(-1)
+    _slots.release()
+    if get_connection_pool() is None:
+        raise Exception("Database connection pool not available")
+    raise Exception(f"Failed to get healthy database connection after {MAX_CONN_RETRIES} attempts")
+
 
-    if conn is None:
-        raise Exception("Failed to get database connection")
+@contextmanager
+def single_transaction(conn):
+    """Route get_connection() on this thread to ``conn`` until the block exits.
+
+    Each nested get_connection() becomes a savepoint instead of its own
+    commit/rollback, so independent init code runs in one transaction.
+    """
+    _scope.conn = conn
+    _scope.depth = 0
+    _scope.failed = False
+    try:
+        yield conn
+    finally:
+        _scope.conn = None
+
+
+def last_scope_failed() -> bool:
+    """True if a get_connection() block failed since the last call (and reset)."""
+    failed = getattr(_scope, "failed", False)
+    _scope.failed = False
+    return failed
+
+
+@contextmanager
+def _savepoint(conn):
+    _scope.depth += 1
+    name = f"scope_{_scope.depth}"
+    with conn.cursor() as cur:
+        cur.execute(f"SAVEPOINT {name}")
     try:
         yield conn
-        conn.commit()
     except Exception:
-        conn.rollback()
+        _scope.failed = True
+        with conn.cursor() as cur:
+            cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
         raise
+    else:
+        with conn.cursor() as cur:
+            cur.execute(f"RELEASE SAVEPOINT {name}")
     finally:
+        _scope.depth -= 1
+
+
+@contextmanager
+def get_connection():
+    """Context manager for getting a connection from the pool."""
+    shared = getattr(_scope, "conn", None)
+    if shared is not None:
+        with _savepoint(shared) as conn:
+            yield conn
+        return
+
+    pool_instance, conn = _checkout()
+    _scope.held = getattr(_scope, "held", 0) + 1
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        discard = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
         try:
-            current_pool = get_connection_pool()
-            if current_pool:
-                current_pool.putconn(conn)
+            conn.rollback()
         except Exception:
-            pass
+            discard = True
+        raise
+    finally:
+        _scope.held -= 1
+        _release(pool_instance, conn, discard)
 
 
 @contextmanager
@@ -130,3 +346,33 @@ def execute_one(query: str, params: Optional[tuple] = None, dict_cursor: bool =
 def is_available() -> bool:
     """Check if database is available."""
     return DATABASE_URL is not None and get_connection_pool() is not None
+
+
+def _benchmark(queries: int) -> None:
+    """Queries per second through get_connection with and without per-checkout probes."""
+    global IDLE_CHECK_SECONDS
+    configured = IDLE_CHECK_SECONDS
+    for label, idle_check in (("SELECT 1 on every checkout", 0.0), (f"lazy liveness ({configured:.0f}s idle)", configured)):
+        IDLE_CHECK_SECONDS = idle_check
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        start = time.perf_counter()
+        for _ in range(queries):
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<32} {queries / elapsed:8.0f} q/s  ({elapsed * 1000 / queries:.2f} ms/query)")
+    IDLE_CHECK_SECONDS = configured
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not DATABASE_URL:
+        sys.exit("DATABASE_URL is not set")
+    if "--bench" in sys.argv:
+        args = sys.argv[sys.argv.index("--bench") + 1:]
+        _benchmark(int(args[0]) if args else 2000)
+    print(pool_stats())
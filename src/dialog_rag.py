@@ -4,14 +4,14 @@ import json
 import time
 from typing import Optional, List, Dict
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
 class DialogRAG:
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
+    @staticmethod
+    def _init_tables():
         if not DATABASE_URL:
             return
         try:
@@ -169,4 +169,5 @@ class DialogRAG:
         except Exception as e:
             logger.debug(f"Failed to mark session successful: {e}")
 
-dialog_rag = DialogRAG()
+dialog_rag = LazySingleton(DialogRAG)
+register_schema("dialog_rag", 1, DialogRAG._init_tables)
@@ -0,0 +1,356 @@
+"""Streaming exports: server-side cursor -> spooled temp files -> Telegram documents.
+
+Rows are pulled from a named (server-side) cursor ``EXPORT_ITERSIZE`` at a
+time and serialized straight into a ``SpooledTemporaryFile`` (optionally
+gzip-compressed), so memory stays flat regardless of table size. When a part
+reaches ``EXPORT_PART_MAX_MB`` a new part is started; every part is a
+self-contained file (CSV header / JSON array / Parquet footer repeated) that
+fits under Telegram's 50 MB bot upload limit.
+
+Formats: csv, ndjson, json, parquet (parquet needs pyarrow).
+"""
+
+import csv
+import gzip
+import importlib
+import io
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.database import get_connection
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "ndjson", "json", "parquet")
+EXPORT_ITERSIZE = int(os.environ.get("EXPORT_ITERSIZE", "2000"))
+EXPORT_PART_MAX_BYTES = int(float(os.environ.get("EXPORT_PART_MAX_MB", "45")) * 1024 * 1024)
+EXPORT_SPOOL_BYTES = 4 * 1024 * 1024
+EXPORT_TRACE_MEMORY = os.environ.get("EXPORT_TRACE_MEMORY", "").lower() in ("1", "true", "yes")
+
+_EXTENSIONS = {"csv": ".csv", "ndjson": ".ndjson", "json": ".json", "parquet": ".parquet"}
+
+
+def parquet_available() -> bool:
+    try:
+        importlib.import_module("pyarrow.parquet")
+        return True
+    except ImportError:
+        return False
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _flat_value(value: Any):
+    """Cell value for CSV: nested values as JSON, datetimes as ISO strings."""
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+@dataclass
+class ExportPart:
+    file: IO[bytes]
+    filename: str
+    size: int
+    rows: int
+
+
+@dataclass
+class ExportResult:
+    parts: List[ExportPart] = field(default_factory=list)
+    rows: int = 0
+    fmt: str = "csv"
+    compressed: bool = False
+    duration: float = 0.0
+    peak_memory_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(p.size for p in self.parts)
+
+    def close(self) -> None:
+        for part in self.parts:
+            try:
+                part.file.close()
+            except Exception:
+                pass
+
+    def __enter__(self) -> "ExportResult":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class _MemoryProbe:
+    """Peak memory during an export.
+
+    With EXPORT_TRACE_MEMORY the Python heap peak is traced exactly
+    (tracemalloc, slower); otherwise the growth of the process max RSS is used.
+    """
+
+    def __init__(self):
+        self._traced = False
+        self._rss_before = 0
+
+    def __enter__(self) -> "_MemoryProbe":
+        if EXPORT_TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._traced = True
+        self._rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return self
+
+    def peak(self) -> int:
+        if self._traced:
+            return tracemalloc.get_traced_memory()[1]
+        return max(0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - self._rss_before) * 1024
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._traced:
+            tracemalloc.stop()
+        return False
+
+
+class _PartSink:
+    """One output part: a spooled temp file, optionally behind gzip."""
+
+    def __init__(self, compress: bool):
+        self.raw = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode="w+b")
+        self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6) if compress else self.raw
+        self.rows = 0
+
+    def write(self, data: bytes) -> None:
+        self.stream.write(data)
+
+    @property
+    def size(self) -> int:
+        return self.raw.tell()
+
+    def finish(self) -> Tuple[IO[bytes], int]:
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        size = self.raw.tell()
+        self.raw.seek(0)
+        return self.raw, size
+
+
+class StreamingExporter:
+    """Serialize row batches into size-bounded parts of one format."""
+
+    def __init__(self, basename: str, fmt: str = "csv", compress: bool = False,
+                 header_labels: Optional[Dict[str, str]] = None,
+                 part_max_bytes: int = EXPORT_PART_MAX_BYTES):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == "parquet":
+            if not parquet_available():
+                raise RuntimeError("Parquet export requires pyarrow")
+            compress = False  # parquet pages are compressed internally
+        self.basename = basename
+        self.fmt = fmt
+        self.compress = compress
+        self.header_labels = header_labels or {}
+        self.part_max_bytes = part_max_bytes
+        self.result = ExportResult(fmt=fmt, compressed=compress)
+        self._sink: Optional[_PartSink] = None
+        self._columns: Optional[List[str]] = None
+        self._parquet_schema = None
+        self._parquet_writer = None
+
+    def _open_part(self) -> None:
+        self._sink = _PartSink(self.compress)
+        if self.fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf).writerow([self.header_labels.get(c, c) for c in self._columns])
+            self._sink.write(("\ufeff" + buf.getvalue()).encode("utf-8"))
+        elif self.fmt == "json":
+            self._sink.write(b"[\n")
+        elif self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._parquet_writer = pq.ParquetWriter(self._sink.stream, self._parquet_schema, compression="snappy")
+
+    def _close_part(self) -> None:
+        sink = self._sink
+        if sink is None:
+            return
+        if self.fmt == "json":
+            sink.write(b"\n]\n")
+        elif self.fmt == "parquet":
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        file, size = sink.finish()
+        self.result.parts.append(ExportPart(file=file, filename="", size=size, rows=sink.rows))
+        self._sink = None
+
+    def _init_columns(self, rows: Sequence[Dict[str, Any]]) -> None:
+        self._columns = list(rows[0].keys())
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            inferred = pa.Table.from_pylist(list(rows)).schema
+            self._parquet_schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in inferred
+            ])
+
+    def _encode(self, rows: Sequence[Dict[str, Any]]) -> bytes:
+        if self.fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in rows:
+                writer.writerow([_flat_value(row.get(c)) for c in self._columns])
+            return buf.getvalue().encode("utf-8")
+        dumps = [json.dumps(row, ensure_ascii=False, default=_json_default) for row in rows]
+        if self.fmt == "ndjson":
+            return ("\n".join(dumps) + "\n").encode("utf-8")
+        prefix = ",\n" if self._sink.rows else ""
+        return (prefix + ",\n".join(dumps)).encode("utf-8")
+
+    def write_batch(self, rows: Sequence[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._columns is None:
+            self._init_columns(rows)
+        if self._sink is None:
+            self._open_part()
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            self._parquet_writer.write_table(pa.Table.from_pylist(list(rows), schema=self._parquet_schema))
+        else:
+            self._sink.write(self._encode(rows))
+        self._sink.rows += len(rows)
+        self.result.rows += len(rows)
+        if self._sink.size >= self.part_max_bytes:
+            self._close_part()
+
+    def finish(self) -> ExportResult:
+        self._close_part()
+        ext = _EXTENSIONS[self.fmt] + (".gz" if self.compress else "")
+        total = len(self.result.parts)
+        for i, part in enumerate(self.result.parts, 1):
+            suffix = f".part{i}of{total}" if total > 1 else ""
+            part.filename = f"{self.basename}{suffix}{ext}"
+        return self.result
+
+    def abort(self) -> None:
+        if self._sink is not None:
+            try:
+                self._sink.raw.close()
+            except Exception:
+                pass
+            self._sink = None
+        self.result.close()
+
+
+def export_query(query: str, params: Optional[tuple], basename: str, fmt: str = "csv",
+                 compress: bool = False,
+                 row_mapper: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 header_labels: Optional[Dict[str, str]] = None,
+                 itersize: int = EXPORT_ITERSIZE) -> ExportResult:
+    """Run ``query`` through a named cursor and stream rows into export parts.
+
+    The caller owns the returned result and must ``close()`` it (it is a
+    context manager) once the parts have been sent.
+    """
+    from psycopg2.extras import RealDictCursor
+
+    exporter = StreamingExporter(basename, fmt=fmt, compress=compress, header_labels=header_labels)
+    start = time.perf_counter()
+    try:
+        with _MemoryProbe() as probe:
+            with get_connection() as conn:
+                with conn.cursor(name=f"export_{uuid.uuid4().hex[:12]}", cursor_factory=RealDictCursor) as cur:
+                    cur.itersize = itersize
+                    cur.execute(query, params)
+                    while True:
+                        rows = cur.fetchmany(itersize)
+                        if not rows:
+                            break
+                        exporter.write_batch([row_mapper(r) if row_mapper else r for r in rows])
+            result = exporter.finish()
+            result.peak_memory_bytes = probe.peak()
+    except Exception:
+        exporter.abort()
+        raise
+
+    result.duration = time.perf_counter() - start
+    _record(basename, result)
+    return result
+
+
+def export_document(data: Any, basename: str, compress: bool = False) -> ExportResult:
+    """Write one JSON document into an export part without building the string."""
+    start = time.perf_counter()
+    sink = _PartSink(compress)
+    try:
+        for chunk in json.JSONEncoder(ensure_ascii=False, indent=2, default=_json_default).iterencode(data):
+            sink.write(chunk.encode("utf-8"))
+        file, size = sink.finish()
+        ext = ".json.gz" if compress else ".json"
+        part = ExportPart(file=file, filename=f"{basename}{ext}", size=size, rows=1)
+    except Exception:
+        sink.raw.close()
+        raise
+    result = ExportResult(parts=[part], rows=1, fmt="json", compressed=compress,
+                          duration=time.perf_counter() - start)
+    _record(basename, result)
+    return result
+
+
+def _record(basename: str, result: ExportResult) -> None:
+    registry.observe("export_duration_seconds", result.duration, format=result.fmt)
+    registry.inc("export_rows_total", result.rows, format=result.fmt)
+    registry.inc("export_bytes_total", result.total_bytes, format=result.fmt)
+    registry.set_gauge("export_peak_memory_bytes", result.peak_memory_bytes, format=result.fmt)
+    logger.info(
+        f"Export {basename}: {result.rows} rows, {len(result.parts)} part(s), "
+        f"{result.total_bytes / 1024:.0f} KB, {result.duration:.1f}s, "
+        f"peak mem {result.peak_memory_bytes / 1024 / 1024:.1f} MB"
+    )
+
+
+def parse_export_args(args: Optional[Iterable[str]], default_days: Optional[int] = 30):
+    """Parse ``[days] [csv|ndjson|json|parquet] [gz]`` command arguments."""
+    days, fmt, compress = default_days, None, False
+    for arg in args or []:
+        arg = arg.lower()
+        if arg.isdigit():
+            days = int(arg)
+        elif arg in EXPORT_FORMATS:
+            fmt = arg
+        elif arg in ("gz", "gzip"):
+            compress = True
+    return days, fmt, compress
+
+
+async def send_export(message, result: ExportResult, caption: str) -> None:
+    """Send every part as a separate Telegram document, then release the files."""
+    try:
+        total = len(result.parts)
+        for i, part in enumerate(result.parts, 1):
+            part_caption = caption if total == 1 else f"{caption} ({i}/{total})"
+            await message.reply_document(document=part.file, filename=part.filename, caption=part_caption)
+    finally:
+        result.close()
@@ -11,14 +11,31 @@ v2.1: session attribution + outcome weighting + niche persistence
   - Session attribution: credits ALL responses in session (1 hour window), not just last
   - Outcome weighting: high-value actions (booking, lead) weighted higher than low-value (portfolio view)
   - Niche persistence: saves detected niche to client profile for future sessions
+v2.2: materialized statistics
+  - Per (tag, niche, day) counters in tag_daily_stats, maintained when responses
+    are tagged and when outcomes are attributed
+  - Windowed rankings read the small counter table instead of scanning
+    response_tags JOIN response_outcomes
+  - Background refresher precomputes adaptive instructions per niche, so
+    get_adaptive_instructions only does dictionary lookups
+  - A user's stored niche is looked up on a background thread the first time
+    they are seen; until it arrives their prompt uses the global hints
+  - Counters for history logged before v2.2 are backfilled by the
+    tag_daily_stats_backfill migration step
 """
+import asyncio
 import logging
 import re
+import threading
 import time
 import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, List, Tuple
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -149,8 +166,53 @@ OUTCOME_WEIGHTS: Dict[str, float] = {
 
 SESSION_ATTRIBUTION_WINDOW_MINUTES = 60
 
+ALL_NICHES = "*"
+
+STYLE_LABELS: Dict[str, str] = {
+    "formal": "формальный",
+    "casual": "неформальный",
+    "analytical": "аналитический",
+    "emotional": "эмоциональный",
+    "skeptical": "осторожный",
+}
+
 _insights_cache: Dict[str, Tuple[float, object]] = {}
 _CACHE_TTL = 300
+_INSIGHTS_CACHE_MAX = 512
+_USER_NICHE_CACHE_MAX = 5000
+
+_TECHNIQUE_RES = [(tech_id, re.compile(info["patterns"], re.IGNORECASE))
+                  for tech_id, info in CLOSING_TECHNIQUES.items()]
+_NICHE_RES = [(niche_id, re.compile(info["patterns"], re.IGNORECASE))
+              for niche_id, info in NICHE_PATTERNS.items()]
+_STYLE_RES = [(style_id, re.compile(pattern, re.IGNORECASE))
+              for style_id, pattern in STYLE_PATTERNS.items()]
+
+
+def _cache_put(key: str, value: object) -> None:
+    if len(_insights_cache) >= _INSIGHTS_CACHE_MAX and key not in _insights_cache:
+        now = time.time()
+        for k in [k for k, v in _insights_cache.items() if now - v[0] >= _CACHE_TTL]:
+            del _insights_cache[k]
+        while len(_insights_cache) >= _INSIGHTS_CACHE_MAX:
+            del _insights_cache[next(iter(_insights_cache))]
+    _insights_cache[key] = (time.time(), value)
+
+
+def _stat_keys(tags: List[Tuple[str, str, float]]) -> List[Tuple[str, str, str]]:
+    """Expand response tags into (tag_type, tag_value, niche) counter keys.
+
+    Techniques are counted globally (niche '*') and per detected niche;
+    styles are counted per detected niche only.
+    """
+    niches = [value for tag_type, value, _ in tags if tag_type == "niche"]
+    keys: List[Tuple[str, str, str]] = []
+    for tag_type, value, _ in tags:
+        if tag_type == "technique":
+            keys.append(("technique", value, ALL_NICHES))
+        if tag_type in ("technique", "style"):
+            keys.extend((tag_type, value, niche) for niche in niches)
+    return keys
 
 
 def _wilson_score(successes: int, total: int, z: float = 1.96) -> float:
@@ -165,9 +227,15 @@ def _wilson_score(successes: int, total: int, z: float = 1.96) -> float:
 
 class FeedbackLoop:
     def __init__(self):
-        self._init_db()
-
-    def _init_db(self):
+        self._adaptive_snapshot: Dict[Optional[str], Tuple[str, ...]] = {}
+        self._snapshot_built_at: float = 0.0
+        self._user_niches: "OrderedDict[int, Optional[str]]" = OrderedDict()
+        self._niche_lock = threading.Lock()
+        self._niche_pending: set = set()
+        self._niche_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-niche")
+
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
 
@@ -224,6 +292,19 @@ class FeedbackLoop:
                             UNIQUE(niche)
                         )
                     """)
+
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS tag_daily_stats (
+                            tag_type VARCHAR(20) NOT NULL,
+                            tag_value VARCHAR(50) NOT NULL,
+                            niche VARCHAR(30) NOT NULL,
+                            day DATE NOT NULL,
+                            total INT NOT NULL DEFAULT 0,
+                            converted INT NOT NULL DEFAULT 0,
+                            weight_sum REAL NOT NULL DEFAULT 0.0,
+                            PRIMARY KEY (tag_type, niche, day, tag_value)
+                        )
+                    """)
             logger.info("Self-Learning Loop v2 tables initialized")
         except Exception as e:
             logger.error(f"Failed to init feedback tables: {e}")
@@ -260,18 +341,18 @@ class FeedbackLoop:
         try:
             tags: List[Tuple[str, str, float]] = []
 
-            for tech_id, tech_info in CLOSING_TECHNIQUES.items():
-                if re.search(tech_info["patterns"], ai_response, re.IGNORECASE):
+            for tech_id, pattern in _TECHNIQUE_RES:
+                if pattern.search(ai_response):
                     tags.append(("technique", tech_id, 0.85))
 
             detected_niche = None
-            for niche_id, niche_info in NICHE_PATTERNS.items():
-                if re.search(niche_info["patterns"], user_message, re.IGNORECASE):
+            for niche_id, pattern in _NICHE_RES:
+                if pattern.search(user_message):
                     tags.append(("niche", niche_id, 0.9))
                     detected_niche = niche_id
 
-            for style_id, pattern in STYLE_PATTERNS.items():
-                if re.search(pattern, user_message, re.IGNORECASE):
+            for style_id, pattern in _STYLE_RES:
+                if pattern.search(user_message):
                     tags.append(("style", style_id, 0.7))
 
             if not tags:
@@ -285,12 +366,23 @@ class FeedbackLoop:
                             VALUES (%s, %s, %s, %s)
                         """, (response_id, tag_type, tag_value, confidence))
 
+                    for tag_type, tag_value, niche in _stat_keys(tags):
+                        cur.execute("""
+                            INSERT INTO tag_daily_stats (tag_type, tag_value, niche, day, total)
+                            VALUES (%s, %s, %s, CURRENT_DATE, 1)
+                            ON CONFLICT (tag_type, niche, day, tag_value)
+                            DO UPDATE SET total = tag_daily_stats.total + 1
+                        """, (tag_type, tag_value, niche))
+
             if detected_niche and user_id:
                 self._save_user_niche(user_id, detected_niche)
         except Exception as e:
             logger.debug(f"Auto-tagging skipped: {e}")
 
     def _save_user_niche(self, user_id: int, niche: str):
+        with self._niche_lock:
+            if user_id in self._user_niches:
+                self._user_niches[user_id] = niche
         try:
             from src.session import save_client_profile
             save_client_profile(user_id, industry=NICHE_PATTERNS.get(niche, {}).get("label", niche))
@@ -307,37 +399,52 @@ class FeedbackLoop:
             with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
-                        UPDATE response_outcomes
+                        UPDATE response_outcomes ro
                         SET outcome_type = CASE
-                                WHEN outcome_weight < %s THEN %s
-                                ELSE outcome_type
+                                WHEN ro.outcome_weight < %s THEN %s
+                                ELSE ro.outcome_type
                             END,
-                            outcome_weight = GREATEST(outcome_weight, %s),
-                            outcome_at = COALESCE(outcome_at, NOW())
-                        WHERE user_id = %s
-                          AND created_at >= NOW() - INTERVAL '%s minutes'
-                          AND (outcome_type IS NULL OR outcome_weight < %s)
-                        RETURNING id
+                            outcome_weight = GREATEST(ro.outcome_weight, %s),
+                            outcome_at = COALESCE(ro.outcome_at, NOW())
+                        FROM (
+                            SELECT id, outcome_type, outcome_weight
+                            FROM response_outcomes
+                            WHERE user_id = %s
+                              AND created_at >= NOW() - INTERVAL '%s minutes'
+                              AND (outcome_type IS NULL OR outcome_weight < %s)
+                            FOR UPDATE
+                        ) old
+                        WHERE ro.id = old.id
+                        RETURNING ro.id, (old.outcome_type IS NULL)::int,
+                                  ro.outcome_weight - COALESCE(old.outcome_weight, 0)
                     """, (weight, outcome_type, weight, user_id,
                           SESSION_ATTRIBUTION_WINDOW_MINUTES, weight))
-                    updated_ids = [row[0] for row in cur.fetchall()]
+                    deltas = cur.fetchall()
 
-                    if not updated_ids:
+                    if not deltas:
                         cur.execute("""
-                            UPDATE response_outcomes
+                            UPDATE response_outcomes ro
                             SET outcome_type = %s,
-                                outcome_weight = GREATEST(outcome_weight, %s),
+                                outcome_weight = GREATEST(ro.outcome_weight, %s),
                                 outcome_at = NOW()
-                            WHERE id = (
-                                SELECT id FROM response_outcomes
+                            FROM (
+                                SELECT id, outcome_type, outcome_weight
+                                FROM response_outcomes
                                 WHERE user_id = %s
                                   AND (outcome_type IS NULL OR outcome_weight < %s)
                                 ORDER BY created_at DESC
                                 LIMIT 1
-                            )
+                                FOR UPDATE
+                            ) old
+                            WHERE ro.id = old.id
+                            RETURNING ro.id, (old.outcome_type IS NULL)::int,
+                                      ro.outcome_weight - COALESCE(old.outcome_weight, 0)
                         """, (outcome_type, weight, user_id, weight))
+                        deltas = cur.fetchall()
 
-                    attributed = len(updated_ids) if updated_ids else cur.rowcount
+                    self._apply_outcome_deltas(cur, deltas)
+
+                    attributed = len(deltas)
                     if attributed > 0:
                         logger.debug(
                             f"Outcome '{outcome_type}' (weight={weight}) attributed to "
@@ -363,15 +470,117 @@ class FeedbackLoop:
             with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
-                        UPDATE response_outcomes
-                        SET outcome_type = %s, outcome_weight = GREATEST(outcome_weight, %s), outcome_at = NOW()
-                        WHERE id = %s
+                        UPDATE response_outcomes ro
+                        SET outcome_type = %s, outcome_weight = GREATEST(ro.outcome_weight, %s), outcome_at = NOW()
+                        FROM (
+                            SELECT id, outcome_type, outcome_weight
+                            FROM response_outcomes
+                            WHERE id = %s
+                            FOR UPDATE
+                        ) old
+                        WHERE ro.id = old.id
+                        RETURNING ro.id, (old.outcome_type IS NULL)::int,
+                                  ro.outcome_weight - COALESCE(old.outcome_weight, 0)
                     """, (outcome_type, weight, response_id))
-                    return cur.rowcount > 0
+                    deltas = cur.fetchall()
+                    self._apply_outcome_deltas(cur, deltas)
+                    return len(deltas) > 0
         except Exception as e:
             logger.error(f"Failed to record outcome for response {response_id}: {e}")
             return False
 
+    def _apply_outcome_deltas(self, cur, deltas: List[Tuple[int, int, float]]):
+        """Fold (response_id, newly_converted, weight_delta) rows into tag_daily_stats.
+
+        Runs inside the caller's transaction so counters never drift from
+        response_outcomes.
+        """
+        deltas = [d for d in deltas if d[1] or d[2]]
+        if not deltas:
+            return
+
+        cur.execute("""
+            WITH d(response_id, newly, dweight) AS (
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::real[])
+            ),
+            keys AS (
+                SELECT rt.response_id, rt.tag_type, rt.tag_value, %s::varchar AS niche
+                FROM response_tags rt
+                JOIN d ON d.response_id = rt.response_id
+                WHERE rt.tag_type = 'technique'
+                UNION ALL
+                SELECT rt.response_id, rt.tag_type, rt.tag_value, rn.tag_value
+                FROM response_tags rt
+                JOIN d ON d.response_id = rt.response_id
+                JOIN response_tags rn ON rn.response_id = rt.response_id AND rn.tag_type = 'niche'
+                WHERE rt.tag_type IN ('technique', 'style')
+            )
+            INSERT INTO tag_daily_stats (tag_type, tag_value, niche, day, total, converted, weight_sum)
+            SELECT k.tag_type, k.tag_value, k.niche, ro.created_at::date,
+                   0, SUM(d.newly), SUM(d.dweight)
+            FROM keys k
+            JOIN d ON d.response_id = k.response_id
+            JOIN response_outcomes ro ON ro.id = k.response_id
+            GROUP BY k.tag_type, k.tag_value, k.niche, ro.created_at::date
+            ON CONFLICT (tag_type, niche, day, tag_value) DO UPDATE SET
+                converted = tag_daily_stats.converted + EXCLUDED.converted,
+                weight_sum = tag_daily_stats.weight_sum + EXCLUDED.weight_sum
+        """, ([d[0] for d in deltas], [int(d[1]) for d in deltas],
+              [float(d[2]) for d in deltas], ALL_NICHES))
+
+    def rebuild_tag_stats(self, days: int = 90) -> int:
+        """Recompute tag_daily_stats from the raw tables for the last N days.
+
+        Used once to backfill counters for responses logged before v2.2 and
+        as a repair tool; the hot path only does incremental updates.
+        """
+        if not DATABASE_URL:
+            return 0
+
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM tag_daily_stats WHERE day >= CURRENT_DATE - %s", (days,))
+                    cur.execute("""
+                        WITH keys AS (
+                            SELECT rt.response_id, rt.tag_type, rt.tag_value, %s::varchar AS niche
+                            FROM response_tags rt
+                            WHERE rt.tag_type = 'technique'
+                            UNION ALL
+                            SELECT rt.response_id, rt.tag_type, rt.tag_value, rn.tag_value
+                            FROM response_tags rt
+                            JOIN response_tags rn ON rn.response_id = rt.response_id AND rn.tag_type = 'niche'
+                            WHERE rt.tag_type IN ('technique', 'style')
+                        )
+                        INSERT INTO tag_daily_stats (tag_type, tag_value, niche, day, total, converted, weight_sum)
+                        SELECT k.tag_type, k.tag_value, k.niche, ro.created_at::date,
+                               COUNT(*), COUNT(ro.outcome_type), COALESCE(SUM(ro.outcome_weight), 0)
+                        FROM keys k
+                        JOIN response_outcomes ro ON ro.id = k.response_id
+                        WHERE ro.created_at >= CURRENT_DATE - %s
+                        GROUP BY k.tag_type, k.tag_value, k.niche, ro.created_at::date
+                    """, (ALL_NICHES, days))
+                    rows = cur.rowcount
+            logger.info(f"Rebuilt tag_daily_stats: {rows} rows for last {days} days")
+            return rows
+        except Exception as e:
+            logger.error(f"Failed to rebuild tag stats: {e}")
+            return 0
+
+    def _fetch_tag_stats(self, tag_type: str, niche: str, days: int,
+                         min_samples: int) -> List[Tuple[str, int, int, float]]:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT tag_value, SUM(total), SUM(converted), SUM(weight_sum)
+                    FROM tag_daily_stats
+                    WHERE tag_type = %s AND niche = %s
+                      AND day >= CURRENT_DATE - %s
+                    GROUP BY tag_value
+                    HAVING SUM(total) >= %s
+                """, (tag_type, niche, days, min_samples))
+                return [(r[0], int(r[1]), int(r[2]), float(r[3] or 0)) for r in cur.fetchall()]
+
     def get_best_techniques(self, niche: Optional[str] = None,
                             days: int = 30, min_samples: int = 10) -> List[Dict]:
         cache_key = f"best_techniques:{niche}:{days}"
@@ -383,58 +592,23 @@ class FeedbackLoop:
             return []
 
         try:
-            niche_filter = ""
-            params: list = [days]
-            if niche:
-                niche_filter = """
-                    AND ro.id IN (
-                        SELECT rt2.response_id FROM response_tags rt2
-                        WHERE rt2.tag_type = 'niche' AND rt2.tag_value = %s
-                    )
-                """
-                params.append(niche)
-
-            with get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(f"""
-                        SELECT
-                            rt.tag_value AS technique,
-                            COUNT(*) AS total,
-                            COUNT(ro.outcome_type) AS converted,
-                            ROUND(COUNT(ro.outcome_type)::numeric / NULLIF(COUNT(*), 0) * 100, 1) AS rate,
-                            ROUND(COALESCE(SUM(ro.outcome_weight), 0)::numeric / NULLIF(COUNT(*), 0) * 100, 1) AS weighted_rate
-                        FROM response_tags rt
-                        JOIN response_outcomes ro ON rt.response_id = ro.id
-                        WHERE rt.tag_type = 'technique'
-                          AND ro.created_at >= NOW() - %s * INTERVAL '1 day'
-                          {niche_filter}
-                        GROUP BY rt.tag_value
-                        HAVING COUNT(*) >= {min_samples}
-                        ORDER BY weighted_rate DESC
-                    """, params)
-
-                    results = []
-                    for row in cur.fetchall():
-                        tech_id = row[0]
-                        total = row[1]
-                        converted = row[2]
-                        raw_rate = float(row[3])
-                        weighted_rate = float(row[4])
-                        wilson = round(_wilson_score(converted, total) * 100, 1)
-                        tech_info = CLOSING_TECHNIQUES.get(tech_id, {})
-                        results.append({
-                            "technique_id": tech_id,
-                            "label": tech_info.get("label", tech_id),
-                            "total": total,
-                            "converted": converted,
-                            "raw_rate": raw_rate,
-                            "weighted_rate": weighted_rate,
-                            "wilson_score": wilson,
-                        })
-
-                    results.sort(key=lambda x: (x["weighted_rate"], x["wilson_score"]), reverse=True)
-
-            _insights_cache[cache_key] = (time.time(), results)
+            rows = self._fetch_tag_stats("technique", niche or ALL_NICHES, days, min_samples)
+            results = []
+            for tech_id, total, converted, weight_sum in rows:
+                tech_info = CLOSING_TECHNIQUES.get(tech_id, {})
+                results.append({
+                    "technique_id": tech_id,
+                    "label": tech_info.get("label", tech_id),
+                    "total": total,
+                    "converted": converted,
+                    "raw_rate": round(converted / total * 100, 1) if total else 0.0,
+                    "weighted_rate": round(weight_sum / total * 100, 1) if total else 0.0,
+                    "wilson_score": round(_wilson_score(converted, total) * 100, 1),
+                })
+
+            results.sort(key=lambda x: (x["weighted_rate"], x["wilson_score"]), reverse=True)
+
+            _cache_put(cache_key, results)
             return results
         except Exception as e:
             logger.error(f"Failed to get best techniques: {e}")
@@ -451,65 +625,20 @@ class FeedbackLoop:
             return None
 
         try:
-            with get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT
-                            rt_style.tag_value AS style,
-                            COUNT(*) AS total,
-                            COUNT(ro.outcome_type) AS converted
-                        FROM response_tags rt_niche
-                        JOIN response_outcomes ro ON rt_niche.response_id = ro.id
-                        JOIN response_tags rt_style ON rt_style.response_id = ro.id AND rt_style.tag_type = 'style'
-                        WHERE rt_niche.tag_type = 'niche'
-                          AND rt_niche.tag_value = %s
-                          AND ro.created_at >= NOW() - %s * INTERVAL '1 day'
-                        GROUP BY rt_style.tag_value
-                        HAVING COUNT(*) >= %s
-                        ORDER BY COUNT(ro.outcome_type)::numeric / NULLIF(COUNT(*), 0) DESC
-                        LIMIT 3
-                    """, (niche, days, min_samples))
-                    style_rows = cur.fetchall()
+            def _by_rate(row):
+                return row[2] / row[1] if row[1] else 0.0
 
-                    cur.execute("""
-                        SELECT
-                            rt_tech.tag_value AS technique,
-                            COUNT(*) AS total,
-                            COUNT(ro.outcome_type) AS converted
-                        FROM response_tags rt_niche
-                        JOIN response_outcomes ro ON rt_niche.response_id = ro.id
-                        JOIN response_tags rt_tech ON rt_tech.response_id = ro.id AND rt_tech.tag_type = 'technique'
-                        WHERE rt_niche.tag_type = 'niche'
-                          AND rt_niche.tag_value = %s
-                          AND ro.created_at >= NOW() - %s * INTERVAL '1 day'
-                        GROUP BY rt_tech.tag_value
-                        HAVING COUNT(*) >= %s
-                        ORDER BY COUNT(ro.outcome_type)::numeric / NULLIF(COUNT(*), 0) DESC
-                        LIMIT 3
-                    """, (niche, days, min_samples))
-                    tech_rows = cur.fetchall()
+            style_stats = self._fetch_tag_stats("style", niche, days, min_samples)
+            tech_stats = self._fetch_tag_stats("technique", niche, days, min_samples)
 
-                    cur.execute("""
-                        SELECT
-                            rt_tech.tag_value AS technique,
-                            COUNT(*) AS total,
-                            COUNT(ro.outcome_type) AS converted
-                        FROM response_tags rt_niche
-                        JOIN response_outcomes ro ON rt_niche.response_id = ro.id
-                        JOIN response_tags rt_tech ON rt_tech.response_id = ro.id AND rt_tech.tag_type = 'technique'
-                        WHERE rt_niche.tag_type = 'niche'
-                          AND rt_niche.tag_value = %s
-                          AND ro.created_at >= NOW() - %s * INTERVAL '1 day'
-                        GROUP BY rt_tech.tag_value
-                        HAVING COUNT(*) >= %s
-                          AND COUNT(ro.outcome_type)::numeric / NULLIF(COUNT(*), 0) < 0.05
-                        ORDER BY COUNT(ro.outcome_type)::numeric / NULLIF(COUNT(*), 0) ASC
-                        LIMIT 2
-                    """, (niche, days, min_samples))
-                    avoid_rows = cur.fetchall()
+            style_rows = sorted(style_stats, key=_by_rate, reverse=True)[:3]
+            tech_rows = sorted(tech_stats, key=_by_rate, reverse=True)[:3]
+            avoid_rows = sorted(
+                [r for r in tech_stats if _by_rate(r) < 0.05], key=_by_rate
+            )[:2]
 
             if not style_rows and not tech_rows:
-                _insights_cache[cache_key] = (time.time(), None)
+                _cache_put(cache_key, None)
                 return None
 
             niche_info = NICHE_PATTERNS.get(niche, {})
@@ -536,7 +665,7 @@ class FeedbackLoop:
                 ],
             }
 
-            _insights_cache[cache_key] = (time.time(), result)
+            _cache_put(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"Failed to get niche insights: {e}")
@@ -545,68 +674,100 @@ class FeedbackLoop:
     def get_adaptive_instructions(self, user_id: int,
                                   user_message: str,
                                   funnel_stage: Optional[str] = None) -> Optional[str]:
-        cache_key = f"adaptive:{user_id}"
-        cached = _insights_cache.get(cache_key)
-        if cached and (time.time() - cached[0]) < 120:
-            return cached[1]  # type: ignore
-
-        self.maybe_refresh_niche_memory()
+        """Return prompt hints from the precomputed snapshot.
 
-        parts: List[str] = []
+        Only dictionary lookups and precompiled regex matching happen here;
+        the aggregation runs in refresh_adaptive_snapshot() on a background job.
+        """
+        snapshot = self._adaptive_snapshot
+        if not snapshot:
+            return None
 
         detected_niche = None
-        msg_lower = user_message.lower()
-        for niche_id, niche_info in NICHE_PATTERNS.items():
-            if re.search(niche_info["patterns"], msg_lower):
+        for niche_id, pattern in _NICHE_RES:
+            if pattern.search(user_message):
                 detected_niche = niche_id
                 break
 
         if not detected_niche:
-            detected_niche = self._get_user_niche(user_id)
-
-        best_global = self.get_best_techniques(niche=None, days=30, min_samples=10)
-        if best_global and len(best_global) >= 2:
-            top2 = best_global[:2]
-            labels = [f"{t['label']} ({t['wilson_score']}%)" for t in top2]
-            parts.append(
-                f"[САМООБУЧЕНИЕ] Лучшие техники закрытия (по данным за 30 дней): {', '.join(labels)}. "
-                f"Приоритизируй их, когда уместно."
-            )
+            detected_niche = self._cached_user_niche(user_id)
 
-        if detected_niche:
-            niche_data = self.get_niche_insights(detected_niche, days=30, min_samples=5)
-            if niche_data:
-                niche_parts = []
-                if niche_data["best_techniques"]:
-                    tech_labels = [t["label"] for t in niche_data["best_techniques"][:2]]
-                    niche_parts.append(f"лучшие техники: {', '.join(tech_labels)}")
-                if niche_data["best_styles"]:
-                    style = niche_data["best_styles"][0]["style"]
-                    style_labels = {
-                        "formal": "формальный",
-                        "casual": "неформальный",
-                        "analytical": "аналитический",
-                        "emotional": "эмоциональный",
-                        "skeptical": "осторожный",
-                    }
-                    niche_parts.append(f"предпочитаемый стиль: {style_labels.get(style, style)}")
-                if niche_data["avoid_techniques"]:
-                    avoid_labels = [t["label"] for t in niche_data["avoid_techniques"]]
-                    niche_parts.append(f"избегай: {', '.join(avoid_labels)}")
-
-                if niche_parts:
-                    niche_label = niche_data["niche_label"]
-                    parts.append(
-                        f"[НИША: {niche_label}] Накопленный опыт: {'; '.join(niche_parts)}."
-                    )
-
-        if not parts:
-            _insights_cache[cache_key] = (time.time(), None)
+        global_parts = snapshot.get(None, ())
+        niche_parts = snapshot.get(detected_niche, ()) if detected_niche else ()
+        if not global_parts and not niche_parts:
             return None
+        return "\n".join(global_parts + niche_parts)
+
+    def _build_adaptive_parts(self, niche: Optional[str]) -> Tuple[str, ...]:
+        if niche is None:
+            best_global = self.get_best_techniques(niche=None, days=30, min_samples=10)
+            if best_global and len(best_global) >= 2:
+                labels = [f"{t['label']} ({t['wilson_score']}%)" for t in best_global[:2]]
+                return (
+                    f"[САМООБУЧЕНИЕ] Лучшие техники закрытия (по данным за 30 дней): {', '.join(labels)}. "
+                    f"Приоритизируй их, когда уместно.",
+                )
+            return ()
+
+        niche_data = self.get_niche_insights(niche, days=30, min_samples=5)
+        if not niche_data:
+            return ()
+
+        niche_parts = []
+        if niche_data["best_techniques"]:
+            tech_labels = [t["label"] for t in niche_data["best_techniques"][:2]]
+            niche_parts.append(f"лучшие техники: {', '.join(tech_labels)}")
+        if niche_data["best_styles"]:
+            style = niche_data["best_styles"][0]["style"]
+            niche_parts.append(f"предпочитаемый стиль: {STYLE_LABELS.get(style, style)}")
+        if niche_data["avoid_techniques"]:
+            avoid_labels = [t["label"] for t in niche_data["avoid_techniques"]]
+            niche_parts.append(f"избегай: {', '.join(avoid_labels)}")
+
+        if not niche_parts:
+            return ()
+        return (f"[НИША: {niche_data['niche_label']}] Накопленный опыт: {'; '.join(niche_parts)}.",)
+
+    def refresh_adaptive_snapshot(self) -> int:
+        """Rebuild the per-niche instruction snapshot and swap it in atomically."""
+        if not DATABASE_URL:
+            return 0
+
+        _insights_cache.clear()
+        snapshot: Dict[Optional[str], Tuple[str, ...]] = {None: self._build_adaptive_parts(None)}
+        for niche_id in NICHE_PATTERNS:
+            parts = self._build_adaptive_parts(niche_id)
+            if parts:
+                snapshot[niche_id] = parts
 
-        result = "\n".join(parts)
-        _insights_cache[cache_key] = (time.time(), result)
-        return result
+        self._adaptive_snapshot = snapshot
+        self._snapshot_built_at = time.time()
+        self.maybe_refresh_niche_memory()
+        return len(snapshot)
+
+    def _cached_user_niche(self, user_id: int) -> Optional[str]:
+        """Cached niche; on a miss, queue the lookup and answer None for now."""
+        with self._niche_lock:
+            if user_id in self._user_niches:
+                self._user_niches.move_to_end(user_id)
+                return self._user_niches[user_id]
+            if user_id in self._niche_pending:
+                return None
+            self._niche_pending.add(user_id)
+        try:
+            self._niche_loader.submit(self._load_user_niche, user_id)
+        except RuntimeError:
+            with self._niche_lock:
+                self._niche_pending.discard(user_id)
+        return None
+
+    def _load_user_niche(self, user_id: int) -> None:
+        niche = self._get_user_niche(user_id)
+        with self._niche_lock:
+            self._niche_pending.discard(user_id)
+            self._user_niches.setdefault(user_id, niche)
+            if len(self._user_niches) > _USER_NICHE_CACHE_MAX:
+                self._user_niches.popitem(last=False)
 
     def _get_user_niche(self, user_id: int) -> Optional[str]:
         try:
@@ -919,6 +1080,7 @@ class FeedbackLoop:
                         WHERE created_at < NOW() - %s * INTERVAL '1 day'
                     """, (days,))
                     deleted = cur.rowcount
+                    cur.execute("DELETE FROM tag_daily_stats WHERE day < CURRENT_DATE - %s", (days,))
                     logger.info(f"Cleaned up {deleted} old response outcomes (older than {days} days)")
                     return deleted
         except Exception as e:
@@ -926,4 +1088,24 @@ class FeedbackLoop:
             return 0
 
 
-feedback_loop = FeedbackLoop()
+def _backfill_tag_stats():
+    """Build tag_daily_stats from the raw tables once, after the table exists.
+
+    rebuild_tag_stats replaces the window it covers, so counters already
+    added incrementally are not double-counted. If it fails the step is not
+    recorded and runs again on the next migration pass.
+    """
+    feedback_loop.rebuild_tag_stats(days=90)
+
+
+feedback_loop = LazySingleton(FeedbackLoop)
+register_schema("feedback_loop", 1, FeedbackLoop._init_db)
+register_schema("tag_daily_stats_backfill", 1, _backfill_tag_stats)
+
+
+async def periodic_feedback_refresh(context):
+    try:
+        niches = await asyncio.to_thread(feedback_loop.refresh_adaptive_snapshot)
+        logger.debug(f"Adaptive snapshot refreshed ({niches} entries)")
+    except Exception as e:
+        logger.error(f"Feedback snapshot refresh failed: {e}")
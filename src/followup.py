@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 from src.leads import lead_manager
 from src.config import config
 from psycopg2.extras import RealDictCursor
@@ -539,7 +541,6 @@ def _build_client_signals(user_id: int) -> str:
 
 class FollowUpManager:
     def __init__(self):
-        self._init_db()
         self._register_ab_tests()
 
     def _register_ab_tests(self):
@@ -566,7 +567,8 @@ class FollowUpManager:
         except Exception as e:
             logger.debug(f"Failed to register followup A/B tests: {e}")
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, follow-ups disabled")
             return
@@ -619,22 +621,9 @@ class FollowUpManager:
         if not DATABASE_URL:
             return None
         try:
-            with get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT AVG(EXTRACT(EPOCH FROM (u.created_at - b.created_at)))
-                        FROM conversations b
-                        JOIN conversations u ON u.user_id = b.user_id 
-                            AND u.role = 'user' 
-                            AND u.created_at > b.created_at
-                            AND u.created_at < b.created_at + INTERVAL '7 days'
-                        WHERE b.user_id = %s AND b.role = 'assistant'
-                        ORDER BY b.created_at DESC
-                        LIMIT 20
-                    """, (user_id,))
-                    result = cur.fetchone()
-                    return result[0] if result and result[0] else None
-        except:
+            from src.conversation_log import conversation_log
+            return conversation_log.avg_response_time(user_id, limit=20)
+        except Exception:
             return None
 
     def _count_consecutive_no_response(self, user_id: int) -> int:
@@ -1173,11 +1162,13 @@ class FollowUpManager:
                 prompt += successful_examples
 
             from src.ai_client import ai_client
-            result = await ai_client.generate_response(
-                messages=[{"role": "user", "parts": [{"text": prompt}]}],
-                thinking_level="low",
-                dynamic_system_prompt=FOLLOWUP_SYSTEM_PROMPT
-            )
+            from src.ai_scheduler import Priority, ai_priority
+            with ai_priority(Priority.BACKGROUND):
+                result = await ai_client.generate_response(
+                    messages=[{"role": "user", "parts": [{"text": prompt}]}],
+                    thinking_level="low",
+                    dynamic_system_prompt=FOLLOWUP_SYSTEM_PROMPT
+                )
 
             if result:
                 text = self._validate_followup_text(result)
@@ -1297,4 +1288,5 @@ class FollowUpManager:
         }
 
 
-follow_up_manager = FollowUpManager()
+follow_up_manager = LazySingleton(FollowUpManager)
+register_schema("followup", 1, FollowUpManager._init_db)
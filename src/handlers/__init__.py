@@ -1,80 +1,141 @@
-from src.handlers.commands import (
-    start_handler,
-    help_handler,
-    clear_handler,
-    menu_handler,
-    price_handler,
-    portfolio_handler,
-    contact_handler,
-    calc_handler,
-    bonus_handler,
-    referral_handler,
-    payment_handler,
-    contract_handler,
-    privacy_handler,
-    faq_handler,
-    promo_handler,
-    testimonials_handler,
-    inline_query_handler,
-    handoff_handler,
-    mystatus_handler,
-    brief_handler,
-    consult_handler,
-    crm_handler,
-    triggers_handler,
-)
+"""Telegram handlers.
 
-from src.handlers.callbacks import callback_handler
+Handler modules are imported on first use. ``from src.handlers import
+message_handler`` still works and loads only the module that defines the
+name; ``deferred(name)`` returns a callback for ``Application.add_handler``
+that imports its module when the first matching update arrives, so
+registering every handler at startup costs nothing. ``warm_up()`` preloads
+the modules on the hot path in the background once the bot is up
+(HANDLER_WARMUP=0 keeps them cold until first use).
+"""
 
-from src.handlers.media import (
-    voice_handler,
-    video_handler,
-    photo_handler,
-    generate_voice_response,
-)
+import asyncio
+import importlib
+import logging
+from typing import Callable, Dict, Iterable
 
-from src.handlers.admin import (
-    leads_handler,
-    stats_handler,
-    export_handler,
-    reviews_handler,
-    history_handler,
-    hot_handler,
-    tag_handler,
-    priority_handler,
-    followup_handler,
-    broadcast_handler,
-    promo_create_handler,
-    promo_list_handler,
-    promo_off_handler,
-    generate_daily_digest,
-    get_emoji_id_handler,
-    sticker_emoji_handler,
-    propensity_dashboard_handler,
-    ab_results_handler,
-    ab_detail_handler,
-    feedback_insights_handler,
-    health_handler,
-    qa_handler,
-    advanced_stats_handler,
-    export_csv_handler,
-    export_analytics_handler,
-    webhook_handler,
-)
+from src.lazy import lazy_callback
 
-from src.handlers.messages import (
-    message_handler,
-    error_handler,
-)
+logger = logging.getLogger(__name__)
 
-from src.handlers.utils import (
-    send_typing_action,
-    WELCOME_MESSAGES,
-    MANAGER_CHAT_ID,
-    loyalty_system,
-    get_broadcast_audience_keyboard,
+_MODULE_EXPORTS = {
+    "src.handlers.commands": (
+        "start_handler",
+        "help_handler",
+        "clear_handler",
+        "menu_handler",
+        "price_handler",
+        "portfolio_handler",
+        "contact_handler",
+        "calc_handler",
+        "bonus_handler",
+        "referral_handler",
+        "payment_handler",
+        "contract_handler",
+        "privacy_handler",
+        "faq_handler",
+        "promo_handler",
+        "testimonials_handler",
+        "inline_query_handler",
+        "handoff_handler",
+        "mystatus_handler",
+        "brief_handler",
+        "consult_handler",
+        "crm_handler",
+        "triggers_handler",
+    ),
+    "src.handlers.callbacks": (
+        "callback_handler",
+    ),
+    "src.handlers.media": (
+        "voice_handler",
+        "video_handler",
+        "photo_handler",
+        "generate_voice_response",
+    ),
+    "src.handlers.admin": (
+        "leads_handler",
+        "stats_handler",
+        "export_handler",
+        "reviews_handler",
+        "history_handler",
+        "hot_handler",
+        "tag_handler",
+        "priority_handler",
+        "followup_handler",
+        "broadcast_handler",
+        "promo_create_handler",
+        "promo_list_handler",
+        "promo_off_handler",
+        "generate_daily_digest",
+        "get_emoji_id_handler",
+        "sticker_emoji_handler",
+        "propensity_dashboard_handler",
+        "ab_results_handler",
+        "ab_detail_handler",
+        "feedback_insights_handler",
+        "health_handler",
+        "reload_content_handler",
+        "traces_handler",
+        "qa_handler",
+        "advanced_stats_handler",
+        "export_csv_handler",
+        "export_analytics_handler",
+        "webhook_handler",
+    ),
+    "src.handlers.messages": (
+        "message_handler",
+        "error_handler",
+    ),
+    "src.handlers.utils": (
+        "send_typing_action",
+        "WELCOME_MESSAGES",
+        "MANAGER_CHAT_ID",
+        "loyalty_system",
+        "get_broadcast_audience_keyboard",
+    ),
+}
+
+_EXPORTS: Dict[str, str] = {
+    name: module for module, names in _MODULE_EXPORTS.items() for name in names
+}
+
+HOT_MODULES = (
+    "src.handlers.messages",
+    "src.handlers.commands",
+    "src.handlers.callbacks",
+    "src.handlers.admin",
+    "google.genai",
 )
 
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+def deferred(name: str) -> Callable:
+    return lazy_callback(_EXPORTS[name], name)
+
+
+async def warm_up(modules: Iterable[str] = HOT_MODULES) -> None:
+    """Import ``modules`` one per event-loop turn so updates keep flowing."""
+    for module_name in modules:
+        await asyncio.sleep(0)
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.error(f"Handler warm-up failed for {module_name}: {e}")
+
+
 __all__ = [
     'start_handler',
     'help_handler',
@@ -124,6 +185,8 @@ __all__ = [
     'ab_detail_handler',
     'feedback_insights_handler',
     'health_handler',
+    'reload_content_handler',
+    'traces_handler',
     'qa_handler',
     'advanced_stats_handler',
     'export_csv_handler',
@@ -1,6 +1,6 @@
+import asyncio
+import html
 import logging
-import tempfile
-import os
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -10,6 +10,7 @@ from src.keyboards import get_review_moderation_keyboard
 from src.security import admin_required, log_admin_action
 from src.analytics import analytics, FunnelEvent
 from src.broadcast import broadcast_manager
+from src.export_stream import parse_export_args, parquet_available, send_export
 
 from src.handlers.utils import loyalty_system
 
@@ -112,21 +113,18 @@ async def export_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = user.id
     log_admin_action(user_id, "export_leads")
     
-    csv_data = lead_manager.export_leads_csv()
+    days, fmt, compress = parse_export_args(context.args, default_days=None)
+    if fmt == "parquet" and not parquet_available():
+        await message.reply_text("Parquet недоступен (не установлен pyarrow).")
+        return
     
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8') as f:
-        f.write(csv_data)
-        temp_path = f.name
+    result = await asyncio.to_thread(lead_manager.export_leads, fmt or "csv", compress, days)
+    if not result:
+        await message.reply_text("Лидов пока нет." if not days else f"Лидов за {days} дней нет.")
+        return
     
-    try:
-        with open(temp_path, 'rb') as f:
-            await message.reply_document(
-                document=f,
-                filename="leads_export.csv",
-                caption="📥 Экспорт лидов"
-            )
-    finally:
-        os.unlink(temp_path)
+    period = f" за {days} дней" if days else ""
+    await send_export(message, result, f"📥 Экспорт лидов{period} ({result.rows})")
 
 
 @admin_required
@@ -643,12 +641,94 @@ async def health_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             for svc, st in cb_status.items():
                 icon = "🟢" if st['state'] == 'closed' else "🔴"
                 text += f"  {icon} {svc}: {st['state']} ({st['failures']} failures)\n"
-        
+
+        from src.response_cache import response_cache
+        rc_stats = response_cache.stats()
+        text += f"\n<b>Кэш FAQ-ответов:</b>\n"
+        text += f"  Записей: {rc_stats['entries']} | Попаданий: {rc_stats['hits']} ({rc_stats['hit_ratio']:.0%})\n"
+        text += f"  Сэкономлено генерации: {rc_stats['saved_seconds']:.0f} с\n"
+
+        from src.ai_scheduler import ai_scheduler
+        ai_stats = ai_scheduler.stats()
+        text += f"\n<b>Очередь Gemini:</b>\n"
+        for model, st in ai_stats["models"].items():
+            text += f"  {model}: {st['in_use']}/{st['limit']} в работе, {st['queued']} в очереди\n"
+        for priority, tokens in ai_stats["tokens_today"].items():
+            budget = ai_stats["budgets"].get(priority)
+            text += f"  Токены {priority}: {tokens:,}" + (f" из {budget:,}" if budget else "") + "\n"
+        if ai_stats["hedges_launched"]:
+            text += f"  Дублирующих запросов: {ai_stats['hedges_launched']} (выиграли {ai_stats['hedges_won']})\n"
+
+        from src.content_registry import content
+        ct_stats = content.stats()
+        text += f"\n<b>Контент:</b>\n"
+        text += f"  Версия {ct_stats['version']} | Промпт ~{ct_stats['system_prompt_tokens']:,} токенов\n"
+        if ct_stats["last_error"]:
+            text += f"  ⚠️ Ошибка перезагрузки: {html.escape(ct_stats['last_error'])}\n"
+
         await update.message.reply_text(text, parse_mode="HTML")
     except Exception as e:
         await update.message.reply_text(f"Ошибка: {e}")
 
 
+@admin_required
+async def reload_content_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/reload_content — re-read prompts, FAQ and knowledge from content/ without a restart."""
+    log_admin_action(update.effective_user.id, "reload_content")
+    try:
+        from src.content_registry import content
+        previous = content.version
+        changed = await asyncio.to_thread(content.reload, True)
+        from src.rag import knowledge_base_rag
+        await asyncio.to_thread(knowledge_base_rag.sync_from_content)
+        stats = content.stats()
+        if stats["last_error"]:
+            text = f"❌ Файлы не загружены, остаётся версия {stats['version']}:\n{stats['last_error']}"
+        elif changed:
+            text = (f"✅ Контент обновлён: {previous[:12]} → {stats['version']}\n"
+                    f"FAQ: {stats['faq']} | Знаний: {stats['chunks']} | Промпт ~{stats['system_prompt_tokens']:,} токенов")
+        else:
+            text = f"Контент не изменился (версия {stats['version']})."
+        await update.message.reply_text(text)
+    except Exception as e:
+        await update.message.reply_text(f"Ошибка: {e}")
+
+
+@admin_required
+async def traces_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/traces [message|voice|photo|callback] [N] — slowest recent traces with per-stage timings."""
+    log_admin_action(update.effective_user.id, "traces")
+    try:
+        from src.tracing import get_slowest_traces, format_trace
+        args = context.args or []
+        name = None
+        limit = 5
+        for arg in args:
+            if arg.isdigit():
+                limit = min(int(arg), 10)
+            else:
+                name = arg
+
+        traces = get_slowest_traces(limit=limit, name=name)
+        if not traces:
+            await update.message.reply_text("Трейсов за последний час нет.")
+            return
+
+        header = f"🐢 <b>Самые медленные ответы (1 час{', ' + html.escape(name) if name else ''})</b>"
+        blocks = [header]
+        length = len(header)
+        for t in traces:
+            block = format_trace(t)
+            if length + len(block) + 2 > 4000:
+                blocks.append("…")
+                break
+            blocks.append(block)
+            length += len(block) + 2
+        await update.message.reply_text("\n\n".join(blocks), parse_mode="HTML")
+    except Exception as e:
+        await update.message.reply_text(f"Ошибка: {e}")
+
+
 @admin_required
 async def qa_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     log_admin_action(update.effective_user.id, "qa_stats")
@@ -693,22 +773,17 @@ async def export_csv_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     log_admin_action(update.effective_user.id, "export_csv")
     try:
         from src.crm_export import crm_exporter
-        args = context.args
-        days = int(args[0]) if args else 30
+        days, fmt, compress = parse_export_args(context.args)
+        if fmt == "parquet" and not parquet_available():
+            await update.message.reply_text("Parquet недоступен (не установлен pyarrow).")
+            return
         
-        csv_data = crm_exporter.export_leads_csv(days)
-        if not csv_data:
+        result = await asyncio.to_thread(crm_exporter.export_leads, days, fmt or "csv", compress)
+        if not result:
             await update.message.reply_text("Нет данных для экспорта.")
             return
         
-        import io
-        file_obj = io.BytesIO(csv_data.encode('utf-8-sig'))
-        file_obj.name = f"leads_{days}d.csv"
-        
-        await update.message.reply_document(
-            document=file_obj,
-            caption=f"📊 Экспорт лидов за {days} дней"
-        )
+        await send_export(update.message, result, f"📊 Экспорт лидов за {days} дней")
     except Exception as e:
         await update.message.reply_text(f"Ошибка экспорта: {e}")
 
@@ -718,22 +793,14 @@ async def export_analytics_handler(update: Update, context: ContextTypes.DEFAULT
     log_admin_action(update.effective_user.id, "export_analytics")
     try:
         from src.crm_export import crm_exporter
-        args = context.args
-        days = int(args[0]) if args else 30
+        days, _, compress = parse_export_args(context.args)
         
-        json_data = crm_exporter.export_analytics_json(days)
-        if not json_data:
+        result = await asyncio.to_thread(crm_exporter.export_analytics_json, days, compress)
+        if not result:
             await update.message.reply_text("Нет данных для экспорта.")
             return
         
-        import io
-        file_obj = io.BytesIO(json_data.encode('utf-8'))
-        file_obj.name = f"analytics_{days}d.json"
-        
-        await update.message.reply_document(
-            document=file_obj,
-            caption=f"📊 Аналитика за {days} дней (JSON)"
-        )
+        await send_export(update.message, result, f"📊 Аналитика за {days} дней (JSON)")
     except Exception as e:
         await update.message.reply_text(f"Ошибка экспорта: {e}")
 
@@ -742,12 +809,28 @@ async def export_analytics_handler(update: Update, context: ContextTypes.DEFAULT
 async def webhook_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     log_admin_action(update.effective_user.id, "webhook")
     args = context.args
-    
+
+    if args and args[0] == "status":
+        from src.webhook_delivery import webhook_delivery
+        stats = webhook_delivery.get_stats()
+        text = (
+            "📡 <b>Доставка webhook (24ч)</b>\n\n"
+            f"✅ Доставлено: {stats.get('delivered', 0)}\n"
+            f"⏳ В очереди: {stats.get('pending', 0)} "
+            f"(старейшее {stats.get('oldest_pending_seconds', 0)}s)\n"
+            f"❌ Не доставлено: {stats.get('failed', 0)}\n"
+        )
+        if "lag_p95_seconds" in stats:
+            text += f"🕒 Задержка доставки p95: {stats['lag_p95_seconds']}s\n"
+        await update.message.reply_text(text, parse_mode="HTML")
+        return
+
     if not args or len(args) < 2:
         await update.message.reply_text(
             "Использование:\n"
             "/webhook add <event_type> <url>\n"
-            "/webhook remove <id>\n\n"
+            "/webhook remove <id>\n"
+            "/webhook status\n\n"
             "Типы событий: new_lead, payment"
         )
         return
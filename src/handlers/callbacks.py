@@ -12,7 +12,8 @@ from src.keyboards import (
 from src.bot_api import copy_text_button, styled_button_api_kwargs
 from src.calculator import calculator_manager
 from src.leads import lead_manager
-from src.knowledge_base import PORTFOLIO_MESSAGE, FAQ_DATA
+from src.knowledge_base import PORTFOLIO_MESSAGE
+from src.content_registry import content
 from src.tasks_tracker import tasks_tracker, TASKS_CONFIG
 from src.referrals import referral_manager, REFERRER_REWARD
 from src.payments import handle_payment_callback
@@ -22,81 +23,120 @@ from src.loyalty import (
     format_package_deals, format_returning_customer_info, format_review_bonus_info
 )
 from src.analytics import analytics, FunnelEvent
+from src.callback_router import CallbackRouter, CallbackRequest
+from src.monitoring import track_handler
+from src.tracing import set_attribute, trace_handler
 
 from src.handlers.utils import loyalty_system, MANAGER_CHAT_ID
 
 logger = logging.getLogger(__name__)
 
 
+router = CallbackRouter()
+
+
+@trace_handler("callback")
+@track_handler("callback_handler")
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    data = query.data
+    set_attribute("data", (update.callback_query.data or "")[:40])
+    await router.dispatch(update, context)
 
-    _followup_cta_callbacks = {"menu_portfolio", "menu_calculator", "book_consultation", "menu_ai_agent", "menu_services"}
-    if data in _followup_cta_callbacks:
-        try:
-            from src.followup import follow_up_manager
-            follow_up_manager.track_cta_click(user_id)
-            follow_up_manager.handle_silent_activity(user_id, activity_type="cta_click")
-        except Exception:
-            pass
 
-    if data == "open_app":
-        await query.message.reply_text(
-            "Вот что могу показать:",
-            reply_markup=get_main_menu_keyboard()
-        )
+def _track_cta_click(user_id: int) -> None:
+    try:
+        from src.followup import follow_up_manager
+        follow_up_manager.track_cta_click(user_id)
+        follow_up_manager.handle_silent_activity(user_id, activity_type="cta_click")
+    except Exception:
+        pass
+
+
+async def _safe_reply(query, text, parse_mode=None, reply_markup=None):
+    try:
+        await query.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except Exception:
+        await query.message.reply_text(text, reply_markup=reply_markup)
+
+
+def _smart(key: str, rate=None):
+    """Register a smart-reply button; failures get a retry hint instead of silence."""
+    def register(handler):
+        async def guarded(cb: CallbackRequest) -> None:
+            try:
+                await handler(cb)
+            except Exception as e:
+                logger.error(f"Smart button '{cb.data}' error for user {cb.user_id}: {e}")
+                await cb.query.message.reply_text("Произошла ошибка, попробуйте ещё раз.")
+        router.exact(key, rate=rate)(guarded)
+        return handler
+    return register
+
+
+@router.exact("open_app")
+async def _open_app(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text(
+        "Вот что могу показать:",
+        reply_markup=get_main_menu_keyboard()
+    )
+
+
+@router.exact("request_manager", rate=(3, 300))
+async def _request_manager(cb: CallbackRequest) -> None:
+    query, context = cb.query, cb.context
+    from src.leads import lead_manager as lm_handoff, LeadPriority
+    user = query.from_user
+    lm_handoff.create_lead(user_id=user.id, username=user.username, first_name=user.first_name)
+    lm_handoff.update_lead(user.id, score=40, priority=LeadPriority.HOT)
     
-    elif data == "request_manager":
-        from src.leads import lead_manager as lm_handoff, LeadPriority
-        user = query.from_user
-        lm_handoff.create_lead(user_id=user.id, username=user.username, first_name=user.first_name)
-        lm_handoff.update_lead(user.id, score=40, priority=LeadPriority.HOT)
-        
-        await query.message.edit_text(
-            "👨‍💼 <b>Запрос отправлен!</b>\n\n"
-            "Менеджер свяжется с вами в ближайшее время.",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-            ])
-        )
-        
-        import os
-        manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
-        if manager_chat_id:
+    await query.message.edit_text(
+        "👨‍💼 <b>Запрос отправлен!</b>\n\n"
+        "Менеджер свяжется с вами в ближайшее время.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+        ])
+    )
+    
+    import os
+    manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
+    if manager_chat_id:
+        try:
+            await context.bot.send_message(
+                int(manager_chat_id),
+                f"🔔 <b>Запрос менеджера</b>\n"
+                f"👤 {user.first_name} (@{user.username or 'нет'})\n"
+                f"🆔 <code>{user.id}</code>",
+                parse_mode="HTML"
+            )
             try:
-                await context.bot.send_message(
-                    int(manager_chat_id),
-                    f"🔔 <b>Запрос менеджера</b>\n"
-                    f"👤 {user.first_name} (@{user.username or 'нет'})\n"
-                    f"🆔 <code>{user.id}</code>",
-                    parse_mode="HTML"
+                from src.manager_coaching import generate_coaching_briefing
+                briefing = generate_coaching_briefing(
+                    user_id=user.id,
+                    trigger_type="explicit_request",
                 )
-                try:
-                    from src.manager_coaching import generate_coaching_briefing
-                    briefing = generate_coaching_briefing(
-                        user_id=user.id,
-                        trigger_type="explicit_request",
-                    )
-                    if briefing:
-                        await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
-                except Exception:
-                    pass
+                if briefing:
+                    await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
             except Exception:
                 pass
-    
-    elif data == "menu_back":
-        await query.edit_message_text(
-            "Вот что могу показать:",
-            reply_markup=get_main_menu_keyboard()
-        )
-    
-    elif data == "menu_services":
-        text = """Мы разрабатываем приложения для разных типов бизнеса:
+        except Exception:
+            pass
+
+
+@router.exact("menu_back")
+async def _menu_back(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.edit_message_text(
+        "Вот что могу показать:",
+        reply_markup=get_main_menu_keyboard()
+    )
+
+
+@router.exact("menu_services")
+async def _menu_services(cb: CallbackRequest) -> None:
+    _track_cta_click(cb.user_id)
+    query = cb.query
+    text = """Мы разрабатываем приложения для разных типов бизнеса:
 
 Интернет-магазины — от 7 дней
 Рестораны и доставка — от 7 дней
@@ -104,33 +144,48 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Медицинские центры — от 12 дней
 
 Выберите направление, расскажу подробнее:"""
-        await query.edit_message_text(
-            text,
-            parse_mode="Markdown",
-            reply_markup=get_services_keyboard()
-        )
-    
-    elif data == "menu_portfolio":
-        from src.portfolio_showcase import get_portfolio_menu
-        text, keyboard = get_portfolio_menu()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-    
-    elif data == "menu_compare":
-        from src.package_comparison import get_comparison_view
-        text, keyboard = get_comparison_view()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "menu_calculator":
-        analytics.track(user_id, FunnelEvent.CALCULATOR_OPEN)
-        calc = calculator_manager.get_calculation(user_id)
-        await query.edit_message_text(
-            f"**Калькулятор стоимости**\n\n{calc.get_summary()}",
-            parse_mode="Markdown",
-            reply_markup=get_calculator_keyboard()
-        )
-    
-    elif data == "menu_ai_agent":
-        text = """AI-агент — это умный помощник для вашего бизнеса.
+    await query.edit_message_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=get_services_keyboard()
+    )
+
+
+@router.exact("menu_portfolio")
+async def _menu_portfolio(cb: CallbackRequest) -> None:
+    _track_cta_click(cb.user_id)
+    query = cb.query
+    from src.portfolio_showcase import get_portfolio_menu
+    text, keyboard = get_portfolio_menu()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("menu_compare")
+async def _menu_compare(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.package_comparison import get_comparison_view
+    text, keyboard = get_comparison_view()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("menu_calculator")
+async def _menu_calculator(cb: CallbackRequest) -> None:
+    _track_cta_click(cb.user_id)
+    query, user_id = cb.query, cb.user_id
+    analytics.track(user_id, FunnelEvent.CALCULATOR_OPEN)
+    calc = calculator_manager.get_calculation(user_id)
+    await query.edit_message_text(
+        f"**Калькулятор стоимости**\n\n{calc.get_summary()}",
+        parse_mode="Markdown",
+        reply_markup=get_calculator_keyboard()
+    )
+
+
+@router.exact("menu_ai_agent")
+async def _menu_ai_agent(cb: CallbackRequest) -> None:
+    _track_cta_click(cb.user_id)
+    query = cb.query
+    text = """AI-агент — это умный помощник для вашего бизнеса.
 
 Отвечает клиентам 24/7, понимает контекст, помнит историю общения. И главное — обучается на ваших данных.
 
@@ -139,15 +194,18 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Даём 7 дней бесплатного теста — можете попробовать на своём бизнесе.
 
 Интересно?"""
-        await query.edit_message_text(
-            text,
-            parse_mode="Markdown",
-            reply_markup=get_lead_keyboard()
-        )
-    
-    elif data == "menu_lead":
-        analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
-        text = """Отлично, давайте обсудим ваш проект!
+    await query.edit_message_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=get_lead_keyboard()
+    )
+
+
+@router.exact("menu_lead")
+async def _menu_lead(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
+    text = """Отлично, давайте обсудим ваш проект!
 
 Напишите мне:
 — Какой у вас бизнес?
@@ -155,87 +213,111 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 — Есть ли примерный бюджет?
 
 Или нажмите кнопку — я свяжусь с вами и обсудим детали."""
-        await query.edit_message_text(
-            text,
-            parse_mode="Markdown",
-            reply_markup=get_lead_keyboard()
-        )
-    
-    elif data == "payment_stars":
-        from src.keyboards import get_stars_payment_keyboard
-        await query.message.edit_text(
-            "⭐ <b>Оплата через Telegram Stars</b>\n\n"
-            "Мгновенная оплата без банковских реквизитов.\n"
-            "Выберите услугу:",
-            parse_mode="HTML",
-            reply_markup=get_stars_payment_keyboard()
-        )
-    
-    elif data.startswith("stars_"):
-        product_id = data.replace("stars_", "")
-        from src.payments import create_stars_invoice
-        success = await create_stars_invoice(context.bot, query.from_user.id, product_id)
-        if success:
-            await query.answer("Счёт отправлен!")
-        else:
-            await query.answer("Ошибка создания счёта", show_alert=True)
-    
-    elif data in ("payment", "pay_card", "pay_bank", "copy_card", "copy_bank",
-                   "copy_card_fallback", "copy_bank_fallback", "pay_confirm", "pay_contract"):
-        action = data.replace("_fallback", "")
-        try:
-            from src.feedback_loop import feedback_loop
-            feedback_loop.record_outcome(user_id, 'callback_payment')
-        except Exception:
-            pass
-        await handle_payment_callback(update, context, action)
-    
-    elif data == "menu_faq" or data == "faq_back":
-        await query.edit_message_text(
-            "❓ **Частые вопросы**\n\nВыберите интересующий вопрос:",
-            parse_mode="Markdown",
-            reply_markup=get_faq_keyboard()
-        )
-    
-    elif data.startswith("faq_") and data in FAQ_DATA:
-        faq = FAQ_DATA[data]
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("◀️ Назад к FAQ", callback_data="faq_back")],
-            [InlineKeyboardButton("Назад в меню", callback_data="menu_back")]
-        ])
-        await query.edit_message_text(
-            f"**{faq['question']}**\n\n{faq['answer']}",
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
+    await query.edit_message_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=get_lead_keyboard()
+    )
+
+
+@router.exact("payment_stars")
+async def _payment_stars(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.keyboards import get_stars_payment_keyboard
+    await query.message.edit_text(
+        "⭐ <b>Оплата через Telegram Stars</b>\n\n"
+        "Мгновенная оплата без банковских реквизитов.\n"
+        "Выберите услугу:",
+        parse_mode="HTML",
+        reply_markup=get_stars_payment_keyboard()
+    )
+
+
+@router.prefix("stars_", alerts=True, rate=(5, 60))
+async def _stars(cb: CallbackRequest) -> None:
+    from src.payments import create_stars_invoice
+    success = await create_stars_invoice(cb.context.bot, cb.user_id, cb.payload)
+    if success:
+        await cb.answer("Счёт отправлен!")
+    else:
+        await cb.answer("Ошибка создания счёта", show_alert=True)
+
+
+@router.exact("payment", "pay_card", "pay_bank", "copy_card", "copy_bank", "copy_card_fallback", "copy_bank_fallback", "pay_confirm", "pay_contract")
+async def _payment(cb: CallbackRequest) -> None:
+    context, update, user_id = cb.context, cb.update, cb.user_id
+    action = cb.data.replace("_fallback", "")
+    try:
+        from src.feedback_loop import feedback_loop
+        feedback_loop.record_outcome(user_id, 'callback_payment')
+    except Exception:
+        pass
+    await handle_payment_callback(update, context, action)
+
+
+@router.exact("menu_faq", "faq_back")
+async def _menu_faq(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.edit_message_text(
+        "❓ **Частые вопросы**\n\nВыберите интересующий вопрос:",
+        parse_mode="Markdown",
+        reply_markup=get_faq_keyboard()
+    )
+
+
+@router.prefix("faq_")
+async def _faq(cb: CallbackRequest) -> None:
+    query, data = cb.query, cb.data
+    faq = content.current.faq.get(data)
+    if faq is None:
+        logger.warning(f"Unknown callback_data: {data} from user {cb.user_id}")
+        return
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад к FAQ", callback_data="faq_back")],
+        [InlineKeyboardButton("Назад в меню", callback_data="menu_back")]
+    ])
+    await query.edit_message_text(
+        f"**{faq['question']}**\n\n{faq['answer']}",
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
+
+
+@router.prefix("price_")
+async def _price(cb: CallbackRequest) -> None:
+    context, update, data = cb.context, cb.update, cb.data
+    await handle_price_callback(update, context, data)
+
+
+@router.exact("menu_testimonials")
+async def _menu_testimonials(cb: CallbackRequest) -> None:
+    query = cb.query
+    reviews = loyalty_system.get_approved_reviews(limit=5)
     
-    elif data.startswith("price_"):
-        await handle_price_callback(update, context, data)
+    if not reviews:
+        text = "⭐ <b>Отзывы клиентов</b>\n\nПока нет опубликованных отзывов. Будьте первым!"
+    else:
+        text = "⭐ <b>Отзывы наших клиентов</b>\n\n"
+        for review in reviews:
+            stars = "⭐" * 5
+            review_type_name = "🎬 Видео" if review.review_type == "video" else "📝 Текст"
+            text += f"{stars}\n"
+            if review.comment:
+                text += f"<i>«{review.comment}»</i>\n"
+            text += f"{review_type_name} • {review.created_at.strftime('%d.%m.%Y')}\n\n"
     
-    elif data == "menu_testimonials":
-        reviews = loyalty_system.get_approved_reviews(limit=5)
-        
-        if not reviews:
-            text = "⭐ <b>Отзывы клиентов</b>\n\nПока нет опубликованных отзывов. Будьте первым!"
-        else:
-            text = "⭐ <b>Отзывы наших клиентов</b>\n\n"
-            for review in reviews:
-                stars = "⭐" * 5
-                review_type_name = "🎬 Видео" if review.review_type == "video" else "📝 Текст"
-                text += f"{stars}\n"
-                if review.comment:
-                    text += f"<i>«{review.comment}»</i>\n"
-                text += f"{review_type_name} • {review.created_at.strftime('%d.%m.%Y')}\n\n"
-        
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="loyalty_review")],
-            [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-        ])
-        
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="loyalty_review")],
+        [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+    ])
     
-    elif data == "loyalty_menu":
-        text = """🎁 <b>Программа лояльности</b>
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("loyalty_menu")
+async def _loyalty_menu(cb: CallbackRequest) -> None:
+    query = cb.query
+    text = """🎁 <b>Программа лояльности</b>
 
 Получайте дополнительные скидки и бонусы:
 
@@ -244,72 +326,87 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 📦 <b>Пакеты</b> — до 15% при заказе с подпиской
 
 Выберите раздел:"""
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_loyalty_menu_keyboard()
-        )
-    
-    elif data == "loyalty_review":
-        text = format_review_bonus_info()
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_review_type_keyboard()
-        )
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_loyalty_menu_keyboard()
+    )
+
+
+@router.exact("loyalty_review")
+async def _loyalty_review(cb: CallbackRequest) -> None:
+    query = cb.query
+    text = format_review_bonus_info()
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_review_type_keyboard()
+    )
+
+
+@router.exact("loyalty_packages")
+async def _loyalty_packages(cb: CallbackRequest) -> None:
+    query = cb.query
+    text = format_package_deals()
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_package_deals_keyboard()
+    )
+
+
+@router.exact("loyalty_returning")
+async def _loyalty_returning(cb: CallbackRequest) -> None:
+    query = cb.query
+    text = format_returning_customer_info()
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_loyalty_menu_keyboard()
+    )
+
+
+@router.exact("loyalty_my_discounts")
+async def _loyalty_my_discounts(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    user_progress = tasks_tracker.get_user_progress(user_id)
+    base_discount = user_progress.get_discount_percent()
     
-    elif data == "loyalty_packages":
-        text = format_package_deals()
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_package_deals_keyboard()
-        )
-    
-    elif data == "loyalty_returning":
-        text = format_returning_customer_info()
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_loyalty_menu_keyboard()
-        )
+    discounts = loyalty_system.calculate_total_discount(user_id, base_discount)
+    is_returning = loyalty_system.is_returning_customer(user_id)
     
-    elif data == "loyalty_my_discounts":
-        user_progress = tasks_tracker.get_user_progress(user_id)
-        base_discount = user_progress.get_discount_percent()
-        
-        discounts = loyalty_system.calculate_total_discount(user_id, base_discount)
-        is_returning = loyalty_system.is_returning_customer(user_id)
-        
-        text = f"""📊 <b>Ваши скидки</b>
+    text = f"""📊 <b>Ваши скидки</b>
 
 💰 <b>Монеты:</b> {user_progress.total_coins}
 🎯 <b>Скидка от монет:</b> {base_discount}%
 🏆 <b>Уровень:</b> {user_progress.get_tier_name()}
 
 """
-        if is_returning:
-            text += f"🔄 <b>Бонус постоянного клиента:</b> +{RETURNING_CUSTOMER_BONUS}%\n"
-        else:
-            text += "🔄 <i>Бонус постоянного клиента: станет доступен после первого заказа</i>\n"
-        
-        text += f"""
+    if is_returning:
+        text += f"🔄 <b>Бонус постоянного клиента:</b> +{RETURNING_CUSTOMER_BONUS}%\n"
+    else:
+        text += "🔄 <i>Бонус постоянного клиента: станет доступен после первого заказа</i>\n"
+    
+    text += f"""
 📦 <b>Пакетные скидки:</b> до 15% (при заказе с подпиской)
 
 ━━━━━━━━━━━━━━━
 💎 <b>Максимальная скидка:</b> {discounts['total']}%
 
 <i>Скидки суммируются (макс. 25%)</i>"""
-        
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_loyalty_menu_keyboard()
-        )
     
-    elif data == "review_video":
-        context.user_data["pending_review_type"] = "video"
-        text = """🎬 <b>Видео-отзыв</b>
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_loyalty_menu_keyboard()
+    )
+
+
+@router.exact("review_video")
+async def _review_video(cb: CallbackRequest) -> None:
+    query, context = cb.query, cb.context
+    context.user_data["pending_review_type"] = "video"
+    text = """🎬 <b>Видео-отзыв</b>
 
 Запишите короткое видео (30 сек — 2 мин) с отзывом о работе с WEB4TG Studio.
 
@@ -321,12 +418,15 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 • Записать новое видео
 
 <i>Расскажите о вашем опыте работы с нами!</i>"""
-        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="loyalty_review")]])
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-    
-    elif data == "review_text":
-        context.user_data["pending_review_type"] = "text_photo"
-        text = """📝 <b>Текстовый отзыв</b>
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="loyalty_review")]])
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("review_text")
+async def _review_text(cb: CallbackRequest) -> None:
+    query, context = cb.query, cb.context
+    context.user_data["pending_review_type"] = "text_photo"
+    text = """📝 <b>Текстовый отзыв</b>
 
 Напишите отзыв и приложите скриншот вашего приложения.
 
@@ -335,14 +435,17 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 2. Скриншот или фото приложения
 
 <i>Можно отправить одним или несколькими сообщениями</i>"""
-        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="loyalty_review")]])
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-    
-    elif data.startswith("package_"):
-        package_id = data.replace("package_", "")
-        if package_id in PACKAGE_DEALS:
-            deal = PACKAGE_DEALS[package_id]
-            text = f"""📦 <b>{deal['name']}</b>
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад", callback_data="loyalty_review")]])
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("package_")
+async def _package(cb: CallbackRequest) -> None:
+    query = cb.query
+    package_id = cb.payload
+    if package_id in PACKAGE_DEALS:
+        deal = PACKAGE_DEALS[package_id]
+        text = f"""📦 <b>{deal['name']}</b>
 
 {deal['description']}
 
@@ -351,156 +454,174 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Чтобы воспользоваться предложением, напишите менеджеру или оставьте заявку.
 
 <i>Скидка применяется к стоимости разработки</i>"""
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("📝 Оставить заявку", callback_data="leave_request")],
-                [InlineKeyboardButton("◀️ Назад", callback_data="loyalty_packages")]
-            ])
-            await query.edit_message_text(
-                text,
-                parse_mode="HTML",
-                reply_markup=keyboard
-            )
-        else:
-            await query.edit_message_text("Информация не найдена", reply_markup=get_back_keyboard())
-    
-    elif data.startswith("mod_approve_"):
-        review_id = int(data.replace("mod_approve_", ""))
-        manager_id = query.from_user.id
-        
-        if str(manager_id) != MANAGER_CHAT_ID:
-            await query.answer("Только менеджер может модерировать отзывы", show_alert=True)
-            return
-        
-        coins = loyalty_system.approve_review(review_id, manager_id)
-        if coins:
-            reviews = loyalty_system.get_pending_reviews()
-            for r in reviews:
-                if r.id == review_id:
-                    tasks_tracker.add_coins(r.user_id, coins, f"review_{r.review_type}")
-                    try:
-                        await context.bot.send_message(
-                            r.user_id,
-                            f"✅ Ваш отзыв одобрен! Начислено <b>{coins} монет</b>.",
-                            parse_mode="HTML"
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to notify user about review approval: {e}")
-                    break
-            
-            await query.edit_message_text(
-                query.message.text + f"\n\n✅ <b>Одобрено</b> — начислено {coins} монет",
-                parse_mode="HTML"
-            )
-        else:
-            await query.answer("Ошибка при одобрении отзыва", show_alert=True)
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📝 Оставить заявку", callback_data="leave_request")],
+            [InlineKeyboardButton("◀️ Назад", callback_data="loyalty_packages")]
+        ])
+        await query.edit_message_text(
+            text,
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+    else:
+        await query.edit_message_text("Информация не найдена", reply_markup=get_back_keyboard())
+
+
+@router.prefix("mod_approve_", parse=int, alerts=True)
+async def _mod_approve(cb: CallbackRequest) -> None:
+    query, context = cb.query, cb.context
+    review_id = cb.payload
+    manager_id = cb.user_id
     
-    elif data.startswith("mod_reject_"):
-        review_id = int(data.replace("mod_reject_", ""))
-        manager_id = query.from_user.id
-        
-        if str(manager_id) != MANAGER_CHAT_ID:
-            await query.answer("Только менеджер может модерировать отзывы", show_alert=True)
-            return
-        
-        if loyalty_system.reject_review(review_id, manager_id):
-            await query.edit_message_text(
-                query.message.text + "\n\n❌ <b>Отклонено</b>",
-                parse_mode="HTML"
-            )
-        else:
-            await query.answer("Ошибка при отклонении отзыва", show_alert=True)
+    if str(manager_id) != MANAGER_CHAT_ID:
+        await cb.answer("Только менеджер может модерировать отзывы", show_alert=True)
+        return
     
-    elif data.startswith("calc_"):
-        calc = calculator_manager.get_calculation(user_id)
-        feature_map = {
-            "calc_catalog": "catalog",
-            "calc_cart": "cart",
-            "calc_payments": "payments",
-            "calc_ai": "ai",
-            "calc_delivery": "delivery",
-            "calc_analytics": "analytics",
-        }
+    coins = loyalty_system.approve_review(review_id, manager_id)
+    if coins:
+        reviews = loyalty_system.get_pending_reviews()
+        for r in reviews:
+            if r.id == review_id:
+                tasks_tracker.add_coins(r.user_id, coins, f"review_{r.review_type}")
+                try:
+                    await context.bot.send_message(
+                        r.user_id,
+                        f"✅ Ваш отзыв одобрен! Начислено <b>{coins} монет</b>.",
+                        parse_mode="HTML"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to notify user about review approval: {e}")
+                break
         
-        if data == "calc_reset":
-            calc.reset()
-        elif data == "calc_total":
-            if calc.selected_features:
-                lead = lead_manager.create_lead(
-                    user_id=user_id,
-                    username=query.from_user.username,
-                    first_name=query.from_user.first_name
-                )
-                lead_manager.update_lead(
-                    user_id=user_id,
-                    selected_features=list(calc.selected_features),
-                    estimated_cost=calc.get_total()
-                )
-                lead_manager.log_event("calculator_used", user_id, {
-                    "features": list(calc.selected_features),
-                    "total": calc.get_total()
-                })
-                lead_manager.update_activity(user_id)
-                
-                text = f"""{calc.get_summary()}
+        await query.edit_message_text(
+            query.message.text + f"\n\n✅ <b>Одобрено</b> — начислено {coins} монет",
+            parse_mode="HTML"
+        )
+    else:
+        await cb.answer("Ошибка при одобрении отзыва", show_alert=True)
 
-Хотите оформить заказ? Нажмите кнопку ниже!"""
-                await query.edit_message_text(
-                    text,
-                    parse_mode="Markdown",
-                    reply_markup=get_lead_keyboard()
-                )
-                return
-        elif data in feature_map:
-            calc.add_feature(feature_map[data])
-        
+
+@router.prefix("mod_reject_", parse=int, alerts=True)
+async def _mod_reject(cb: CallbackRequest) -> None:
+    query = cb.query
+    review_id = cb.payload
+    manager_id = cb.user_id
+    
+    if str(manager_id) != MANAGER_CHAT_ID:
+        await cb.answer("Только менеджер может модерировать отзывы", show_alert=True)
+        return
+    
+    if loyalty_system.reject_review(review_id, manager_id):
         await query.edit_message_text(
-            f"**Калькулятор стоимости**\n\n{calc.get_summary()}",
-            parse_mode="Markdown",
-            reply_markup=get_calculator_keyboard()
+            query.message.text + "\n\n❌ <b>Отклонено</b>",
+            parse_mode="HTML"
         )
+    else:
+        await cb.answer("Ошибка при отклонении отзыва", show_alert=True)
+
+
+@router.prefix("calc_")
+async def _calc(cb: CallbackRequest) -> None:
+    query, user_id, data = cb.query, cb.user_id, cb.data
+    calc = calculator_manager.get_calculation(user_id)
+    feature_map = {
+        "calc_catalog": "catalog",
+        "calc_cart": "cart",
+        "calc_payments": "payments",
+        "calc_ai": "ai",
+        "calc_delivery": "delivery",
+        "calc_analytics": "analytics",
+    }
     
-    elif data == "lead_submit":
-        user = query.from_user
-        lead = lead_manager.get_lead(user_id)
-        if not lead:
+    if data == "calc_reset":
+        calc.reset()
+    elif data == "calc_total":
+        if calc.selected_features:
             lead = lead_manager.create_lead(
                 user_id=user_id,
-                username=user.username,
-                first_name=user.first_name
+                username=query.from_user.username,
+                first_name=query.from_user.first_name
             )
-        
-        notification = lead_manager.format_lead_notification(lead)
-        
-        manager_id = lead_manager.get_manager_chat_id()
-        if manager_id:
-            try:
-                await context.bot.send_message(
-                    chat_id=manager_id,
-                    text=notification,
-                    parse_mode="Markdown"
-                )
-                logger.info(f"Lead notification sent for user {user_id}")
-            except Exception as e:
-                logger.error(f"Failed to send lead notification: {e}")
-        
-        await query.edit_message_text(
-            """Отлично, записал вашу заявку!
-
-Свяжусь с вами в ближайшее время — обычно в течение пары часов в рабочее время.
+            lead_manager.update_lead(
+                user_id=user_id,
+                selected_features=list(calc.selected_features),
+                estimated_cost=calc.get_total()
+            )
+            lead_manager.log_event("calculator_used", user_id, {
+                "features": list(calc.selected_features),
+                "total": calc.get_total()
+            })
+            lead_manager.update_activity(user_id)
+            
+            text = f"""{calc.get_summary()}
 
-А пока можете задавать любые вопросы, я на связи.""",
-            reply_markup=get_back_keyboard()
-        )
+Хотите оформить заказ? Нажмите кнопку ниже!"""
+            await query.edit_message_text(
+                text,
+                parse_mode="Markdown",
+                reply_markup=get_lead_keyboard()
+            )
+            return
+    elif data in feature_map:
+        calc.add_feature(feature_map[data])
     
-    elif data == "lead_question":
-        await query.edit_message_text(
-            "Спрашивайте — отвечу на всё, что знаю)",
-            reply_markup=get_back_keyboard()
+    await query.edit_message_text(
+        f"**Калькулятор стоимости**\n\n{calc.get_summary()}",
+        parse_mode="Markdown",
+        reply_markup=get_calculator_keyboard()
+    )
+
+
+@router.exact("lead_submit", rate=(3, 300))
+async def _lead_submit(cb: CallbackRequest) -> None:
+    query, context, user_id = cb.query, cb.context, cb.user_id
+    user = query.from_user
+    lead = lead_manager.get_lead(user_id)
+    if not lead:
+        lead = lead_manager.create_lead(
+            user_id=user_id,
+            username=user.username,
+            first_name=user.first_name
         )
     
-    elif data.startswith("service_"):
-        services_info = {
-            "service_shop": """Интернет-магазины — наша специализация.
+    notification = lead_manager.format_lead_notification(lead)
+    
+    manager_id = lead_manager.get_manager_chat_id()
+    if manager_id:
+        try:
+            await context.bot.send_message(
+                chat_id=manager_id,
+                text=notification,
+                parse_mode="Markdown"
+            )
+            logger.info(f"Lead notification sent for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to send lead notification: {e}")
+    
+    await query.edit_message_text(
+        """Отлично, записал вашу заявку!
+
+Свяжусь с вами в ближайшее время — обычно в течение пары часов в рабочее время.
+
+А пока можете задавать любые вопросы, я на связи.""",
+        reply_markup=get_back_keyboard()
+    )
+
+
+@router.exact("lead_question")
+async def _lead_question(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.edit_message_text(
+        "Спрашивайте — отвечу на всё, что знаю)",
+        reply_markup=get_back_keyboard()
+    )
+
+
+@router.prefix("service_")
+async def _service(cb: CallbackRequest) -> None:
+    query, data = cb.query, cb.data
+    services_info = {
+        "service_shop": """Интернет-магазины — наша специализация.
 
 Срок разработки: 7-10 дней. В базовый пакет входит каталог, корзина, оплата, профиль покупателя.
 
@@ -509,7 +630,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Примеры: Radiance (одежда), TechMart (электроника), SneakerVault (кроссовки).
 
 Хотите посмотреть или сразу обсудим ваш проект?""",
-            "service_restaurant": """Рестораны и доставку делаем часто.
+        "service_restaurant": """Рестораны и доставку делаем часто.
 
 Срок: 7-10 дней. Базово: меню, корзина, заказ, бронирование столов, доставка.
 
@@ -518,7 +639,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Пример: DeluxeDine — красивый проект, могу показать.
 
 Вам для какого формата — кафе, ресторан, доставка?""",
-            "service_beauty": """Салоны красоты — одно из любимых направлений.
+        "service_beauty": """Салоны красоты — одно из любимых направлений.
 
 Срок: 10-12 дней. Каталог услуг, онлайн-запись, выбор мастера, профиль клиента.
 
@@ -527,163 +648,214 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Пример: GlowSpa — очень красивый проект получился.
 
 Расскажите про ваш салон, что хотите реализовать?""",
-            "service_fitness": """Фитнес-клубы — интересные проекты.
+        "service_fitness": """Фитнес-клубы — интересные проекты.
 
 Срок: 10-12 дней. Расписание занятий, абонементы, запись к тренеру, профиль с прогрессом.
 
 Можно добавить push-уведомления, трекер тренировок, видео-тренировки.
 
 У вас клуб или студия? Сколько направлений?""",
-            "service_medical": """Медицинские проекты — сложнее, но делаем.
+        "service_medical": """Медицинские проекты — сложнее, но делаем.
 
 Срок: 12-15 дней. Список врачей, онлайн-запись, история приёмов, результаты анализов.
 
 Можно добавить видеоконсультации, напоминания о приёме, чат с врачом.
 
 Расскажите подробнее — клиника или частная практика?""",
-            "service_services": """Сервисные бизнесы тоже разрабатываем.
+        "service_services": """Сервисные бизнесы тоже разрабатываем.
 
 Срок: 8-12 дней в зависимости от функционала. Каталог услуг, бронирование, оплата, история заказов.
 
 Делали для автомоек, аренды авто, такси, курьерских служб.
 
 Какой у вас сервис? Расскажите, подберём решение."""
-        }
-        
-        text = services_info.get(data, "Информация не найдена")
-        await query.edit_message_text(
-            text,
-            parse_mode="Markdown",
-            reply_markup=get_lead_keyboard()
-        )
+    }
     
-    elif data.startswith("ref_"):
-        user_id = query.from_user.id
-        user = query.from_user
-        stats = referral_manager.get_or_create_user(user_id, user.username, user.first_name)
-        
-        if data == "ref_copy_code":
-            await query.answer(f"Код: {stats.referral_code}", show_alert=True)
-        
-        elif data == "ref_copy_code_btn":
-            await query.answer("Код скопирован!")
-        
-        elif data == "ref_share":
-            ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
-            share_text = f"Присоединяйся к WEB4TG Studio! Получи 50 монет по моей ссылке: {ref_link}"
-            share_keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(
-                    "📋 Скопировать ссылку",
-                    callback_data="ref_copy_link_btn",
-                    **copy_text_button("copy", ref_link)
-                )],
-                [InlineKeyboardButton("◀️ Назад", callback_data="ref_back")]
-            ])
-            await query.answer()
-            await query.message.reply_text(
-                f"📤 **Поделитесь этой ссылкой:**\n\n{ref_link}\n\n"
-                f"Или отправьте друзьям это сообщение:\n\n_{share_text}_",
-                parse_mode="Markdown",
-                reply_markup=share_keyboard
-            )
-        
-        elif data == "ref_copy_link_btn":
-            await query.answer("Ссылка скопирована!")
-        
-        elif data == "ref_list":
-            referrals = referral_manager.get_referrals_list(user_id)
-            
-            if not referrals:
-                text = "👥 **Мои рефералы**\n\nУ вас пока нет приглашённых друзей.\n\nПоделитесь своей ссылкой и получайте монеты!"
-            else:
-                text = f"👥 **Мои рефералы** ({len(referrals)})\n\n"
-                for i, ref in enumerate(referrals[:10], 1):
-                    name = ref.referred_first_name or ref.referred_username or f"User {ref.referred_telegram_id}"
-                    status_icon = "✅" if ref.status == "active" else "⏳"
-                    text += f"{i}. {status_icon} {name} — +{ref.bonus_amount} монет\n"
-                
-                if len(referrals) > 10:
-                    text += f"\n...и ещё {len(referrals) - 10}"
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ Назад", callback_data="ref_back")]
-            ])
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
-        
-        elif data == "ref_back":
-            tier_emoji = stats.get_tier_emoji()
-            ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
-            
-            text = f"""💰 **Реферальная программа**
+    text = services_info.get(data, "Информация не найдена")
+    await query.edit_message_text(
+        text,
+        parse_mode="Markdown",
+        reply_markup=get_lead_keyboard()
+    )
+
+
+def _referral_text(stats) -> str:
+    ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
+    return f"""💰 **Реферальная программа**
 
 📊 **Ваша статистика:**
-{tier_emoji} Уровень: {stats.tier.value}
+{stats.get_tier_emoji()} Уровень: {stats.tier.value}
 👥 Приглашено: {stats.total_referrals}
 💵 Заработано: {stats.total_earnings} монет
 
 🔗 **Ваш код:** `{stats.referral_code}`
 📤 **Ссылка:** {ref_link}"""
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(
-                    "📋 Скопировать код",
-                    callback_data="ref_copy_code_btn",
-                    **copy_text_button("copy", stats.referral_code)
-                )],
-                [InlineKeyboardButton("📤 Поделиться ссылкой", callback_data="ref_share")],
-                [InlineKeyboardButton("👥 Мои рефералы", callback_data="ref_list")],
-                [InlineKeyboardButton("Назад в меню", callback_data="menu_back")]
-            ])
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
-    
-    elif data.startswith("tasks_"):
-        user_id = query.from_user.id
-        
-        if data == "tasks_progress":
-            progress = tasks_tracker.get_user_progress(user_id)
-            available = tasks_tracker.get_available_tasks(user_id)
-            
-            completed_count = len(progress.completed_tasks)
-            total_tasks = sum(len(tasks) for tasks in TASKS_CONFIG.values())
-            
-            tier_emoji_map = {0: "🔰", 5: "🥉", 10: "🥈", 15: "🥇", 20: "💎", 25: "👑"}
-            current_emoji = tier_emoji_map.get(progress.get_discount_percent(), "🔰")
-            
-            text = f"""📊 **Твой прогресс**
 
-{current_emoji} **Уровень:** {progress.get_tier_name()}
-💰 **Монеты:** {progress.total_coins}
+
+def _referral_stats(cb: CallbackRequest):
+    user = cb.query.from_user
+    return referral_manager.get_or_create_user(cb.user_id, user.username, user.first_name)
+
+
+@router.exact("ref_copy_code", alerts=True)
+async def _ref_copy_code(cb: CallbackRequest) -> None:
+    stats = _referral_stats(cb)
+    await cb.answer(f"Код: {stats.referral_code}", show_alert=True)
+
+
+@router.exact("ref_copy_code_btn", alerts=True)
+async def _ref_copy_code_btn(cb: CallbackRequest) -> None:
+    await cb.answer("Код скопирован!")
+
+
+@router.exact("ref_copy_link_btn", alerts=True)
+async def _ref_copy_link_btn(cb: CallbackRequest) -> None:
+    await cb.answer("Ссылка скопирована!")
+
+
+@router.exact("ref_share")
+async def _ref_share(cb: CallbackRequest) -> None:
+    stats = _referral_stats(cb)
+    ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
+    share_text = f"Присоединяйся к WEB4TG Studio! Получи 50 монет по моей ссылке: {ref_link}"
+    share_keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            "📋 Скопировать ссылку",
+            callback_data="ref_copy_link_btn",
+            **copy_text_button("copy", ref_link)
+        )],
+        [InlineKeyboardButton("◀️ Назад", callback_data="ref_back")]
+    ])
+    await cb.query.message.reply_text(
+        f"📤 **Поделитесь этой ссылкой:**\n\n{ref_link}\n\n"
+        f"Или отправьте друзьям это сообщение:\n\n_{share_text}_",
+        parse_mode="Markdown",
+        reply_markup=share_keyboard
+    )
+
+
+@router.exact("ref_list")
+async def _ref_list(cb: CallbackRequest) -> None:
+    referrals = referral_manager.get_referrals_list(cb.user_id)
+    
+    if not referrals:
+        text = "👥 **Мои рефералы**\n\nУ вас пока нет приглашённых друзей.\n\nПоделитесь своей ссылкой и получайте монеты!"
+    else:
+        text = f"👥 **Мои рефералы** ({len(referrals)})\n\n"
+        for i, ref in enumerate(referrals[:10], 1):
+            name = ref.referred_first_name or ref.referred_username or f"User {ref.referred_telegram_id}"
+            status_icon = "✅" if ref.status == "active" else "⏳"
+            text += f"{i}. {status_icon} {name} — +{ref.bonus_amount} монет\n"
+        
+        if len(referrals) > 10:
+            text += f"\n...и ещё {len(referrals) - 10}"
+    
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад", callback_data="ref_back")]
+    ])
+    await cb.query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+@router.exact("ref_back")
+async def _ref_back(cb: CallbackRequest) -> None:
+    stats = _referral_stats(cb)
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            "📋 Скопировать код",
+            callback_data="ref_copy_code_btn",
+            **copy_text_button("copy", stats.referral_code)
+        )],
+        [InlineKeyboardButton("📤 Поделиться ссылкой", callback_data="ref_share")],
+        [InlineKeyboardButton("👥 Мои рефералы", callback_data="ref_list")],
+        [InlineKeyboardButton("Назад в меню", callback_data="menu_back")]
+    ])
+    await cb.query.edit_message_text(_referral_text(stats), parse_mode="Markdown", reply_markup=keyboard)
+
+
+TIER_EMOJI = {0: "🔰", 5: "🥉", 10: "🥈", 15: "🥇", 20: "💎", 25: "👑"}
+PLATFORM_NAMES = {
+    "telegram": "📱 Telegram",
+    "youtube": "📺 YouTube",
+    "instagram": "📸 Instagram",
+    "tiktok": "🎵 TikTok",
+}
+
+
+def _task_platform(task_id: str):
+    """(platform, task config) for a task id, or (None, None)."""
+    for plat, tasks in TASKS_CONFIG.items():
+        if task_id in tasks:
+            return plat, tasks[task_id]
+    return None, None
+
+
+def _parse_platform(value: str) -> str:
+    if value not in PLATFORM_NAMES:
+        raise ValueError(f"unknown platform {value!r}")
+    return value
+
+
+async def _show_platform_tasks(cb: CallbackRequest, platform: str) -> None:
+    tasks = tasks_tracker.get_available_tasks(cb.user_id)["tasks"].get(platform, [])
+    
+    text = f"**{PLATFORM_NAMES.get(platform, 'Задания')} задания**\n\n"
+    buttons = []
+    for task in tasks:
+        status_icon = "✅" if task["status"] == "completed" else "⭐"
+        tname = task.get("name", task["id"])
+        text += f"{status_icon} {tname} — {task['coins']} монет\n"
+        
+        if task["status"] != "completed":
+            buttons.append([InlineKeyboardButton(f"▶️ {tname} (+{task['coins']})", callback_data=f"do_task_{task['id']}")])
+    
+    buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")])
+    await cb.query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
+
+
+@router.exact("tasks_progress")
+async def _tasks_progress(cb: CallbackRequest) -> None:
+    progress = tasks_tracker.get_user_progress(cb.user_id)
+    
+    completed_count = len(progress.completed_tasks)
+    total_tasks = sum(len(tasks) for tasks in TASKS_CONFIG.values())
+    current_emoji = TIER_EMOJI.get(progress.get_discount_percent(), "🔰")
+    
+    text = f"""📊 **Твой прогресс**
+
+{current_emoji} **Уровень:** {progress.get_tier_name()}
+💰 **Монеты:** {progress.total_coins}
 🔥 **Стрик:** {progress.current_streak} дней (макс: {progress.max_streak})
 💵 **Скидка:** {progress.get_discount_percent()}%
 ✅ **Выполнено:** {completed_count} из {total_tasks} заданий
 
 **До следующего уровня:**"""
-            
-            next_tiers = [(500, 5), (1000, 10), (1500, 15), (2000, 20), (2500, 25)]
-            for coins_need, discount in next_tiers:
-                if progress.total_coins < coins_need:
-                    remaining = coins_need - progress.total_coins
-                    text += f"\n🎯 Ещё {remaining} монет до {discount}% скидки"
-                    break
-            else:
-                text += "\n👑 Максимальный уровень достигнут!"
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("📱 Telegram", callback_data="tasks_telegram"),
-                 InlineKeyboardButton("📺 YouTube", callback_data="tasks_youtube")],
-                [InlineKeyboardButton("📸 Instagram", callback_data="tasks_instagram"),
-                 InlineKeyboardButton("🎵 TikTok", callback_data="tasks_tiktok")],
-                [InlineKeyboardButton("Назад", callback_data="tasks_back")]
-            ])
-            
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
-        
-        elif data == "tasks_back" or data == "earn_coins" or data == "tasks_menu":
-            progress = tasks_tracker.get_user_progress(user_id)
-            tier_emoji_map = {0: "🔰", 5: "🥉", 10: "🥈", 15: "🥇", 20: "💎", 25: "👑"}
-            current_emoji = tier_emoji_map.get(progress.get_discount_percent(), "🔰")
-            
-            text = f"""🎁 <b>Получи скидку до 25%!</b>
+    
+    next_tiers = [(500, 5), (1000, 10), (1500, 15), (2000, 20), (2500, 25)]
+    for coins_need, discount in next_tiers:
+        if progress.total_coins < coins_need:
+            remaining = coins_need - progress.total_coins
+            text += f"\n🎯 Ещё {remaining} монет до {discount}% скидки"
+            break
+    else:
+        text += "\n👑 Максимальный уровень достигнут!"
+    
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📱 Telegram", callback_data="tasks_telegram"),
+         InlineKeyboardButton("📺 YouTube", callback_data="tasks_youtube")],
+        [InlineKeyboardButton("📸 Instagram", callback_data="tasks_instagram"),
+         InlineKeyboardButton("🎵 TikTok", callback_data="tasks_tiktok")],
+        [InlineKeyboardButton("Назад", callback_data="tasks_back")]
+    ])
+    
+    await cb.query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+@router.exact("tasks_back", "tasks_menu", "earn_coins")
+async def _tasks_menu(cb: CallbackRequest) -> None:
+    progress = tasks_tracker.get_user_progress(cb.user_id)
+    current_emoji = TIER_EMOJI.get(progress.get_discount_percent(), "🔰")
+    
+    text = f"""🎁 <b>Получи скидку до 25%!</b>
 
 {current_emoji} <b>Уровень:</b> {progress.get_tier_name()}
 💰 <b>Монеты:</b> {progress.total_coins}
@@ -695,119 +867,71 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 ⭐ Оставь отзыв — до 500 монет
 
 Выбери раздел:"""
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("📱 Telegram", callback_data="tasks_telegram"),
-                 InlineKeyboardButton("📺 YouTube", callback_data="tasks_youtube")],
-                [InlineKeyboardButton("📸 Instagram", callback_data="tasks_instagram"),
-                 InlineKeyboardButton("🎵 TikTok", callback_data="tasks_tiktok")],
-                [InlineKeyboardButton("👥 Пригласить друзей", callback_data="referral_menu")],
-                [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="loyalty_review")],
-                [InlineKeyboardButton("📊 Мой прогресс", callback_data="tasks_progress")],
-                [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-            ])
-            
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-        
-        elif data in ["tasks_telegram", "tasks_youtube", "tasks_instagram", "tasks_tiktok"]:
-            platform = data.replace("tasks_", "")
-            platform_names = {
-                "telegram": "📱 Telegram",
-                "youtube": "📺 YouTube", 
-                "instagram": "📸 Instagram",
-                "tiktok": "🎵 TikTok"
-            }
-            
-            tasks = tasks_tracker.get_available_tasks(user_id)["tasks"].get(platform, [])
-            progress = tasks_tracker.get_user_progress(user_id)
-            
-            text = f"**{platform_names[platform]} задания**\n\n"
-            
-            buttons = []
-            for task in tasks:
-                status_icon = "✅" if task["status"] == "completed" else "⭐"
-                tname = task.get("name", task["id"])
-                text += f"{status_icon} {tname} — {task['coins']} монет\n"
-                
-                if task["status"] != "completed":
-                    buttons.append([InlineKeyboardButton(
-                        f"▶️ {tname} (+{task['coins']})",
-                        callback_data=f"do_task_{task['id']}"
-                    )])
-            
-            buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")])
-            
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
     
-    elif data.startswith("do_task_"):
-        task_id = data.replace("do_task_", "")
-        user_id = query.from_user.id
-        
-        task_config = None
-        platform = None
-        for plat, tasks in TASKS_CONFIG.items():
-            if task_id in tasks:
-                task_config = tasks[task_id]
-                platform = plat
-                break
-        
-        if not task_config:
-            await query.answer("Задание не найдено", show_alert=True)
-            return
-        
-        task_type = task_config.get("type", "view")
-        task_name = task_config.get("name", task_id.replace(f"{platform}_", "").replace("_", " ").title())
-        task_desc = task_config.get("desc", "")
-        coins = task_config.get("coins", 0)
-        task_url = task_config.get("url", "")
-        
-        platform_info = {
-            "telegram": {"emoji": "📱", "name": "Telegram"},
-            "youtube": {"emoji": "📺", "name": "YouTube"},
-            "instagram": {"emoji": "📸", "name": "Instagram"},
-            "tiktok": {"emoji": "🎵", "name": "TikTok"}
-        }
-        
-        pinfo = platform_info.get(platform, {"emoji": "📱", "name": platform})
-        
-        task_type_names = {
-            "subscribe": "Подписаться",
-            "like": "Поставить лайк",
-            "comment": "Написать комментарий",
-            "share": "Поделиться",
-            "view": "Посмотреть",
-            "save": "Сохранить",
-            "bell": "Включить уведомления"
-        }
-        
-        action_text = task_type_names.get(task_type, "Выполнить")
-        
-        if platform == "telegram":
-            if task_type == "subscribe":
-                is_subscribed = await tasks_tracker.check_telegram_subscription(user_id, task_config.get("channel", "web4_tg"))
-                
-                if not is_subscribed:
-                    keyboard = InlineKeyboardMarkup([
-                        [InlineKeyboardButton(f"{pinfo['emoji']} Открыть канал @web4_tg", url=task_url or "https://t.me/web4_tg")],
-                        [InlineKeyboardButton("✅ Я подписался", callback_data=f"verify_task_{task_id}")],
-                        [InlineKeyboardButton("◀️ Назад", callback_data=f"tasks_{platform}")]
-                    ])
-                    
-                    await query.edit_message_text(
-                        f"{pinfo['emoji']} **{task_name}**\n\n"
-                        f"📌 {task_desc}\n\n"
-                        f"1️⃣ Нажми кнопку — откроется канал @web4_tg\n"
-                        f"2️⃣ Подпишись на канал\n"
-                        f"3️⃣ Вернись и нажми «Я подписался»\n\n"
-                        f"🎁 Награда: **{coins} монет**",
-                        parse_mode="Markdown",
-                        reply_markup=keyboard
-                    )
-                    return
-            else:
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📱 Telegram", callback_data="tasks_telegram"),
+         InlineKeyboardButton("📺 YouTube", callback_data="tasks_youtube")],
+        [InlineKeyboardButton("📸 Instagram", callback_data="tasks_instagram"),
+         InlineKeyboardButton("🎵 TikTok", callback_data="tasks_tiktok")],
+        [InlineKeyboardButton("👥 Пригласить друзей", callback_data="referral_menu")],
+        [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="loyalty_review")],
+        [InlineKeyboardButton("📊 Мой прогресс", callback_data="tasks_progress")],
+        [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+    ])
+    
+    await cb.query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("tasks_", parse=_parse_platform)
+async def _tasks_platform(cb: CallbackRequest) -> None:
+    await _show_platform_tasks(cb, cb.payload)
+
+
+@router.prefix("do_task_", alerts=True, rate=(10, 60))
+async def _do_task(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    task_id = cb.payload
+    
+    platform, task_config = _task_platform(task_id)
+    if not task_config:
+        await cb.answer("Задание не найдено", show_alert=True)
+        return
+    
+    task_type = task_config.get("type", "view")
+    task_name = task_config.get("name", task_id.replace(f"{platform}_", "").replace("_", " ").title())
+    task_desc = task_config.get("desc", "")
+    coins = task_config.get("coins", 0)
+    task_url = task_config.get("url", "")
+    
+    platform_info = {
+        "telegram": {"emoji": "📱", "name": "Telegram"},
+        "youtube": {"emoji": "📺", "name": "YouTube"},
+        "instagram": {"emoji": "📸", "name": "Instagram"},
+        "tiktok": {"emoji": "🎵", "name": "TikTok"}
+    }
+    
+    pinfo = platform_info.get(platform, {"emoji": "📱", "name": platform})
+    
+    task_type_names = {
+        "subscribe": "Подписаться",
+        "like": "Поставить лайк",
+        "comment": "Написать комментарий",
+        "share": "Поделиться",
+        "view": "Посмотреть",
+        "save": "Сохранить",
+        "bell": "Включить уведомления"
+    }
+    
+    action_text = task_type_names.get(task_type, "Выполнить")
+    
+    if platform == "telegram":
+        if task_type == "subscribe":
+            is_subscribed = await tasks_tracker.check_telegram_subscription(user_id, task_config.get("channel", "web4_tg"))
+            
+            if not is_subscribed:
                 keyboard = InlineKeyboardMarkup([
                     [InlineKeyboardButton(f"{pinfo['emoji']} Открыть канал @web4_tg", url=task_url or "https://t.me/web4_tg")],
-                    [InlineKeyboardButton("✅ Готово", callback_data=f"confirm_task_{task_id}")],
+                    [InlineKeyboardButton("✅ Я подписался", callback_data=f"verify_task_{task_id}")],
                     [InlineKeyboardButton("◀️ Назад", callback_data=f"tasks_{platform}")]
                 ])
                 
@@ -815,17 +939,16 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                     f"{pinfo['emoji']} **{task_name}**\n\n"
                     f"📌 {task_desc}\n\n"
                     f"1️⃣ Нажми кнопку — откроется канал @web4_tg\n"
-                    f"2️⃣ {action_text}\n"
-                    f"3️⃣ Вернись и нажми «Готово»\n\n"
+                    f"2️⃣ Подпишись на канал\n"
+                    f"3️⃣ Вернись и нажми «Я подписался»\n\n"
                     f"🎁 Награда: **{coins} монет**",
                     parse_mode="Markdown",
                     reply_markup=keyboard
                 )
                 return
-        
-        if task_url:
+        else:
             keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(f"{pinfo['emoji']} Открыть {pinfo['name']}", url=task_url)],
+                [InlineKeyboardButton(f"{pinfo['emoji']} Открыть канал @web4_tg", url=task_url or "https://t.me/web4_tg")],
                 [InlineKeyboardButton("✅ Готово", callback_data=f"confirm_task_{task_id}")],
                 [InlineKeyboardButton("◀️ Назад", callback_data=f"tasks_{platform}")]
             ])
@@ -833,107 +956,70 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             await query.edit_message_text(
                 f"{pinfo['emoji']} **{task_name}**\n\n"
                 f"📌 {task_desc}\n\n"
-                f"1️⃣ Нажми кнопку — откроется {pinfo['name']}\n"
-                f"2️⃣ Выполни задание\n"
+                f"1️⃣ Нажми кнопку — откроется канал @web4_tg\n"
+                f"2️⃣ {action_text}\n"
                 f"3️⃣ Вернись и нажми «Готово»\n\n"
                 f"🎁 Награда: **{coins} монет**",
                 parse_mode="Markdown",
                 reply_markup=keyboard
             )
             return
-        
-        result = await tasks_tracker.complete_task(user_id, task_id, platform)
-        
-        if result["success"]:
-            await query.answer(f"🎉 +{result['coinsAwarded']} монет! Всего: {result['totalCoins']}", show_alert=True)
-        else:
-            await query.answer(result["message"], show_alert=True)
-        
-        tasks = tasks_tracker.get_available_tasks(user_id)["tasks"].get(platform, [])
-        platform_names = {"telegram": "📱 Telegram", "youtube": "📺 YouTube", "instagram": "📸 Instagram", "tiktok": "🎵 TikTok"}
-        
-        text = f"**{platform_names[platform]} задания**\n\n"
-        buttons = []
-        for task in tasks:
-            status_icon = "✅" if task["status"] == "completed" else "⭐"
-            tname = task.get("name", task["id"])
-            text += f"{status_icon} {tname} — {task['coins']} монет\n"
-            
-            if task["status"] != "completed":
-                buttons.append([InlineKeyboardButton(f"▶️ {tname} (+{task['coins']})", callback_data=f"do_task_{task['id']}")])
-        
-        buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")])
-        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
     
-    elif data.startswith("verify_task_"):
-        task_id = data.replace("verify_task_", "")
-        user_id = query.from_user.id
-        
-        platform = None
-        for plat, tasks in TASKS_CONFIG.items():
-            if task_id in tasks:
-                platform = plat
-                break
-        
-        result = await tasks_tracker.complete_task(user_id, task_id, platform or "telegram")
+    if task_url:
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"{pinfo['emoji']} Открыть {pinfo['name']}", url=task_url)],
+            [InlineKeyboardButton("✅ Готово", callback_data=f"confirm_task_{task_id}")],
+            [InlineKeyboardButton("◀️ Назад", callback_data=f"tasks_{platform}")]
+        ])
         
-        if result["success"]:
-            await query.answer(f"🎉 +{result['coinsAwarded']} монет! Всего: {result['totalCoins']}", show_alert=True)
-            
-            tasks = tasks_tracker.get_available_tasks(user_id)["tasks"].get(platform, [])
-            platform_names = {"telegram": "📱 Telegram", "youtube": "📺 YouTube", "instagram": "📸 Instagram", "tiktok": "🎵 TikTok"}
-            
-            text = f"**{platform_names[platform]} задания**\n\n"
-            buttons = []
-            for task in tasks:
-                status_icon = "✅" if task["status"] == "completed" else "⭐"
-                tname = task.get("name", task["id"])
-                text += f"{status_icon} {tname} — {task['coins']} монет\n"
-                
-                if task["status"] != "completed":
-                    buttons.append([InlineKeyboardButton(f"▶️ {tname} (+{task['coins']})", callback_data=f"do_task_{task['id']}")])
-            
-            buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")])
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
-        else:
-            await query.answer(result["message"], show_alert=True)
+        await query.edit_message_text(
+            f"{pinfo['emoji']} **{task_name}**\n\n"
+            f"📌 {task_desc}\n\n"
+            f"1️⃣ Нажми кнопку — откроется {pinfo['name']}\n"
+            f"2️⃣ Выполни задание\n"
+            f"3️⃣ Вернись и нажми «Готово»\n\n"
+            f"🎁 Награда: **{coins} монет**",
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
+        return
     
-    elif data.startswith("confirm_task_"):
-        task_id = data.replace("confirm_task_", "")
-        user_id = query.from_user.id
-        
-        platform = None
-        for plat, tasks in TASKS_CONFIG.items():
-            if task_id in tasks:
-                platform = plat
-                break
-        
-        result = await tasks_tracker.complete_task(user_id, task_id, platform or "youtube")
-        
-        if result["success"]:
-            await query.answer(f"🎉 +{result['coinsAwarded']} монет! Всего: {result['totalCoins']}", show_alert=True)
-            
-            tasks = tasks_tracker.get_available_tasks(user_id)["tasks"].get(platform, [])
-            platform_names = {"telegram": "📱 Telegram", "youtube": "📺 YouTube", "instagram": "📸 Instagram", "tiktok": "🎵 TikTok"}
-            
-            text = f"**{platform_names.get(platform, 'Задания')} задания**\n\n"
-            buttons = []
-            for task in tasks:
-                status_icon = "✅" if task["status"] == "completed" else "⭐"
-                tname = task.get("name", task["id"])
-                text += f"{status_icon} {tname} — {task['coins']} монет\n"
-                
-                if task["status"] != "completed":
-                    buttons.append([InlineKeyboardButton(f"▶️ {tname} (+{task['coins']})", callback_data=f"do_task_{task['id']}")])
-            
-            buttons.append([InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")])
-            await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
-        else:
-            await query.answer(result["message"], show_alert=True)
+    result = await tasks_tracker.complete_task(user_id, task_id, platform)
     
-    elif data.startswith("portfolio_"):
-        portfolio_info = {
-            "portfolio_ecommerce": """🛒 <b>E-Commerce проекты</b>
+    if result["success"]:
+        await cb.answer(f"🎉 +{result['coinsAwarded']} монет! Всего: {result['totalCoins']}", show_alert=True)
+    else:
+        await cb.answer(result["message"], show_alert=True)
+    
+    await _show_platform_tasks(cb, platform)
+
+
+async def _complete_task(cb: CallbackRequest, default_platform: str) -> None:
+    platform, _ = _task_platform(cb.payload)
+    result = await tasks_tracker.complete_task(cb.user_id, cb.payload, platform or default_platform)
+    
+    if result["success"]:
+        await cb.answer(f"🎉 +{result['coinsAwarded']} монет! Всего: {result['totalCoins']}", show_alert=True)
+        await _show_platform_tasks(cb, platform)
+    else:
+        await cb.answer(result["message"], show_alert=True)
+
+
+@router.prefix("verify_task_", alerts=True, rate=(10, 60))
+async def _verify_task(cb: CallbackRequest) -> None:
+    await _complete_task(cb, "telegram")
+
+
+@router.prefix("confirm_task_", alerts=True, rate=(10, 60))
+async def _confirm_task(cb: CallbackRequest) -> None:
+    await _complete_task(cb, "youtube")
+
+
+@router.prefix("portfolio_")
+async def _portfolio(cb: CallbackRequest) -> None:
+    query, data = cb.query, cb.data
+    portfolio_info = {
+        "portfolio_ecommerce": """🛒 <b>E-Commerce проекты</b>
 
 <b>Radiance</b> — магазин одежды
 • <i>Было:</i> Продажи только через Instagram DM, терялись заявки
@@ -948,7 +1034,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Также: SneakerVault, FragranceRoyale, FloralArt
 
 Хотите такой же результат для своего бизнеса?""",
-            "portfolio_services": """💅 <b>Сервисные проекты</b>
+        "portfolio_services": """💅 <b>Сервисные проекты</b>
 
 <b>GlowSpa</b> — салон красоты
 • <i>Было:</i> Запись по телефону, 30% no-show
@@ -961,7 +1047,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 • <i>Результат:</i> Обработка заказов ускорилась в 3 раза
 
 Расскажите о вашем бизнесе — покажу подходящий кейс.""",
-            "portfolio_fintech": """💰 <b>Финтех проекты</b>
+        "portfolio_fintech": """💰 <b>Финтех проекты</b>
 
 <b>Banking App</b> — банковское приложение
 • <i>Было:</i> Только веб-интерфейс, неудобно с телефона
@@ -974,7 +1060,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 • <i>Результат:</i> Средний чек вырос на 25%
 
 Планируете финтех-проект?""",
-            "portfolio_education": """📚 <b>Образовательные проекты</b>
+        "portfolio_education": """📚 <b>Образовательные проекты</b>
 
 <b>Courses</b> — онлайн-школа
 • <i>Было:</i> Курсы на Getcourse, высокие комиссии
@@ -984,23 +1070,26 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 Каталог курсов, трекинг прогресса, сертификаты — всё внутри Telegram.
 
 У вас образовательный проект?"""
-        }
-        
-        text = portfolio_info.get(data, "Информация не найдена")
-        await query.edit_message_text(
-            text,
-            parse_mode="HTML",
-            reply_markup=get_lead_keyboard()
-        )
+    }
     
-    elif data == "referral_menu":
-        user = query.from_user
-        stats = referral_manager.get_or_create_user(user.id, user.username, user.first_name)
-        
-        tier_emoji = stats.get_tier_emoji()
-        ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
-        
-        text = f"""💰 **Реферальная программа**
+    text = portfolio_info.get(data, "Информация не найдена")
+    await query.edit_message_text(
+        text,
+        parse_mode="HTML",
+        reply_markup=get_lead_keyboard()
+    )
+
+
+@router.exact("referral_menu")
+async def _referral_menu(cb: CallbackRequest) -> None:
+    query = cb.query
+    user = query.from_user
+    stats = referral_manager.get_or_create_user(user.id, user.username, user.first_name)
+    
+    tier_emoji = stats.get_tier_emoji()
+    ref_link = referral_manager.get_bot_referral_link(stats.referral_code)
+    
+    text = f"""💰 **Реферальная программа**
 
 📊 **Ваша статистика:**
 {tier_emoji} Уровень: {stats.tier.value}
@@ -1015,115 +1104,135 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 • Друг получает: 50 монет
 
 Приглашай друзей и зарабатывай!"""
-        
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📋 Скопировать код", callback_data="ref_copy_code")],
-            [InlineKeyboardButton("📤 Поделиться ссылкой", callback_data="ref_share")],
-            [InlineKeyboardButton("👥 Мои рефералы", callback_data="ref_list")],
-            [InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")]
-        ])
-        
-        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
-
-    elif data and data.startswith("bc_"):
-        from src.security import is_admin
-        if not is_admin(user_id):
-            await query.edit_message_text("⛔ Доступ запрещён")
-            return
-
-        if data == "bc_cancel":
-            context.user_data.pop('broadcast_draft', None)
-            context.user_data.pop('broadcast_compose', None)
-            await query.edit_message_text("❌ Рассылка отменена")
-
-        elif data.startswith("bc_audience_"):
-            audience = data.replace("bc_audience_", "")
-            draft = context.user_data.get('broadcast_draft')
-            if not draft:
-                await query.edit_message_text("❌ Черновик не найден. Начните заново: /broadcast")
-                return
-
-            from src.broadcast import broadcast_manager
-            if audience == "all":
-                count = len(broadcast_manager.get_user_ids('all'))
-            else:
-                count = len(broadcast_manager.get_user_ids('priority', priority=audience))
-
-            context.user_data['broadcast_audience'] = audience
-
-            audience_names = {'all': 'всем', 'hot': 'горячим', 'warm': 'тёплым', 'cold': 'холодным'}
-            audience_name = audience_names.get(audience, audience)
-
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(f"✅ Да, отправить {count} чел.", callback_data="bc_confirm")],
-                [InlineKeyboardButton("❌ Отмена", callback_data="bc_cancel")]
-            ])
-            await query.edit_message_text(
-                f"📤 <b>Подтверждение рассылки</b>\n\n"
-                f"Аудитория: <b>{audience_name}</b>\n"
-                f"Получателей: <b>{count}</b>\n\n"
-                f"Отправить?",
-                parse_mode="HTML",
-                reply_markup=keyboard
-            )
-
-        elif data == "bc_confirm":
-            draft = context.user_data.get('broadcast_draft')
-            audience = context.user_data.get('broadcast_audience', 'all')
-            if not draft:
-                await query.edit_message_text("❌ Черновик не найден. Начните заново: /broadcast")
-                return
-
-            from src.broadcast import broadcast_manager
-
-            bc_id = broadcast_manager.create_broadcast(
-                admin_id=user_id,
-                content_type=draft['type'],
-                text_content=draft.get('text'),
-                media_file_id=draft.get('file_id'),
-                caption=draft.get('caption'),
-                parse_mode='HTML' if draft['type'] == 'text' else None,
-                target_audience=audience
+    
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📋 Скопировать код", callback_data="ref_copy_code")],
+        [InlineKeyboardButton("📤 Поделиться ссылкой", callback_data="ref_share")],
+        [InlineKeyboardButton("👥 Мои рефералы", callback_data="ref_list")],
+        [InlineKeyboardButton("◀️ Назад", callback_data="tasks_back")]
+    ])
+    
+    await query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+async def _require_admin(cb: CallbackRequest) -> bool:
+    from src.security import is_admin
+    if is_admin(cb.user_id):
+        return True
+    await cb.query.edit_message_text("⛔ Доступ запрещён")
+    return False
+
+
+@router.exact("bc_cancel")
+async def _bc_cancel(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query, context = cb.query, cb.context
+    context.user_data.pop('broadcast_draft', None)
+    context.user_data.pop('broadcast_compose', None)
+    await query.edit_message_text("❌ Рассылка отменена")
+
+
+@router.prefix("bc_audience_")
+async def _bc_audience(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query, context = cb.query, cb.context
+    audience = cb.payload
+    draft = context.user_data.get('broadcast_draft')
+    if not draft:
+        await query.edit_message_text("❌ Черновик не найден. Начните заново: /broadcast")
+        return
+
+    from src.broadcast import broadcast_manager
+    if audience == "all":
+        count = len(broadcast_manager.get_user_ids('all'))
+    else:
+        count = len(broadcast_manager.get_user_ids('priority', priority=audience))
+
+    context.user_data['broadcast_audience'] = audience
+
+    audience_names = {'all': 'всем', 'hot': 'горячим', 'warm': 'тёплым', 'cold': 'холодным'}
+    audience_name = audience_names.get(audience, audience)
+
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"✅ Да, отправить {count} чел.", callback_data="bc_confirm")],
+        [InlineKeyboardButton("❌ Отмена", callback_data="bc_cancel")]
+    ])
+    await query.edit_message_text(
+        f"📤 <b>Подтверждение рассылки</b>\n\n"
+        f"Аудитория: <b>{audience_name}</b>\n"
+        f"Получателей: <b>{count}</b>\n\n"
+        f"Отправить?",
+        parse_mode="HTML",
+        reply_markup=keyboard
+    )
+
+
+@router.exact("bc_confirm", rate=(1, 30))
+async def _bc_confirm(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query, context, user_id = cb.query, cb.context, cb.user_id
+    draft = context.user_data.get('broadcast_draft')
+    audience = context.user_data.get('broadcast_audience', 'all')
+    if not draft:
+        await query.edit_message_text("❌ Черновик не найден. Начните заново: /broadcast")
+        return
+
+    from src.broadcast import broadcast_manager
+
+    bc_id = broadcast_manager.create_broadcast(
+        admin_id=user_id,
+        content_type=draft['type'],
+        text_content=draft.get('text'),
+        media_file_id=draft.get('file_id'),
+        caption=draft.get('caption'),
+        parse_mode='HTML' if draft['type'] == 'text' else None,
+        target_audience=audience
+    )
+
+    context.user_data.pop('broadcast_draft', None)
+    context.user_data.pop('broadcast_audience', None)
+
+    await query.edit_message_text("📤 <b>Рассылка запущена...</b>\n\n⏳ Ожидайте отчёт.", parse_mode="HTML")
+
+    admin_chat_id = query.message.chat_id
+
+    async def progress_callback(sent, failed, blocked, total):
+        try:
+            await context.bot.send_message(
+                chat_id=admin_chat_id,
+                text=f"📊 Прогресс: {sent + failed + blocked}/{total}\n✅ {sent} | ❌ {failed} | 🚫 {blocked}"
             )
+        except Exception:
+            pass
 
-            context.user_data.pop('broadcast_draft', None)
-            context.user_data.pop('broadcast_audience', None)
-
-            await query.edit_message_text("📤 <b>Рассылка запущена...</b>\n\n⏳ Ожидайте отчёт.", parse_mode="HTML")
-
-            admin_chat_id = query.message.chat_id
-
-            async def progress_callback(sent, failed, blocked, total):
-                try:
-                    await context.bot.send_message(
-                        chat_id=admin_chat_id,
-                        text=f"📊 Прогресс: {sent + failed + blocked}/{total}\n✅ {sent} | ❌ {failed} | 🚫 {blocked}"
-                    )
-                except Exception:
-                    pass
-
-            result = await broadcast_manager.send_broadcast(
-                bot=context.bot,
-                broadcast_id=bc_id,
-                progress_callback=progress_callback
-            )
+    result = await broadcast_manager.send_broadcast(
+        bot=context.bot,
+        broadcast_id=bc_id,
+        progress_callback=progress_callback
+    )
+
+    bc = broadcast_manager.get_broadcast(bc_id)
+    if bc:
+        await context.bot.send_message(
+            chat_id=admin_chat_id,
+            text=f"✅ <b>Рассылка завершена!</b>\n\n"
+                 f"📊 <b>Результаты:</b>\n"
+                 f"👥 Всего: {bc.get('total_users', 0)}\n"
+                 f"✅ Доставлено: {bc.get('sent_count', 0)}\n"
+                 f"❌ Ошибки: {bc.get('failed_count', 0)}\n"
+                 f"🚫 Заблокировали: {bc.get('blocked_count', 0)}",
+            parse_mode="HTML"
+        )
 
-            bc = broadcast_manager.get_broadcast(bc_id)
-            if bc:
-                await context.bot.send_message(
-                    chat_id=admin_chat_id,
-                    text=f"✅ <b>Рассылка завершена!</b>\n\n"
-                         f"📊 <b>Результаты:</b>\n"
-                         f"👥 Всего: {bc.get('total_users', 0)}\n"
-                         f"✅ Доставлено: {bc.get('sent_count', 0)}\n"
-                         f"❌ Ошибки: {bc.get('failed_count', 0)}\n"
-                         f"🚫 Заблокировали: {bc.get('blocked_count', 0)}",
-                    parse_mode="HTML"
-                )
 
-    elif data == "leave_request":
-        analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
-        text = """Отлично, давайте обсудим ваш проект!
+@router.exact("leave_request")
+async def _leave_request(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
+    text = """Отлично, давайте обсудим ваш проект!
 
 Напишите мне:
 — Какой у вас бизнес?
@@ -1131,190 +1240,206 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 — Какой бюджет рассматриваете?
 
 Я подготовлю индивидуальное предложение."""
-        await query.edit_message_text(
-            text,
-            reply_markup=get_lead_keyboard()
+    await query.edit_message_text(
+        text,
+        reply_markup=get_lead_keyboard()
+    )
+
+
+@router.prefix("sub_")
+async def _sub(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.pricing import SUBSCRIPTIONS, format_price
+    sub_key = cb.payload
+    sub = SUBSCRIPTIONS.get(sub_key)
+    if sub:
+        features_text = "\n".join([f"  • {f}" for f in sub["features"]])
+        text = (
+            f"📦 <b>{sub['name']}</b> — {format_price(sub['price'])}/мес\n\n"
+            f"<b>Что входит:</b>\n{features_text}\n\n"
+            f"Хотите подключить? Оставьте заявку!"
         )
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📝 Оставить заявку", callback_data="leave_request")],
+            [InlineKeyboardButton("◀️ Назад к ценам", callback_data="price_subs")]
+        ])
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await query.edit_message_text("Информация не найдена", reply_markup=get_back_keyboard())
 
-    elif data.startswith("sub_"):
-        from src.pricing import SUBSCRIPTIONS, format_price
-        sub_key = data.replace("sub_", "")
-        sub = SUBSCRIPTIONS.get(sub_key)
-        if sub:
-            features_text = "\n".join([f"  • {f}" for f in sub["features"]])
-            text = (
-                f"📦 <b>{sub['name']}</b> — {format_price(sub['price'])}/мес\n\n"
-                f"<b>Что входит:</b>\n{features_text}\n\n"
-                f"Хотите подключить? Оставьте заявку!"
-            )
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("📝 Оставить заявку", callback_data="leave_request")],
-                [InlineKeyboardButton("◀️ Назад к ценам", callback_data="price_subs")]
-            ])
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-        else:
-            await query.edit_message_text("Информация не найдена", reply_markup=get_back_keyboard())
 
-    elif data.startswith("smart_"):
-        try:
-            await _handle_smart_button(query, context, data, user_id)
-        except Exception as e:
-            logger.error(f"Smart button '{data}' error for user {user_id}: {e}")
-            await query.message.reply_text("Произошла ошибка, попробуйте ещё раз.")
+@router.exact("start_quiz")
+async def _start_quiz(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.onboarding import onboarding_manager
+    onboarding_manager.start_quiz(user_id)
+    text, keyboard = onboarding_manager.get_step_keyboard(0)
+    await query.message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("quiz_biz_", "quiz_prob_", "quiz_bud_")
+async def _quiz_step(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.onboarding import onboarding_manager
+    state = onboarding_manager.process_answer(user_id, cb.payload)
+    if state:
+        text, keyboard = onboarding_manager.get_step_keyboard(state.step)
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("quiz_time_")
+async def _quiz_time(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.onboarding import onboarding_manager
+    answer = cb.payload
+    state = onboarding_manager.process_answer(user_id, answer)
+    if state and state.completed:
+        onboarding_manager.save_to_lead(user_id)
+        analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
+        text, keyboard = onboarding_manager.generate_recommendation(user_id)
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
 
-    elif data == "start_quiz":
-        from src.onboarding import onboarding_manager
-        onboarding_manager.start_quiz(user_id)
-        text, keyboard = onboarding_manager.get_step_keyboard(0)
+@router.exact("quiz_skip")
+async def _quiz_skip(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.onboarding import onboarding_manager
+    onboarding_manager.clear_state(user_id)
+    await query.edit_message_text(
+        "Вот что могу показать:",
+        reply_markup=get_main_menu_keyboard()
+    )
+
+
+@router.exact("quiz_to_ai")
+async def _quiz_to_ai(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.onboarding import onboarding_manager
+    state = onboarding_manager.get_state(user_id)
+    hint = ""
+    if state and state.business_type:
+        from src.onboarding import BUSINESS_TYPES
+        biz = BUSINESS_TYPES.get(state.business_type, {})
+        hint = f" для направления «{biz.get('name', '')}»"
+    await query.message.reply_text(
+        f"💬 Отлично! Напишите мне любой вопрос{hint} — "
+        "я AI-консультант и помогу подобрать оптимальное решение."
+    )
+
+
+@router.exact("start_brief")
+async def _start_brief(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.brief_generator import brief_generator
+    brief_generator.start_brief(user_id)
+    result = brief_generator.get_current_step(user_id)
+    if result:
+        text, keyboard = result
         await query.message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("quiz_biz_"):
-        from src.onboarding import onboarding_manager
-        answer = data.replace("quiz_biz_", "")
-        state = onboarding_manager.process_answer(user_id, answer)
-        if state:
-            text, keyboard = onboarding_manager.get_step_keyboard(state.step)
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("quiz_prob_"):
-        from src.onboarding import onboarding_manager
-        answer = data.replace("quiz_prob_", "")
-        state = onboarding_manager.process_answer(user_id, answer)
-        if state:
-            text, keyboard = onboarding_manager.get_step_keyboard(state.step)
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@router.exact("brief_cancel")
+async def _brief_cancel(cb: CallbackRequest) -> None:
+    from src.brief_generator import brief_generator
+    brief_generator.clear_state(cb.user_id)
+    await cb.query.edit_message_text(
+        "❌ Бриф отменён.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+        ])
+    )
 
-    elif data.startswith("quiz_bud_"):
-        from src.onboarding import onboarding_manager
-        answer = data.replace("quiz_bud_", "")
-        state = onboarding_manager.process_answer(user_id, answer)
-        if state:
-            text, keyboard = onboarding_manager.get_step_keyboard(state.step)
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("quiz_time_"):
-        from src.onboarding import onboarding_manager
-        answer = data.replace("quiz_time_", "")
-        state = onboarding_manager.process_answer(user_id, answer)
-        if state and state.completed:
-            onboarding_manager.save_to_lead(user_id)
-            analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
-            text, keyboard = onboarding_manager.generate_recommendation(user_id)
-            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+def _parse_brief_answer(value: str):
+    step_id, answer = value.split("_", 1)
+    return step_id, answer
 
-    elif data == "quiz_skip":
-        from src.onboarding import onboarding_manager
-        onboarding_manager.clear_state(user_id)
-        await query.edit_message_text(
-            "Вот что могу показать:",
-            reply_markup=get_main_menu_keyboard()
-        )
 
-    elif data == "quiz_to_ai":
-        from src.onboarding import onboarding_manager
-        state = onboarding_manager.get_state(user_id)
-        hint = ""
-        if state and state.business_type:
-            from src.onboarding import BUSINESS_TYPES
-            biz = BUSINESS_TYPES.get(state.business_type, {})
-            hint = f" для направления «{biz.get('name', '')}»"
-        await query.message.reply_text(
-            f"💬 Отлично! Напишите мне любой вопрос{hint} — "
-            "я AI-консультант и помогу подобрать оптимальное решение."
+@router.prefix("brief_", parse=_parse_brief_answer)
+async def _brief_answer(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.brief_generator import brief_generator
+    step_id, answer = cb.payload
+    state = brief_generator.process_answer(user_id, step_id, answer)
+    if state and state.completed:
+        brief_generator.save_to_lead(
+            user_id,
+            username=query.from_user.username,
+            first_name=query.from_user.first_name
         )
-
-    elif data == "start_brief":
-        from src.brief_generator import brief_generator
-        brief_generator.start_brief(user_id)
+        analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
+        text, keyboard = brief_generator.format_brief(user_id)
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+    elif state:
         result = brief_generator.get_current_step(user_id)
         if result:
             text, keyboard = result
-            await query.message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
+            await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("brief_") and not data.startswith("brief_send"):
-        from src.brief_generator import brief_generator
-        if data == "brief_cancel":
-            brief_generator.clear_state(user_id)
-            await query.edit_message_text(
-                "❌ Бриф отменён.",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-                ])
-            )
-        else:
-            parts = data.split("_", 2)
-            if len(parts) >= 3:
-                step_id = parts[1]
-                answer = parts[2]
-                state = brief_generator.process_answer(user_id, step_id, answer)
-                if state and state.completed:
-                    brief_generator.save_to_lead(
-                        user_id,
-                        username=query.from_user.username,
-                        first_name=query.from_user.first_name
-                    )
-                    analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
-                    text, keyboard = brief_generator.format_brief(user_id)
-                    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-                elif state:
-                    result = brief_generator.get_current_step(user_id)
-                    if result:
-                        text, keyboard = result
-                        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "brief_send_manager":
+
+@router.exact("brief_send_manager", rate=(3, 300))
+async def _brief_send_manager(cb: CallbackRequest) -> None:
+    query, context, user_id = cb.query, cb.context, cb.user_id
+    try:
+        from src.feedback_loop import feedback_loop
+        feedback_loop.record_outcome(user_id, 'brief_sent_manager')
+    except Exception:
+        pass
+    from src.brief_generator import brief_generator
+    import os
+    manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
+    brief_text = brief_generator.get_brief_summary_for_manager(user_id)
+    await query.edit_message_text(
+        "✅ <b>Бриф отправлен менеджеру!</b>\n\n"
+        "Он подготовит коммерческое предложение и свяжется с вами.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+        ])
+    )
+    if manager_chat_id:
         try:
-            from src.feedback_loop import feedback_loop
-            feedback_loop.record_outcome(user_id, 'brief_sent_manager')
-        except Exception:
-            pass
-        from src.brief_generator import brief_generator
-        import os
-        manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
-        brief_text = brief_generator.get_brief_summary_for_manager(user_id)
-        await query.edit_message_text(
-            "✅ <b>Бриф отправлен менеджеру!</b>\n\n"
-            "Он подготовит коммерческое предложение и свяжется с вами.",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-            ])
-        )
-        if manager_chat_id:
+            await context.bot.send_message(
+                int(manager_chat_id),
+                f"📋 <b>Новый бриф от клиента!</b>\n\n"
+                f"👤 {query.from_user.first_name} (@{query.from_user.username or 'нет'})\n"
+                f"🆔 <code>{user_id}</code>\n\n"
+                f"{brief_text}",
+                parse_mode="HTML"
+            )
             try:
-                await context.bot.send_message(
-                    int(manager_chat_id),
-                    f"📋 <b>Новый бриф от клиента!</b>\n\n"
-                    f"👤 {query.from_user.first_name} (@{query.from_user.username or 'нет'})\n"
-                    f"🆔 <code>{user_id}</code>\n\n"
-                    f"{brief_text}",
-                    parse_mode="HTML"
-                )
-                try:
-                    from src.manager_coaching import generate_coaching_briefing
-                    briefing = generate_coaching_briefing(user_id=user_id)
-                    if briefing:
-                        await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
-                except Exception:
-                    pass
+                from src.manager_coaching import generate_coaching_briefing
+                briefing = generate_coaching_briefing(user_id=user_id)
+                if briefing:
+                    await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
             except Exception:
                 pass
+        except Exception:
+            pass
+
 
-    elif data == "generate_kp":
-        from src.brief_generator import brief_generator
-        from src.kp_generator import generate_and_send_kp, get_kp_prompt_for_brief
-        state = brief_generator.get_state(user_id)
-        if not state or not state.completed:
-            await query.answer("Сначала пройдите бриф!", show_alert=True)
+@router.exact("generate_kp", alerts=True, rate=(3, 60))
+async def _generate_kp(cb: CallbackRequest) -> None:
+    query, context, update, user_id = cb.query, cb.context, cb.update, cb.user_id
+    from src.brief_generator import brief_generator
+    from src.kp_generator import generate_and_send_kp, get_kp_prompt_for_brief
+    state = brief_generator.get_state(user_id)
+    if not state or not state.completed:
+        await cb.answer("Сначала пройдите бриф!", show_alert=True)
+    else:
+        await cb.answer()
+        await query.edit_message_text(
+            "⏳ <b>Генерирую персональное предложение...</b>\n\n"
+            "AI анализирует ваш бриф и формирует PDF-документ.",
+            parse_mode="HTML"
+        )
+        client_name = query.from_user.first_name or ""
+        ai_text = ""
+        previous = context.user_data.get("kp_ai_text")
+        if previous and previous[0] == state.answers:
+            # same brief: reuse the text so the rendered PDF comes from the KP cache
+            ai_text = previous[1]
         else:
-            await query.answer()
-            await query.edit_message_text(
-                "⏳ <b>Генерирую персональное предложение...</b>\n\n"
-                "AI анализирует ваш бриф и формирует PDF-документ.",
-                parse_mode="HTML"
-            )
-            client_name = query.from_user.first_name or ""
-            ai_text = ""
             try:
                 from src.ai_client import ai_client
                 prompt = get_kp_prompt_for_brief(state.answers, client_name)
@@ -1322,402 +1447,546 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 ai_text = await ai_client.generate_response(
                     messages, thinking_level="medium"
                 )
+                if ai_text:
+                    context.user_data["kp_ai_text"] = (dict(state.answers), ai_text)
             except Exception as e:
                 logger.warning(f"AI KP text generation failed: {e}")
 
-            discount_pct = 0
-            try:
-                from src.achievements import vip_program
-                tier = vip_program.get_user_tier(user_id)
-                tier_discounts = {"bronze": 0, "silver": 5, "gold": 10, "platinum": 15, "diamond": 20}
-                discount_pct = tier_discounts.get(tier, 0)
-            except Exception:
-                pass
-
-            success = await generate_and_send_kp(
-                update=update,
-                context=context,
-                brief_answers=state.answers,
-                client_name=client_name,
-                ai_text=ai_text,
-                discount_pct=discount_pct,
-            )
-
-            if success:
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=(
-                        "✅ <b>PDF отправлен!</b>\n\n"
-                        "Вы можете переслать документ коллегам для согласования."
-                    ),
-                    parse_mode="HTML",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("👨‍💼 Отправить менеджеру", callback_data="brief_send_manager")],
-                        [InlineKeyboardButton("📄 Скачать ещё раз", callback_data="generate_kp")],
-                        [InlineKeyboardButton("◀️ Главное меню", callback_data="menu_back")],
-                    ])
-                )
-                analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
-
-    elif data == "my_dashboard":
-        from src.client_dashboard import build_dashboard
-        text, keyboard = build_dashboard(
-            user_id,
-            username=query.from_user.username or "",
-            first_name=query.from_user.first_name or ""
-        )
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "referral_info":
-        from src.referrals import referral_manager, REFERRER_REWARD
-        ref_code = referral_manager.get_referral_code(user_id)
-        ref_stats = referral_manager.get_user_stats(user_id)
-        bot_username = (await context.bot.get_me()).username
-        ref_link = f"https://t.me/{bot_username}?start=ref_{ref_code}"
-        text = (
-            f"👥 <b>Ваша реферальная программа</b>\n\n"
-            f"🔗 Ваша ссылка:\n<code>{ref_link}</code>\n\n"
-            f"👥 Приглашено: {ref_stats.get('referral_count', 0)}\n"
-            f"💰 Заработано: {ref_stats.get('total_earned', 0)} монет\n\n"
-            f"За каждого друга: <b>+{REFERRER_REWARD} монет</b>"
-        )
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("◀️ Назад", callback_data="my_dashboard")]
-        ])
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "compare_packages":
-        from src.package_comparison import get_comparison_view
-        text, keyboard = get_comparison_view()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data.startswith("pkg_"):
-        from src.package_comparison import get_package_detail
-        pkg_id = data.replace("pkg_", "")
-        text, keyboard = get_package_detail(pkg_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data.startswith("pkg_calc_"):
-        from src.package_comparison import calculate_with_discount
-        pkg_id = data.replace("pkg_calc_", "")
-        discount = 0
+        discount_pct = 0
         try:
-            from src.tasks_tracker import tasks_tracker
-            progress = tasks_tracker.get_user_progress(user_id)
-            discount = progress.get_discount_percent()
+            from src.achievements import vip_program
+            tier = vip_program.get_user_tier(user_id)
+            tier_discounts = {"bronze": 0, "silver": 5, "gold": 10, "platinum": 15, "diamond": 20}
+            discount_pct = tier_discounts.get(tier, 0)
         except Exception:
             pass
-        text, keyboard = calculate_with_discount(pkg_id, discount)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data.startswith("timeline_"):
-        from src.package_comparison import get_timeline_view
-        pkg_id = data.replace("timeline_", "")
-        text, keyboard = get_timeline_view(pkg_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "portfolio_cases":
-        from src.portfolio_showcase import get_portfolio_menu
-        text, keyboard = get_portfolio_menu()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("pcase_"):
-        from src.portfolio_showcase import get_case_detail
-        case_id = data.replace("pcase_", "")
-        text, keyboard = get_case_detail(case_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data in ("book_consult", "book_consultation"):
-        try:
-            from src.feedback_loop import feedback_loop
-            feedback_loop.record_outcome(user_id, 'callback_booking')
-        except Exception:
-            pass
-        from src.consultation import consultation_manager
-        text, keyboard = consultation_manager.start_booking(user_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+        success = await generate_and_send_kp(
+            update=update,
+            context=context,
+            brief_answers=state.answers,
+            client_name=client_name,
+            ai_text=ai_text,
+            discount_pct=discount_pct,
+        )
 
-    elif data.startswith("consult_date_"):
-        from src.consultation import consultation_manager
-        date = data.replace("consult_date_", "")
-        text, keyboard = consultation_manager.set_date(user_id, date)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+        if success:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=(
+                    "✅ <b>PDF отправлен!</b>\n\n"
+                    "Вы можете переслать документ коллегам для согласования."
+                ),
+                parse_mode="HTML",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("👨‍💼 Отправить менеджеру", callback_data="brief_send_manager")],
+                    [InlineKeyboardButton("📄 Скачать ещё раз", callback_data="generate_kp")],
+                    [InlineKeyboardButton("◀️ Главное меню", callback_data="menu_back")],
+                ])
+            )
+            analytics.track(user_id, FunnelEvent.LEAD_FORM_OPEN)
 
-    elif data.startswith("consult_time_"):
-        from src.consultation import consultation_manager
-        time_slot = data.replace("consult_time_", "")
-        text, keyboard = consultation_manager.set_time(user_id, time_slot)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data.startswith("consult_topic_"):
-        from src.consultation import consultation_manager
-        import os
-        topic = data.replace("consult_topic_", "")
-        text, keyboard = consultation_manager.set_topic(user_id, topic)
-        consultation_manager.save_to_lead(user_id)
+@router.exact("my_dashboard")
+async def _my_dashboard(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.client_dashboard import build_dashboard
+    text, keyboard = build_dashboard(
+        user_id,
+        username=query.from_user.username or "",
+        first_name=query.from_user.first_name or ""
+    )
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("referral_info")
+async def _referral_info(cb: CallbackRequest) -> None:
+    query, context, user_id = cb.query, cb.context, cb.user_id
+    from src.referrals import referral_manager, REFERRER_REWARD
+    ref_code = referral_manager.get_referral_code(user_id)
+    ref_stats = referral_manager.get_user_stats(user_id)
+    bot_username = (await context.bot.get_me()).username
+    ref_link = f"https://t.me/{bot_username}?start=ref_{ref_code}"
+    text = (
+        f"👥 <b>Ваша реферальная программа</b>\n\n"
+        f"🔗 Ваша ссылка:\n<code>{ref_link}</code>\n\n"
+        f"👥 Приглашено: {ref_stats.get('referral_count', 0)}\n"
+        f"💰 Заработано: {ref_stats.get('total_earned', 0)} монет\n\n"
+        f"За каждого друга: <b>+{REFERRER_REWARD} монет</b>"
+    )
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад", callback_data="my_dashboard")]
+    ])
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("compare_packages")
+async def _compare_packages(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.package_comparison import get_comparison_view
+    text, keyboard = get_comparison_view()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("pkg_")
+async def _pkg(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.package_comparison import get_package_detail
+    pkg_id = cb.payload
+    text, keyboard = get_package_detail(pkg_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("pkg_calc_")
+async def _pkg_calc(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.package_comparison import calculate_with_discount
+    pkg_id = cb.payload
+    discount = 0
+    try:
+        from src.tasks_tracker import tasks_tracker
+        progress = tasks_tracker.get_user_progress(user_id)
+        discount = progress.get_discount_percent()
+    except Exception:
+        pass
+    text, keyboard = calculate_with_discount(pkg_id, discount)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("timeline_")
+async def _timeline(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.package_comparison import get_timeline_view
+    pkg_id = cb.payload
+    text, keyboard = get_timeline_view(pkg_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("portfolio_cases")
+async def _portfolio_cases(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.portfolio_showcase import get_portfolio_menu
+    text, keyboard = get_portfolio_menu()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("pcase_")
+async def _pcase(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.portfolio_showcase import get_case_detail
+    case_id = cb.payload
+    text, keyboard = get_case_detail(case_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("book_consult", "book_consultation")
+async def _book_consult(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    if cb.data == "book_consultation":
+        _track_cta_click(user_id)
+    try:
+        from src.feedback_loop import feedback_loop
+        feedback_loop.record_outcome(user_id, 'callback_booking')
+    except Exception:
+        pass
+    from src.consultation import consultation_manager
+    text, keyboard = consultation_manager.start_booking(user_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("consult_date_")
+async def _consult_date(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.consultation import consultation_manager
+    date = cb.payload
+    text, keyboard = consultation_manager.set_date(user_id, date)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("consult_time_")
+async def _consult_time(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.consultation import consultation_manager
+    time_slot = cb.payload
+    text, keyboard = consultation_manager.set_time(user_id, time_slot)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("consult_topic_", rate=(3, 300))
+async def _consult_topic(cb: CallbackRequest) -> None:
+    query, context, user_id = cb.query, cb.context, cb.user_id
+    from src.consultation import consultation_manager
+    import os
+    topic = cb.payload
+    text, keyboard = consultation_manager.set_topic(user_id, topic)
+    consultation_manager.save_to_lead(user_id)
+    try:
+        from src.feedback_loop import feedback_loop
+        feedback_loop.record_outcome(user_id, 'consultation_booked')
+    except Exception:
+        pass
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+    manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
+    if manager_chat_id:
         try:
-            from src.feedback_loop import feedback_loop
-            feedback_loop.record_outcome(user_id, 'consultation_booked')
-        except Exception:
-            pass
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-        manager_chat_id = os.environ.get("MANAGER_CHAT_ID")
-        if manager_chat_id:
+            notif = consultation_manager.get_manager_notification(
+                user_id, query.from_user.username or "", query.from_user.first_name or ""
+            )
+            await context.bot.send_message(int(manager_chat_id), notif, parse_mode="HTML")
             try:
-                notif = consultation_manager.get_manager_notification(
-                    user_id, query.from_user.username or "", query.from_user.first_name or ""
-                )
-                await context.bot.send_message(int(manager_chat_id), notif, parse_mode="HTML")
-                try:
-                    from src.manager_coaching import generate_coaching_briefing
-                    briefing = generate_coaching_briefing(user_id=user_id)
-                    if briefing:
-                        await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
-                except Exception:
-                    pass
+                from src.manager_coaching import generate_coaching_briefing
+                briefing = generate_coaching_briefing(user_id=user_id)
+                if briefing:
+                    await context.bot.send_message(int(manager_chat_id), briefing, parse_mode="HTML")
             except Exception:
                 pass
+        except Exception:
+            pass
 
-    elif data == "consult_cancel":
-        await query.edit_message_text(
-            "❌ Запись отменена.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ Меню", callback_data="menu_back")]
-            ])
-        )
 
-    elif data == "offers_menu":
-        from src.countdown_offers import countdown_manager
-        text, keyboard = countdown_manager.get_offers_menu()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@router.exact("consult_cancel")
+async def _consult_cancel(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.edit_message_text(
+        "❌ Запись отменена.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("◀️ Меню", callback_data="menu_back")]
+        ])
+    )
+
+
+@router.exact("offers_menu")
+async def _offers_menu(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.countdown_offers import countdown_manager
+    text, keyboard = countdown_manager.get_offers_menu()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("claim_offer_")
+async def _claim_offer(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.countdown_offers import countdown_manager
+    offer_id = cb.payload
+    text, keyboard = countdown_manager.claim_offer(user_id, offer_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("demo_menu")
+async def _demo_menu(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.trial_demo import get_demo_menu
+    text, keyboard = get_demo_menu()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("savings_calc")
+async def _savings_calc(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.trial_demo import calculate_savings
+    text, keyboard = calculate_savings()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("crm_dashboard")
+async def _crm_dashboard(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query = cb.query
+    from src.crm_dashboard import get_crm_dashboard
+    text, keyboard = get_crm_dashboard()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("crm_hot")
+async def _crm_hot(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query = cb.query
+    from src.crm_dashboard import get_hot_leads_view
+    text, keyboard = get_hot_leads_view()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+def _parse_lead_cursor(text: str):
+    from src.leads import LeadCursor
+    return LeadCursor.decode(text)
+
+
+@router.prefix("crm_hot_", parse=_parse_lead_cursor)
+async def _crm_hot_page(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query = cb.query
+    from src.crm_dashboard import get_hot_leads_view
+    text, keyboard = get_hot_leads_view(after=cb.payload)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("crm_health")
+async def _crm_health(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query = cb.query
+    from src.crm_dashboard import get_client_health_view
+    text, keyboard = get_client_health_view()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("crm_analytics")
+async def _crm_analytics(cb: CallbackRequest) -> None:
+    if not await _require_admin(cb):
+        return
+    query = cb.query
+    from src.advanced_analytics import advanced_analytics as adv_analytics
+    try:
+        dropoff = adv_analytics.get_dropoff_analysis(days=30)
+        stages = dropoff.get("stages", {})
+        text = "📊 <b>Аналитика воронки (30 дней)</b>\n\n"
+        if stages:
+            for stage_name, stage_data in stages.items():
+                count = stage_data.get("count", 0)
+                text += f"• {stage_name}: {count}\n"
+        else:
+            text += "Данных пока недостаточно для анализа.\n"
+        text += "\n<i>Подробная аналитика доступна через /crm</i>"
+    except Exception as e:
+        logger.warning(f"CRM analytics error: {e}")
+        text = "📊 <b>Аналитика</b>\n\nДанных пока недостаточно для анализа."
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад к CRM", callback_data="crm_dashboard")],
+    ])
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("promo_enter")
+async def _promo_enter(cb: CallbackRequest) -> None:
+    query = cb.query
+    text = ("🎟 <b>Введите промокод</b>\n\n"
+            "Отправьте команду с кодом:\n"
+            "<code>/promo ВАШКОД</code>")
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад", callback_data="menu_back")],
+    ])
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("achievements_view")
+async def _achievements_view(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.achievements import achievement_manager
+    text, keyboard = achievement_manager.get_achievements_view(user_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("vip_program")
+async def _vip_program(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.achievements import get_vip_view
+    text, keyboard = get_vip_view(user_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("leaderboard")
+async def _leaderboard(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.achievements import get_leaderboard
+    text, keyboard = get_leaderboard()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("seasonal_promo")
+async def _seasonal_promo(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.achievements import get_seasonal_promo_view
+    text, keyboard = get_seasonal_promo_view()
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("next_story")
+async def _next_story(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.social_features import story_rotator
+    text, keyboard = story_rotator.get_story_view(user_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("share_story")
+async def _share_story(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.social_features import get_share_text
+    ref_code = ""
+    try:
+        from src.referrals import referral_manager
+        ref_code = referral_manager.get_referral_code(user_id)
+    except Exception:
+        pass
+    text, keyboard = get_share_text(user_id, ref_code)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("gift_catalog")
+async def _gift_catalog(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.social_features import get_gift_catalog
+    text, keyboard = get_gift_catalog(user_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.prefix("buy_gift_")
+async def _buy_gift(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.social_features import buy_gift
+    gift_id = cb.payload
+    text, keyboard = buy_gift(user_id, gift_id)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.exact("ai_coach_analyze")
+async def _ai_coach_analyze(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.edit_message_text(
+        "📊 <b>AI-коуч анализирует ваши диалоги...</b>\n\n"
+        "Для полного анализа обратитесь к менеджеру — он подготовит "
+        "персональные рекомендации по улучшению конверсии.",
+        parse_mode="HTML",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("👨‍💼 Связаться с менеджером", callback_data="request_manager")],
+            [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
+        ])
+    )
 
-    elif data.startswith("claim_offer_"):
-        from src.countdown_offers import countdown_manager
-        offer_id = data.replace("claim_offer_", "")
-        text, keyboard = countdown_manager.claim_offer(user_id, offer_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "demo_menu":
-        from src.trial_demo import get_demo_menu
-        text, keyboard = get_demo_menu()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_prices")
+async def _smart_prices(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.pricing import get_price_main_text, get_price_main_keyboard
+    await _safe_reply(query, get_price_main_text(), parse_mode="Markdown", reply_markup=get_price_main_keyboard())
 
-    elif data == "savings_calc":
-        from src.trial_demo import calculate_savings
-        text, keyboard = calculate_savings()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "crm_dashboard":
-        from src.crm_dashboard import get_crm_dashboard
-        text, keyboard = get_crm_dashboard()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_portfolio")
+async def _smart_portfolio(cb: CallbackRequest) -> None:
+    query = cb.query
+    await _safe_reply(query, PORTFOLIO_MESSAGE, parse_mode="Markdown", reply_markup=get_portfolio_keyboard())
 
-    elif data == "crm_hot":
-        from src.crm_dashboard import get_hot_leads_view
-        text, keyboard = get_hot_leads_view()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "crm_health":
-        from src.crm_dashboard import get_client_health_view
-        text, keyboard = get_client_health_view()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_faq")
+async def _smart_faq(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text("❓ Выберите вопрос:", reply_markup=get_faq_keyboard())
 
-    elif data == "crm_analytics":
-        from src.advanced_analytics import advanced_analytics as adv_analytics
-        try:
-            dropoff = adv_analytics.get_dropoff_analysis(days=30)
-            stages = dropoff.get("stages", {})
-            text = "📊 <b>Аналитика воронки (30 дней)</b>\n\n"
-            if stages:
-                for stage_name, stage_data in stages.items():
-                    count = stage_data.get("count", 0)
-                    text += f"• {stage_name}: {count}\n"
-            else:
-                text += "Данных пока недостаточно для анализа.\n"
-            text += "\n<i>Подробная аналитика доступна через /crm</i>"
-        except Exception as e:
-            logger.warning(f"CRM analytics error: {e}")
-            text = "📊 <b>Аналитика</b>\n\nДанных пока недостаточно для анализа."
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("◀️ Назад к CRM", callback_data="crm_dashboard")],
-        ])
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "promo_enter":
-        text = ("🎟 <b>Введите промокод</b>\n\n"
-                "Отправьте команду с кодом:\n"
-                "<code>/promo ВАШКОД</code>")
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("◀️ Назад", callback_data="menu_back")],
-        ])
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_calc")
+async def _smart_calc(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text("🧮 Выберите функции для расчёта:", reply_markup=get_calculator_keyboard())
 
-    elif data == "achievements_view":
-        from src.achievements import achievement_manager
-        text, keyboard = achievement_manager.get_achievements_view(user_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "vip_program":
-        from src.achievements import get_vip_view
-        text, keyboard = get_vip_view(user_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_compare")
+async def _smart_compare(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.pricing import get_price_main_text, get_price_main_keyboard
+    await _safe_reply(query, get_price_main_text(), parse_mode="Markdown", reply_markup=get_price_main_keyboard())
 
-    elif data == "leaderboard":
-        from src.achievements import get_leaderboard
-        text, keyboard = get_leaderboard()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "seasonal_promo":
-        from src.achievements import get_seasonal_promo_view
-        text, keyboard = get_seasonal_promo_view()
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+@_smart("smart_roi")
+async def _smart_roi(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text(
+        "Давайте прикинем, как быстро окупится ваш проект. "
+        "Расскажите — какая у вас сфера, примерный средний чек и сколько клиентов в месяц? "
+        "Я посчитаю всё конкретно под вас."
+    )
 
-    elif data == "next_story":
-        from src.social_features import story_rotator
-        text, keyboard = story_rotator.get_story_view(user_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
-    elif data == "share_story":
-        from src.social_features import get_share_text
-        ref_code = ""
-        try:
-            from src.referrals import referral_manager
-            ref_code = referral_manager.get_referral_code(user_id)
-        except Exception:
-            pass
-        text, keyboard = get_share_text(user_id, ref_code)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "gift_catalog":
-        from src.social_features import get_gift_catalog
-        text, keyboard = get_gift_catalog(user_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data.startswith("buy_gift_"):
-        from src.social_features import buy_gift
-        gift_id = data.replace("buy_gift_", "")
-        text, keyboard = buy_gift(user_id, gift_id)
-        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
-
-    elif data == "ai_coach_analyze":
-        await query.edit_message_text(
-            "📊 <b>AI-коуч анализирует ваши диалоги...</b>\n\n"
-            "Для полного анализа обратитесь к менеджеру — он подготовит "
-            "персональные рекомендации по улучшению конверсии.",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("👨‍💼 Связаться с менеджером", callback_data="request_manager")],
-                [InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")]
-            ])
+@_smart("smart_discount")
+async def _smart_discount(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    from src.tasks_tracker import tasks_tracker as tt_smart
+    progress = tt_smart.get_user_progress(user_id)
+    discount = progress.get_discount_percent()
+    coins = progress.total_coins
+    if discount > 0:
+        text = (
+            f"У вас уже есть скидка {discount}% и {coins} монет на счету. "
+            f"Можно ещё увеличить — до 25%. Попробуйте /bonus, там несложные задания."
         )
-
     else:
-        logger.warning(f"Unknown callback_data: {data} from user {user_id}")
-
-
-async def _handle_smart_button(query, context, data: str, user_id: int) -> None:
+        text = (
+            "Сейчас у вас скидок пока нет, но это легко исправить. "
+            "Напишите /bonus — там задания, за которые начисляются монеты. "
+            "Скидка растёт до 25%."
+        )
+    await query.message.reply_text(text)
+
+
+@_smart("smart_consult")
+async def _smart_consult(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    await query.message.reply_text(
+        "📞 Отлично! Напишите удобное время для созвона — "
+        "менеджер свяжется с вами. Или просто расскажите о проекте здесь, "
+        "и я помогу подготовить всю информацию."
+    )
+    lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
+    lead_manager.add_tag(user_id, "consult_request")
+
+
+@_smart("smart_brief")
+async def _smart_brief(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text(
+        "Отлично, давайте соберём ТЗ. Расскажите своими словами — "
+        "что за бизнес, что хотите от приложения, есть ли макеты или референсы? "
+        "Я помогу всё структурировать."
+    )
+
+
+@_smart("smart_lead")
+async def _smart_lead(cb: CallbackRequest) -> None:
+    query, user_id = cb.query, cb.user_id
+    lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
+    from src.leads import LeadPriority
+    lead_manager.update_lead(user_id, score=40, priority=LeadPriority.HOT)
+    await query.message.reply_text(
+        "Записал! Менеджер свяжется с вами в ближайшее время. "
+        "А пока можем продолжить — расскажите, что хотите реализовать, и я помогу подготовить детали."
+    )
+
+
+@_smart("smart_payment")
+async def _smart_payment(cb: CallbackRequest) -> None:
+    query = cb.query
+    from src.payments import get_payment_keyboard
+    await query.message.reply_text("💳 Выберите способ оплаты:", reply_markup=get_payment_keyboard())
+
+
+@_smart("smart_contract")
+async def _smart_contract(cb: CallbackRequest) -> None:
+    query = cb.query
+    await query.message.reply_text(
+        "Договор подготовим после того, как согласуем ТЗ и стоимость. "
+        "Если ещё не обсудили детали — давайте начнём с описания проекта, а дальше я всё оформлю.",
+        reply_markup=get_lead_keyboard()
+    )
+
+
+@_smart("smart_manager", rate=(3, 300))
+async def _smart_manager(cb: CallbackRequest) -> None:
+    query, context, user_id = cb.query, cb.context, cb.user_id
     import os
-
-    async def _safe_reply(text, parse_mode=None, reply_markup=None):
+    lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
+    lead_manager.add_tag(user_id, "manager_request")
+    await query.message.reply_text("📞 Запрос передан менеджеру. Он свяжется с вами в ближайшее время!")
+    manager_id = os.environ.get("MANAGER_CHAT_ID")
+    if manager_id:
         try:
-            await query.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
-        except Exception:
-            await query.message.reply_text(text, reply_markup=reply_markup)
-
-    if data == "smart_prices":
-        from src.pricing import get_price_main_text, get_price_main_keyboard
-        await _safe_reply(get_price_main_text(), parse_mode="Markdown", reply_markup=get_price_main_keyboard())
-
-    elif data == "smart_portfolio":
-        await _safe_reply(PORTFOLIO_MESSAGE, parse_mode="Markdown", reply_markup=get_portfolio_keyboard())
-
-    elif data == "smart_faq":
-        await query.message.reply_text("❓ Выберите вопрос:", reply_markup=get_faq_keyboard())
-
-    elif data == "smart_calc":
-        await query.message.reply_text("🧮 Выберите функции для расчёта:", reply_markup=get_calculator_keyboard())
-
-    elif data == "smart_compare":
-        from src.pricing import get_price_main_text, get_price_main_keyboard
-        await _safe_reply(get_price_main_text(), parse_mode="Markdown", reply_markup=get_price_main_keyboard())
-
-    elif data == "smart_roi":
-        await query.message.reply_text(
-            "Давайте прикинем, как быстро окупится ваш проект. "
-            "Расскажите — какая у вас сфера, примерный средний чек и сколько клиентов в месяц? "
-            "Я посчитаю всё конкретно под вас."
-        )
-
-    elif data == "smart_discount":
-        from src.tasks_tracker import tasks_tracker as tt_smart
-        progress = tt_smart.get_user_progress(user_id)
-        discount = progress.get_discount_percent()
-        coins = progress.total_coins
-        if discount > 0:
-            text = (
-                f"У вас уже есть скидка {discount}% и {coins} монет на счету. "
-                f"Можно ещё увеличить — до 25%. Попробуйте /bonus, там несложные задания."
-            )
-        else:
-            text = (
-                "Сейчас у вас скидок пока нет, но это легко исправить. "
-                "Напишите /bonus — там задания, за которые начисляются монеты. "
-                "Скидка растёт до 25%."
+            await context.bot.send_message(
+                int(manager_id),
+                f"🔔 Запрос от клиента\n"
+                f"👤 {query.from_user.first_name} (@{query.from_user.username or 'нет'})\n"
+                f"🆔 {user_id}",
+                parse_mode="HTML"
             )
-        await query.message.reply_text(text)
-
-    elif data == "smart_consult":
-        await query.message.reply_text(
-            "📞 Отлично! Напишите удобное время для созвона — "
-            "менеджер свяжется с вами. Или просто расскажите о проекте здесь, "
-            "и я помогу подготовить всю информацию."
-        )
-        lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
-        lead_manager.add_tag(user_id, "consult_request")
-
-    elif data == "smart_brief":
-        await query.message.reply_text(
-            "Отлично, давайте соберём ТЗ. Расскажите своими словами — "
-            "что за бизнес, что хотите от приложения, есть ли макеты или референсы? "
-            "Я помогу всё структурировать."
-        )
-
-    elif data == "smart_lead":
-        lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
-        from src.leads import LeadPriority
-        lead_manager.update_lead(user_id, score=40, priority=LeadPriority.HOT)
-        await query.message.reply_text(
-            "Записал! Менеджер свяжется с вами в ближайшее время. "
-            "А пока можем продолжить — расскажите, что хотите реализовать, и я помогу подготовить детали."
-        )
-
-    elif data == "smart_payment":
-        from src.payments import get_payment_keyboard
-        await query.message.reply_text("💳 Выберите способ оплаты:", reply_markup=get_payment_keyboard())
-
-    elif data == "smart_contract":
-        await query.message.reply_text(
-            "Договор подготовим после того, как согласуем ТЗ и стоимость. "
-            "Если ещё не обсудили детали — давайте начнём с описания проекта, а дальше я всё оформлю.",
-            reply_markup=get_lead_keyboard()
-        )
-
-    elif data == "smart_manager":
-        lead_manager.create_lead(user_id=user_id, username=query.from_user.username, first_name=query.from_user.first_name)
-        lead_manager.add_tag(user_id, "manager_request")
-        await query.message.reply_text("📞 Запрос передан менеджеру. Он свяжется с вами в ближайшее время!")
-        manager_id = os.environ.get("MANAGER_CHAT_ID")
-        if manager_id:
-            try:
-                await context.bot.send_message(
-                    int(manager_id),
-                    f"🔔 Запрос от клиента\n"
-                    f"👤 {query.from_user.first_name} (@{query.from_user.username or 'нет'})\n"
-                    f"🆔 {user_id}",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-
-    else:
-        logger.warning(f"Unknown smart button: {data}")
+        except Exception:
+            pass
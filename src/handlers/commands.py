@@ -13,7 +13,7 @@ from src.keyboards import (
     get_faq_keyboard
 )
 from src.calculator import calculator_manager
-from src.knowledge_base import HELP_MESSAGE, PORTFOLIO_MESSAGE, CONTACT_MESSAGE, CLEAR_MESSAGE, PRIVACY_POLICY, FAQ_DATA, WELCOME_MESSAGE_RETURNING
+from src.knowledge_base import HELP_MESSAGE, PORTFOLIO_MESSAGE, CONTACT_MESSAGE, CLEAR_MESSAGE, PRIVACY_POLICY, WELCOME_MESSAGE_RETURNING
 from src.tasks_tracker import tasks_tracker
 from src.referrals import referral_manager, REFERRER_REWARD, REFERRED_REWARD
 from src.pricing import get_price_main_text, get_price_main_keyboard
@@ -21,6 +21,7 @@ from src.ab_testing import ab_testing
 from src.keyboards import get_portfolio_keyboard
 from src.analytics import analytics, FunnelEvent
 from src.bot_api import copy_text_button, styled_button_api_kwargs
+from src.tts_cache import send_voice
 
 from src.handlers.utils import WELCOME_MESSAGES, get_welcome_message
 from src.handlers.media import generate_voice_response
@@ -191,9 +192,8 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         voice_greeting = None
         try:
             from google.genai import types as genai_types
-            from src.config import config as app_config, get_gemini_client
-
-            ai_client_greet = get_gemini_client()
+            from src.ai_scheduler import ai_scheduler
+            from src.config import config as app_config
 
             if is_returning:
                 greet_prompt = (
@@ -265,11 +265,10 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 )
 
             greet_response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    ai_client_greet.models.generate_content,
-                    model=app_config.model_name,
-                    contents=[greet_prompt],
-                    config=genai_types.GenerateContentConfig(
+                ai_scheduler.generate(
+                    app_config.model_name,
+                    [greet_prompt],
+                    genai_types.GenerateContentConfig(
                         max_output_tokens=500,
                         temperature=0.85
                     )
@@ -330,7 +329,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                     raise RuntimeError(f"Voice audio too small: {len(voice_audio) if voice_audio else 0} bytes")
 
                 logger.info(f"Voice greeting: TTS success, {len(voice_audio)} bytes, sending to Telegram for user {user.id}")
-                await bot_instance.send_voice(chat_id=chat_id, voice=voice_audio)
+                await send_voice(bot_instance.send_voice, voice_audio, chat_id=chat_id)
                 ab_testing.track_event(user.id, "welcome_voice", "voice_sent")
                 logger.info(f"Voice greeting SENT to user {user.id} (period={time_period}, attempt={_attempt+1}, size={len(voice_audio)} bytes)")
                 recording_indicator_task.cancel()
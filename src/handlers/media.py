@@ -1,8 +1,9 @@
 import asyncio
 import logging
+import os
 import re
-import hashlib
 import time
+from typing import Optional
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
@@ -11,10 +12,13 @@ from src.session import session_manager
 from src.config import config
 from src.leads import lead_manager
 from src.keyboards import get_loyalty_menu_keyboard
+from src.metrics import registry, timed
+from src.monitoring import monitor, track_handler
+from src.tts_cache import tts_cache, clip_key, phrase_key, send_voice
+from src.tracing import span, trace_handler
 
 from src.handlers.utils import (
-    send_typing_action, apply_stress_marks, expand_abbreviations,
-    numbers_to_words, naturalize_speech,
+    send_typing_action, normalize_speech,
     loyalty_system, MANAGER_CHAT_ID
 )
 
@@ -22,12 +26,19 @@ logger = logging.getLogger(__name__)
 
 _elevenlabs_client = None
 _elevenlabs_async_client = None
-_voice_cache = {}
 
 STREAMING_LATENCY_OPTIMIZATION = 3
 SHORT_TEXT_THRESHOLD = 200
 SHORT_TEXT_FORMAT = "mp3_22050_32"
 LONG_TEXT_FORMAT = "mp3_44100_128"
+TTS_MODEL_ID = "eleven_v3"
+
+VOICE_SEGMENT_FORMAT = "opus_48000_64"
+VOICE_SEGMENT_CONCURRENCY = int(os.environ.get("TTS_SEGMENT_CONCURRENCY", "3"))
+VOICE_SEGMENT_MIN_CHARS = 60
+VOICE_SPLIT_MIN_CHARS = 160
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[!?])\s+|(?<=[^.]\.)\s+')
+VOICE_BRIDGE_DRAFT_SENTENCES = 3
 
 
 def _get_elevenlabs_client():
@@ -139,17 +150,14 @@ async def enhance_voice_text(text: str) -> str:
         return _auto_enhance_short(text)
 
     from google.genai import types
-    from src.config import get_gemini_client
-
-    client = get_gemini_client()
+    from src.ai_scheduler import ai_scheduler
 
     try:
         response = await asyncio.wait_for(
-            asyncio.to_thread(
-                client.models.generate_content,
-                model=config.model_name,
-                contents=[VOICE_ENHANCE_PROMPT + text],
-                config=types.GenerateContentConfig(
+            ai_scheduler.generate(
+                config.model_name,
+                [VOICE_ENHANCE_PROMPT + text],
+                types.GenerateContentConfig(
                     max_output_tokens=2000,
                     temperature=0.2
                 )
@@ -309,7 +317,7 @@ async def _generate_voice_streaming_async(voice_text: str, profile: dict, output
             stream_kwargs = {
                 "voice_id": config.elevenlabs_voice_id,
                 "text": voice_text,
-                "model_id": "eleven_v3",
+                "model_id": TTS_MODEL_ID,
                 "output_format": output_format,
                 "voice_settings": VoiceSettings(
                     stability=profile["stability"],
@@ -338,6 +346,7 @@ async def _generate_voice_streaming_async(voice_text: str, profile: dict, output
         audio_bytes = b"".join(chunks)
         total_time = time.monotonic() - start_time
         ttfb = (first_chunk_time - start_time) if first_chunk_time else total_time
+        registry.observe("tts_first_byte_seconds", ttfb, format=output_format)
 
         logger.info(
             f"Streaming TTS: {len(voice_text)} chars → {len(audio_bytes)} bytes, "
@@ -367,7 +376,7 @@ async def _generate_voice_sync_fallback(voice_text: str, profile: dict, output_f
         el_client.text_to_speech.convert,
         voice_id=config.elevenlabs_voice_id,
         text=voice_text,
-        model_id="eleven_v3",
+        model_id=TTS_MODEL_ID,
         output_format=output_format,
         voice_settings=VoiceSettings(
             stability=profile["stability"],
@@ -385,30 +394,15 @@ async def _generate_voice_sync_fallback(voice_text: str, profile: dict, output_f
     return audio_bytes
 
 
-async def generate_voice_response(text: str, use_cache: bool = False, voice_profile: str = None, skip_enhance: bool = False) -> bytes:
-    global _voice_cache
-    
-    if not config.elevenlabs_api_key:
-        raise RuntimeError("ElevenLabs client not configured")
-
-    clean_text = _clean_text_for_voice(text)
-    
-    if use_cache:
-        cache_key = hashlib.md5(clean_text.encode()).hexdigest()
-        if cache_key in _voice_cache:
-            logger.debug("Using cached voice response")
-            return _voice_cache[cache_key]
-
+async def _prepare_voice_text(clean_text: str, voice_profile: str = None, skip_enhance: bool = False):
+    """Enhanced, speech-normalized text for ElevenLabs and its voice settings."""
     if skip_enhance:
         voice_text = clean_text
         logger.debug("Skipping enhance_voice_text (skip_enhance=True)")
     else:
         voice_text = await enhance_voice_text(clean_text)
 
-    voice_text = naturalize_speech(voice_text)
-    voice_text = expand_abbreviations(voice_text)
-    voice_text = numbers_to_words(voice_text)
-    voice_text = apply_stress_marks(voice_text)
+    voice_text = normalize_speech(voice_text)
 
     voice_text = voice_text.rstrip()
     if voice_text and voice_text[-1] not in '.!?…':
@@ -438,81 +432,148 @@ async def generate_voice_response(text: str, use_cache: bool = False, voice_prof
         profile = VOICE_PROFILES[voice_profile]
     else:
         profile = _detect_voice_profile(voice_text)
+    return voice_text, profile
 
-    output_format = _select_output_format(len(voice_text))
 
+async def _synthesize(voice_text: str, profile: dict, output_format: str, phrase: str = None) -> bytes:
+    key = clip_key(voice_text, profile, output_format, config.elevenlabs_voice_id, TTS_MODEL_ID)
+    cached = await asyncio.to_thread(tts_cache.get, key)
+    if cached:
+        if phrase:
+            await asyncio.to_thread(tts_cache.link_phrase, phrase, key)
+        return cached
+
+    started = time.perf_counter()
     try:
         audio_bytes = await _generate_voice_streaming_async(voice_text, profile, output_format)
+    except Exception:
+        monitor.track_external("elevenlabs", time.perf_counter() - started, success=False, operation="tts")
+        raise
+    monitor.track_external("elevenlabs", time.perf_counter() - started, success=bool(audio_bytes), operation="tts")
+    if not audio_bytes:
+        raise RuntimeError("Empty audio response from TTS")
+    await asyncio.to_thread(tts_cache.put, key, audio_bytes, phrase)
+    return audio_bytes
 
-        if not audio_bytes:
-            raise RuntimeError("Empty audio response from TTS")
 
-        if use_cache:
-            cache_key = hashlib.md5(clean_text.encode()).hexdigest()
-            _voice_cache[cache_key] = audio_bytes
-            if len(_voice_cache) > 10:
-                oldest = next(iter(_voice_cache))
-                del _voice_cache[oldest]
-        
-        return audio_bytes
+async def generate_voice_response(text: str, use_cache: bool = True, voice_profile: str = None, skip_enhance: bool = False) -> bytes:
+    """Synthesize ``text`` through ElevenLabs, reusing cached clips.
+
+    With ``use_cache`` a phrase spoken before is returned without the
+    enhance call; ``use_cache=False`` re-runs enhancement for variety, and
+    the clip cache then only hits when the enhanced text repeats exactly.
+    """
+    if not config.elevenlabs_api_key:
+        raise RuntimeError("ElevenLabs client not configured")
+
+    clean_text = _clean_text_for_voice(text)
+
+    phrase = phrase_key(clean_text, voice_profile, not skip_enhance)
+    if use_cache:
+        cached = await asyncio.to_thread(tts_cache.get_phrase, phrase)
+        if cached:
+            logger.debug("Using cached voice response")
+            return cached
+
+    voice_text, profile = await _prepare_voice_text(clean_text, voice_profile, skip_enhance)
+    output_format = _select_output_format(len(voice_text))
+
+    try:
+        return await _synthesize(voice_text, profile, output_format, phrase=phrase)
     except Exception as e:
         logger.error(f"ElevenLabs voice generation failed ({type(e).__name__}): {e}")
         raise
 
 
-async def _transcribe_voice(voice_bytes: bytes) -> str:
-    result = await _transcribe_voice_with_emotion(voice_bytes)
-    return result.get("text", "")
+def _split_voice_segments(voice_text: str) -> list:
+    """Sentence-sized pieces of ``voice_text``; short sentences are merged forward."""
+    segments = []
+    for sentence in _SENTENCE_BOUNDARY.split(voice_text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if segments and len(segments[-1]) < VOICE_SEGMENT_MIN_CHARS:
+            segments[-1] += " " + sentence
+        else:
+            segments.append(sentence)
+    if len(segments) > 1 and len(segments[-1]) < VOICE_SEGMENT_MIN_CHARS // 2:
+        segments[-2] += " " + segments.pop()
+    return segments
+
+
+async def send_voice_streaming(send, text: str, voice_profile: str = None,
+                               skip_enhance: bool = False, **send_kwargs) -> int:
+    """Speak ``text`` through ``send`` without waiting for the whole clip.
+
+    The text is split into sentences that are synthesized concurrently (at
+    most VOICE_SEGMENT_CONCURRENCY at a time). The first sentence goes out as
+    its own voice note as soon as it is ready; the rest are joined into a
+    second note without re-encoding. Texts shorter than VOICE_SPLIT_MIN_CHARS
+    are still sent as one note. Returns the number of audio bytes sent and
+    raises if not even the first note could be sent.
+    """
+    if not config.elevenlabs_api_key:
+        raise RuntimeError("ElevenLabs client not configured")
+    from src.audio_pipeline import concat_ogg_opus
+
+    start = time.perf_counter()
+    clean_text = _clean_text_for_voice(text)
+    voice_text, profile = await _prepare_voice_text(clean_text, voice_profile, skip_enhance)
 
+    segments = _split_voice_segments(voice_text)
+    if len(voice_text) < VOICE_SPLIT_MIN_CHARS or len(segments) < 2:
+        segments = [voice_text]
+    slots = asyncio.Semaphore(VOICE_SEGMENT_CONCURRENCY)
 
-async def _convert_ogg_to_wav(ogg_bytes: bytes) -> bytes:
-    import tempfile
-    import os
-    from io import BytesIO
+    async def synthesize(segment: str) -> bytes:
+        async with slots:
+            with timed("tts_segment_seconds"):
+                return await _synthesize(segment, profile, VOICE_SEGMENT_FORMAT)
 
+    tasks = [asyncio.ensure_future(synthesize(segment)) for segment in segments]
     try:
-        from pydub import AudioSegment
-        audio = AudioSegment.from_ogg(BytesIO(ogg_bytes))
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        wav_buffer = BytesIO()
-        audio.export(wav_buffer, format="wav")
-        wav_data = wav_buffer.getvalue()
-        logger.info(f"Converted OGG ({len(ogg_bytes)} bytes) to WAV ({len(wav_data)} bytes) via pydub")
-        return wav_data
-    except Exception as e:
-        logger.warning(f"pydub conversion failed: {e}")
+        first = await tasks[0]
+        if len(first) < 100:
+            raise RuntimeError(f"Voice audio too small: {len(first)} bytes")
+        await send_voice(send, first, **send_kwargs)
+        registry.observe("voice_time_to_first_audio_seconds", time.perf_counter() - start,
+                         segments=min(len(segments), 2))
+        sent = len(first)
+
+        if len(tasks) > 1:
+            try:
+                rest = await asyncio.gather(*tasks[1:])
+                try:
+                    notes = [concat_ogg_opus(rest)]
+                except ValueError as e:
+                    logger.warning(f"Cannot join voice segments ({e}), sending them separately")
+                    notes = list(rest)
+                for note in notes:
+                    await send_voice(send, note, **send_kwargs)
+                    sent += len(note)
+            except Exception as e:
+                registry.inc("voice_stream_partial_total")
+                logger.warning(f"Voice continuation failed after first note ({type(e).__name__}): {e}")
 
-    ogg_path = None
-    wav_path = None
-    try:
-        import subprocess
-        with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as ogg_file:
-            ogg_file.write(ogg_bytes)
-            ogg_path = ogg_file.name
-        wav_path = ogg_path.replace('.ogg', '.wav')
-        result = subprocess.run(
-            ['ffmpeg', '-y', '-i', ogg_path, '-ar', '16000', '-ac', '1', '-f', 'wav', wav_path],
-            capture_output=True, timeout=15
+        logger.info(
+            f"Streamed voice: {len(voice_text)} chars in {len(segments)} segments, "
+            f"{sent} bytes, total={time.perf_counter() - start:.2f}s"
         )
-        if result.returncode == 0:
-            with open(wav_path, 'rb') as f:
-                wav_data = f.read()
-            logger.info(f"Converted OGG ({len(ogg_bytes)} bytes) to WAV ({len(wav_data)} bytes) via ffmpeg")
-            return wav_data
-        else:
-            logger.warning(f"ffmpeg conversion failed: {result.stderr[:200]}")
-    except FileNotFoundError:
-        logger.warning("ffmpeg not found")
-    except Exception as e:
-        logger.warning(f"ffmpeg conversion error: {e}")
+        return sent
     finally:
-        for p in [ogg_path, wav_path]:
-            if p:
-                try:
-                    os.unlink(p)
-                except Exception:
-                    pass
-    return b""
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _transcribe_voice(voice_bytes: bytes) -> str:
+    result = await _transcribe_voice_with_emotion(voice_bytes)
+    return result.get("text", "")
+
+
+async def _convert_ogg_to_wav(ogg_bytes: bytes) -> bytes:
+    from src.audio_pipeline import ogg_to_wav
+    return await ogg_to_wav(ogg_bytes)
 
 
 def _parse_emotion_json(raw: str) -> dict:
@@ -561,115 +622,109 @@ def _parse_emotion_json(raw: str) -> dict:
     return {"text": "", "emotion": "neutral", "energy": "medium"}
 
 
-async def _transcribe_voice_with_emotion(voice_bytes: bytes) -> dict:
-    from google import genai
-    from google.genai import types
-    import tempfile
-    import os
+INLINE_AUDIO_MAX_BYTES = 14 * 1024 * 1024
 
-    from src.config import get_gemini_client
-    client = get_gemini_client()
-    audio_model = config.audio_model_name
-
-    prompt_text = (
-        "Проанализируй это голосовое сообщение. Верни JSON:\n"
-        '{"text": "дословная расшифровка на языке оригинала", '
-        '"emotion": "одно слово: confident/hesitant/frustrated/excited/neutral/friendly/rushed/calm", '
-        '"energy": "low/medium/high"}\n'
-        "Если не можешь разобрать текст — верни пустой text.\n"
-        "Верни ТОЛЬКО JSON, без комментариев и markdown."
+TRANSCRIBE_PROMPT = (
+    "Проанализируй это голосовое сообщение. Верни JSON:\n"
+    '{"text": "дословная расшифровка на языке оригинала", '
+    '"emotion": "одно слово: confident/hesitant/frustrated/excited/neutral/friendly/rushed/calm", '
+    '"energy": "low/medium/high"}\n'
+    "Если не можешь разобрать текст — верни пустой text.\n"
+    "Верни ТОЛЬКО JSON, без комментариев и markdown."
+)
+
+
+async def _transcribe_audio_part(audio_part, strategy_name: str):
+    from google.genai import types
+    from src.ai_scheduler import ai_scheduler
+
+    response = await ai_scheduler.generate(
+        config.audio_model_name,
+        [audio_part, types.Part(text=TRANSCRIBE_PROMPT)],
+        types.GenerateContentConfig(
+            max_output_tokens=600,
+            temperature=0.1
+        )
     )
 
-    wav_bytes = await _convert_ogg_to_wav(voice_bytes)
+    resp_text = None
+    try:
+        resp_text = response.text
+    except (ValueError, AttributeError):
+        candidates = getattr(response, 'candidates', None)
+        if candidates and len(candidates) > 0:
+            parts = getattr(candidates[0].content, 'parts', [])
+            if parts:
+                resp_text = getattr(parts[0], 'text', None)
+
+    logger.info(f"[{strategy_name}] model={config.audio_model_name}, response={resp_text[:300] if resp_text else 'None'}")
+    if not resp_text:
+        logger.warning(f"[{strategy_name}] No text in response, candidates={getattr(response, 'candidates', 'N/A')}")
+        return None
+    result = _parse_emotion_json(resp_text.strip())
+    if not result["text"]:
+        logger.warning(f"[{strategy_name}] Parsed text is empty from raw: {resp_text[:300]}")
+        return None
+    return result
+
+
+def _inline_strategy(client, data: bytes, mime: str, name: str):
+    async def attempt():
+        from google.genai import types
+        return await _transcribe_audio_part(types.Part.from_bytes(data=data, mime_type=mime), name)
+    return name, attempt
+
+
+def _files_api_strategy(client, data: bytes, mime: str, name: str):
+    async def attempt():
+        from io import BytesIO
+        from google.genai import types
+        uploaded_file = await asyncio.to_thread(
+            client.files.upload,
+            file=BytesIO(data),
+            config=types.UploadFileConfig(mime_type=mime)
+        )
+        try:
+            logger.info(f"[{name}] Uploaded {len(data)} bytes, uri={uploaded_file.uri}")
+            part = types.Part.from_uri(file_uri=uploaded_file.uri, mime_type=mime)
+            return await _transcribe_audio_part(part, name)
+        finally:
+            try:
+                await asyncio.to_thread(client.files.delete, name=uploaded_file.name)
+            except Exception:
+                pass
+    return name, attempt
 
-    strategies = []
 
-    if wav_bytes:
-        strategies.append(("files_api_wav", wav_bytes, "audio/wav", ".wav"))
-        strategies.append(("inline_wav", wav_bytes, "audio/wav", None))
-    strategies.append(("files_api_ogg", bytes(voice_bytes), "audio/ogg", ".ogg"))
-    strategies.append(("inline_ogg", bytes(voice_bytes), "audio/ogg", None))
+async def _transcribe_voice_with_emotion(voice_bytes: bytes) -> dict:
+    """Transcribe a voice note with one request picked by payload size.
 
-    for strategy_name, audio_data, mime, suffix in strategies:
-        uploaded_file = None
-        tmp_path = None
-        try:
-            if strategy_name.startswith("files_api"):
-                try:
-                    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-                        tmp.write(audio_data)
-                        tmp_path = tmp.name
-
-                    upload_config = types.UploadFileConfig(mime_type=mime)
-                    uploaded_file = await asyncio.to_thread(
-                        client.files.upload,
-                        file=tmp_path,
-                        config=upload_config
-                    )
-                    logger.info(f"[{strategy_name}] Uploaded {len(audio_data)} bytes, uri={uploaded_file.uri}, mime={uploaded_file.mime_type}")
+    16 kHz WAV is preferred and sent inline while it fits the inline request
+    limit, otherwise through the Files API. Only if that fails are the OGG
+    alternatives raced against each other.
+    """
+    from src.audio_pipeline import first_success
+    from src.config import get_gemini_client
+    client = get_gemini_client()
 
-                    audio_part = types.Part.from_uri(
-                        file_uri=uploaded_file.uri,
-                        mime_type=mime
-                    )
-                except Exception as upload_err:
-                    logger.warning(f"[{strategy_name}] Upload failed: {upload_err}")
-                    continue
-                finally:
-                    if tmp_path:
-                        try:
-                            os.unlink(tmp_path)
-                        except Exception:
-                            pass
-            else:
-                audio_part = types.Part.from_bytes(data=audio_data, mime_type=mime)
-                logger.info(f"[{strategy_name}] Using inline {len(audio_data)} bytes, mime={mime}")
-
-            text_part = types.Part(text=prompt_text)
-
-            response = await asyncio.to_thread(
-                client.models.generate_content,
-                model=audio_model,
-                contents=[audio_part, text_part],
-                config=types.GenerateContentConfig(
-                    max_output_tokens=600,
-                    temperature=0.1
-                )
-            )
+    ogg_bytes = bytes(voice_bytes)
+    wav_bytes = await _convert_ogg_to_wav(ogg_bytes)
 
-            resp_text = None
-            try:
-                resp_text = response.text
-            except (ValueError, AttributeError):
-                candidates = getattr(response, 'candidates', None)
-                if candidates and len(candidates) > 0:
-                    parts = getattr(candidates[0].content, 'parts', [])
-                    if parts:
-                        resp_text = getattr(parts[0], 'text', None)
-
-            logger.info(f"[{strategy_name}] model={audio_model}, response={resp_text[:300] if resp_text else 'None'}")
-
-            if resp_text:
-                result = _parse_emotion_json(resp_text.strip())
-                if result["text"]:
-                    if uploaded_file:
-                        try:
-                            await asyncio.to_thread(client.files.delete, name=uploaded_file.name)
-                        except Exception:
-                            pass
-                    return result
-                logger.warning(f"[{strategy_name}] Parsed text is empty from raw: {resp_text[:300]}")
-            else:
-                logger.warning(f"[{strategy_name}] No text in response, candidates={getattr(response, 'candidates', 'N/A')}")
+    attempts = []
+    for label, data, mime in (("wav", wav_bytes, "audio/wav"), ("ogg", ogg_bytes, "audio/ogg")):
+        if not data:
+            continue
+        if len(data) <= INLINE_AUDIO_MAX_BYTES:
+            attempts.append(_inline_strategy(client, data, mime, f"inline_{label}"))
+        else:
+            attempts.append(_files_api_strategy(client, data, mime, f"files_api_{label}"))
+    if len(ogg_bytes) <= INLINE_AUDIO_MAX_BYTES:
+        attempts.append(_files_api_strategy(client, ogg_bytes, "audio/ogg", "files_api_ogg"))
 
-        except Exception as e:
-            logger.error(f"[{strategy_name}] Transcription error: {e}", exc_info=True)
-        finally:
-            if uploaded_file:
-                try:
-                    await asyncio.to_thread(client.files.delete, name=uploaded_file.name)
-                except Exception:
-                    pass
+    strategy, result = await first_success(attempts, "voice_transcribe_total")
+    if result:
+        logger.info(f"Voice transcribed via {strategy}")
+        return result
 
     logger.error(f"All transcription strategies failed for {len(voice_bytes)} bytes audio")
     return {"text": "", "emotion": "neutral", "energy": "medium"}
@@ -704,13 +759,18 @@ SMART_VOICE_COOLDOWN = 300
 SMART_VOICE_MAX_PER_SESSION = 5
 
 
-def should_send_smart_voice(user_id: int, message_text: str, context_user_data: dict, response_text: str = "") -> dict:
+def should_send_smart_voice(user_id: int, message_text: str, context_user_data: dict, response_text: str = "",
+                            commit: bool = True) -> dict:
     """Smart voice strategy — decides WHEN and HOW to send voice.
     
     Returns dict:
       {"send": False} — text only
       {"send": True, "mode": "full", "profile": "..."} — full voice response
       {"send": True, "mode": "bridge", "profile": "..."} — short voice bridge + text details
+
+    With ``commit=False`` the decision does not use up the session's voice
+    budget; it can then be made before the reply exists and confirmed
+    with ``commit_smart_voice``.
     """
     import time as _time
 
@@ -728,7 +788,6 @@ def should_send_smart_voice(user_id: int, message_text: str, context_user_data:
         return result_no
 
     lower = message_text.lower()
-    resp_len = len(response_text)
 
     trigger_type = None
     voice_profile = "default"
@@ -801,23 +860,33 @@ def should_send_smart_voice(user_id: int, message_text: str, context_user_data:
 
     _detected_rushed = any(w in lower for w in VOICE_SENTIMENT_TRIGGERS.get("rushed", []))
     mode = "full"
-    if resp_len > 500:
-        mode = "bridge"
     if _detected_rushed:
         mode = "bridge"
     if trigger_type == "sentiment_rushed":
         voice_profile = "factual"
 
-    context_user_data['last_smart_voice_ts'] = _time.time()
-    context_user_data['smart_voice_count'] = voice_count + 1
-
-    return {
+    decision = {
         "send": True,
         "mode": mode,
         "profile": voice_profile,
         "trigger": trigger_type,
         "priority": priority,
     }
+    if commit:
+        return commit_smart_voice(decision, context_user_data, response_text)
+    return decision
+
+
+def commit_smart_voice(decision: dict, context_user_data: dict, response_text: str = "") -> dict:
+    """Count a positive voice decision against the session budget and cooldown.
+
+    Long replies switch the decision to bridge mode.
+    """
+    if len(response_text) > 500:
+        decision = {**decision, "mode": "bridge"}
+    context_user_data['last_smart_voice_ts'] = time.time()
+    context_user_data['smart_voice_count'] = context_user_data.get('smart_voice_count', 0) + 1
+    return decision
 
 
 def should_send_proactive_voice(user_id: int, message_text: str, context_user_data: dict) -> bool:
@@ -826,16 +895,15 @@ def should_send_proactive_voice(user_id: int, message_text: str, context_user_da
     return result.get("send", False)
 
 
-async def generate_voice_bridge(full_response: str, user_message: str, voice_profile: str = "default") -> bytes:
-    """Generate short 2-3 sentence voice bridge for long responses.
-    
+async def voice_bridge_text(full_response: str, user_message: str) -> str:
+    """Short 2-3 sentence voice bridge for long responses.
+
     Instead of reading the entire long response, Алекс says the KEY POINT
     and a CTA, while the full text goes as a regular message.
     """
     from google.genai import types as genai_types
-    from src.config import config as app_config, get_gemini_client
-
-    client = get_gemini_client()
+    from src.ai_scheduler import ai_scheduler
+    from src.config import config as app_config
 
     safe_response = full_response[:800] if len(full_response) > 800 else full_response
 
@@ -862,11 +930,10 @@ async def generate_voice_bridge(full_response: str, user_message: str, voice_pro
     )
 
     try:
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model=app_config.model_name,
-            contents=[prompt],
-            config=genai_types.GenerateContentConfig(
+        response = await ai_scheduler.generate(
+            app_config.model_name,
+            [prompt],
+            genai_types.GenerateContentConfig(
                 max_output_tokens=400,
                 temperature=0.6
             )
@@ -879,18 +946,30 @@ async def generate_voice_bridge(full_response: str, user_message: str, voice_pro
             bridge_text = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF]+', '', bridge_text)
             clean = re.sub(r'\[\w[\w\s]*?\]\s*', '', bridge_text)
             if 50 < len(clean) < 400:
-                return await generate_voice_response(bridge_text, voice_profile=voice_profile)
+                return bridge_text
 
     except Exception as e:
         logger.warning(f"Voice bridge generation failed: {e}")
 
-    try:
-        summary = _make_text_summary(full_response, max_len=250)
-        bridge_fallback = f"[warm] {summary}"
-        return await generate_voice_response(bridge_fallback, voice_profile=voice_profile)
-    except Exception as fb_err:
-        logger.error(f"Voice bridge fallback also failed: {fb_err}")
-        raise
+    summary = _make_text_summary(full_response, max_len=250)
+    return f"[warm] {summary}"
+
+
+async def generate_voice_bridge(full_response: str, user_message: str, voice_profile: str = "default") -> bytes:
+    bridge_text = await voice_bridge_text(full_response, user_message)
+    return await generate_voice_response(bridge_text, voice_profile=voice_profile)
+
+
+async def send_voice_bridge(send, full_response: str, user_message: str,
+                            voice_profile: str = "default", bridge_text: Optional[str] = None,
+                            **send_kwargs) -> int:
+    """Speak the voice bridge through ``send`` sentence by sentence; returns bytes sent.
+
+    ``bridge_text`` is a bridge already drafted while the reply was streaming.
+    """
+    if not bridge_text:
+        bridge_text = await voice_bridge_text(full_response, user_message)
+    return await send_voice_streaming(send, bridge_text, voice_profile=voice_profile, **send_kwargs)
 
 
 def _make_text_summary(full_text: str, max_len: int = 300) -> str:
@@ -907,20 +986,26 @@ def _make_text_summary(full_text: str, max_len: int = 300) -> str:
     return clean[:max_len].strip() + "..."
 
 
+@trace_handler("voice")
 async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
+    started = time.time()
 
     typing_task = asyncio.create_task(
         send_typing_action(update, duration=60.0)
     )
 
     try:
+        received_at = time.perf_counter()
         voice = update.message.voice
-        file = await context.bot.get_file(voice.file_id)
-        voice_bytes = await file.download_as_bytearray()
+        with span("telegram.download", kind="voice"):
+            file = await context.bot.get_file(voice.file_id)
+            voice_bytes = await file.download_as_bytearray()
 
-        voice_analysis = await _transcribe_voice_with_emotion(voice_bytes)
+        with span("voice.transcribe", size=len(voice_bytes)):
+            voice_analysis = await _transcribe_voice_with_emotion(voice_bytes)
         transcription = voice_analysis.get("text", "")
+        registry.observe("voice_to_text_seconds", time.perf_counter() - received_at)
         client_emotion = voice_analysis.get("emotion", "neutral")
         client_energy = voice_analysis.get("energy", "medium")
 
@@ -929,18 +1014,19 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             await update.message.reply_text(
                 "Не удалось распознать сообщение. Попробуйте ещё раз или напишите текстом."
             )
+            monitor.track_request("voice_handler", time.time() - started, success=False, error="empty transcription")
             return
 
         logger.info(f"User {user.id} voice transcribed ({len(transcription)} chars, emotion={client_emotion}, energy={client_energy}): {transcription[:100]}...")
 
-        session = session_manager.get_session(
-            user_id=user.id,
-            username=user.username,
-            first_name=user.first_name
-        )
+        with span("session.get_session"):
+            session = session_manager.get_session(
+                user_id=user.id,
+                username=user.username,
+                first_name=user.first_name
+            )
 
-        session.add_message("user", transcription, config.max_history_length)
-        lead_manager.save_message(user.id, "user", f"[Голосовое] {transcription}")
+        session.add_message("user", transcription, config.max_history_length, kind="voice")
         lead_manager.log_event("voice_message", user.id, {
             "duration": voice.duration if voice.duration else 0,
             "length": len(transcription),
@@ -963,7 +1049,8 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         follow_up_manager.schedule_follow_up(user.id)
 
         from src.context_builder import build_full_context, parse_ai_buttons
-        client_context = build_full_context(user.id, transcription, user.username, user.first_name)
+        with span("context.build_full"):
+            client_context = build_full_context(user.id, transcription, user.username, user.first_name)
 
         emotion_hint = EMOTION_TO_VOICE_STYLE.get(client_emotion, "")
         if emotion_hint:
@@ -1053,18 +1140,17 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 except asyncio.CancelledError:
                     pass
                 session.add_message("assistant", "Показал запрошенную информацию", config.max_history_length)
-                lead_manager.save_message(user.id, "assistant", "Показал запрошенную информацию")
                 _run_voice_post_processing(user.id, transcription, session)
+                monitor.track_request("voice_handler", time.time() - started, success=True)
                 return
         except Exception as e:
             logger.warning(f"Voice agentic loop failed, falling back to direct: {e}")
 
-            from src.knowledge_base import SYSTEM_PROMPT
+            from src.content_registry import content
             from google import genai
             from google.genai import types
 
-            from src.config import get_gemini_client
-            gemini_client = get_gemini_client()
+            from src.ai_scheduler import ai_scheduler
 
             history_text = ""
             for msg in session.get_history()[-6:]:
@@ -1086,12 +1172,11 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 f"Ответь как консультант Алекс. Коротко, разговорно, для озвучки."
             )
 
-            response = await asyncio.to_thread(
-                gemini_client.models.generate_content,
-                model=config.model_name,
-                contents=[full_prompt],
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
+            response = await ai_scheduler.generate(
+                config.model_name,
+                [full_prompt],
+                types.GenerateContentConfig(
+                    system_instruction=content.current.system_prompt,
                     max_output_tokens=1000,
                     temperature=0.7
                 )
@@ -1106,7 +1191,6 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         response_text, ai_buttons = parse_ai_buttons(response_text)
 
         session.add_message("assistant", response_text, config.max_history_length)
-        lead_manager.save_message(user.id, "assistant", response_text)
 
         typing_task.cancel()
         try:
@@ -1142,24 +1226,21 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
             for _v_attempt in range(2):
                 try:
-                    voice_audio = await generate_voice_bridge(
-                        response_text, transcription, voice_profile=voice_profile_for_reply
-                    )
-
-                    if not voice_audio or len(voice_audio) < 100:
-                        raise RuntimeError(f"Voice audio too small: {len(voice_audio) if voice_audio else 0} bytes")
-
-                    await update.message.reply_voice(voice=voice_audio)
+                    with span("voice.bridge", attempt=_v_attempt + 1):
+                        voice_size = await send_voice_bridge(
+                            update.message.reply_voice, response_text, transcription,
+                            voice_profile=voice_profile_for_reply
+                        )
                     voice_sent = True
                     lead_manager.log_event("voice_reply_sent", user.id, {
                         "emotion": client_emotion,
                         "profile": voice_profile_for_reply,
                         "mode": "bridge",
                         "resp_len": resp_len,
-                        "audio_size": len(voice_audio),
+                        "audio_size": voice_size,
                         "attempt": _v_attempt + 1
                     })
-                    logger.info(f"Voice reply SENT to user {user.id} (emotion={client_emotion}, profile={voice_profile_for_reply}, mode=bridge, attempt={_v_attempt+1}, size={len(voice_audio)})")
+                    logger.info(f"Voice reply SENT to user {user.id} (emotion={client_emotion}, profile={voice_profile_for_reply}, mode=bridge, attempt={_v_attempt+1}, size={voice_size})")
                     break
                 except Exception as e:
                     logger.error(f"Voice reply attempt {_v_attempt+1} failed for user {user.id}: {type(e).__name__}: {e}")
@@ -1199,29 +1280,28 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         logger.info(f"User {user.id}: voice processed (emotion={client_emotion}, profile={voice_profile_for_reply}, voice_reply={'yes' if voice_sent else 'no'}, voice_msg#{context.user_data.get('voice_message_count', 0)})")
 
         _run_voice_post_processing(user.id, transcription, session)
+        monitor.track_request("voice_handler", time.time() - started, success=True)
 
     except Exception as e:
         typing_task.cancel()
         logger.error(f"Voice processing error ({type(e).__name__}): {e}")
+        monitor.track_request("voice_handler", time.time() - started, success=False, error=str(e))
         await update.message.reply_text(
             "Не удалось обработать голосовое сообщение. Напишите текстом, пожалуйста."
         )
 
 
 def _run_voice_post_processing(user_id: int, transcription: str, session):
-    from src.handlers.messages import auto_tag_lead, auto_score_lead, extract_insights_if_needed, summarize_if_needed
+    from src.conversation_jobs import conversation_jobs
+    from src.handlers.messages import auto_tag_lead, auto_score_lead
 
     auto_tag_lead(user_id, transcription)
     auto_score_lead(user_id, transcription)
-
-    asyncio.create_task(
-        extract_insights_if_needed(user_id, session)
-    )
-    asyncio.create_task(
-        summarize_if_needed(user_id, session)
-    )
+    conversation_jobs.submit(user_id, session)
 
 
+@trace_handler("photo")
+@track_handler("photo_handler")
 async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     if not user or not update.message:
@@ -1262,19 +1342,28 @@ async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 typing_task.cancel()
                 return
 
-            file = await context.bot.get_file(photo.file_id)
-            photo_bytes = await file.download_as_bytearray()
+            from src.vision_pipeline import (
+                pick_photo_size, prepare_image_async, analysis_cache, analyze_image,
+            )
+            started = time.perf_counter()
+
+            photo = pick_photo_size(update.message.photo)
+            with span("telegram.download", kind="photo"):
+                file = await context.bot.get_file(photo.file_id)
+                photo_bytes = await file.download_as_bytearray()
+            with span("vision.prepare"):
+                prepared = await prepare_image_async(photo_bytes)
 
             caption = update.message.caption or ""
 
-            session = session_manager.get_session(
-                user_id=user.id,
-                username=user.username,
-                first_name=user.first_name
-            )
+            with span("session.get_session"):
+                session = session_manager.get_session(
+                    user_id=user.id,
+                    username=user.username,
+                    first_name=user.first_name
+                )
 
             from src.vision_sales import (
-                VISION_CLASSIFICATION_PROMPT,
                 get_image_type_from_caption,
                 build_vision_system_prompt,
                 get_smart_buttons_for_image,
@@ -1284,74 +1373,52 @@ async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 is_warm_image,
                 build_manager_notification,
                 get_vision_analysis_context,
-                ImageType,
             )
-
-            from google.genai import types as genai_types
-            from src.config import get_gemini_client
-            gemini_client = get_gemini_client()
-
-            image_part = genai_types.Part.from_bytes(data=bytes(photo_bytes), mime_type="image/jpeg")
+            from src.context_builder import build_full_context, parse_ai_buttons
 
             caption_hint = get_image_type_from_caption(caption)
-
-            if caption_hint:
-                image_type = caption_hint
-            else:
-                try:
-                    classify_response = await asyncio.to_thread(
-                        gemini_client.models.generate_content,
-                        model=config.model_name,
-                        contents=[image_part, genai_types.Part(text=VISION_CLASSIFICATION_PROMPT)],
-                        config=genai_types.GenerateContentConfig(
-                            max_output_tokens=30,
-                            temperature=0.1
-                        )
+            user_text = caption or "Проанализируй это изображение."
+
+            result = analysis_cache.get(user.id, prepared.phash, caption)
+            cached = result is not None
+            if not cached:
+                with span("context.build_full"):
+                    client_context = build_full_context(user.id, user_text, user.username, user.first_name)
+                if caption_hint:
+                    vision_context = get_vision_analysis_context(caption_hint)
+                    client_context = f"{vision_context}\n{client_context}" if client_context else vision_context
+                system_prompt = build_vision_system_prompt(caption_hint, client_context)
+
+                with span("vision.analyze", image_type=caption_hint or "auto"):
+                    result = await analyze_image(
+                        config.model_name, prepared,
+                        user_text, system_prompt, caption_hint,
                     )
-                    raw_type = (classify_response.text or "general").strip().lower().replace(" ", "_")
-                    valid_types = {e.value for e in ImageType}
-                    image_type = raw_type if raw_type in valid_types else ImageType.GENERAL.value
-                except Exception as classify_err:
-                    logger.warning(f"Image classification failed: {classify_err}")
-                    image_type = ImageType.GENERAL.value
-
-            logger.info(f"Vision analysis for user {user_id}: type={image_type}, caption={caption[:100] if caption else 'none'}")
-
-            user_text = caption if caption else f"Проанализируй это изображение (тип: {image_type})"
+                if result.text:
+                    analysis_cache.put(user.id, prepared.phash, caption, result)
+
+            image_type = result.image_type
+            elapsed = time.perf_counter() - started
+            registry.observe("vision_photo_seconds", elapsed, cached=cached)
+            logger.info(
+                f"Vision analysis for user {user_id}: type={image_type}, cached={cached}, "
+                f"image={prepared.original_bytes}->{len(prepared.data)} bytes ({prepared.width}x{prepared.height}), "
+                f"tokens={result.prompt_tokens}+{result.output_tokens}, {elapsed:.2f}s, "
+                f"caption={caption[:100] if caption else 'none'}"
+            )
 
-            session.add_message("user", f"[Фото: {image_type}]{f': {caption}' if caption else ''}", config.max_history_length)
-            lead_manager.save_message(user.id, "user", f"[Фото: {image_type}]{f': {caption}' if caption else ''}")
+            if not caption:
+                user_text = f"Проанализируй это изображение (тип: {image_type})"
+            session.add_message("user", f"[Фото: {image_type}]{f': {caption}' if caption else ''}",
+                                config.max_history_length, kind="photo")
             lead_manager.log_event(f"photo_{image_type}", user.id)
             lead_manager.update_activity(user.id)
 
-            from src.context_builder import build_full_context, parse_ai_buttons
-            client_context = build_full_context(user.id, user_text, user.username, user.first_name)
-
-            vision_context = get_vision_analysis_context(image_type)
-            full_client_ctx = f"{vision_context}\n{client_context}" if client_context else vision_context
-
-            system_prompt = build_vision_system_prompt(image_type, full_client_ctx)
-
-            analysis_text = genai_types.Part(text=user_text if caption else "Проанализируй это изображение.")
-            all_parts = [image_part, analysis_text]
-
-            response = await asyncio.to_thread(
-                gemini_client.models.generate_content,
-                model=config.model_name,
-                contents=all_parts,
-                config=genai_types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    max_output_tokens=2000,
-                    temperature=0.7
-                )
-            )
-
             typing_task.cancel()
 
-            if response.text:
-                clean_text, ai_buttons = parse_ai_buttons(response.text)
+            if result.text:
+                clean_text, ai_buttons = parse_ai_buttons(result.text)
                 session.add_message("assistant", clean_text, config.max_history_length)
-                lead_manager.save_message(user.id, "assistant", clean_text)
 
                 try:
                     from src.session import save_vision_context
@@ -9,6 +9,7 @@ from telegram.constants import ChatAction
 from src.session import session_manager
 from src.ai_client import ai_client, validate_response, check_response_quality
 from src.config import config
+from src.conversation_jobs import conversation_jobs
 from src.keyboards import get_main_menu_keyboard, get_lead_keyboard, get_loyalty_menu_keyboard
 from src.leads import lead_manager, LeadPriority
 from src.knowledge_base import ERROR_MESSAGE
@@ -16,7 +17,10 @@ from src.tasks_tracker import tasks_tracker
 from src.pricing import get_price_main_text, get_price_main_keyboard
 from src.loyalty import REVIEW_REWARDS, RETURNING_CUSTOMER_BONUS, format_review_notification
 from src.tool_handlers import execute_tool_call
-from src.prompt_composer import compose_system_prompt, build_context_signals_dict
+from src.prompt_composer import compose_system_prompt, build_context_signals_dict, get_rag_context, selected_methodologies
+from src.reply_pipeline import ReplyPipeline
+from src.response_cache import response_cache
+from src.tracing import span, trace_handler
 
 from src.handlers.utils import send_typing_action, loyalty_system, MANAGER_CHAT_ID
 from src.keyboards import get_review_moderation_keyboard
@@ -75,6 +79,54 @@ def _build_returning_client_context(user_id, profile, session):
         return None
 
 
+_CONTEXT_STEPS = ("context.build_signals", "context.rag", "session.client_profile", "session.vision_history")
+_SENTENCE_END = re.compile(r'[.!?](?:\s|$)')
+
+
+def _start_context_lookups(user, user_message: str, user_data: dict, message_count: int) -> ReplyPipeline:
+    """Reply pipeline with the pre-generation lookups and the voice decision already running."""
+    from src.session import get_client_profile, get_vision_history
+
+    pipeline = ReplyPipeline()
+    pipeline.add("context.build_signals", lambda: build_context_signals_dict(
+        user_id=user.id,
+        user_message=user_message,
+        username=user.username or "",
+        first_name=user.first_name or "",
+        message_count=message_count,
+        include_rag=False,
+    ), thread=True)
+    pipeline.add("context.rag", lambda: get_rag_context(user_message), thread=True)
+    pipeline.add("session.client_profile", lambda: get_client_profile(user.id), thread=True)
+    pipeline.add("session.vision_history", lambda: get_vision_history(user.id), thread=True)
+
+    async def _decide_voice():
+        profile = pipeline.value("session.client_profile")
+        if 'prefers_voice' not in user_data and profile and profile.get("prefers_voice") == "true":
+            user_data['prefers_voice'] = True
+            user_data['voice_message_count'] = 1
+        from src.handlers.media import should_send_smart_voice
+        return await asyncio.to_thread(should_send_smart_voice, user.id, user_message, user_data, commit=False)
+
+    pipeline.add("voice.decide", _decide_voice, deps=("session.client_profile",))
+    pipeline.start(*_CONTEXT_STEPS, "voice.decide")
+    return pipeline
+
+
+def _maybe_draft_voice_bridge(pipeline: ReplyPipeline, draft: str, user_message: str) -> None:
+    """Start the voice bridge from the first streamed sentences once voice is decided."""
+    if pipeline.has("voice.bridge_text") or not pipeline.done("voice.decide"):
+        return
+    if not (pipeline.value("voice.decide") or {}).get("send"):
+        return
+    from src.handlers.media import voice_bridge_text, VOICE_BRIDGE_DRAFT_SENTENCES
+    if len(_SENTENCE_END.findall(draft)) < VOICE_BRIDGE_DRAFT_SENTENCES:
+        return
+    pipeline.add("voice.bridge_text", lambda: voice_bridge_text(draft, user_message),
+                 deps=("voice.decide",), speculative=True)
+    pipeline.start("voice.bridge_text")
+
+
 def detect_query_context(message_text: str) -> str:
     text_lower = message_text.lower()
 
@@ -198,148 +250,6 @@ def auto_score_lead(user_id: int, message_text: str) -> None:
         logger.debug(f"Auto-scoring failed for user {user_id}: {e}")
 
 
-async def summarize_if_needed(user_id: int, session) -> None:
-    try:
-        if not session._needs_summarization:
-            return
-        if session.message_count < 20:
-            return
-        
-        old_messages = session.messages[:len(session.messages) - 10]
-        texts = []
-        for msg in old_messages:
-            if msg.get("parts"):
-                for part in msg["parts"]:
-                    if isinstance(part, dict) and part.get("text"):
-                        text = part["text"][:150]
-                        texts.append(f"{msg['role']}: {text}")
-        
-        if not texts:
-            return
-        
-        conversation_text = "\n".join(texts)
-        existing_summary = session._summary or ""
-        
-        prompt = f"""Сожми этот диалог в компактное резюме (максимум 200 слов). Сохрани ключевую информацию: тип бизнеса, потребности, бюджет, решения, договорённости. 
-
-{f'Предыдущее резюме: {existing_summary}' if existing_summary else ''}
-
-Диалог для сжатия:
-{conversation_text}
-
-Верни ТОЛЬКО резюме, без пояснений."""
-        
-        from src.ai_client import ai_client
-        summary = await ai_client.quick_response(prompt)
-        
-        if summary and len(summary) > 20:
-            session.set_summary(summary)
-            session.messages = session.messages[-10:]
-            logger.info(f"Summarized conversation for user {user_id}: {len(summary)} chars")
-    except Exception as e:
-        logger.debug(f"Summarization failed for user {user_id}: {e}")
-
-
-async def extract_insights_if_needed(user_id: int, session) -> None:
-    try:
-        if session.message_count < 6 or session.message_count % 5 != 0:
-            return
-        
-        history = session.get_history()
-        if len(history) < 6:
-            return
-        
-        recent_texts = []
-        for msg in history[-10:]:
-            if msg.get("parts"):
-                for part in msg["parts"]:
-                    if isinstance(part, dict) and part.get("text"):
-                        recent_texts.append(f"{msg['role']}: {part['text'][:200]}")
-        
-        if not recent_texts:
-            return
-        
-        conversation_text = "\n".join(recent_texts)
-        
-        prompt = f"""Проанализируй диалог и извлеки ключевые данные о клиенте. Верни ТОЛЬКО JSON (без markdown):
-{{"business_type": "тип бизнеса или null", "budget": "бюджет или null", "timeline": "желаемые сроки или null", "needs": ["список потребностей"], "ready_to_buy": true/false}}
-
-Диалог:
-{conversation_text}"""
-        
-        from src.ai_client import ai_client
-        result = await ai_client.quick_response(prompt)
-        
-        import json
-        import re
-        result = result.strip()
-        if result.startswith("```"):
-            result = result.split("\n", 1)[1] if "\n" in result else result
-            result = result.rsplit("```", 1)[0] if "```" in result else result
-            result = result.strip()
-        
-        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', result)
-        if json_match:
-            result = json_match.group(0)
-        
-        try:
-            insights = json.loads(result)
-        except json.JSONDecodeError:
-            result = result.replace("'", '"').replace("True", "true").replace("False", "false").replace("None", "null")
-            try:
-                insights = json.loads(result)
-            except json.JSONDecodeError:
-                logger.debug(f"Could not parse insights JSON for user {user_id}")
-                return
-        
-        if insights.get("business_type"):
-            lead_manager.add_tag(user_id, insights["business_type"])
-        if insights.get("budget"):
-            lead_manager.add_tag(user_id, f"budget:{insights['budget']}")
-        if insights.get("needs"):
-            for need in insights["needs"][:3]:
-                lead_manager.add_tag(user_id, need[:30])
-        if insights.get("ready_to_buy"):
-            lead_manager.update_lead(user_id, priority=LeadPriority.HOT)
-            lead_manager.add_tag(user_id, "ready_to_buy")
-
-        try:
-            from src.session import save_client_profile
-            profile_data = {}
-            if insights.get("business_type"):
-                industry_map = {
-                    "магазин": "shop", "shop": "shop", "интернет-магазин": "shop", "ecommerce": "shop",
-                    "ресторан": "restaurant", "restaurant": "restaurant", "кафе": "restaurant", "общепит": "restaurant",
-                    "салон": "beauty", "beauty": "beauty", "красота": "beauty", "косметология": "beauty",
-                    "фитнес": "fitness", "fitness": "fitness", "спорт": "fitness", "gym": "fitness",
-                    "клиника": "medical", "medical": "medical", "медицина": "medical",
-                    "образование": "education", "education": "education", "школа": "education", "курсы": "education", "обучение": "education",
-                    "доставка еды": "delivery", "delivery": "delivery", "курьер": "delivery",
-                    "услуги": "services", "services": "services", "сервис": "services", "клининг": "services", "ремонт": "services",
-                }
-                btype = insights["business_type"].lower()
-                for key, val in industry_map.items():
-                    if key in btype:
-                        profile_data["industry"] = val
-                        break
-                if "industry" not in profile_data:
-                    profile_data["industry"] = insights["business_type"][:50]
-            if insights.get("budget"):
-                profile_data["budget_range"] = str(insights["budget"])[:50]
-            if insights.get("timeline"):
-                profile_data["timeline"] = str(insights["timeline"])[:50]
-            if insights.get("needs"):
-                profile_data["needs"] = ", ".join(insights["needs"][:5])[:200]
-            if profile_data:
-                save_client_profile(user_id, **profile_data)
-        except Exception as e:
-            logger.debug(f"Failed to save client profile: {e}")
-
-        logger.info(f"Extracted insights for user {user_id}: {insights}")
-    except Exception as e:
-        logger.debug(f"Insight extraction failed for user {user_id}: {e}")
-
-
 def auto_tag_lead(user_id: int, message_text: str) -> None:
     try:
         lead = lead_manager.get_lead(user_id)
@@ -356,6 +266,7 @@ def auto_tag_lead(user_id: int, message_text: str) -> None:
         logger.debug(f"Auto-tagging failed for user {user_id}: {e}")
 
 
+@trace_handler("message")
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     message = update.message
@@ -516,6 +427,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "🚀 Хочу приложение!": "lead"
     }
     
+    canned_prompt = False
     if user_message in quick_buttons:
         if user_message == "🚀 Хочу приложение!":
             lead = lead_manager.create_lead(
@@ -541,18 +453,22 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return
         else:
             user_message = quick_buttons[user_message]
+            canned_prompt = True
     
-    session = session_manager.get_session(
-        user_id=user.id,
-        username=(user.username or ""),
-        first_name=(user.first_name or "")
-    )
+    with span("session.get_session"):
+        session = session_manager.get_session(
+            user_id=user.id,
+            username=(user.username or ""),
+            first_name=(user.first_name or "")
+        )
     
     session.add_message("user", user_message, config.max_history_length)
+
+    pipeline = _start_context_lookups(user, user_message, user_data, session.message_count)
     
-    lead_manager.save_message(user.id, "user", user_message)
-    lead_manager.log_event("message", user.id, {"length": len(user_message)})
-    lead_manager.update_activity(user.id)
+    with span("leads.record_message"):
+        lead_manager.log_event("message", user.id, {"length": len(user_message)})
+        lead_manager.update_activity(user.id)
 
     try:
         from src.propensity import propensity_scorer
@@ -575,16 +491,6 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     except Exception as e:
         logger.debug(f"Proactive engagement tracking skipped: {e}")
 
-    if 'prefers_voice' not in user_data:
-        try:
-            from src.session import get_client_profile
-            profile = get_client_profile(user.id)
-            if profile and profile.get("prefers_voice") == "true":
-                user_data['prefers_voice'] = True
-                user_data['voice_message_count'] = 1
-        except Exception as e:
-            logger.debug(f"Voice preference check skipped: {e}")
-
     from src.followup import follow_up_manager
     follow_up_manager.cancel_follow_ups(user.id)
     follow_up_manager.schedule_follow_up(user.id)
@@ -612,31 +518,21 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     from src.context_builder import parse_ai_buttons
 
-    context_signals = build_context_signals_dict(
-        user_id=user.id,
-        user_message=user_message,
-        username=user.username or "",
-        first_name=user.first_name or "",
-        message_count=session.message_count
-    )
+    context_signals = await pipeline.result("context.build_signals") or {}
 
-    try:
-        from src.session import get_client_profile
-        profile = get_client_profile(user.id)
-        if profile:
-            returning_ctx = _build_returning_client_context(user.id, profile, session)
-            if returning_ctx:
-                context_signals["returning_context"] = returning_ctx
-    except Exception:
-        pass
+    rag_context = await pipeline.result("context.rag")
+    if rag_context:
+        context_signals["rag"] = rag_context
 
-    try:
-        from src.session import get_vision_history
-        vision_hist = get_vision_history(user.id)
-        if vision_hist:
-            context_signals["vision_history"] = vision_hist
-    except Exception:
-        pass
+    profile = await pipeline.result("session.client_profile")
+    if profile:
+        returning_ctx = _build_returning_client_context(user.id, profile, session)
+        if returning_ctx:
+            context_signals["returning_context"] = returning_ctx
+
+    vision_hist = await pipeline.result("session.vision_history")
+    if vision_hist:
+        context_signals["vision_history"] = vision_hist
 
     lang_suffix = get_prompt_suffix(user_lang)
 
@@ -650,13 +546,14 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if query_context:
         logger.debug(f"User {user.id} query_context: {query_context}")
 
-    dynamic_prompt = compose_system_prompt(
-        context_signals=context_signals,
-        query_context=query_context or None,
-        adaptive_hint=adaptive_hint or None,
-        lang_suffix=lang_suffix or None,
-        user_id=user.id,
-    )
+    with pipeline.step("prompt.compose", deps=_CONTEXT_STEPS), span("prompt.compose"):
+        dynamic_prompt = compose_system_prompt(
+            context_signals=context_signals,
+            query_context=query_context or None,
+            adaptive_hint=adaptive_hint or None,
+            lang_suffix=lang_suffix or None,
+            user_id=user.id,
+        )
 
     typing_task = asyncio.create_task(
         send_typing_action(update, duration=60.0)
@@ -683,137 +580,155 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         elif funnel_val in ("consideration",) and "ТЁПЛЫЙ" in propensity_val:
             thinking_level = "high"
 
+        pipeline.begin("ai.generate", deps=("prompt.compose",))
         response = None
+        postprocessed = False
+        reply_cache_key = None
+        if response_cache.is_cacheable(user_message, query_context, context_signals, canned=canned_prompt,
+                                       has_history=session.has_prior_history):
+            methodologies = await asyncio.to_thread(selected_methodologies, context_signals, user.id)
+            reply_cache_key = response_cache.key_for(user_message, user_lang, context_signals, methodologies)
+            response = response_cache.get(reply_cache_key, user.first_name or "")
+            postprocessed = response is not None
+        from_cache = postprocessed
 
         messages_for_ai = session.get_history()
 
-        try:
-            async def _tool_executor(tool_name, tool_args):
-                return await execute_tool_call(
-                    tool_name, tool_args,
-                    user.id, user.username or "", user.first_name or ""
-                )
+        if response is None:
+            try:
+                async def _tool_executor(tool_name, tool_args):
+                    return await execute_tool_call(
+                        tool_name, tool_args,
+                        user.id, user.username or "", user.first_name or ""
+                    )
             
-            agentic_result = await ai_client.agentic_loop(
-                messages=messages_for_ai,
-                tool_executor=_tool_executor,
-                thinking_level=thinking_level,
-                max_steps=4,
-                query_context=query_context or None,
-                dynamic_system_prompt=dynamic_prompt
-            )
+                agentic_result = await ai_client.agentic_loop(
+                    messages=messages_for_ai,
+                    tool_executor=_tool_executor,
+                    thinking_level=thinking_level,
+                    max_steps=4,
+                    query_context=query_context or None,
+                    dynamic_system_prompt=dynamic_prompt
+                )
             
-            if agentic_result["special_actions"]:
-                for action_type, action_data in agentic_result["special_actions"]:
-                    if action_type == "portfolio":
-                        from src.keyboards import get_portfolio_keyboard
-                        from src.knowledge_base import PORTFOLIO_MESSAGE
-                        await message.reply_text(
-                            PORTFOLIO_MESSAGE, parse_mode="Markdown",
-                            reply_markup=get_portfolio_keyboard()
-                        )
-                    elif action_type == "pricing":
-                        await message.reply_text(
-                            get_price_main_text(), parse_mode="Markdown",
-                            reply_markup=get_price_main_keyboard()
-                        )
-                    elif action_type == "payment":
-                        from src.payments import get_payment_keyboard
-                        await message.reply_text(
-                            "💳 Выберите способ оплаты:",
-                            reply_markup=get_payment_keyboard()
-                        )
-                    elif action_type == "ai_brief":
-                        from src.brief_generator import brief_generator
-                        brief_text, brief_keyboard = brief_generator.format_brief(user.id)
-                        if "не завершён" not in brief_text:
-                            try:
-                                await message.reply_text(
-                                    brief_text, parse_mode="HTML",
-                                    reply_markup=brief_keyboard
-                                )
-                            except Exception:
-                                await message.reply_text(
-                                    brief_text.replace("<b>", "").replace("</b>", ""),
-                                    reply_markup=brief_keyboard
-                                )
+                if agentic_result["special_actions"]:
+                    for action_type, action_data in agentic_result["special_actions"]:
+                        if action_type == "portfolio":
+                            from src.keyboards import get_portfolio_keyboard
+                            from src.knowledge_base import PORTFOLIO_MESSAGE
+                            await message.reply_text(
+                                PORTFOLIO_MESSAGE, parse_mode="Markdown",
+                                reply_markup=get_portfolio_keyboard()
+                            )
+                        elif action_type == "pricing":
+                            await message.reply_text(
+                                get_price_main_text(), parse_mode="Markdown",
+                                reply_markup=get_price_main_keyboard()
+                            )
+                        elif action_type == "payment":
+                            from src.payments import get_payment_keyboard
+                            await message.reply_text(
+                                "💳 Выберите способ оплаты:",
+                                reply_markup=get_payment_keyboard()
+                            )
+                        elif action_type == "ai_brief":
+                            from src.brief_generator import brief_generator
+                            brief_text, brief_keyboard = brief_generator.format_brief(user.id)
+                            if "не завершён" not in brief_text:
+                                try:
+                                    await message.reply_text(
+                                        brief_text, parse_mode="HTML",
+                                        reply_markup=brief_keyboard
+                                    )
+                                except Exception:
+                                    await message.reply_text(
+                                        brief_text.replace("<b>", "").replace("</b>", ""),
+                                        reply_markup=brief_keyboard
+                                    )
             
-            if agentic_result["text"]:
-                response = agentic_result["text"]
-            elif agentic_result["special_actions"]:
-                typing_task.cancel()
-                try:
-                    await typing_task
-                except asyncio.CancelledError:
-                    pass
-                session.add_message("assistant", "Показал запрошенную информацию", config.max_history_length)
-                lead_manager.save_message(user.id, "assistant", "Показал запрошенную информацию")
-                logger.info(f"User {user.id}: processed message #{session.message_count} (agentic, {len(agentic_result['all_tool_results'])} tools)")
-                auto_tag_lead(user.id, user_message)
-                auto_score_lead(user.id, user_message)
-                return
-            else:
-                response = None
+                if agentic_result["all_tool_results"]:
+                    reply_cache_key = None
+                if agentic_result["text"]:
+                    response = agentic_result["text"]
+                elif agentic_result["special_actions"]:
+                    typing_task.cancel()
+                    try:
+                        await typing_task
+                    except asyncio.CancelledError:
+                        pass
+                    session.add_message("assistant", "Показал запрошенную информацию", config.max_history_length)
+                    logger.info(f"User {user.id}: processed message #{session.message_count} (agentic, {len(agentic_result['all_tool_results'])} tools)")
+                    auto_tag_lead(user.id, user_message)
+                    auto_score_lead(user.id, user_message)
+                    return
+                else:
+                    response = None
                 
-        except Exception as e:
-            logger.warning(f"Agentic loop failed, falling back to streaming: {e}")
-
-            from src.bot_api import send_message_draft
-            last_draft_len = 0
-            draft_count = 0
-
-            async def on_stream_chunk(partial_text: str):
-                nonlocal last_draft_len, draft_count
-                import re as _re
-                display_text = _re.sub(r'\[BUTTONS:.*$', '', partial_text, flags=_re.DOTALL).rstrip()
-                if len(display_text) - last_draft_len >= 40:
+            except Exception as e:
+                logger.warning(f"Agentic loop failed, falling back to streaming: {e}")
+
+                from src.bot_api import send_message_draft
+                last_draft_len = 0
+                draft_count = 0
+
+                async def on_stream_chunk(display_text: str):
+                    nonlocal last_draft_len, draft_count
+                    _maybe_draft_voice_bridge(pipeline, display_text, user_message)
+                    if len(display_text) > last_draft_len:
+                        try:
+                            with span("telegram.send_message_draft"):
+                                await send_message_draft(
+                                    context.bot,
+                                    chat.id,
+                                    display_text + " ▌"
+                                )
+                            last_draft_len = len(display_text)
+                            draft_count += 1
+                        except Exception as e:
+                            logger.debug(f"Stream chunk callback error: {e}")
+
+                postprocessed = True
+                response = await ai_client.generate_response_stream(
+                    messages=messages_for_ai,
+                    thinking_level=thinking_level,
+                    on_chunk=on_stream_chunk,
+                    query_context=query_context or None,
+                    dynamic_system_prompt=dynamic_prompt
+                )
+
+                if draft_count > 0:
                     try:
-                        await send_message_draft(
-                            context.bot,
-                            chat.id,
-                            display_text + " ▌"
-                        )
-                        last_draft_len = len(partial_text)
-                        draft_count += 1
+                        await send_message_draft(context.bot, chat.id, "")
                     except Exception as e:
-                        logger.debug(f"Stream chunk callback error: {e}")
-
-            response = await ai_client.generate_response_stream(
-                messages=messages_for_ai,
-                thinking_level=thinking_level,
-                on_chunk=on_stream_chunk,
-                query_context=query_context or None,
-                dynamic_system_prompt=dynamic_prompt
-            )
-
-            if draft_count > 0:
-                try:
-                    await send_message_draft(context.bot, chat.id, "")
-                except Exception as e:
-                    logger.debug(f"Draft clear error: {e}")
+                        logger.debug(f"Draft clear error: {e}")
 
         if not response:
             response = "Извините, не удалось сформировать ответ. Попробуйте переформулировать вопрос."
+            reply_cache_key = None
+        pipeline.end("ai.generate")
+
+        if not postprocessed:
+            is_valid, cleaned = validate_response(response)
+            if not is_valid:
+                logger.info(f"Response validation corrected issues for user {user.id}")
+                response = cleaned
 
-        is_valid, cleaned = validate_response(response)
-        if not is_valid:
-            logger.info(f"Response validation corrected issues for user {user.id}")
-            response = cleaned
+            response = check_response_quality(response, user_message, query_context=query_context or "")
 
-        response = check_response_quality(response, user_message, query_context=query_context or "")
+        if reply_cache_key and not from_cache:
+            response_cache.put(reply_cache_key, response, user.first_name or "", pipeline.duration("ai.generate"))
 
         response, ai_buttons = parse_ai_buttons(response)
 
         session.add_message("assistant", response, config.max_history_length)
 
-        lead_manager.save_message(user.id, "assistant", response)
-
         typing_task.cancel()
         try:
             await typing_task
         except asyncio.CancelledError:
             pass
 
+        pipeline.begin("reply.send", deps=("ai.generate", "voice.decide", "voice.bridge_text"))
         reply_markup = None
         if ai_buttons:
             keyboard_rows = [[InlineKeyboardButton(text, callback_data=cb)] for text, cb in ai_buttons]
@@ -822,13 +737,13 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         smart_voice_sent = False
         try:
             from src.handlers.media import (
-                should_send_smart_voice,
-                generate_voice_bridge
-            )
-            voice_decision = should_send_smart_voice(
-                user.id, user_message, user_data, response_text=response
+                commit_smart_voice,
+                send_voice_bridge,
+                voice_bridge_text
             )
+            voice_decision = await pipeline.result("voice.decide") or {"send": False}
             if voice_decision.get("send"):
+                voice_decision = commit_smart_voice(voice_decision, user_data, response)
                 voice_mode = voice_decision.get("mode", "full")
                 voice_profile = voice_decision.get("profile", "default")
                 voice_trigger = voice_decision.get("trigger", "unknown")
@@ -838,16 +753,17 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     send_record_voice_action(chat, duration=120.0)
                 )
 
+                if not pipeline.has("voice.bridge_text"):
+                    pipeline.add("voice.bridge_text", lambda: voice_bridge_text(response, user_message))
+                bridge_text = await pipeline.result("voice.bridge_text")
+
                 for _sv_attempt in range(2):
                     try:
-                        voice_audio = await generate_voice_bridge(
-                            response, user_message, voice_profile=voice_profile
-                        )
-
-                        if not voice_audio or len(voice_audio) < 100:
-                            raise RuntimeError(f"Voice audio too small: {len(voice_audio) if voice_audio else 0} bytes")
-
-                        await message.reply_voice(voice=voice_audio)
+                        with span("voice.bridge", attempt=_sv_attempt + 1):
+                            voice_size = await send_voice_bridge(
+                                message.reply_voice, response, user_message,
+                                voice_profile=voice_profile, bridge_text=bridge_text
+                            )
 
                         if len(response) > 4096:
                             chunks = [response[i:i+4096] for i in range(0, len(response), 4096)]
@@ -865,11 +781,11 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                             "mode": voice_mode,
                             "profile": voice_profile,
                             "priority": voice_decision.get("priority", 0),
-                            "audio_size": len(voice_audio),
+                            "audio_size": voice_size,
                             "attempt": _sv_attempt + 1,
                             "message_preview": user_message[:100]
                         })
-                        logger.info(f"Smart voice SENT to user {user.id} (trigger={voice_trigger}, mode={voice_mode}, profile={voice_profile}, attempt={_sv_attempt+1}, size={len(voice_audio)})")
+                        logger.info(f"Smart voice SENT to user {user.id} (trigger={voice_trigger}, mode={voice_mode}, profile={voice_profile}, attempt={_sv_attempt+1}, size={voice_size})")
                         break
                     except Exception as voice_err:
                         logger.warning(f"Smart voice attempt {_sv_attempt+1} failed for user {user.id}: {type(voice_err).__name__}: {voice_err}")
@@ -899,7 +815,9 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             else:
                 await message.reply_text(response, reply_markup=reply_markup)
 
-        logger.info(f"User {user.id}: processed message #{session.message_count} (voice={'smart' if smart_voice_sent else 'text'})")
+        pipeline.end("reply.send")
+
+        logger.info(f"User {user.id}: processed message #{session.message_count} (voice={'smart' if smart_voice_sent else 'text'}{', cached' if from_cache else ''})")
 
         monitor.track_request("message_handler", _time.time() - _msg_start, success=True)
 
@@ -967,8 +885,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         asyncio.create_task(_post_response_analytics(
             user.id, user_message, response, _msg_count_snap, _sess_msgs_snap
         ))
-        asyncio.create_task(extract_insights_if_needed(user.id, session))
-        asyncio.create_task(summarize_if_needed(user.id, session))
+        conversation_jobs.submit(user.id, session)
 
     except Exception as e:
         typing_task.cancel()
@@ -979,6 +896,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             ERROR_MESSAGE,
             reply_markup=get_main_menu_keyboard()
         )
+    finally:
+        pipeline.finish("reply.send")
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -257,9 +257,9 @@ def get_package_deals_keyboard() -> InlineKeyboardMarkup:
 
 
 def get_faq_keyboard() -> InlineKeyboardMarkup:
-    from src.knowledge_base import FAQ_DATA
+    from src.content_registry import content
     keyboard = []
-    for key, faq in FAQ_DATA.items():
+    for key, faq in content.current.faq.items():
         keyboard.append([InlineKeyboardButton(f"❔ {faq['question']}", callback_data=key)])
     keyboard.append([InlineKeyboardButton("◀️ Назад в меню", callback_data="menu_back")])
     return InlineKeyboardMarkup(keyboard)
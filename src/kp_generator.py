@@ -9,16 +9,35 @@ Multi-page premium layout inspired by Behance/Dribbble 2025-2026 trends:
 - Dramatic price presentation
 - Clean horizontal timeline
 - ReportLab canvas with gradients, shadows, rounded cards
+
+Rendering is CPU-bound, so ``render_kp_pdf`` runs ``build_kp_pdf`` in a
+process pool (KP_PDF_WORKERS, started lazily) behind a semaphore that caps
+concurrent renders and queues the rest (at most KP_PDF_MAX_QUEUE waiting).
+Identical inputs on the same day return the memoized PDF, and concurrent
+identical requests share one render. Inside a document the repeated static
+blocks (page footer, steps) are form XObjects drawn once and placed by
+reference, and word wrapping is cached per worker.
+
+``python -m src.kp_generator --bench [N] [--parallel P]`` compares inline
+rendering with the pool.
 """
 
+import asyncio
+import hashlib
 import io
+import json
 import os
 import logging
+import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Dict, Optional
-
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from functools import lru_cache
+from multiprocessing import get_context
+from typing import Dict, Optional, Tuple
 
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
@@ -27,6 +46,8 @@ from reportlab.lib.units import mm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
+from src.metrics import registry
+
 logger = logging.getLogger(__name__)
 
 W, H = A4
@@ -260,16 +281,13 @@ def _tc(c, x, y, txt, font=None, size=10, color=C_SLATE700):
     c.drawCentredString(x, y, txt)
 
 
-def _wrap(c, x, y, text, max_w, font=None, size=9.5, color=C_SLATE600, leading=14.5):
-    f = font or FONT
-    c.setFont(f, size)
-    c.setFillColor(color)
-    words = text.split()
+@lru_cache(maxsize=1024)
+def _break_lines(text: str, max_w: float, font: str, size: float) -> Tuple[str, ...]:
     lines = []
     cur = ""
-    for w in words:
+    for w in text.split():
         test = f"{cur} {w}".strip()
-        if c.stringWidth(test, f, size) > max_w:
+        if pdfmetrics.stringWidth(test, font, size) > max_w:
             if cur:
                 lines.append(cur)
             cur = w
@@ -277,24 +295,21 @@ def _wrap(c, x, y, text, max_w, font=None, size=9.5, color=C_SLATE600, leading=1
             cur = test
     if cur:
         lines.append(cur)
+    return tuple(lines)
+
+
+def _wrap(c, x, y, text, max_w, font=None, size=9.5, color=C_SLATE600, leading=14.5):
+    f = font or FONT
+    c.setFont(f, size)
+    c.setFillColor(color)
+    lines = _break_lines(text, max_w, f, size)
     for i, line in enumerate(lines):
         c.drawString(x, y - i * leading, line)
     return len(lines) * leading
 
 
 def _text_height(c, text, max_w, font=None, size=9.5, leading=14.5):
-    f = font or FONT
-    words = text.split()
-    lines = 1
-    cur = ""
-    for w in words:
-        test = f"{cur} {w}".strip()
-        if c.stringWidth(test, f, size) > max_w:
-            lines += 1
-            cur = w
-        else:
-            cur = test
-    return lines * leading
+    return max(1, len(_break_lines(text, max_w, font or FONT, size))) * leading
 
 
 def _shadow(c, x, y, w, h, r=8):
@@ -337,13 +352,40 @@ def _accent_line(c, x, y, w, color=C_INDIGO, thickness=2.5):
     c.restoreState()
 
 
-def _page_footer(c, page_num):
+_FORM_TOP = H
+
+
+def _place(c, name, y, draw):
+    """Place a static block drawn by ``draw(c, top)`` with its top at ``y``.
+
+    The block becomes a form XObject the first time it is used in a document;
+    later uses only reference it. ReportLab gives forms font resources only,
+    so blocks with gradients or transparency are drawn directly.
+    """
+    forms = c.__dict__.setdefault("_kp_forms", set())
+    if name not in forms:
+        c.beginForm(name, lowerx=0, lowery=-H, upperx=W, uppery=2 * H)
+        draw(c, _FORM_TOP)
+        c.endForm()
+        forms.add(name)
+    c.saveState()
+    c.translate(0, y - _FORM_TOP)
+    c.doForm(name)
+    c.restoreState()
+
+
+def _footer_art(c, top):
+    base = top - H
     c.saveState()
     c.setStrokeColor(C_SLATE200)
     c.setLineWidth(0.3)
-    c.line(LM, 22, W - RM, 22)
+    c.line(LM, base + 22, W - RM, base + 22)
     c.restoreState()
-    _tc(c, W / 2, 10, f"WEB4TG Studio  \u00b7  \u00a9 {datetime.now().year}", FONT, 6.5, C_SLATE400)
+    _tc(c, W / 2, base + 10, f"WEB4TG Studio  \u00b7  \u00a9 {datetime.now().year}", FONT, 6.5, C_SLATE400)
+
+
+def _page_footer(c, page_num):
+    _place(c, "kp_footer", H, _footer_art)
     _tr(c, W - RM, 10, str(page_num), FONT, 6.5, C_SLATE400)
 
 
@@ -721,19 +763,17 @@ def _draw_payment(c, y, price, discount_pct):
     return y - 14
 
 
-def _draw_steps(c, y):
-    steps = [
-        ("Согласование", "Утверждаем ТЗ и подписываем договор"),
-        ("Предоплата", "Оплата 35% — старт работы"),
-        ("Демо", "Промежуточная демонстрация прогресса"),
-        ("Сдача", "Финальная приёмка и оплата остатка"),
-        ("Запуск", "Деплой + поддержка"),
-    ]
+STEPS = [
+    ("Согласование", "Утверждаем ТЗ и подписываем договор"),
+    ("Предоплата", "Оплата 35% — старт работы"),
+    ("Демо", "Промежуточная демонстрация прогресса"),
+    ("Сдача", "Финальная приёмка и оплата остатка"),
+    ("Запуск", "Деплой + поддержка"),
+]
 
-    if y - len(steps) * 26 < BOTTOM:
-        c.showPage()
-        y = H - 36
 
+def _steps_art(c, y):
+    steps = STEPS
     for i, (title, desc) in enumerate(steps):
         is_last = i == len(steps) - 1
         color = C_EMERALD if is_last else C_INDIGO
@@ -759,7 +799,14 @@ def _draw_steps(c, y):
 
         y -= 28
 
-    return y
+
+def _draw_steps(c, y):
+    if y - len(STEPS) * 26 < BOTTOM:
+        c.showPage()
+        y = H - 36
+
+    _place(c, "kp_steps", y, _steps_art)
+    return y - len(STEPS) * 28
 
 
 def _draw_cta(c, y):
@@ -796,6 +843,7 @@ def build_kp_pdf(
     ai_text: str = "",
     discount_pct: int = 0,
     kp_number: Optional[int] = None,
+    date_str: Optional[str] = None,
 ) -> bytes:
     pkg_key = _determine_package(brief_answers)
     pkg = PACKAGE_DATA[pkg_key]
@@ -807,7 +855,7 @@ def build_kp_pdf(
     c.setAuthor("WEB4TG Studio")
 
     kp_num = kp_number or int(time.time()) % 100000
-    date_str = datetime.now().strftime("%d.%m.%Y")
+    date_str = date_str or datetime.now().strftime("%d.%m.%Y")
     page = 1
 
     _draw_cover(c, project_type, pkg["name"], pkg["timeline"], kp_num, date_str, client_name)
@@ -892,6 +940,143 @@ def get_kp_prompt_for_brief(brief_answers: Dict, client_name: str = "") -> str:
     return _get_ai_kp_prompt(brief_answers, pkg_key, client_name or "Клиент")
 
 
+KP_PDF_WORKERS = int(os.environ.get("KP_PDF_WORKERS", str(min(2, os.cpu_count() or 1))))
+KP_PDF_MAX_QUEUE = int(os.environ.get("KP_PDF_MAX_QUEUE", "20"))
+KP_PDF_TIMEOUT = float(os.environ.get("KP_PDF_TIMEOUT", "60"))
+KP_PDF_CACHE_SIZE = int(os.environ.get("KP_PDF_CACHE_SIZE", "32"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_render_slots: Optional[asyncio.Semaphore] = None
+_waiting = 0
+_pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class KPQueueFull(RuntimeError):
+    pass
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    """Lazily started worker pool; None renders in a thread (KP_PDF_WORKERS=0)."""
+    global _executor
+    if KP_PDF_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Workers fork from a clean forkserver with reportlab and the
+                # fonts preloaded, not from the bot process with its threads
+                # and DB connections.
+                ctx = get_context("forkserver")
+                ctx.set_forkserver_preload([__name__])
+                _executor = ProcessPoolExecutor(max_workers=KP_PDF_WORKERS, mp_context=ctx)
+                logger.info(f"KP PDF pool started with {KP_PDF_WORKERS} workers")
+    return _executor
+
+
+def shutdown_pdf_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _render_job(kwargs: Dict) -> bytes:
+    return build_kp_pdf(**kwargs)
+
+
+def _cache_key(kwargs: Dict) -> str:
+    raw = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _render(kwargs: Dict) -> bytes:
+    global _render_slots, _waiting
+    if _render_slots is None:
+        _render_slots = asyncio.Semaphore(max(1, KP_PDF_WORKERS))
+    if _waiting >= KP_PDF_MAX_QUEUE:
+        registry.inc("kp_pdf_rejected_total")
+        raise KPQueueFull(f"KP render queue is full ({_waiting} waiting)")
+
+    _waiting += 1
+    registry.set_gauge("kp_pdf_queue_depth", _waiting)
+    queued_at = time.perf_counter()
+    try:
+        await _render_slots.acquire()
+    finally:
+        _waiting -= 1
+        registry.set_gauge("kp_pdf_queue_depth", _waiting)
+    try:
+        registry.observe("kp_pdf_wait_seconds", time.perf_counter() - queued_at)
+        start = time.perf_counter()
+        executor = _get_executor()
+        if executor is None:
+            pdf = await asyncio.to_thread(build_kp_pdf, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                pdf = await asyncio.wait_for(loop.run_in_executor(executor, _render_job, kwargs), KP_PDF_TIMEOUT)
+            except BrokenProcessPool:
+                logger.error("KP PDF worker pool broke; it will be restarted on the next render")
+                shutdown_pdf_pool()
+                raise
+        registry.observe("kp_pdf_render_seconds", time.perf_counter() - start)
+        return pdf
+    finally:
+        _render_slots.release()
+
+
+async def render_kp_pdf(
+    brief_answers: Dict,
+    client_name: str = "",
+    ai_text: str = "",
+    discount_pct: int = 0,
+) -> bytes:
+    """Render a KP off the event loop; identical inputs on the same day are served from memory."""
+    kwargs = {
+        "brief_answers": brief_answers,
+        "client_name": client_name,
+        "ai_text": ai_text,
+        "discount_pct": discount_pct,
+        "date_str": datetime.now().strftime("%d.%m.%Y"),
+    }
+    key = _cache_key(kwargs)
+    kwargs["kp_number"] = int(key[:8], 16) % 100000 or 1
+
+    cached = _pdf_cache.get(key)
+    if cached is not None:
+        _pdf_cache.move_to_end(key)
+        registry.inc("kp_pdf_cache_total", result="hit")
+        return cached
+    pending = _inflight.get(key)
+    if pending is not None:
+        registry.inc("kp_pdf_cache_total", result="shared")
+        return await asyncio.shield(pending)
+
+    registry.inc("kp_pdf_cache_total", result="miss")
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        pdf = await _render(kwargs)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+    future.set_result(pdf)
+    _pdf_cache[key] = pdf
+    while len(_pdf_cache) > KP_PDF_CACHE_SIZE:
+        _pdf_cache.popitem(last=False)
+    return pdf
+
+
 async def generate_and_send_kp(
     update,
     context,
@@ -900,95 +1085,129 @@ async def generate_and_send_kp(
     ai_text: str = "",
     discount_pct: int = 0,
 ):
-    from telegram import InputFile
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputFile
     chat_id = update.effective_chat.id
-    try:
-        if ai_text is None:
-            ai_text = ""
-        if not isinstance(ai_text, str):
-            ai_text = str(ai_text)
-        if not isinstance(client_name, str):
-            client_name = str(client_name) if client_name else ""
-
-        logger.info(
-            f"Building KP PDF: client={client_name!r}, ai_text_len={len(ai_text)}, "
-            f"discount={discount_pct}%, brief_keys={list(brief_answers.keys())}, "
-            f"font={FONT}, font_dirs_checked={_FONT_DIRS}"
-        )
+    if ai_text is None:
+        ai_text = ""
+    if not isinstance(ai_text, str):
+        ai_text = str(ai_text)
+    if not isinstance(client_name, str):
+        client_name = str(client_name) if client_name else ""
+
+    logger.info(
+        f"Building KP PDF: client={client_name!r}, ai_text_len={len(ai_text)}, "
+        f"discount={discount_pct}%, brief_keys={list(brief_answers.keys())}, font={FONT}"
+    )
 
-        pdf_bytes = build_kp_pdf(
-            brief_answers=brief_answers,
-            client_name=client_name,
-            ai_text=ai_text,
-            discount_pct=discount_pct,
+    pdf_bytes = None
+    fallback = False
+    try:
+        pdf_bytes = await render_kp_pdf(brief_answers, client_name, ai_text, discount_pct)
+    except Exception as e:
+        logger.error(
+            f"Failed to generate KP PDF: {type(e).__name__}: {e} | "
+            f"client={client_name!r}, ai_text_len={len(ai_text)}, "
+            f"discount={discount_pct}, brief={brief_answers}, font={FONT}",
+            exc_info=not isinstance(e, KPQueueFull)
         )
-
+        if ai_text and not isinstance(e, KPQueueFull):
+            try:
+                logger.info("Retrying KP PDF without AI text (fallback)")
+                pdf_bytes = await render_kp_pdf(brief_answers, client_name, "", discount_pct)
+                fallback = True
+            except Exception as fallback_err:
+                logger.error(f"Fallback KP PDF also failed: {type(fallback_err).__name__}: {fallback_err}", exc_info=True)
+
+    if pdf_bytes is not None:
         logger.info(f"KP PDF built: {len(pdf_bytes)} bytes")
-
         project_type = brief_answers.get("project_type", "project")
         safe_name = project_type.replace(" ", "_").replace("/", "_")
         filename = f"KP_WEB4TG_{safe_name}.pdf"
-
-        await context.bot.send_document(
-            chat_id=chat_id,
-            document=InputFile(io.BytesIO(pdf_bytes), filename=filename),
-            caption=(
+        if fallback:
+            caption = (
+                "\U0001f4c4 <b>\u0412\u0430\u0448\u0435 \u043a\u043e\u043c\u043c\u0435\u0440\u0447\u0435\u0441\u043a\u043e\u0435 \u043f\u0440\u0435\u0434\u043b\u043e\u0436\u0435\u043d\u0438\u0435</b>\n\n"
+                "\u0414\u043e\u043a\u0443\u043c\u0435\u043d\u0442 \u0441\u043e\u0434\u0435\u0440\u0436\u0438\u0442 \u043e\u043f\u0438\u0441\u0430\u043d\u0438\u0435 \u043f\u0440\u043e\u0435\u043a\u0442\u0430, \u0441\u0442\u043e\u0438\u043c\u043e\u0441\u0442\u044c \u0438 \u0441\u0440\u043e\u043a\u0438."
+            )
+        else:
+            caption = (
                 "\U0001f4c4 <b>\u0412\u0430\u0448\u0435 \u043f\u0435\u0440\u0441\u043e\u043d\u0430\u043b\u044c\u043d\u043e\u0435 \u043a\u043e\u043c\u043c\u0435\u0440\u0447\u0435\u0441\u043a\u043e\u0435 \u043f\u0440\u0435\u0434\u043b\u043e\u0436\u0435\u043d\u0438\u0435</b>\n\n"
                 "\u0414\u043e\u043a\u0443\u043c\u0435\u043d\u0442 \u0441\u043e\u0434\u0435\u0440\u0436\u0438\u0442 \u043e\u043f\u0438\u0441\u0430\u043d\u0438\u0435 \u043f\u0440\u043e\u0435\u043a\u0442\u0430, \u0441\u0442\u043e\u0438\u043c\u043e\u0441\u0442\u044c, "
                 "\u0441\u0440\u043e\u043a\u0438 \u0438 \u043f\u043e\u0440\u044f\u0434\u043e\u043a \u0440\u0430\u0431\u043e\u0442\u044b.\n\n"
                 "\u041f\u0435\u0440\u0435\u0448\u043b\u0438\u0442\u0435 \u0435\u0433\u043e \u043a\u043e\u043b\u043b\u0435\u0433\u0430\u043c \u0434\u043b\u044f \u0441\u043e\u0433\u043b\u0430\u0441\u043e\u0432\u0430\u043d\u0438\u044f!"
-            ),
-            parse_mode="HTML",
-        )
-        logger.info(f"KP PDF sent to user {update.effective_user.id}")
-        return True
-
-    except Exception as e:
-        logger.error(
-            f"Failed to generate/send KP PDF: {type(e).__name__}: {e} | "
-            f"client={client_name!r}, ai_text_len={len(ai_text) if ai_text else 0}, "
-            f"discount={discount_pct}, brief={brief_answers}, font={FONT}",
-            exc_info=True
-        )
-
-        try:
-            logger.info("Retrying KP PDF without AI text (fallback)")
-            fallback_pdf = build_kp_pdf(
-                brief_answers=brief_answers,
-                client_name=client_name if client_name else "",
-                ai_text="",
-                discount_pct=discount_pct,
             )
-            project_type = brief_answers.get("project_type", "project")
-            safe_name = project_type.replace(" ", "_").replace("/", "_")
-            filename = f"KP_WEB4TG_{safe_name}.pdf"
+        try:
             await context.bot.send_document(
                 chat_id=chat_id,
-                document=InputFile(io.BytesIO(fallback_pdf), filename=filename),
-                caption=(
-                    "\U0001f4c4 <b>\u0412\u0430\u0448\u0435 \u043a\u043e\u043c\u043c\u0435\u0440\u0447\u0435\u0441\u043a\u043e\u0435 \u043f\u0440\u0435\u0434\u043b\u043e\u0436\u0435\u043d\u0438\u0435</b>\n\n"
-                    "\u0414\u043e\u043a\u0443\u043c\u0435\u043d\u0442 \u0441\u043e\u0434\u0435\u0440\u0436\u0438\u0442 \u043e\u043f\u0438\u0441\u0430\u043d\u0438\u0435 \u043f\u0440\u043e\u0435\u043a\u0442\u0430, \u0441\u0442\u043e\u0438\u043c\u043e\u0441\u0442\u044c \u0438 \u0441\u0440\u043e\u043a\u0438."
-                ),
+                document=InputFile(io.BytesIO(pdf_bytes), filename=filename),
+                caption=caption,
                 parse_mode="HTML",
             )
-            logger.info(f"Fallback KP PDF sent to user {update.effective_user.id}")
+            logger.info(f"{'Fallback ' if fallback else ''}KP PDF sent to user {update.effective_user.id}")
             return True
-        except Exception as fallback_err:
-            logger.error(f"Fallback KP PDF also failed: {type(fallback_err).__name__}: {fallback_err}", exc_info=True)
+        except Exception as e:
+            logger.error(f"Failed to send KP PDF: {type(e).__name__}: {e}", exc_info=True)
 
-        try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=(
-                    "\u26a0\ufe0f \u041f\u0440\u043e\u0438\u0437\u043e\u0448\u043b\u0430 \u043e\u0448\u0438\u0431\u043a\u0430 \u043f\u0440\u0438 \u0433\u0435\u043d\u0435\u0440\u0430\u0446\u0438\u0438 PDF.\n\n"
-                    "\u041f\u043e\u043f\u0440\u043e\u0431\u0443\u0439\u0442\u0435 \u0435\u0449\u0451 \u0440\u0430\u0437 \u0438\u043b\u0438 \u043d\u0430\u043f\u0438\u0448\u0438\u0442\u0435 \u043d\u0430\u043c @web4_tg \u2014 \u043c\u044b \u043e\u0442\u043f\u0440\u0430\u0432\u0438\u043c \u043f\u0440\u0435\u0434\u043b\u043e\u0436\u0435\u043d\u0438\u0435 \u0432\u0440\u0443\u0447\u043d\u0443\u044e."
-                ),
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("\U0001f504 \u041f\u043e\u043f\u0440\u043e\u0431\u043e\u0432\u0430\u0442\u044c \u0435\u0449\u0451 \u0440\u0430\u0437", callback_data="generate_kp")],
-                    [InlineKeyboardButton("\U0001f468\u200d\U0001f4bc \u041e\u0442\u043f\u0440\u0430\u0432\u0438\u0442\u044c \u043c\u0435\u043d\u0435\u0434\u0436\u0435\u0440\u0443", callback_data="brief_send_manager")],
-                    [InlineKeyboardButton("\u25c0\ufe0f \u0413\u043b\u0430\u0432\u043d\u043e\u0435 \u043c\u0435\u043d\u044e", callback_data="menu_back")],
-                ]),
-            )
-        except Exception:
-            pass
-        return False
+    try:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=(
+                "\u26a0\ufe0f \u041f\u0440\u043e\u0438\u0437\u043e\u0448\u043b\u0430 \u043e\u0448\u0438\u0431\u043a\u0430 \u043f\u0440\u0438 \u0433\u0435\u043d\u0435\u0440\u0430\u0446\u0438\u0438 PDF.\n\n"
+                "\u041f\u043e\u043f\u0440\u043e\u0431\u0443\u0439\u0442\u0435 \u0435\u0449\u0451 \u0440\u0430\u0437 \u0438\u043b\u0438 \u043d\u0430\u043f\u0438\u0448\u0438\u0442\u0435 \u043d\u0430\u043c @web4_tg \u2014 \u043c\u044b \u043e\u0442\u043f\u0440\u0430\u0432\u0438\u043c \u043f\u0440\u0435\u0434\u043b\u043e\u0436\u0435\u043d\u0438\u0435 \u0432\u0440\u0443\u0447\u043d\u0443\u044e."
+            ),
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("\U0001f504 \u041f\u043e\u043f\u0440\u043e\u0431\u043e\u0432\u0430\u0442\u044c \u0435\u0449\u0451 \u0440\u0430\u0437", callback_data="generate_kp")],
+                [InlineKeyboardButton("\U0001f468\u200d\U0001f4bc \u041e\u0442\u043f\u0440\u0430\u0432\u0438\u0442\u044c \u043c\u0435\u043d\u0435\u0434\u0436\u0435\u0440\u0443", callback_data="brief_send_manager")],
+                [InlineKeyboardButton("\u25c0\ufe0f \u0413\u043b\u0430\u0432\u043d\u043e\u0435 \u043c\u0435\u043d\u044e", callback_data="menu_back")],
+            ]),
+        )
+    except Exception:
+        pass
+    return False
+
+
+def _benchmark(docs: int, parallel: int) -> None:
+    """Per-document latency and throughput: inline rendering vs the process pool."""
+    brief = {"project_type": "shop", "budget_timeline": "balanced", "audience": "b2c", "design_pref": "modern"}
+    ai_text = "\n".join(["Клиенту нужен магазин в Telegram с каталогом и оплатой. " * 4] * 4)
+
+    build_kp_pdf(brief, "warmup", ai_text)
+    start = time.perf_counter()
+    for i in range(docs):
+        build_kp_pdf(brief, f"Client {i}", ai_text)
+    inline = time.perf_counter() - start
+    print(f"  inline, sequential          {docs / inline:6.1f} docs/s  ({inline * 1000 / docs:.1f} ms/doc)")
+
+    async def run_pool():
+        await render_kp_pdf(brief, "warmup", ai_text)
+        latencies = []
+
+        async def one(i):
+            t = time.perf_counter()
+            await render_kp_pdf(brief, f"Pool client {i}", ai_text)
+            latencies.append(time.perf_counter() - t)
+
+        start = time.perf_counter()
+        for batch in range(0, docs, parallel):
+            await asyncio.gather(*(one(i) for i in range(batch, min(docs, batch + parallel))))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+        print(f"  pool x{KP_PDF_WORKERS}, {parallel} parallel      {docs / elapsed:6.1f} docs/s  "
+              f"(p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms incl. queueing)")
+
+        t = time.perf_counter()
+        await render_kp_pdf(brief, "Pool client 0", ai_text)
+        print(f"  memoized repeat             {(time.perf_counter() - t) * 1000:9.3f} ms")
+
+    asyncio.run(run_pool())
+    shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    if "--bench" in sys.argv:
+        args = [a for a in sys.argv[sys.argv.index("--bench") + 1:] if not a.startswith("--")]
+        parallel = 4
+        if "--parallel" in sys.argv:
+            parallel = int(sys.argv[sys.argv.index("--parallel") + 1])
+        _benchmark(int(args[0]) if args else 20, parallel)
@@ -0,0 +1,87 @@
+"""Lazy construction and lazy imports.
+
+``lead_manager = LazySingleton(LeadManager)`` keeps the import-time name and
+call sites unchanged, but the object is only built on first attribute access.
+``LazyModule("google.genai")`` does the same for a heavy module, and
+``lazy_callback(module, name)`` for a handler that is registered at startup
+but imported on the first update it handles.
+"""
+
+import importlib
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LazySingleton(Generic[T]):
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], T]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self) -> str:
+        if self._instance is None:
+            return f"<lazy {getattr(self._factory, '__name__', 'singleton')} (not initialized)>"
+        return repr(self._instance)
+
+
+class LazyModule:
+    """Module stand-in that imports the real module on first attribute access."""
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _resolve(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_callback(module_name: str, attr: str) -> Callable:
+    """Async callback that imports ``module_name.attr`` when first awaited."""
+    target = None
+
+    async def callback(*args, **kwargs):
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(module_name), attr)
+        return await target(*args, **kwargs)
+
+    callback.__name__ = callback.__qualname__ = attr
+    callback.__module__ = module_name
+    return callback
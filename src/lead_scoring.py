@@ -0,0 +1,345 @@
+"""Lead score and purchase propensity from one feature vector.
+
+Both scores are computed from one row per user, built by FEATURE_COLUMNS
+over ``leads`` joined with ``interaction_metrics``. Time-based features
+(hours since the last lead activity, days since the first and last
+interaction) are computed by the database clock. ``lead_score`` and
+``propensity_score`` are written once, against an array namespace.
+Python scalars and NumPy columns therefore go through the same arithmetic.
+
+- lead score (``leads.score``, 0-100): contact details, budget, estimate,
+  selected features, message count, recency of activity. A score of
+  HOT_SCORE or more raises the priority to hot, WARM_SCORE or more to warm;
+  lower scores keep the priority as set;
+- propensity (``interaction_metrics.last_score``, 0-100): message velocity
+  and depth, sessions, tool usage, buying signals and manual boosts,
+  multiplied by a recency decay.
+
+``lead_scoring.rescore_user`` is the event path. LeadManager.update_activity
+and PropensityScorer.record_interaction call it after every message: one
+SELECT, then an UPDATE only for a score that changed.
+
+The recency terms change while a user is silent, so ``rescore_all`` reruns
+every LEAD_RESCORE_INTERVAL seconds. It reads the feature rows through a
+server-side cursor in chunks of LEAD_RESCORE_BATCH. Each chunk is scored as
+NumPy columns, or row by row when NumPy is not installed. Changed scores are
+written in bulk with ``UPDATE … FROM (VALUES …)``. A row whose user was
+active after the read is skipped; the event path has already rescored it.
+The batch only replays recency, so it never lowers a lead's priority (only a
+new message can), and it leaves alone a lead written by an explicit event
+(handoff, consultation, /priority, …) after its last message: those set the
+score and priority on purpose and keep them until the user writes again.
+
+Metrics: ``lead_rescore_seconds``, ``lead_rescore_rows``,
+``lead_rescore_updates_total{table}``.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LEAD_RESCORE_INTERVAL = int(os.environ.get("LEAD_RESCORE_INTERVAL", "3600"))
+LEAD_RESCORE_BATCH = int(os.environ.get("LEAD_RESCORE_BATCH", "5000"))
+BULK_PAGE_SIZE = 500
+
+HOT_SCORE = 50
+WARM_SCORE = 25
+
+FEATURE_COLUMNS = """
+    COALESCE(l.user_id, m.user_id) AS user_id,
+    l.user_id IS NOT NULL AS has_lead,
+    m.user_id IS NOT NULL AS has_metrics,
+    COALESCE(l.phone, '') <> '' AS has_phone,
+    COALESCE(l.business_type, '') <> '' AS has_business_type,
+    COALESCE(l.budget, '') <> '' AS has_budget,
+    COALESCE(l.estimated_cost, 0) AS estimated_cost,
+    COALESCE(cardinality(l.selected_features), 0) AS feature_count,
+    COALESCE(l.message_count, 0) AS message_count,
+    EXTRACT(EPOCH FROM LOCALTIMESTAMP - l.last_activity) / 3600 AS hours_since_activity,
+    EXTRACT(EPOCH FROM LOCALTIMESTAMP - m.first_interaction) / 86400 AS days_active,
+    EXTRACT(EPOCH FROM LOCALTIMESTAMP - m.last_interaction) / 86400 AS days_since_interaction,
+    COALESCE(m.total_messages, 0) AS total_messages,
+    COALESCE(m.session_count, 0) AS session_count,
+    COALESCE(m.calculator_uses, 0) AS calculator_uses,
+    COALESCE(m.portfolio_views, 0) AS portfolio_views,
+    COALESCE(m.pricing_views, 0) AS pricing_views,
+    COALESCE(m.roi_uses, 0) AS roi_uses,
+    COALESCE(m.brief_uses, 0) AS brief_uses,
+    COALESCE(m.compare_uses, 0) AS compare_uses,
+    COALESCE(m.lead_submitted, FALSE) AS lead_submitted,
+    COALESCE(m.consultation_requested, FALSE) AS consultation_requested,
+    COALESCE(m.payment_viewed, FALSE) AS payment_viewed,
+    COALESCE(m.score_boost, 0) AS score_boost,
+    l.score AS stored_score,
+    l.priority AS stored_priority,
+    m.last_score AS stored_propensity,
+    l.last_activity AS lead_seen,
+    l.updated_at AS lead_updated,
+    m.last_interaction AS metrics_seen
+"""
+
+# A missing timestamp counts as "long ago": no recency bonus, full decay.
+_FEATURE_DEFAULTS = {
+    "hours_since_activity": math.inf,
+    "days_active": 0.1,
+    "days_since_interaction": math.inf,
+}
+FEATURES = (
+    "has_phone", "has_business_type", "has_budget", "estimated_cost", "feature_count", "message_count",
+    "hours_since_activity", "days_active", "days_since_interaction", "total_messages", "session_count",
+    "calculator_uses", "portfolio_views", "pricing_views", "roi_uses", "brief_uses", "compare_uses",
+    "lead_submitted", "consultation_requested", "payment_viewed", "score_boost",
+)
+
+SCALAR_OPS = SimpleNamespace(
+    minimum=min,
+    maximum=max,
+    where=lambda condition, a, b: a if condition else b,
+    floor=math.floor,
+)
+
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def _feature(row: Dict, name: str) -> float:
+    value = row[name]
+    if value is None:
+        return _FEATURE_DEFAULTS.get(name, 0)
+    return float(value) if name in _FEATURE_DEFAULTS else value
+
+
+def lead_score(f, xp=SCALAR_OPS):
+    messages = f["message_count"]
+    hours = f["hours_since_activity"]
+    score = (
+        f["has_phone"] * 20
+        + f["has_business_type"] * 15
+        + f["has_budget"] * 15
+        + (f["estimated_cost"] > 0) * 10
+        + xp.minimum(f["feature_count"] * 5, 20)
+        + xp.where(messages >= 5, 10, xp.where(messages >= 2, 5, 0))
+        + xp.where(hours < 24, 10, xp.where(hours < 72, 5, 0))
+    )
+    return xp.minimum(score, 100)
+
+
+def propensity_score(f, xp=SCALAR_OPS):
+    days_active = xp.maximum(f["days_active"], 0.1)
+    velocity = xp.minimum(f["total_messages"] / days_active * 3, 15)
+    depth = xp.minimum(f["total_messages"] / 3, 15)
+    sessions = xp.minimum(f["session_count"] * 5, 15)
+    tools = xp.minimum(
+        f["calculator_uses"] * 8 + f["portfolio_views"] * 5 + f["pricing_views"] * 3
+        + f["roi_uses"] * 5 + f["brief_uses"] * 8 + f["compare_uses"] * 3,
+        25,
+    )
+    buying = xp.minimum(f["lead_submitted"] * 15 + f["consultation_requested"] * 10 + f["payment_viewed"] * 15, 25)
+    idle = f["days_since_interaction"]
+    decay = xp.where(idle <= 1, 1.0, xp.where(idle <= 3, 0.9, xp.where(idle <= 7, 0.7, xp.where(
+        idle <= 14, 0.5, xp.where(idle <= 30, 0.3, 0.1)))))
+    raw = velocity + depth + sessions + tools + buying + f["score_boost"]
+    return xp.minimum(xp.floor(raw * decay), 100)
+
+
+_PRIORITY_RANK = {"cold": 0, "warm": 1, "hot": 2}
+
+
+def priority_for(score, current, xp=SCALAR_OPS):
+    return xp.where(score >= HOT_SCORE, "hot", xp.where(score >= WARM_SCORE, "warm", current))
+
+
+def _set_by_event(row: Dict) -> bool:
+    """The lead was written by something other than a message since its last message."""
+    seen, updated = row["lead_seen"], row["lead_updated"]
+    return seen is None or (updated is not None and updated > seen)
+
+
+def _never_lower(stored: Optional[str], computed: str) -> str:
+    stored = stored or "cold"
+    return computed if _PRIORITY_RANK.get(computed, 0) >= _PRIORITY_RANK.get(stored, 0) else stored
+
+
+@dataclass
+class Scores:
+    user_id: int
+    lead: Optional[int]
+    priority: Optional[str]
+    propensity: Optional[int]
+
+
+def _score_row(row: Dict) -> Scores:
+    f = {name: _feature(row, name) for name in FEATURES}
+    lead = int(lead_score(f)) if row["has_lead"] else None
+    return Scores(
+        user_id=row["user_id"],
+        lead=lead,
+        priority=priority_for(lead, row["stored_priority"] or "cold") if lead is not None else None,
+        propensity=int(propensity_score(f)) if row["has_metrics"] else None,
+    )
+
+
+def score_rows(rows: List[Dict]) -> List[Scores]:
+    """Score a chunk of feature rows, as NumPy columns when available."""
+    np = _numpy()
+    if np is None or len(rows) < 2:
+        return [_score_row(row) for row in rows]
+    f = {name: np.array([_feature(row, name) for row in rows], dtype=float) for name in FEATURES}
+    leads = lead_score(f, np).astype(int)
+    current = np.array([row["stored_priority"] or "cold" for row in rows], dtype=object)
+    priorities = priority_for(leads, current, np)
+    propensities = propensity_score(f, np).astype(int)
+    return [
+        Scores(
+            user_id=row["user_id"],
+            lead=int(leads[i]) if row["has_lead"] else None,
+            priority=str(priorities[i]) if row["has_lead"] else None,
+            propensity=int(propensities[i]) if row["has_metrics"] else None,
+        )
+        for i, row in enumerate(rows)
+    ]
+
+
+class LeadScoringEngine:
+    def _read_user(self, cur, user_id: int) -> Optional[Dict]:
+        cur.execute(f"""
+            SELECT {FEATURE_COLUMNS}
+            FROM (SELECT %s::bigint AS user_id) u
+            LEFT JOIN leads l ON l.user_id = u.user_id
+            LEFT JOIN interaction_metrics m ON m.user_id = u.user_id
+            WHERE l.user_id IS NOT NULL OR m.user_id IS NOT NULL
+        """, (user_id,))
+        return cur.fetchone()
+
+    def score_user(self, user_id: int) -> Optional[Scores]:
+        """Current scores for one user, without storing them."""
+        if not DATABASE_URL:
+            return None
+        try:
+            with get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    row = self._read_user(cur, user_id)
+            return _score_row(row) if row else None
+        except Exception as e:
+            logger.error(f"Failed to score user {user_id}: {e}")
+        return None
+
+    def rescore_user(self, user_id: int) -> Optional[Scores]:
+        """Score one user after an event and store whatever changed."""
+        if not DATABASE_URL:
+            return None
+        try:
+            with get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    row = self._read_user(cur, user_id)
+                    if not row:
+                        return None
+                    scores = _score_row(row)
+                    if scores.lead is not None and (scores.lead, scores.priority) != (row["stored_score"], row["stored_priority"]):
+                        cur.execute(
+                            "UPDATE leads SET score = %s, priority = %s WHERE user_id = %s",
+                            (scores.lead, scores.priority, user_id)
+                        )
+                    if scores.propensity is not None and scores.propensity != row["stored_propensity"]:
+                        cur.execute("""
+                            UPDATE interaction_metrics SET last_score = %s, score_updated_at = CURRENT_TIMESTAMP
+                            WHERE user_id = %s
+                        """, (scores.propensity, user_id))
+            return scores
+        except Exception as e:
+            logger.error(f"Failed to rescore user {user_id}: {e}")
+        return None
+
+    def rescore_all(self) -> Dict[str, int]:
+        """Rescore every user; returns the number of rows updated per table."""
+        updated = {"leads": 0, "interaction_metrics": 0}
+        if not DATABASE_URL:
+            return updated
+
+        start = time.perf_counter()
+        lead_changes: List[tuple] = []
+        propensity_changes: List[tuple] = []
+        total = 0
+        with get_connection() as conn:
+            with conn.cursor(name=f"rescore_{uuid.uuid4().hex[:12]}", cursor_factory=RealDictCursor) as cur:
+                cur.itersize = LEAD_RESCORE_BATCH
+                cur.execute(f"""
+                    SELECT {FEATURE_COLUMNS}
+                    FROM leads l FULL OUTER JOIN interaction_metrics m ON m.user_id = l.user_id
+                """)
+                while True:
+                    rows = cur.fetchmany(LEAD_RESCORE_BATCH)
+                    if not rows:
+                        break
+                    total += len(rows)
+                    for row, scores in zip(rows, score_rows(rows)):
+                        if scores.lead is not None and not _set_by_event(row):
+                            priority = _never_lower(row["stored_priority"], scores.priority)
+                            if (scores.lead, priority) != (row["stored_score"], row["stored_priority"]):
+                                lead_changes.append((scores.user_id, scores.lead, priority,
+                                                     row["lead_seen"], row["lead_updated"]))
+                        if scores.propensity is not None and scores.propensity != row["stored_propensity"]:
+                            propensity_changes.append((scores.user_id, scores.propensity, row["metrics_seen"]))
+
+        updated["leads"] = self._bulk_update("""
+            UPDATE leads AS l SET score = v.score, priority = v.priority
+            FROM (VALUES %s) AS v(user_id, score, priority, seen, updated)
+            WHERE l.user_id = v.user_id AND l.last_activity IS NOT DISTINCT FROM v.seen::timestamp
+              AND l.updated_at IS NOT DISTINCT FROM v.updated::timestamp
+        """, lead_changes)
+        updated["interaction_metrics"] = self._bulk_update("""
+            UPDATE interaction_metrics AS m SET last_score = v.score, score_updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(user_id, score, seen)
+            WHERE m.user_id = v.user_id AND m.last_interaction IS NOT DISTINCT FROM v.seen::timestamp
+        """, propensity_changes)
+
+        elapsed = time.perf_counter() - start
+        registry.observe("lead_rescore_seconds", elapsed)
+        registry.set_gauge("lead_rescore_rows", total)
+        for table, count in updated.items():
+            if count:
+                registry.inc("lead_rescore_updates_total", count, table=table)
+        logger.info(
+            f"Rescored {total} users in {elapsed:.2f}s: {updated['leads']} lead scores, "
+            f"{updated['interaction_metrics']} propensity scores changed"
+        )
+        return updated
+
+    @staticmethod
+    def _bulk_update(query: str, values: List[tuple]) -> int:
+        count = 0
+        for offset in range(0, len(values), BULK_PAGE_SIZE):
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    execute_values(cur, query, values[offset:offset + BULK_PAGE_SIZE], page_size=BULK_PAGE_SIZE)
+                    count += cur.rowcount
+        return count
+
+
+lead_scoring = LazySingleton(LeadScoringEngine)
+
+
+async def periodic_lead_rescore(context):
+    try:
+        await asyncio.to_thread(lead_scoring.rescore_all)
+    except Exception as e:
+        logger.error(f"Lead rescoring failed: {e}")
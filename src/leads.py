@@ -1,13 +1,16 @@
 import os
 import time
 import logging
-import csv
-import io
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 from enum import Enum
 from datetime import datetime, timedelta
 from src.database import get_connection, is_available as db_available, DATABASE_URL
+from src.lazy import LazySingleton
+from src.lead_scoring import lead_scoring
+from src.migrations import register_schema
+from src.export_stream import ExportResult, export_query
+from src.conversation_log import conversation_log, VOICE_PREFIX
 from psycopg2.extras import RealDictCursor
 
 logger = logging.getLogger(__name__)
@@ -47,6 +50,46 @@ class Lead:
     message_count: int = 0
 
 
+_EPOCH = datetime(1970, 1, 1)
+_B36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(n: int) -> str:
+    digits = ""
+    while True:
+        n, r = divmod(n, 36)
+        digits = _B36[r] + digits
+        if not n:
+            return digits
+
+
+@dataclass(frozen=True)
+class LeadCursor:
+    """Position after the last lead of a page in (score, updated_at, user_id)
+    order, short enough for callback_data."""
+    score: int
+    updated_at: datetime
+    user_id: int
+
+    def encode(self) -> str:
+        micros = (self.updated_at - _EPOCH) // timedelta(microseconds=1)
+        return ".".join(_base36(v) for v in (self.score, micros, self.user_id))
+
+    @classmethod
+    def decode(cls, text: str) -> "LeadCursor":
+        parts = text.split(".")
+        if len(parts) != 3:
+            raise ValueError(f"Malformed lead cursor: {text!r}")
+        score, micros, user_id = (int(p, 36) for p in parts)
+        return cls(score, _EPOCH + timedelta(microseconds=micros), user_id)
+
+
+@dataclass
+class LeadPage:
+    leads: List[Lead]
+    next_cursor: Optional[LeadCursor] = None
+
+
 @dataclass
 class Message:
     id: Optional[int]
@@ -59,18 +102,18 @@ class Message:
 class LeadManager:
     def __init__(self):
         self._manager_chat_id: Optional[int] = None
-        self._init_db()
     
     def _get_connection(self):
         return get_connection()
     
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, leads will not be persisted")
             return
         
         try:
-            with self._get_connection() as conn:
+            with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS leads (
@@ -107,16 +150,6 @@ class LeadManager:
                         except Exception:
                             pass
                     
-                    cur.execute("""
-                        CREATE TABLE IF NOT EXISTS conversations (
-                            id SERIAL PRIMARY KEY,
-                            user_id BIGINT NOT NULL,
-                            role VARCHAR(20) NOT NULL,
-                            content TEXT NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS analytics (
                             id SERIAL PRIMARY KEY,
@@ -133,11 +166,18 @@ class LeadManager:
                     cur.execute("""
                         CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at)
                     """)
+                    cur.execute("UPDATE leads SET score = 0 WHERE score IS NULL")
+                    cur.execute("UPDATE leads SET updated_at = created_at WHERE updated_at IS NULL")
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_leads_rank
+                        ON leads(score, updated_at, user_id)
+                    """)
                     cur.execute("""
-                        CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations(user_id)
+                        CREATE INDEX IF NOT EXISTS idx_leads_priority_rank
+                        ON leads(priority, score, updated_at, user_id)
                     """)
                     cur.execute("""
-                        CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations(created_at)
+                        CREATE INDEX IF NOT EXISTS idx_leads_tags ON leads USING GIN(tags)
                     """)
                     cur.execute("""
                         CREATE INDEX IF NOT EXISTS idx_analytics_type ON analytics(event_type)
@@ -156,45 +196,17 @@ class LeadManager:
     def get_manager_chat_id(self) -> Optional[int]:
         return self._manager_chat_id
     
-    def save_message(self, user_id: int, role: str, content: str) -> None:
-        if not DATABASE_URL:
-            return
-        
-        try:
-            with self._get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO conversations (user_id, role, content)
-                        VALUES (%s, %s, %s)
-                    """, (user_id, role, content[:10000]))
-        except Exception as e:
-            logger.error(f"Failed to save message: {e}")
-    
     def get_conversation_history(self, user_id: int, limit: int = 50) -> List[Message]:
-        if not DATABASE_URL:
-            return []
-        
-        messages = []
-        try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT * FROM conversations 
-                        WHERE user_id = %s 
-                        ORDER BY created_at DESC 
-                        LIMIT %s
-                    """, (user_id, limit))
-                    for row in cur.fetchall():
-                        messages.append(Message(
-                            id=row['id'],
-                            user_id=row['user_id'],
-                            role=row['role'],
-                            content=row['content'],
-                            created_at=row['created_at'].timestamp() if row['created_at'] else time.time()
-                        ))
-        except Exception as e:
-            logger.error(f"Failed to get conversation: {e}")
-        return list(reversed(messages))
+        return [
+            Message(
+                id=row['id'],
+                user_id=row['user_id'],
+                role=row['role'],
+                content=conversation_log.display_content(row),
+                created_at=row['created_at'].timestamp() if row['created_at'] else time.time()
+            )
+            for row in conversation_log.recent(user_id, limit)
+        ]
     
     def log_event(self, event_type: str, user_id: Optional[int] = None, data: Optional[Dict] = None) -> None:
         if not DATABASE_URL:
@@ -381,34 +393,9 @@ class LeadManager:
         return "\n".join(lines)
     
     def calculate_score(self, user_id: int) -> int:
-        score = 0
-        lead = self.get_lead(user_id)
-        if not lead:
-            return 0
-        
-        if lead.phone:
-            score += 20
-        if lead.business_type:
-            score += 15
-        if lead.budget:
-            score += 15
-        if lead.estimated_cost > 0:
-            score += 10
-        if lead.selected_features:
-            score += min(len(lead.selected_features) * 5, 20)
-        if lead.message_count >= 5:
-            score += 10
-        elif lead.message_count >= 2:
-            score += 5
-        
-        if lead.last_activity:
-            hours_since = (time.time() - lead.last_activity) / 3600
-            if hours_since < 24:
-                score += 10
-            elif hours_since < 72:
-                score += 5
-        
-        return min(score, 100)
+        """Current lead score, computed by the shared scoring engine without storing it."""
+        scores = lead_scoring.score_user(user_id)
+        return scores.lead or 0 if scores else 0
     
     def update_activity(self, user_id: int) -> None:
         if not DATABASE_URL:
@@ -416,59 +403,20 @@ class LeadManager:
         
         try:
             with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                with conn.cursor() as cur:
                     cur.execute("""
                         UPDATE leads SET 
                             last_activity = CURRENT_TIMESTAMP,
                             message_count = COALESCE(message_count, 0) + 1,
                             updated_at = CURRENT_TIMESTAMP
                         WHERE user_id = %s
-                        RETURNING *
                     """, (user_id,))
-                    row = cur.fetchone()
-                    if not row:
+                    if not cur.rowcount:
                         return
-                    
-                    lead = self._row_to_lead(row)
-                    score = self._calculate_score_from_lead(lead)
-                    
-                    priority_val = lead.priority.value if lead.priority else "cold"
-                    if score >= 50:
-                        priority_val = LeadPriority.HOT.value
-                    elif score >= 25:
-                        priority_val = LeadPriority.WARM.value
-                    
-                    cur.execute("""
-                        UPDATE leads SET score = %s, priority = %s, updated_at = CURRENT_TIMESTAMP
-                        WHERE user_id = %s
-                    """, (score, priority_val, user_id))
+            lead_scoring.rescore_user(user_id)
         except Exception as e:
             logger.error(f"Failed to update activity: {e}")
     
-    def _calculate_score_from_lead(self, lead) -> int:
-        score = 0
-        if lead.phone:
-            score += 20
-        if lead.business_type:
-            score += 15
-        if lead.budget:
-            score += 15
-        if lead.estimated_cost > 0:
-            score += 10
-        if lead.selected_features:
-            score += min(len(lead.selected_features) * 5, 20)
-        if lead.message_count >= 5:
-            score += 10
-        elif lead.message_count >= 2:
-            score += 5
-        if lead.last_activity:
-            hours_since = (time.time() - lead.last_activity) / 3600
-            if hours_since < 24:
-                score += 10
-            elif hours_since < 72:
-                score += 5
-        return min(score, 100)
-    
     def add_tag(self, user_id: int, tag: str) -> Optional[Lead]:
         lead = self.get_lead(user_id)
         if not lead:
@@ -488,41 +436,61 @@ class LeadManager:
         tags = [t for t in lead.tags if t != tag]
         return self.update_lead(user_id, tags=tags)
     
-    def get_leads_by_priority(self, priority: LeadPriority, limit: int = 50) -> List[Lead]:
+    def get_leads_page(
+        self,
+        priority: Optional[LeadPriority] = None,
+        tag: Optional[str] = None,
+        after: Optional[LeadCursor] = None,
+        limit: int = 10
+    ) -> LeadPage:
+        """One page of leads by score, most recently updated first among equals.
+
+        Keyset pagination: the next page starts after ``next_cursor`` through
+        idx_leads_rank / idx_leads_priority_rank, so a page costs the same at
+        any depth; tag filters use the GIN index on tags.
+        """
         if not DATABASE_URL:
-            return []
+            return LeadPage([])
+        
+        conditions = []
+        params: list = []
+        if priority is not None:
+            conditions.append("priority = %s")
+            params.append(priority.value)
+        if tag is not None:
+            conditions.append("tags @> ARRAY[%s]::text[]")
+            params.append(tag)
+        if after is not None:
+            conditions.append("(score, updated_at, user_id) < (%s, %s, %s)")
+            params.extend([after.score, after.updated_at, after.user_id])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit + 1)
         
-        leads = []
         try:
             with self._get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(
-                        "SELECT * FROM leads WHERE priority = %s ORDER BY score DESC LIMIT %s",
-                        (priority.value, limit)
-                    )
-                    for row in cur.fetchall():
-                        leads.append(self._row_to_lead(row))
+                    cur.execute(f"""
+                        SELECT * FROM leads {where}
+                        ORDER BY score DESC, updated_at DESC, user_id DESC
+                        LIMIT %s
+                    """, params)
+                    rows = cur.fetchall()
         except Exception as e:
-            logger.error(f"Failed to get leads by priority: {e}")
-        return leads
+            logger.error(f"Failed to get leads page: {e}")
+            return LeadPage([])
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = LeadCursor(last['score'], last['updated_at'], last['user_id'])
+        return LeadPage([self._row_to_lead(row) for row in rows], next_cursor)
+    
+    def get_leads_by_priority(self, priority: LeadPriority, limit: int = 50) -> List[Lead]:
+        return self.get_leads_page(priority=priority, limit=limit).leads
     
     def get_leads_by_tag(self, tag: str, limit: int = 50) -> List[Lead]:
-        if not DATABASE_URL:
-            return []
-        
-        leads = []
-        try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(
-                        "SELECT * FROM leads WHERE %s = ANY(tags) ORDER BY score DESC LIMIT %s",
-                        (tag, limit)
-                    )
-                    for row in cur.fetchall():
-                        leads.append(self._row_to_lead(row))
-        except Exception as e:
-            logger.error(f"Failed to get leads by tag: {e}")
-        return leads
+        return self.get_leads_page(tag=tag, limit=limit).leads
     
     def get_lead_history(self, user_id: int, limit: int = 100) -> List[Dict]:
         if not DATABASE_URL:
@@ -533,14 +501,16 @@ class LeadManager:
             with self._get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("""
-                        SELECT 'message' as type, role, content, created_at
-                        FROM conversations WHERE user_id = %s
+                        SELECT 'message' as type, role,
+                               CASE WHEN kind = 'voice' THEN %s || content ELSE content END as content,
+                               created_at
+                        FROM conversation_log WHERE user_id = %s
                         UNION ALL
                         SELECT 'event' as type, event_type as role, 
                                COALESCE(data::text, '') as content, created_at
                         FROM analytics WHERE user_id = %s
                         ORDER BY created_at DESC LIMIT %s
-                    """, (user_id, user_id, limit))
+                    """, (VOICE_PREFIX, user_id, user_id, limit))
                     for row in cur.fetchall():
                         history.append({
                             'type': row['type'],
@@ -553,19 +523,36 @@ class LeadManager:
         return list(reversed(history))
     
     def get_all_leads(self, limit: int = 100) -> List[Lead]:
+        return self.get_leads_page(limit=limit).leads
+    
+    def get_lead_counters(self) -> Dict:
+        """Pipeline counters for the CRM views, aggregated in one scan."""
+        empty = {"total": 0, "hot": 0, "warm": 0, "cold": 0, "converted": 0,
+                 "healthy": 0, "at_risk": 0, "churning": 0, "avg_score": 0.0}
         if not DATABASE_URL:
-            return []
+            return empty
         
-        leads = []
         try:
             with self._get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("SELECT * FROM leads ORDER BY score DESC, created_at DESC LIMIT %s", (limit,))
-                    for row in cur.fetchall():
-                        leads.append(self._row_to_lead(row))
+                    cur.execute("""
+                        SELECT
+                            COUNT(*) AS total,
+                            COUNT(*) FILTER (WHERE priority = 'hot') AS hot,
+                            COUNT(*) FILTER (WHERE priority = 'warm') AS warm,
+                            COUNT(*) FILTER (WHERE priority = 'cold' OR priority IS NULL) AS cold,
+                            COUNT(*) FILTER (WHERE status = 'converted') AS converted,
+                            COUNT(*) FILTER (WHERE score >= 50) AS healthy,
+                            COUNT(*) FILTER (WHERE score >= 20 AND score < 50) AS at_risk,
+                            COUNT(*) FILTER (WHERE COALESCE(score, 0) < 20) AS churning,
+                            COALESCE(AVG(score), 0)::float AS avg_score
+                        FROM leads
+                    """)
+                    row = cur.fetchone()
+                    return dict(row) if row else empty
         except Exception as e:
-            logger.error(f"Failed to get leads: {e}")
-        return leads
+            logger.error(f"Failed to get lead counters: {e}")
+        return empty
     
     def get_stats(self) -> Dict:
         if not DATABASE_URL:
@@ -649,35 +636,58 @@ class LeadManager:
             logger.error(f"Failed to get popular topics: {e}")
         return []
     
-    def export_leads_csv(self) -> str:
-        leads = self.get_all_leads(limit=1000)
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        writer.writerow([
-            'ID', 'User ID', 'Username', 'Имя', 'Телефон', 
-            'Тип бизнеса', 'Бюджет', 'Расчёт', 'Статус', 
-            'Функции', 'Сообщение', 'Дата создания'
-        ])
-        
-        for lead in leads:
-            writer.writerow([
-                lead.id,
-                lead.user_id,
-                f"@{lead.username}" if lead.username else "",
-                lead.first_name or "",
-                lead.phone or "",
-                lead.business_type or "",
-                lead.budget or "",
-                lead.estimated_cost,
-                lead.status.value,
-                ", ".join(lead.selected_features),
-                lead.message or "",
-                datetime.fromtimestamp(lead.created_at).strftime("%Y-%m-%d %H:%M")
-            ])
+    _EXPORT_LABELS = {
+        'id': 'ID', 'user_id': 'User ID', 'username': 'Username', 'first_name': 'Имя',
+        'phone': 'Телефон', 'business_type': 'Тип бизнеса', 'budget': 'Бюджет',
+        'estimated_cost': 'Расчёт', 'status': 'Статус', 'selected_features': 'Функции',
+        'message': 'Сообщение', 'created_at': 'Дата создания',
+    }
+    
+    @staticmethod
+    def _export_row(row: dict) -> dict:
+        created = row['created_at']
+        return {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'username': f"@{row['username']}" if row['username'] else "",
+            'first_name': row['first_name'] or "",
+            'phone': row['phone'] or "",
+            'business_type': row['business_type'] or "",
+            'budget': row['budget'] or "",
+            'estimated_cost': row['estimated_cost'] or 0,
+            'status': row['status'],
+            'selected_features': ", ".join(row['selected_features'] or []),
+            'message': row['message'] or "",
+            'created_at': created.strftime("%Y-%m-%d %H:%M") if created else "",
+        }
+    
+    def export_leads(self, fmt: str = "csv", compress: bool = False,
+                     days: Optional[int] = None) -> Optional[ExportResult]:
+        """Stream leads (all, or created in the last ``days``) into export parts; the caller closes the result."""
+        if not DATABASE_URL:
+            return None
         
-        return output.getvalue()
-
+        where = "WHERE created_at >= NOW() - %s * INTERVAL '1 day'" if days else ""
+        try:
+            result = export_query(
+                f"""
+                SELECT id, user_id, username, first_name, phone, business_type, budget,
+                       estimated_cost, status, selected_features, message, created_at
+                FROM leads {where} ORDER BY score DESC, created_at DESC
+                """,
+                (days,) if days else None, f"leads_{days}d" if days else "leads_export", fmt=fmt, compress=compress,
+                row_mapper=self._export_row, header_labels=self._EXPORT_LABELS
+            )
+            if not result.rows:
+                result.close()
+                return None
+            return result
+        except Exception as e:
+            logger.error(f"Failed to export leads: {e}")
+        return None
+    
+    def export_leads_csv(self, compress: bool = False) -> Optional[ExportResult]:
+        return self.export_leads("csv", compress)
 
-lead_manager = LeadManager()
+lead_manager = LazySingleton(LeadManager)
+register_schema("leads", 2, LeadManager._init_db)
@@ -4,6 +4,7 @@ from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 from src.database import get_connection, is_available as db_available, DATABASE_URL
+from src.migrations import register_schema
 from psycopg2.extras import RealDictCursor
 
 logger = logging.getLogger(__name__)
@@ -73,21 +74,19 @@ class CustomerOrder:
 
 
 class LoyaltySystem:
-    def __init__(self):
-        self._init_db()
-    
     def _get_connection(self):
         if not DATABASE_URL:
             raise Exception("DATABASE_URL not configured")
         return get_connection()
     
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, loyalty system disabled")
             return
         
         try:
-            with self._get_connection() as conn:
+            with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS customer_reviews (
@@ -452,3 +451,6 @@ def format_review_bonus_info() -> str:
 💡 <i>Отзывы проверяются менеджером перед начислением</i>
 
 Готовы оставить отзыв? Выберите тип:"""
+
+
+register_schema("loyalty", 1, LoyaltySystem._init_db)
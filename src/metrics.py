@@ -0,0 +1,317 @@
+"""Low-overhead metrics registry: counters, gauges and log-linear histograms.
+
+Every series has constant memory (histograms use a fixed bucket layout),
+recording is a couple of list/float updates with no locking, and the whole
+registry can be rendered in Prometheus text format for a local scrape
+endpoint or a file export.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_MANTISSAS = (1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0)
+
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = tuple(
+    round(m * 10 ** e, 6) for e in range(-3, 3) for m in _MANTISSAS
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(round(value, 6))
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated inside a bucket."""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        total = self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c == 0:
+                continue
+            if seen + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                fraction = (rank - seen) / c
+                return min(lower + (upper - lower) * fraction, self.max)
+            seen += c
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def merge(self, other: "Histogram") -> None:
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def since(self, earlier: "Histogram") -> "Histogram":
+        """Observations recorded after ``earlier``, a past copy of this histogram.
+
+        The interval maximum is not tracked, so it is bounded by the upper
+        edge of the highest non-empty bucket.
+        """
+        delta = Histogram(self.bounds)
+        delta.counts = [max(0, a - b) for a, b in zip(self.counts, earlier.counts)]
+        delta.count = sum(delta.counts)
+        delta.sum = max(0.0, self.sum - earlier.sum)
+        top = max((i for i, c in enumerate(delta.counts) if c), default=None)
+        if top is not None:
+            delta.max = min(self.max, self.bounds[top]) if top < len(self.bounds) else self.max
+        return delta
+
+
+class MetricsRegistry:
+    """Named metric families keyed by label sets.
+
+    Series lookup is a dict hit; only the first observation of a new label
+    set takes the registry lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, Tuple[str, str, Dict[LabelKey, object]]] = {}
+
+    def _series(self, kind: str, name: str, help_text: str, labels: Dict[str, object], factory):
+        family = self._families.get(name)
+        key = _label_key(labels)
+        if family is not None:
+            series = family[2].get(key)
+            if series is not None:
+                return series
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = (kind, help_text, {})
+                self._families[name] = family
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as {family[0]}")
+            series = family[2].get(key)
+            if series is None:
+                series = factory()
+                family[2][key] = series
+            return series
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._series("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._series("gauge", name, help_text, labels, Gauge)
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        return self._series("histogram", name, help_text, labels, Histogram)
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauge(name, **labels).set(value)
+
+    def series(self, name: str) -> List[Tuple[Dict[str, str], object]]:
+        family = self._families.get(name)
+        if not family:
+            return []
+        return [(dict(key), s) for key, s in list(family[2].items())]
+
+    def merged_histogram(self, name: str) -> Histogram:
+        """One histogram holding the buckets of every series of ``name``."""
+        merged = Histogram()
+        for _, h in self.series(name):
+            merged.merge(h)
+        return merged
+
+    def histogram_summaries(self) -> List[Dict]:
+        """Flat list of {name, labels, count, sum, p50, p95, p99} for every histogram series."""
+        rows = []
+        for name, (kind, _, series) in list(self._families.items()):
+            if kind != "histogram":
+                continue
+            for key, h in list(series.items()):
+                if not h.count:
+                    continue
+                row = {"name": name, "labels": dict(key), "count": h.count,
+                       "sum": round(h.sum, 4), "max": round(h.max, 4)}
+                for q in QUANTILES:
+                    row[f"p{int(q * 100)}"] = round(h.quantile(q), 4)
+                rows.append(row)
+        return rows
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for name, (kind, help_text, series) in sorted(self._families.items()):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            items = sorted(series.items())
+            if kind != "histogram":
+                for key, s in items:
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(s.value)}")
+                continue
+
+            for key, h in items:
+                cumulative = 0
+                for bound, c in zip(h.bounds, h.counts):
+                    cumulative += c
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {h.count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(h.sum)}")
+                lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+
+            for q in QUANTILES:
+                qname = f"{name}_p{int(q * 100)}"
+                lines.append(f"# TYPE {qname} gauge")
+                for key, h in items:
+                    lines.append(f"{qname}{_format_labels(key)} {_format_value(h.quantile(q))}")
+        return "\n".join(lines) + "\n"
+
+    def export_to_file(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+class timed:
+    """Context manager that records elapsed seconds into a histogram."""
+
+    __slots__ = ("_name", "_labels", "_start")
+
+    def __init__(self, name: str, **labels):
+        self._name = name
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe(self._name, time.perf_counter() - self._start, **self._labels)
+        if exc_type is not None:
+            registry.inc(f"{self._name.removesuffix('_seconds')}_errors_total", **self._labels)
+        return False
+
+
+registry = MetricsRegistry()
+
+_metrics_server: Optional[asyncio.AbstractServer] = None
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+        path = request_line.split(b" ")[1] if request_line.count(b" ") >= 2 else b"/"
+        if path.split(b"?")[0] == b"/metrics":
+            body = registry.render_prometheus().encode("utf-8")
+            status = b"200 OK"
+        else:
+            body = b"not found\n"
+            status = b"404 Not Found"
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> None:
+    """Serve GET /metrics in Prometheus text format on a local port."""
+    global _metrics_server
+    if _metrics_server is not None:
+        return
+    _metrics_server = await asyncio.start_server(_serve_metrics, host, port)
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
@@ -0,0 +1,175 @@
+"""Versioned schema migrations.
+
+Modules register their DDL with ``register_schema(name, version, apply)``
+instead of running it from singleton constructors at import time. The runner
+records applied versions in ``schema_migrations`` and applies only what is
+pending, all in one transaction (a savepoint per step), under an advisory
+lock so concurrent starts do not race. A warm start costs one SELECT.
+
+Bump a module's version whenever its DDL changes; the step's statements must
+stay idempotent (IF NOT EXISTS) because they re-run as a whole.
+
+Run at deploy time with ``python -m src.migrations`` (``--status`` to list);
+bot.py also applies pending steps on startup unless MIGRATIONS_ON_STARTUP=0.
+"""
+
+import importlib
+import logging
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from src.database import get_connection, single_transaction, last_scope_failed, DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+_LOCK_ID = 731_000
+
+SCHEMA_MODULES = (
+    "src.conversation_log",
+    "src.leads",
+    "src.session",
+    "src.analytics",
+    "src.advanced_analytics",
+    "src.monitoring",
+    "src.propensity",
+    "src.referrals",
+    "src.loyalty",
+    "src.broadcast",
+    "src.ab_testing",
+    "src.followup",
+    "src.proactive_engagement",
+    "src.feedback_loop",
+    "src.conversation_qa",
+    "src.dialog_rag",
+    "src.brief_generator",
+    "src.crm_export",
+    "src.webhook_delivery",
+    "src.payments",
+    "src.promocodes",
+    "src.calendar_booking",
+    "src.tasks_tracker",
+    "src.rag",
+)
+
+
+@dataclass
+class Migration:
+    name: str
+    version: int
+    apply: Callable[[], None]
+
+
+_registry: "OrderedDict[str, Migration]" = OrderedDict()
+
+
+def register_schema(name: str, version: int, apply: Callable[[], None]) -> None:
+    _registry[name] = Migration(name, version, apply)
+
+
+def _load_modules() -> None:
+    for module_name in SCHEMA_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.error(f"Migrations: failed to import {module_name}: {e}")
+
+
+def _ensure_table(cur) -> None:
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name VARCHAR(100) PRIMARY KEY,
+            version INT NOT NULL,
+            duration_ms INT,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def _applied_versions(cur) -> Dict[str, int]:
+    cur.execute("SELECT name, version FROM schema_migrations")
+    return {name: version for name, version in cur.fetchall()}
+
+
+def run_migrations() -> List[str]:
+    """Apply pending migrations; returns the names that were applied."""
+    if not DATABASE_URL:
+        return []
+    _load_modules()
+    start = time.perf_counter()
+    applied: List[str] = []
+    failed: List[str] = []
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_ID,))
+                _ensure_table(cur)
+                current = _applied_versions(cur)
+                pending = [m for m in _registry.values() if current.get(m.name, 0) < m.version]
+                if not pending:
+                    return []
+
+                with single_transaction(conn):
+                    for i, m in enumerate(pending):
+                        step_start = time.perf_counter()
+                        cur.execute(f"SAVEPOINT migration_{i}")
+                        try:
+                            m.apply()
+                            ok = not last_scope_failed()
+                        except Exception as e:
+                            logger.error(f"Migration {m.name} v{m.version} raised: {e}")
+                            ok = False
+                        if not ok:
+                            cur.execute(f"ROLLBACK TO SAVEPOINT migration_{i}")
+                            failed.append(m.name)
+                            continue
+                        cur.execute(f"RELEASE SAVEPOINT migration_{i}")
+                        cur.execute("""
+                            INSERT INTO schema_migrations (name, version, duration_ms)
+                            VALUES (%s, %s, %s)
+                            ON CONFLICT (name) DO UPDATE SET
+                                version = EXCLUDED.version,
+                                duration_ms = EXCLUDED.duration_ms,
+                                applied_at = NOW()
+                        """, (m.name, m.version, int((time.perf_counter() - step_start) * 1000)))
+                        applied.append(f"{m.name}@{m.version}")
+    except Exception as e:
+        logger.error(f"Schema migrations failed: {e}")
+        return applied
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Schema migrations: applied {len(applied)} in {elapsed:.2f}s"
+                + (f", failed: {', '.join(failed)}" if failed else ""))
+    return applied
+
+
+def get_schema_status() -> List[Dict]:
+    """Registered migrations with the version applied in the database."""
+    _load_modules()
+    current: Dict[str, int] = {}
+    if DATABASE_URL:
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    _ensure_table(cur)
+                    current = _applied_versions(cur)
+        except Exception as e:
+            logger.error(f"Failed to read schema_migrations: {e}")
+    return [
+        {"name": m.name, "version": m.version, "applied": current.get(m.name, 0),
+         "pending": current.get(m.name, 0) < m.version}
+        for m in _registry.values()
+    ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if "--status" in sys.argv:
+        for row in get_schema_status():
+            mark = "PENDING" if row["pending"] else "ok"
+            print(f"  {row['name']:<28} v{row['version']:<3} applied v{row['applied']:<3} {mark}")
+    else:
+        names = run_migrations()
+        print(f"Applied {len(names)} migration(s): {', '.join(names) or '-'}")
@@ -4,16 +4,22 @@ import time
 import logging
 import asyncio
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import Dict, Optional, Any
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import wraps
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+from src.metrics import registry
 
 logger = logging.getLogger(__name__)
 
 MANAGER_CHAT_ID = os.environ.get("MANAGER_CHAT_ID")
+METRICS_PORT = os.environ.get("METRICS_PORT")
+METRICS_EXPORT_PATH = os.environ.get("METRICS_EXPORT_PATH")
 
 
 @dataclass
@@ -30,17 +36,18 @@ class PerformanceMonitor:
         self._metrics: Dict[str, MetricPoint] = defaultdict(MetricPoint)
         self._start_time = time.time()
         self._message_count = 0
-        self._ai_latencies = []
-        self._error_log = []
+        self._ai_latencies: deque = deque(maxlen=500)
+        self._ai_hist_mark = None
+        self._error_log: deque = deque(maxlen=1000)
         self._alert_cooldowns: Dict[str, float] = {}
         self._health_status = {
             "database": True,
             "ai_service": True,
             "telegram_api": True,
         }
-        self._init_db()
 
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             return
         try:
@@ -77,33 +84,38 @@ class PerformanceMonitor:
         except Exception as e:
             logger.error(f"Failed to init monitoring tables: {e}")
 
-    def track_request(self, operation: str, duration: float, success: bool = True, error: str = None):
+    def track_request(self, operation: str, duration: float, success: bool = True, error: str = None,
+                      handler: Optional[str] = None):
         m = self._metrics[operation]
         m.count += 1
         m.total_time += duration
+        registry.observe("request_duration_seconds", duration,
+                         operation=operation, handler=handler or operation)
         if not success:
             m.errors += 1
             m.last_error = error
             m.last_error_time = time.time()
-            self._error_log.append({
-                "operation": operation,
-                "error": error,
-                "time": time.time()
-            })
-            if len(self._error_log) > 1000:
-                self._error_log = self._error_log[-500:]
-
-    def track_ai_latency(self, latency: float, model: str = "gemini"):
-        self._ai_latencies.append({"latency": latency, "model": model, "time": time.time()})
-        if len(self._ai_latencies) > 500:
-            self._ai_latencies = self._ai_latencies[-250:]
+            registry.inc("request_errors_total", operation=operation, handler=handler or operation)
+            self._error_log.append((time.time(), operation, error))
+
+    def track_ai_latency(self, latency: float, model: str = "gemini", operation: str = "generate"):
+        self._ai_latencies.append((time.time(), latency))
+        registry.observe("ai_latency_seconds", latency, model=model, operation=operation)
+
+    def track_external(self, service: str, duration: float, success: bool = True,
+                       operation: Optional[str] = None):
+        registry.observe("external_call_seconds", duration, service=service, operation=operation)
+        if not success:
+            registry.inc("external_call_errors_total", service=service, operation=operation)
 
     def track_message(self):
         self._message_count += 1
+        registry.inc("messages_total")
 
     def update_health(self, service: str, healthy: bool):
         prev = self._health_status.get(service)
         self._health_status[service] = healthy
+        registry.set_gauge("service_healthy", 1 if healthy else 0, service=service)
         if prev is True and not healthy:
             self._record_alert(
                 alert_type=f"{service}_down",
@@ -144,48 +156,74 @@ class PerformanceMonitor:
             return
         try:
             import json
+            rows = []
+            for op, m in self._metrics.items():
+                avg_time = m.total_time / m.count if m.count > 0 else 0
+                rows.append((
+                    f"op_{op}",
+                    avg_time,
+                    json.dumps({
+                        "count": m.count,
+                        "errors": m.errors,
+                        "total_time": round(m.total_time, 3)
+                    })
+                ))
+
+            ai_hist = registry.merged_histogram("ai_latency_seconds")
+            interval = ai_hist.since(self._ai_hist_mark) if self._ai_hist_mark else ai_hist
+            self._ai_hist_mark = ai_hist
+
+            recent_ai = self._recent_ai_latencies()
+            if recent_ai:
+                avg_latency = sum(recent_ai) / len(recent_ai)
+                p95 = interval.quantile(0.95) if interval.count else avg_latency
+                rows.append((
+                    "ai_latency",
+                    avg_latency,
+                    json.dumps({"p95": round(p95, 3), "p95_samples": interval.count, "samples": len(recent_ai)})
+                ))
+
+            for summary in registry.histogram_summaries():
+                rows.append((
+                    f"hist_{summary['name']}",
+                    summary["p95"],
+                    json.dumps(summary)
+                ))
+
+            if not rows:
+                return
+
             with get_connection() as conn:
                 with conn.cursor() as cur:
-                    for op, m in self._metrics.items():
-                        avg_time = m.total_time / m.count if m.count > 0 else 0
-                        cur.execute("""
-                            INSERT INTO bot_metrics (metric_name, metric_value, metadata)
-                            VALUES (%s, %s, %s)
-                        """, (
-                            f"op_{op}",
-                            avg_time,
-                            json.dumps({
-                                "count": m.count,
-                                "errors": m.errors,
-                                "total_time": round(m.total_time, 3)
-                            })
-                        ))
-
-                    recent_ai = [x for x in self._ai_latencies if time.time() - x["time"] < 3600]
-                    if recent_ai:
-                        avg_latency = sum(x["latency"] for x in recent_ai) / len(recent_ai)
-                        p95 = sorted([x["latency"] for x in recent_ai])[int(len(recent_ai) * 0.95)] if len(recent_ai) > 1 else avg_latency
-                        cur.execute("""
-                            INSERT INTO bot_metrics (metric_name, metric_value, metadata)
-                            VALUES (%s, %s, %s)
-                        """, (
-                            "ai_latency",
-                            avg_latency,
-                            json.dumps({"p95": round(p95, 3), "samples": len(recent_ai)})
-                        ))
+                    values = ",".join(
+                        cur.mogrify("(%s, %s, %s)", row).decode("utf-8") for row in rows
+                    )
+                    cur.execute(
+                        "INSERT INTO bot_metrics (metric_name, metric_value, metadata) VALUES " + values
+                    )
         except Exception as e:
             logger.error(f"Failed to save metrics: {e}")
 
+    def _recent_ai_latencies(self, window: float = 3600):
+        cutoff = time.time() - window
+        return [latency for ts, latency in self._ai_latencies if ts >= cutoff]
+
+    def export_prometheus(self, path: Optional[str] = None) -> str:
+        text = registry.render_prometheus()
+        if path:
+            registry.export_to_file(path)
+        return text
+
     def get_health_report(self) -> Dict[str, Any]:
         uptime = time.time() - self._start_time
         hours = int(uptime // 3600)
         minutes = int((uptime % 3600) // 60)
 
-        recent_errors = [e for e in self._error_log if time.time() - e["time"] < 3600]
+        recent_errors = [e for e in self._error_log if time.time() - e[0] < 3600]
         error_rate = len(recent_errors) / max(self._message_count, 1) * 100
 
-        recent_ai = [x for x in self._ai_latencies if time.time() - x["time"] < 3600]
-        avg_ai_latency = sum(x["latency"] for x in recent_ai) / len(recent_ai) if recent_ai else 0
+        recent_ai = self._recent_ai_latencies()
+        avg_ai_latency = sum(recent_ai) / len(recent_ai) if recent_ai else 0
 
         return {
             "uptime": f"{hours}h {minutes}m",
@@ -205,7 +243,8 @@ class PerformanceMonitor:
                     "error_rate": round(m.errors / m.count * 100, 1) if m.count > 0 else 0
                 }
                 for op, m in self._metrics.items()
-            }
+            },
+            "latency_percentiles": registry.histogram_summaries(),
         }
 
     def format_health_message(self) -> str:
@@ -238,6 +277,13 @@ class PerformanceMonitor:
                     text += f" ⚠️{stats['errors']} err"
                 text += "\n"
 
+        percentiles = sorted(report['latency_percentiles'], key=lambda r: r['count'], reverse=True)[:8]
+        if percentiles:
+            text += "\n<b>Латентность p50/p95/p99:</b>\n"
+            for row in percentiles:
+                label = row['labels'].get('handler') or row['labels'].get('service') or row['labels'].get('model') or row['name']
+                text += f"• {label}: {row['p50']}/{row['p95']}/{row['p99']}s (n={row['count']})\n"
+
         return text
 
     async def check_and_alert(self, bot):
@@ -298,7 +344,7 @@ class HealthChecker:
             latency = time.time() - start
             healthy = bool(result) and latency < 30
             self.monitor.update_health("ai_service", healthy)
-            self.monitor.track_ai_latency(latency)
+            self.monitor.track_ai_latency(latency, operation="health_check")
             return healthy
         except Exception:
             self.monitor.update_health("ai_service", False)
@@ -313,10 +359,29 @@ class HealthChecker:
         }
 
 
-monitor = PerformanceMonitor()
+monitor = LazySingleton(PerformanceMonitor)
+register_schema("monitoring", 1, PerformanceMonitor._init_db)
 health_checker = HealthChecker(monitor)
 
 
+def track_handler(operation: str):
+    """Decorator: record each call of a telegram handler with track_request;
+    an exception escaping the handler counts as an error."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.time()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                monitor.track_request(operation, time.time() - started, success=False, error=str(e))
+                raise
+            monitor.track_request(operation, time.time() - started, success=True)
+            return result
+        return wrapper
+    return decorator
+
+
 async def periodic_health_check(context):
     try:
         await health_checker.run_all_checks()
@@ -329,5 +394,17 @@ async def periodic_health_check(context):
 async def periodic_metrics_save(context):
     try:
         monitor.save_metrics_snapshot()
+        if METRICS_EXPORT_PATH:
+            monitor.export_prometheus(METRICS_EXPORT_PATH)
     except Exception as e:
         logger.error(f"Metrics save failed: {e}")
+
+
+async def start_metrics_endpoint() -> None:
+    if not METRICS_PORT:
+        return
+    try:
+        from src.metrics import start_metrics_server
+        await start_metrics_server(int(METRICS_PORT))
+    except Exception as e:
+        logger.error(f"Failed to start metrics endpoint: {e}")
@@ -7,6 +7,7 @@ import logging
 from src.analytics import analytics, FunnelEvent
 from src.bot_api import copy_text_button, styled_button_api_kwargs
 from src.database import get_connection, DATABASE_URL
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ def _init_payment_requests_table():
         logger.error(f"Failed to init payment_requests table: {e}")
 
 
-_init_payment_requests_table()
+register_schema("payment_requests", 1, _init_payment_requests_table)
 
 
 def _init_star_payments_table():
@@ -54,7 +55,7 @@ def _init_star_payments_table():
     except Exception as e:
         logger.error(f"Failed to init star_payments table: {e}")
 
-_init_star_payments_table()
+register_schema("star_payments", 1, _init_star_payments_table)
 
 
 def record_payment_request(user_id: int, payment_type: str) -> None:
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 from src.leads import lead_manager
 from src.config import config
 from psycopg2.extras import RealDictCursor
@@ -250,10 +252,8 @@ def _build_client_signals(user_id: int) -> str:
 
 
 class ProactiveEngagementEngine:
-    def __init__(self):
-        self._init_db()
-
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, proactive engagement disabled")
             return
@@ -765,10 +765,12 @@ class ProactiveEngagementEngine:
             prompt = prompt_template.format(**format_params)
 
             from src.ai_client import ai_client
-            result = await ai_client.generate_response(
-                messages=[{"role": "user", "parts": [{"text": prompt}]}],
-                thinking_level="low"
-            )
+            from src.ai_scheduler import Priority, ai_priority
+            with ai_priority(Priority.BACKGROUND):
+                result = await ai_client.generate_response(
+                    messages=[{"role": "user", "parts": [{"text": prompt}]}],
+                    thinking_level="low"
+                )
 
             if result:
                 text = result.strip().strip('"').strip("'")
@@ -929,4 +931,5 @@ class ProactiveEngagementEngine:
         return {}
 
 
-proactive_engine = ProactiveEngagementEngine()
+proactive_engine = LazySingleton(ProactiveEngagementEngine)
+register_schema("proactive_engagement", 1, ProactiveEngagementEngine._init_db)
@@ -4,15 +4,15 @@ from datetime import datetime
 from typing import Optional
 
 from src.database import execute_query, execute_one
+from src.lazy import LazySingleton
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
 
 class PromoCodeManager:
-    def __init__(self):
-        self.init_tables()
-
-    def init_tables(self):
+    @staticmethod
+    def init_tables():
         try:
             execute_query("""
                 CREATE TABLE IF NOT EXISTS promocodes (
@@ -182,8 +182,5 @@ class PromoCodeManager:
         return "\n".join(lines)
 
 
-try:
-    promo_manager = PromoCodeManager()
-except Exception as e:
-    logger.error(f"Failed to initialize PromoCodeManager: {e}")
-    promo_manager = None
+promo_manager = LazySingleton(PromoCodeManager)
+register_schema("promocodes", 1, PromoCodeManager.init_tables)
@@ -2,6 +2,9 @@ import logging
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.lead_scoring import lead_scoring
+from src.migrations import register_schema
 
 logger = logging.getLogger(__name__)
 
@@ -9,10 +12,8 @@ SESSION_GAP_MINUTES = 30
 
 
 class PropensityScorer:
-    def __init__(self):
-        self._init_db()
-
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, propensity scoring disabled")
             return
@@ -41,9 +42,11 @@ class PropensityScorer:
                             consultation_requested BOOLEAN DEFAULT FALSE,
                             payment_viewed BOOLEAN DEFAULT FALSE,
                             last_score INT DEFAULT 0,
-                            score_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                            score_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            score_boost INT DEFAULT 0
                         )
                     """)
+                    cur.execute("ALTER TABLE interaction_metrics ADD COLUMN IF NOT EXISTS score_boost INT DEFAULT 0")
             logger.info("interaction_metrics table initialized")
         except Exception as e:
             logger.error(f"Failed to init interaction_metrics table: {e}")
@@ -135,85 +138,16 @@ class PropensityScorer:
                         params
                     )
 
-            score = self.calculate_score(user_id)
-            if score is not None:
-                with get_connection() as conn:
-                    with conn.cursor() as cur:
-                        cur.execute(
-                            "UPDATE interaction_metrics SET last_score = %s, score_updated_at = CURRENT_TIMESTAMP WHERE user_id = %s",
-                            (score, user_id)
-                        )
+            lead_scoring.rescore_user(user_id)
         except Exception as e:
             logger.error(f"Failed to record interaction for user {user_id}: {e}")
 
     def calculate_score(self, user_id: int) -> int:
+        """Current propensity, computed by the shared scoring engine without storing it."""
         if not DATABASE_URL:
             return 0
-
-        try:
-            with get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT first_interaction, last_interaction, total_messages,
-                               session_count, calculator_uses, portfolio_views,
-                               pricing_views, lead_submitted, consultation_requested,
-                               payment_viewed, roi_uses, brief_uses, compare_uses
-                        FROM interaction_metrics WHERE user_id = %s
-                    """, (user_id,))
-                    row = cur.fetchone()
-                    if not row:
-                        return 0
-
-                    (first_interaction, last_interaction, total_messages,
-                     session_count, calculator_uses, portfolio_views,
-                     pricing_views, lead_submitted, consultation_requested,
-                     payment_viewed, roi_uses, brief_uses, compare_uses) = row
-
-                    days_active = max((datetime.utcnow() - first_interaction).total_seconds() / 86400, 0.1)
-                    messages_per_day = total_messages / days_active
-                    engagement_velocity = min(messages_per_day * 3, 15)
-
-                    session_depth = min(total_messages / 3, 15)
-
-                    multi_session = min(session_count * 5, 15)
-
-                    tool_engagement = min(
-                        calculator_uses * 8
-                        + portfolio_views * 5
-                        + pricing_views * 3
-                        + roi_uses * 5
-                        + brief_uses * 8
-                        + compare_uses * 3,
-                        25
-                    )
-
-                    buying_signals = min(
-                        (15 if lead_submitted else 0)
-                        + (10 if consultation_requested else 0)
-                        + (15 if payment_viewed else 0),
-                        25
-                    )
-
-                    days_since_last = (datetime.utcnow() - last_interaction).total_seconds() / 86400
-                    if days_since_last <= 1:
-                        decay = 1.0
-                    elif days_since_last <= 3:
-                        decay = 0.9
-                    elif days_since_last <= 7:
-                        decay = 0.7
-                    elif days_since_last <= 14:
-                        decay = 0.5
-                    elif days_since_last <= 30:
-                        decay = 0.3
-                    else:
-                        decay = 0.1
-
-                    raw_score = engagement_velocity + session_depth + multi_session + tool_engagement + buying_signals
-                    final_score = min(100, int(raw_score * decay))
-                    return final_score
-        except Exception as e:
-            logger.error(f"Failed to calculate score for user {user_id}: {e}")
-            return 0
+        scores = lead_scoring.score_user(user_id)
+        return scores.propensity or 0 if scores else 0
 
     def get_score(self, user_id: int) -> Optional[int]:
         if not DATABASE_URL:
@@ -241,13 +175,14 @@ class PropensityScorer:
             if current is None:
                 self.record_interaction(user_id, "message")
                 current = 0
-            new_score = min(100, current + boost)
             with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(
-                        "UPDATE interaction_metrics SET last_score = %s, score_updated_at = CURRENT_TIMESTAMP WHERE user_id = %s",
-                        (new_score, user_id)
+                        "UPDATE interaction_metrics SET score_boost = LEAST(score_boost + %s, 100) WHERE user_id = %s",
+                        (boost, user_id)
                     )
+            scores = lead_scoring.rescore_user(user_id)
+            new_score = scores.propensity if scores else current
             logger.info(f"Propensity boost for user {user_id}: +{boost} ({reason}), {current}->{new_score}")
         except Exception as e:
             logger.error(f"Failed to boost score for user {user_id}: {e}")
@@ -307,4 +242,5 @@ class PropensityScorer:
         return {"hot_70_100": 0, "warm_40_69": 0, "cool_20_39": 0, "cold_0_19": 0}
 
 
-propensity_scorer = PropensityScorer()
+propensity_scorer = LazySingleton(PropensityScorer)
+register_schema("propensity", 2, PropensityScorer._init_db)
@@ -2,13 +2,16 @@ import os
 import logging
 import secrets
 import string
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dataclasses import dataclass
 from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
+from src.database import get_connection
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ.get("RAILWAY_DATABASE_URL") or os.environ.get("DATABASE_URL")
@@ -107,19 +110,17 @@ class Referral:
 
 
 class ReferralManager:
-    def __init__(self):
-        self._init_db()
-    
     def _get_connection(self):
-        return psycopg2.connect(DATABASE_URL)
+        return get_connection()
     
-    def _init_db(self):
+    @staticmethod
+    def _init_db():
         if not DATABASE_URL:
             logger.warning("DATABASE_URL not set, referral program will not work")
             return
         
         try:
-            with self._get_connection() as conn:
+            with get_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS referral_users (
@@ -401,4 +402,5 @@ class ReferralManager:
             return {"score": 0, "total_referrals": 0, "active_referrals": 0, "converted_referrals": 0}
 
 
-referral_manager = ReferralManager()
+referral_manager = LazySingleton(ReferralManager)
+register_schema("referrals", 1, ReferralManager._init_db)
@@ -0,0 +1,191 @@
+"""Dependency graph of the steps that produce one reply.
+
+A ``ReplyPipeline`` is built per message. ``add`` registers a step with the
+names of the steps it needs; ``start`` launches it as a task that waits for
+those dependencies first, so independent lookups overlap instead of running
+one after another. Sync steps registered with ``thread=True`` run through
+``asyncio.to_thread``. Stretches of handler code that stay inline are
+recorded with ``pipeline.begin``/``end`` or ``with pipeline.step(...)`` so
+they belong to the same graph.
+
+Steps registered with ``speculative=True`` (voice-bridge drafting from the
+first streamed sentences) may turn out to be unused; ``finish`` cancels them
+if they are still running.
+
+``critical_path`` walks back from the terminal step, at each step following
+the dependency that finished last: that chain is what set the reply latency.
+``finish`` records ``reply_critical_path_seconds``,
+``reply_step_seconds{step,critical}`` and a ``critical_path`` attribute on
+the current trace span.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.metrics import registry
+from src.tracing import set_attribute, span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Step:
+    name: str
+    deps: Tuple[str, ...]
+    func: Optional[Callable[[], Any]] = None
+    thread: bool = False
+    speculative: bool = False
+    task: Optional[asyncio.Future] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+class ReplyPipeline:
+    def __init__(self, name: str = "message"):
+        self.name = name
+        self.origin = time.perf_counter()
+        self._steps: Dict[str, _Step] = {}
+
+    def add(self, name: str, func: Callable[[], Any], deps: Iterable[str] = (),
+            thread: bool = False, speculative: bool = False) -> None:
+        """Register a step; ``func`` returns a value or an awaitable."""
+        if name in self._steps:
+            raise ValueError(f"Pipeline step {name!r} registered twice")
+        self._steps[name] = _Step(name, tuple(deps), func, thread, speculative)
+
+    def has(self, name: str) -> bool:
+        return name in self._steps
+
+    def start(self, *names: str) -> None:
+        for name in names:
+            self._task(name)
+
+    def done(self, name: str) -> bool:
+        step = self._steps.get(name)
+        return step is not None and step.end is not None
+
+    def _task(self, name: str) -> asyncio.Future:
+        step = self._steps[name]
+        if step.task is None:
+            if step.func is None:
+                raise ValueError(f"Pipeline step {name!r} is inline and cannot be started")
+            step.task = asyncio.ensure_future(self._run(step))
+        return step.task
+
+    async def _run(self, step: _Step) -> Any:
+        for dep in step.deps:
+            if self._steps[dep].func is not None:
+                await self.result(dep)
+        step.start = time.perf_counter()
+        try:
+            with span(step.name):
+                if step.thread:
+                    value = await asyncio.to_thread(step.func)
+                else:
+                    value = step.func()
+                    if asyncio.iscoroutine(value):
+                        value = await value
+            return value
+        except asyncio.CancelledError:
+            step.error = "cancelled"
+            raise
+        except Exception as e:
+            step.error = type(e).__name__
+            logger.warning(f"Reply step {step.name} failed: {type(e).__name__}: {e}")
+            return None
+        finally:
+            step.end = time.perf_counter()
+
+    async def result(self, name: str) -> Any:
+        """Value of a step, starting it if needed; None if it failed."""
+        try:
+            return await asyncio.shield(self._task(name))
+        except asyncio.CancelledError:
+            if self._steps[name].error == "cancelled":
+                return None
+            raise
+
+    def value(self, name: str) -> Any:
+        """Value of a finished step, or None."""
+        step = self._steps.get(name)
+        if step is None or step.task is None or not step.task.done() or step.task.cancelled():
+            return None
+        return step.task.result()
+
+    def duration(self, name: str) -> float:
+        step = self._steps.get(name)
+        return step.duration if step is not None else 0.0
+
+    def begin(self, name: str, deps: Iterable[str] = ()) -> None:
+        """Mark the start of an inline stretch of handler code.
+
+        Deps that never get registered (a step the reply did not need) are ignored.
+        """
+        if name in self._steps:
+            raise ValueError(f"Pipeline step {name!r} registered twice")
+        step = self._steps[name] = _Step(name, tuple(deps))
+        step.start = time.perf_counter()
+
+    def end(self, name: str) -> None:
+        self._steps[name].end = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str, deps: Iterable[str] = ()) -> Iterator[None]:
+        """``begin``/``end`` around a block."""
+        self.begin(name, deps)
+        try:
+            yield
+        except Exception as e:
+            self._steps[name].error = type(e).__name__
+            raise
+        finally:
+            self.end(name)
+
+    def critical_path(self, terminal: str) -> List[_Step]:
+        path = []
+        step = self._steps.get(terminal)
+        while step is not None and step.end is not None:
+            path.append(step)
+            finished = [self._steps[d] for d in step.deps if d in self._steps and self._steps[d].end is not None]
+            step = max(finished, key=lambda s: s.end) if finished else None
+        path.reverse()
+        return path
+
+    def finish(self, terminal: str) -> Optional[float]:
+        """Cancel leftover speculative work and report the critical path; returns its length in seconds."""
+        for step in self._steps.values():
+            if not step.speculative or step.task is None:
+                continue
+            if step.task.done():
+                registry.inc("reply_speculation_total", step=step.name, result="finished")
+            else:
+                step.task.cancel()
+                registry.inc("reply_speculation_total", step=step.name, result="cancelled")
+
+        path = self.critical_path(terminal)
+        if not path:
+            return None
+        total = path[-1].end - self.origin
+        critical = {s.name for s in path}
+        for step in self._steps.values():
+            if step.end is not None and step.start is not None:
+                registry.observe("reply_step_seconds", step.duration, step=step.name,
+                                 critical="yes" if step.name in critical else "no")
+        registry.observe("reply_critical_path_seconds", total, pipeline=self.name)
+
+        chain = " > ".join(f"{s.name} {s.duration * 1000:.0f}ms" for s in path)
+        other = total - sum(s.duration for s in path)
+        set_attribute("critical_path", chain)
+        logger.info(f"Reply critical path {total * 1000:.0f}ms: {chain} (+{other * 1000:.0f}ms outside steps)")
+        return total
@@ -0,0 +1,247 @@
+"""Shared cache of replies to FAQ-like questions.
+
+A reply is reused across users when the question is generic: classified as
+``faq`` by detect_query_context or sent by a quick button, short, asked as
+the first message of the session (the model sees no earlier history or
+summary, so nothing the asker said before can end up in the reply), and
+without personal signals (objection, buying signal, returning client, photo
+history) that would shape the answer. Replies that needed tool calls are
+not stored.
+
+Entries are keyed by the normalized question plus the context features that
+change the answer: language, funnel-stage bucket, a digest of the client
+profile that goes into the system prompt, so only users with the same
+profile (in practice: none yet) share an entry, and a digest of the user's
+experiment arms (the ``ab_test`` and ``adaptive_instructions`` signals and
+the methodology keys picked for the user), so a reply generated in one A/B
+arm is never served in another. Normalization
+lowercases, folds ё, drops punctuation, emoji and stop words, cuts each
+word to a six-letter stem and sorts the stems, so word order, inflection
+and punctuation variants of one question share an entry. There are no
+embeddings here: "semantic" means exactly this folding.
+
+The key also carries the content version, a hash of the content registry
+version (prompts, prices, FAQ) and the knowledge_chunks revision. The
+revision is a DB query, so it is re-read off the event loop: every
+VERSION_CHECK_INTERVAL seconds by ``periodic_version_refresh`` and right
+after a knowledge chunk is written. When the version changes the cache is
+cleared, so edited prices or knowledge are never answered from a stale
+entry for longer than that. Entries also expire after RESPONSE_CACHE_TTL.
+
+The asker's first name is replaced by a placeholder when it appears in the
+greeting (the first GREETING_CHARS characters) and filled in with the
+current user's name when the reply is served. A reply that mentions the
+name anywhere else is not stored: it may be the bot's own persona or a
+product name rather than the asker.
+
+Metrics: ``response_cache_lookups_total{result}``,
+``response_cache_hit_ratio``, ``response_cache_saved_seconds_total``,
+``response_cache_entries``.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.lazy import LazySingleton
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", str(6 * 3600)))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1000"))
+VERSION_CHECK_INTERVAL = 60
+MAX_QUESTION_WORDS = 20
+GREETING_CHARS = 40
+
+_PERSONAL_SIGNALS = ("objection", "buying_signal", "returning_context", "vision_history", "winback")
+_VARIANT_SIGNALS = ("ab_test", "adaptive_instructions")
+_STOP_WORDS = frozenset(
+    "а и в во на по о об у к с со за из от до для же ли бы то это мне меня мой моя "
+    "вы вам вас ваш ты тебе я мы нам ну вот the a an is are to of for".split()
+)
+_WORD = re.compile(r"[a-zа-я0-9]+")
+_STEM_LENGTH = 6
+_NAME = "\x00name\x00"
+
+_FUNNEL_BUCKETS = {
+    "awareness": "early",
+    "interest": "early",
+    "consideration": "mid",
+    "decision": "late",
+    "negotiation": "late",
+    "action": "late",
+}
+
+
+def normalize_question(text: str) -> str:
+    words = _WORD.findall(text.lower().replace("ё", "е"))
+    return " ".join(sorted({w[:_STEM_LENGTH] for w in words if w not in _STOP_WORDS}))
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def context_features(language: str, context_signals: Dict[str, str], methodologies: str = "") -> str:
+    funnel = _FUNNEL_BUCKETS.get(context_signals.get("funnel_stage", ""), "none")
+    profile = _digest(context_signals.get("client_profile", ""))[:16]
+    variants = _digest(methodologies, *(context_signals.get(s, "") for s in _VARIANT_SIGNALS))[:16]
+    return f"{language or 'ru'}|{funnel}|{profile}|{variants}"
+
+
+def _depersonalize(text: str, first_name: str) -> Optional[str]:
+    """``text`` with the greeting's name replaced, or None if the name also
+    appears elsewhere and the reply must not be shared."""
+    if len(first_name) < 2:
+        return text
+    pattern = re.compile(rf"\b{re.escape(first_name)}\b")
+    match = pattern.search(text)
+    if match is None:
+        return text
+    if match.start() > GREETING_CHARS:
+        return None
+    text = text[:match.start()] + _NAME + text[match.end():]
+    return None if pattern.search(text) else text
+
+
+def _personalize(text: str, first_name: str) -> Optional[str]:
+    if _NAME not in text:
+        return text
+    return text.replace(_NAME, first_name) if first_name else None
+
+
+@dataclass
+class _Entry:
+    text: str
+    stored_at: float
+    generation_seconds: float
+    hits: int = 0
+
+
+class ResponseCache:
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._knowledge_revision = ""
+        self._hits = 0
+        self._misses = 0
+        self._saved_seconds = 0.0
+
+    def is_cacheable(self, question: str, query_context: Optional[str], context_signals: Dict[str, str],
+                     canned: bool = False, has_history: bool = True) -> bool:
+        """``has_history``: the session holds anything besides the question
+        itself; such replies are generated from that history and never shared."""
+        if has_history:
+            return False
+        if not canned and query_context != "faq":
+            return False
+        if len(question.split()) > MAX_QUESTION_WORDS or not normalize_question(question):
+            return False
+        return not any(signal in context_signals for signal in _PERSONAL_SIGNALS)
+
+    def content_version(self) -> str:
+        """Content registry version plus the last knowledge revision read;
+        no I/O, so it is safe on the event loop."""
+        from src.content_registry import content
+        version = _digest(content.version, self._knowledge_revision)
+        if self._version is not None and version != self._version:
+            self.clear()
+            logger.info("Response cache cleared: content or knowledge base changed")
+        self._version = version
+        return version
+
+    def refresh_version(self) -> None:
+        """Re-read the knowledge_chunks revision (a DB query; run off the loop)."""
+        from src.rag import knowledge_base_rag
+        self._knowledge_revision = knowledge_base_rag.revision()
+        self.content_version()
+
+    def invalidate(self) -> None:
+        """Content or knowledge changed; called from the thread that changed it."""
+        self.refresh_version()
+
+    def key_for(self, question: str, language: str, context_signals: Dict[str, str],
+                methodologies: str = "") -> str:
+        return _digest(normalize_question(question), context_features(language, context_signals, methodologies),
+                       self.content_version())
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        registry.inc("response_cache_lookups_total", result="hit" if hit else "miss")
+        registry.set_gauge("response_cache_hit_ratio", self._hits / (self._hits + self._misses))
+
+    def get(self, key: str, first_name: str = "") -> Optional[str]:
+        """Cached reply addressed to ``first_name``; a reply that names its
+        asker is not served to a user without a name."""
+        text = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                text = _personalize(entry.text, first_name)
+            if text is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self._saved_seconds += entry.generation_seconds
+        self._record(text is not None)
+        if text is not None:
+            registry.inc("response_cache_saved_seconds_total", entry.generation_seconds)
+        return text
+
+    def put(self, key: str, text: str, first_name: str = "", generation_seconds: float = 0.0) -> None:
+        if not text:
+            return
+        text = _depersonalize(text, first_name)
+        if text is None:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(text, time.monotonic(), generation_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            registry.set_gauge("response_cache_entries", len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        registry.set_gauge("response_cache_entries", 0)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+            "saved_seconds": self._saved_seconds,
+        }
+
+
+response_cache = LazySingleton(ResponseCache)
+
+
+async def periodic_version_refresh(context):
+    try:
+        await asyncio.to_thread(response_cache.refresh_version)
+    except Exception as e:
+        logger.error(f"Response cache version refresh failed: {e}")
@@ -4,6 +4,9 @@ from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 from collections import OrderedDict
 
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = None
@@ -38,7 +41,7 @@ class UserSession:
     _summary: Optional[str] = None
     _needs_summarization: bool = False
     
-    def add_message(self, role: str, content: str, max_history: int = 30) -> None:
+    def add_message(self, role: str, content: str, max_history: int = 30, kind: str = "text") -> None:
         if role == "user":
             self.messages.append({
                 "role": "user",
@@ -50,29 +53,31 @@ class UserSession:
                 "parts": [{"text": content}]
             })
         
+        if len(self.messages) >= SUMMARIZATION_THRESHOLD:
+            self._needs_summarization = True
         if len(self.messages) > max_history:
-            if len(self.messages) >= SUMMARIZATION_THRESHOLD and not self._needs_summarization:
-                self._needs_summarization = True
             self.messages = self.messages[-max_history:]
         
         self.last_activity = time.time()
         self.message_count += 1
 
-        _save_message_to_db(self.user_id, role, content)
+        _save_message_to_db(self.user_id, role, content, kind)
     
-    def get_history(self) -> List[Dict]:
-        result = []
-        if self._summary:
-            result.append({
-                "role": "user",
-                "parts": [{"text": f"[РЕЗЮМЕ ПРЕДЫДУЩЕГО ДИАЛОГА]\n{self._summary}"}]
-            })
-            result.append({
-                "role": "model",
-                "parts": [{"text": "Понял контекст из предыдущего диалога, продолжаю."}]
-            })
-        result.extend(self.messages)
-        return result
+    @property
+    def has_prior_history(self) -> bool:
+        """True once the session holds more than the message being answered."""
+        return len(self.messages) > 1 or bool(self._summary)
+    
+    def get_history(self, token_budget: Optional[int] = None) -> List[Dict]:
+        """Summary and recent messages packed under ``token_budget`` (see src.context_window)."""
+        from src.context_window import CONTEXT_TOKEN_BUDGET, pack
+        from src.tracing import set_attribute
+        packed = pack(self.messages, self._summary, token_budget or CONTEXT_TOKEN_BUDGET)
+        set_attribute("history_tokens", packed.tokens)
+        if packed.dropped or packed.truncated:
+            logger.debug(f"History for user {self.user_id}: ~{packed.tokens} tokens, "
+                         f"{packed.dropped} dropped, {packed.truncated} truncated")
+        return packed.messages
     
     def set_summary(self, summary: str) -> None:
         self._summary = summary
@@ -87,15 +92,12 @@ class UserSession:
         _clear_history_db(self.user_id)
 
 
-def _save_message_to_db(user_id: int, role: str, content: str):
+def _save_message_to_db(user_id: int, role: str, content: str, kind: str = "text"):
     if not DATABASE_URL:
         return
     try:
-        from src.database import execute_query
-        execute_query(
-            "INSERT INTO conversation_history (telegram_id, role, content) VALUES (%s, %s, %s)",
-            (user_id, role, content[:10000])
-        )
+        from src.conversation_log import conversation_log
+        conversation_log.append(user_id, role, content, kind=kind)
     except Exception as e:
         logger.debug(f"Failed to save message to DB: {e}")
 
@@ -104,8 +106,8 @@ def _clear_history_db(user_id: int):
     if not DATABASE_URL:
         return
     try:
-        from src.database import execute_query
-        execute_query("DELETE FROM conversation_history WHERE telegram_id = %s", (user_id,))
+        from src.conversation_log import conversation_log
+        conversation_log.clear_context(user_id)
     except Exception as e:
         logger.debug(f"Failed to clear history from DB: {e}")
 
@@ -145,19 +147,13 @@ def _load_history_from_db(user_id: int, limit: int = 20) -> List[Dict]:
     if not DATABASE_URL:
         return []
     try:
-        from src.database import execute_query
-        rows = execute_query(
-            """SELECT role, content FROM conversation_history 
-               WHERE telegram_id = %s 
-               ORDER BY created_at DESC LIMIT %s""",
-            (user_id, limit),
-            fetch=True, dict_cursor=True
-        )
+        from src.conversation_log import conversation_log
+        rows = conversation_log.recent(user_id, limit, session_only=True)
         if not rows:
             return []
         
         messages = []
-        for row in reversed(rows):
+        for row in rows:
             gemini_role = "user" if row["role"] == "user" else "model"
             messages.append({
                 "role": gemini_role,
@@ -170,26 +166,12 @@ def _load_history_from_db(user_id: int, limit: int = 20) -> List[Dict]:
 
 
 def _init_conversation_table():
+    # Message history lives in conversation_log (its only writer); this only
+    # sets up the per-user summary, profile and vision tables around it.
     if not DATABASE_URL:
         return
     try:
         from src.database import execute_query
-        execute_query("""
-            CREATE TABLE IF NOT EXISTS conversation_history (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT NOT NULL,
-                role VARCHAR(20) NOT NULL,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-        execute_query(
-            "CREATE INDEX IF NOT EXISTS idx_conv_history_tid ON conversation_history(telegram_id)"
-        )
-        execute_query("""
-            DELETE FROM conversation_history 
-            WHERE created_at < NOW() - INTERVAL '30 days'
-        """)
         execute_query("""
             CREATE TABLE IF NOT EXISTS conversation_summaries (
                 telegram_id BIGINT PRIMARY KEY,
@@ -233,9 +215,9 @@ def _init_conversation_table():
         execute_query(
             "CREATE INDEX IF NOT EXISTS idx_vision_analyses_tid ON vision_analyses(telegram_id)"
         )
-        logger.info("Conversation history + summaries + client_profiles + vision_analyses tables initialized")
+        logger.info("Conversation summaries + client_profiles + vision_analyses tables initialized")
     except Exception as e:
-        logger.warning(f"Failed to init conversation_history table: {e}")
+        logger.warning(f"Failed to init conversation tables: {e}")
 
 
 ALLOWED_PROFILE_COLUMNS = {
@@ -349,7 +331,6 @@ class SessionManager:
         self._sessions: OrderedDict[int, UserSession] = OrderedDict()
         self._max_sessions = max_sessions
         self._session_ttl = session_ttl
-        _init_conversation_table()
     
     def get_session(self, user_id: int, username: Optional[str] = None, 
                     first_name: Optional[str] = None) -> UserSession:
@@ -399,4 +380,5 @@ class SessionManager:
         }
 
 
-session_manager = SessionManager()
+session_manager = LazySingleton(SessionManager)
+register_schema("session", 1, _init_conversation_table)
@@ -0,0 +1,530 @@
+"""Speech normalization of reply text before TTS.
+
+The rule tables (abbreviations, stress marks, Russian number words) and the
+original step-by-step functions ``naturalize_speech``,
+``expand_abbreviations``, ``numbers_to_words`` and ``apply_stress_marks``
+live here; ``handlers.utils`` re-exports them.
+
+``normalize_speech`` produces the same text as those four steps in that
+order, but compiles every rule once into a single alternation (abbreviations
+and stress words as prefix tries) and rewrites the text in one left-to-right
+scan, with number spelling memoized. The places where a later step of the
+chain would see the output of an earlier one (word boundaries next to
+``%``/``₽``/``+``, stress marks inside ``процентов``) are handled explicitly.
+
+``python -m src.speech --check`` compares both on a corpus of repo texts and
+edge cases; ``--bench`` measures throughput of both.
+"""
+
+import functools
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+ABBREVIATION_MAP = {
+    "ROI": "ар-о-ай",
+    "CRM": "си-ар-эм",
+    "UX": "ю-экс",
+    "UI": "ю-ай",
+    "UX/UI": "ю-экс ю-ай",
+    "API": "эй-пи-ай",
+    "SaaS": "сас",
+    "MVP": "эм-ви-пи",
+    "KPI": "кей-пи-ай",
+    "SEO": "сео",
+    "SMM": "эс-эм-эм",
+    "B2B": "би-ту-би",
+    "B2C": "би-ту-си",
+    "IT": "ай-ти",
+    "FAQ": "эф-эй-кью",
+    "PDF": "пи-ди-эф",
+    "AI": "эй-ай",
+    "TG": "тэ-гэ",
+    "Mini App": "мини-апп",
+    "Mini Apps": "мини-аппс",
+    "Web App": "веб-апп",
+    "WEB4TG": "WEB4TG",
+    "HTML": "эйч-ти-эм-эл",
+    "CSS": "си-эс-эс",
+    "JS": "джей-эс",
+    "QR": "кью-ар",
+    "NDA": "эн-ди-эй",
+    "ТЗ": "тэ-зэ",
+    "CMS": "си-эм-эс",
+    "SDK": "эс-ди-кей",
+    "ERP": "и-ар-пи",
+    "PR": "пи-ар",
+    "HR": "эйч-ар",
+    "ИП": "ай-пи",
+    "ООО": "о-о-о",
+    "ИНН": "и-эн-эн",
+    "CDEK": "сдэк",
+    "Telegram": "Телегра́м",
+    "WhatsApp": "Вотсапп",
+    "Instagram": "Инстаграм",
+    "YouTube": "Ютуб",
+    "Google": "Гугл",
+}
+
+
+STRESS_DICTIONARY = {
+    "разработка": "разрабо́тка",
+    "приложение": "приложе́ние",
+    "приложения": "приложе́ния",
+    "стоимость": "сто́имость",
+    "договор": "догово́р",
+    "звонит": "звони́т",
+    "каталог": "катало́г",
+    "маркетинг": "ма́ркетинг",
+    "обеспечение": "обеспе́чение",
+    "средства": "сре́дства",
+    "процент": "проце́нт",
+    "квартал": "кварта́л",
+    "эксперт": "экспе́рт",
+    "оптовый": "опто́вый",
+    "украинский": "украи́нский",
+    "красивее": "краси́вее",
+    "мастерски": "мастерски́",
+    "включит": "включи́т",
+    "облегчить": "облегчи́ть",
+    "углубить": "углуби́ть",
+    "баловать": "балова́ть",
+    "досуг": "досу́г",
+    "жалюзи": "жалюзи́",
+    "торты": "то́рты",
+    "банты": "ба́нты",
+    "шарфы": "ша́рфы",
+    "порты": "по́рты",
+    "склады": "скла́ды",
+    "telegram": "телегра́м",
+    "функционал": "функциона́л",
+    "интерфейс": "интерфе́йс",
+    "дизайн": "диза́йн",
+    "контент": "конте́нт",
+    "проект": "прое́кт",
+    "клиент": "клие́нт",
+    "сервис": "се́рвис",
+    "бизнес": "би́знес",
+    "менеджер": "ме́неджер",
+    "маркетплейс": "маркетпле́йс",
+    "подписка": "подпи́ска",
+    "интеграция": "интегра́ция",
+    "аналитика": "анали́тика",
+    "монетизация": "монетиза́ция",
+    "конверсия": "конве́рсия",
+    "шаблон": "шабло́н",
+    "платёж": "платёж",
+    "оплата": "опла́та",
+    "скидка": "ски́дка",
+    "тариф": "тари́ф",
+    "портфолио": "портфо́лио",
+    "калькулятор": "калькуля́тор",
+    "консультант": "консульта́нт",
+    "автоматизация": "автоматиза́ция",
+    "уведомление": "уведомле́ние",
+    "бронирование": "брони́рование",
+    "доставка": "доста́вка",
+    "ресторан": "рестора́н",
+    "фитнес": "фи́тнес",
+    "продвижение": "продвиже́ние",
+    "сообщество": "соо́бщество",
+    "преимущество": "преиму́щество",
+    "обслуживание": "обслу́живание",
+    "предложение": "предложе́ние",
+    "приветствие": "приве́тствие",
+    "потенциал": "потенциа́л",
+    "программист": "программи́ст",
+    "разработчик": "разрабо́тчик",
+    "технология": "техноло́гия",
+    "платформа": "платфо́рма",
+    "инструмент": "инструме́нт",
+    "обновление": "обновле́ние",
+    "функциональность": "функциона́льность",
+    "архитектура": "архитекту́ра",
+    "производительность": "производи́тельность",
+    "масштабирование": "масштаби́рование",
+    "рентабельность": "рента́бельность",
+    "окупаемость": "окупа́емость",
+}
+
+
+ONES = {
+    0: '', 1: 'одна', 2: 'две', 3: 'три', 4: 'четыре', 5: 'пять',
+    6: 'шесть', 7: 'семь', 8: 'восемь', 9: 'девять', 10: 'десять',
+    11: 'одиннадцать', 12: 'двенадцать', 13: 'тринадцать', 14: 'четырнадцать',
+    15: 'пятнадцать', 16: 'шестнадцать', 17: 'семнадцать', 18: 'восемнадцать', 19: 'девятнадцать',
+}
+ONES_MASC = {1: 'один', 2: 'два'}
+TENS = {
+    2: 'двадцать', 3: 'тридцать', 4: 'сорок', 5: 'пятьдесят',
+    6: 'шестьдесят', 7: 'семьдесят', 8: 'восемьдесят', 9: 'девяносто',
+}
+HUNDREDS = {
+    1: 'сто', 2: 'двести', 3: 'триста', 4: 'четыреста', 5: 'пятьсот',
+    6: 'шестьсот', 7: 'семьсот', 8: 'восемьсот', 9: 'девятьсот',
+}
+
+
+def _number_to_words_russian(n: int) -> str:
+    if n == 0:
+        return 'ноль'
+    if n < 0:
+        return 'минус ' + _number_to_words_russian(-n)
+
+    parts = []
+
+    if n >= 1_000_000:
+        millions = n // 1_000_000
+        n %= 1_000_000
+        m_word = _small_number_to_words(millions, masculine=True)
+        if millions % 10 == 1 and millions % 100 != 11:
+            parts.append(m_word + ' миллион')
+        elif 2 <= millions % 10 <= 4 and not (12 <= millions % 100 <= 14):
+            parts.append(m_word + ' миллиона')
+        else:
+            parts.append(m_word + ' миллионов')
+
+    if n >= 1000:
+        thousands = n // 1000
+        n %= 1000
+        t_word = _small_number_to_words(thousands, masculine=False)
+        if thousands % 10 == 1 and thousands % 100 != 11:
+            parts.append(t_word + ' тысяча')
+        elif 2 <= thousands % 10 <= 4 and not (12 <= thousands % 100 <= 14):
+            parts.append(t_word + ' тысячи')
+        else:
+            parts.append(t_word + ' тысяч')
+
+    if n > 0:
+        parts.append(_small_number_to_words(n, masculine=True))
+
+    return ' '.join(parts).strip()
+
+
+def _small_number_to_words(n: int, masculine: bool = True) -> str:
+    if n == 0:
+        return ''
+    parts = []
+    if n >= 100:
+        parts.append(HUNDREDS[n // 100])
+        n %= 100
+    if 10 <= n <= 19:
+        parts.append(ONES[n])
+        return ' '.join(parts)
+    if n >= 20:
+        parts.append(TENS[n // 10])
+        n %= 10
+    if 1 <= n <= 9:
+        if masculine and n in ONES_MASC:
+            parts.append(ONES_MASC[n])
+        else:
+            parts.append(ONES[n])
+    return ' '.join(parts)
+
+
+def numbers_to_words(text: str) -> str:
+    def replace_number(match):
+        num_str = match.group(0).replace(' ', '').replace('\u00a0', '')
+        try:
+            n = int(num_str)
+            if n > 10_000_000 or n < 0:
+                return match.group(0)
+            return _number_to_words_russian(n)
+        except ValueError:
+            return match.group(0)
+
+    result = re.sub(r'\d[\d\s\u00a0]*\d', replace_number, text)
+    result = re.sub(r'(?<!\w)\d+(?!\w)', replace_number, result)
+    return result
+
+
+def naturalize_speech(text: str) -> str:
+    result = text
+    result = re.sub(r'(\d+)\s*₽', lambda m: m.group(1) + ' рублей', result)
+    result = re.sub(r'(\d+)\s*%', lambda m: m.group(1) + ' процентов', result)
+    result = re.sub(r'\+\s*(\d)', lambda m: 'плюс ' + m.group(1), result)
+    result = result.replace(' / ', ' или ')
+    result = re.sub(r'(\d+)-(\d+)', lambda m: m.group(1) + ' — ' + m.group(2), result)
+    result = re.sub(r'\bтел\.', 'телефон', result)
+    result = re.sub(r'\bдоп\.', 'дополнительный', result)
+    result = re.sub(r'\bнапр\.', 'например', result)
+    result = re.sub(r'\bт\.д\.', 'так далее', result)
+    result = re.sub(r'\bт\.п\.', 'тому подобное', result)
+    result = re.sub(r'\bи т\.д\.', 'и так далее', result)
+    result = re.sub(r'\bи т\.п\.', 'и тому подобное', result)
+    result = re.sub(r'\bруб\.', 'рублей', result)
+    result = re.sub(r'\bмес\.', 'месяц', result)
+    result = re.sub(r'\bмин\.', 'минут', result)
+    return result
+
+
+def expand_abbreviations(text: str) -> str:
+    result = text
+    for abbr, pronunciation in sorted(ABBREVIATION_MAP.items(), key=lambda x: len(x[0]), reverse=True):
+        pattern = re.compile(r'\b' + re.escape(abbr) + r'\b')
+        result = pattern.sub(pronunciation, result)
+    return result
+
+
+def apply_stress_marks(text: str) -> str:
+    result = text
+    for word, stressed in STRESS_DICTIONARY.items():
+        pattern = re.compile(re.escape(word), re.IGNORECASE)
+        result = pattern.sub(stressed, result)
+    return result
+
+
+DOTTED_ABBREVIATIONS = {
+    "тел.": "телефон",
+    "доп.": "дополнительный",
+    "напр.": "например",
+    "т.д.": "так далее",
+    "т.п.": "тому подобное",
+    "руб.": "рублей",
+    "мес.": "месяц",
+    "мин.": "минут",
+}
+
+MAX_SPOKEN_NUMBER = 10_000_000
+
+_WORD_CHAR = re.compile(r"\w")
+_DIGIT_RUN = re.compile(r"\d+")
+_UNIT = re.compile(r"\s*([₽%])")
+_RANGE_DASH = re.compile(r"-(?=\d)")
+_PLUS = re.compile(r"\+\s*(?=\d)")
+
+
+def _alternation(keys) -> str:
+    """Regex matching the longest of ``keys``, factored into a prefix trie."""
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _live_stress_keys(stress: Dict[str, str]) -> Dict[str, str]:
+    """Entries the sequential apply_stress_marks can still reach.
+
+    A key that contains an earlier key never matches there: the earlier
+    replacement has already put a stress mark inside it.
+    """
+    live = {}
+    earlier: List[str] = []
+    for key, value in stress.items():
+        lowered = key.lower()
+        if not any(e in lowered for e in earlier):
+            live[key] = value
+        if value.lower() != lowered:
+            earlier.append(lowered)
+    return live
+
+
+@functools.lru_cache(maxsize=4096)
+def _spell(n: int) -> Optional[str]:
+    if n > MAX_SPOKEN_NUMBER or n < 0:
+        return None
+    return _number_to_words_russian(n)
+
+
+class SpeechNormalizer:
+    def __init__(self, abbreviations: Dict[str, str], stress: Dict[str, str], dotted: Dict[str, str]):
+        stress = _live_stress_keys(stress)
+        self._stress_map = {k.lower(): v for k, v in stress.items()}
+        self._stress_re = re.compile(f"(?i:{_alternation(self._stress_map)})")
+        self._abbr = {k: self._stressed(v) for k, v in abbreviations.items()}
+        self._dotted = {k: self._stressed(v) for k, v in dotted.items()}
+        self._units = {"₽": self._stressed(" рублей"), "%": self._stressed(" процентов")}
+        self._plus = self._stressed("плюс ")
+        self._slash = self._stressed(" или ")
+        self._pattern = re.compile(
+            rf"(?P<dotted>\b(?:{_alternation(dotted)}))"
+            rf"|(?P<abbr>\b(?:{_alternation(abbreviations)})\b)"
+            r"|(?P<plus>\+\s*(?=\d))"
+            r"|(?P<slash> / )"
+            r"|(?P<num>\d(?:[\d\s\u00a0]*\d)?)"
+            rf"|(?P<stress>{self._stress_re.pattern})"
+        )
+
+    def _stressed(self, text: str) -> str:
+        return self._stress_re.sub(lambda m: self._stress_map[m.group().lower()], text)
+
+    @staticmethod
+    def _is_word(ch: str) -> bool:
+        return bool(ch) and _WORD_CHAR.match(ch) is not None
+
+    def _next_is_word(self, text: str, pos: int) -> bool:
+        if pos >= len(text):
+            return False
+        return _PLUS.match(text, pos) is not None or self._is_word(text[pos])
+
+    @staticmethod
+    def _spell_runs(token: str, prev_word: bool, next_word: bool) -> str:
+        """Spell the digit runs of ``token`` that stand alone as words."""
+        runs = list(_DIGIT_RUN.finditer(token))
+        parts, last = [], 0
+        for i, run in enumerate(runs):
+            left_word = prev_word if i == 0 else False
+            right_word = next_word if i == len(runs) - 1 else False
+            spoken = None if left_word or right_word else _spell(int(run.group()))
+            parts.append(token[last:run.start()])
+            parts.append(spoken if spoken is not None else run.group())
+            last = run.end()
+        parts.append(token[last:])
+        return "".join(parts)
+
+    def normalize(self, text: str) -> str:
+        out: List[str] = []
+        last_char = ""
+        pos = 0
+        range_end = -1
+        search = self._pattern.search
+        while True:
+            m = search(text, pos)
+            if m is None:
+                out.append(text[pos:])
+                break
+            start, end, kind = m.start(), m.end(), m.lastgroup
+            if start > pos:
+                out.append(text[pos:start])
+                last_char = text[start - 1]
+
+            if kind in ("dotted", "abbr") and (
+                self._is_word(last_char) or (kind == "abbr" and self._next_is_word(text, end))
+            ):
+                stress = self._stress_re.match(text, start)
+                if stress is None:
+                    out.append(text[start])
+                    last_char = text[start]
+                    pos = start + 1
+                    continue
+                kind, end = "stress", stress.end()
+
+            if kind == "num":
+                token = m.group()
+                unit = _UNIT.match(text, end)
+                dash = None
+                if unit is None and not (start == range_end and token.isdigit()):
+                    dash = _RANGE_DASH.match(text, end)
+                if len(token) > 1:
+                    n = token.replace(" ", "").replace("\u00a0", "")
+                    spoken = _spell(int(n)) if n.isdigit() else None
+                else:
+                    spoken = None
+                if spoken is None:
+                    follows_word = unit is None and dash is None and self._next_is_word(text, end)
+                    spoken = self._spell_runs(token, self._is_word(last_char), follows_word)
+                out.append(spoken)
+                if unit is not None:
+                    out.append(self._units[unit.group(1)])
+                    end = unit.end()
+                elif dash is not None:
+                    out.append(" — ")
+                    end = range_end = dash.end()
+            elif kind == "dotted":
+                out.append(self._dotted[m.group()])
+            elif kind == "abbr":
+                out.append(self._abbr[m.group()])
+            elif kind == "plus":
+                out.append(self._plus)
+            elif kind == "slash":
+                out.append(self._slash)
+            else:
+                out.append(self._stress_map[text[start:end].lower()])
+            last_char = out[-1][-1:] if out[-1] else last_char
+            pos = end
+        return "".join(out)
+
+
+_normalizer: Optional[SpeechNormalizer] = None
+
+
+def normalize_speech(text: str) -> str:
+    """``apply_stress_marks(numbers_to_words(expand_abbreviations(naturalize_speech(text))))`` in one pass."""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = SpeechNormalizer(ABBREVIATION_MAP, STRESS_DICTIONARY, DOTTED_ABBREVIATIONS)
+    return _normalizer.normalize(text)
+
+
+def _legacy_chain(text: str) -> str:
+    return apply_stress_marks(numbers_to_words(expand_abbreviations(naturalize_speech(text))))
+
+
+_EDGE_CASES = [
+    "Стоимость от 150 000₽, скидка 10-20%, срок 7-10 дней.",
+    "Звоните: +7 999 123-45-67 или пишите, тел. в профиле.",
+    "UX/UI, API и CRM для B2B и B2C, WEB4TG 2024, Mini Apps и Mini App.",
+    "Telegram, telegram, TELEGRAM, Telegrams и telegram-бот.",
+    "1-2-3-4, 1-2 3-4, 1 000-2 000, 5%-10%, 5-10₽, +5-10.",
+    "5%UX 5₽Telegram UX+5 мин.5 1+1 2+ 2 x12y Web3 2024 COVID-19 4G 5G.",
+    "20 000 000 000₽ и 10 000 001, 10 000 000, 0 и 007.",
+    "1\n2, 3 000, 4\t5, ١٢٣ и т.д., и т.п., напр. доп. руб. мес. мин.",
+    "ФУНКЦИОНАЛЬНОСТЬ, функционал, Функциональность, платёж ПЛАТЁЖ.",
+    "ТЗ, ИП, ООО, ИНН, NDA, SaaS, Google, YouTube, WhatsApp, Instagram.",
+    "Разработка приложения, договориться о проекте, клиентов и сервисы.",
+    "a / b / c, UX / UI, 1 / 2, 3/4.",
+]
+
+
+def _corpus() -> List[str]:
+    """String literals of the project's modules plus hand-written edge cases."""
+    import ast
+    import os
+    root = os.path.dirname(os.path.abspath(__file__))
+    texts = list(_EDGE_CASES)
+    for dirpath, _dirs, files in os.walk(root):
+        for name in sorted(files):
+            if not name.endswith(".py") or name == "speech.py":
+                continue
+            with open(os.path.join(dirpath, name), encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Constant) and isinstance(node.value, str) and len(node.value) >= 20:
+                    texts.append(node.value)
+    return texts
+
+
+def _check() -> int:
+    texts = _corpus()
+    mismatches = 0
+    for text in texts:
+        expected, actual = _legacy_chain(text), normalize_speech(text)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"MISMATCH\n  in:       {text[:200]!r}\n  legacy:   {expected[:200]!r}\n  compiled: {actual[:200]!r}")
+    print(f"{len(texts) - mismatches}/{len(texts)} texts identical")
+    return 1 if mismatches else 0
+
+
+def _bench(rounds: int) -> None:
+    texts = [t for t in _corpus() if 100 <= len(t) <= 2000]
+    chars = sum(len(t) for t in texts) * rounds
+    for name, fn in (("legacy chain", _legacy_chain), ("compiled", normalize_speech)):
+        fn(texts[0])
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                fn(text)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>13}: {len(texts) * rounds / elapsed:9.0f} texts/s  {chars / elapsed / 1e6:6.2f} Mchar/s")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        idx = sys.argv.index("--bench")
+        _bench(int(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 else 20)
+    else:
+        sys.exit(_check())
@@ -0,0 +1,128 @@
+"""Import-time profile of the bot process.
+
+``python bot.py --profile-startup`` re-runs ``import bot`` in a fresh
+interpreter under ``-X importtime`` and prints the import tree ordered by
+cumulative time, plus wall time and peak RSS of that interpreter.
+``--profile-startup=full`` also imports the deferred handler modules, which
+shows what lazy loading keeps off the startup path.
+
+Options: ``--min-ms=N`` hides subtrees cheaper than N ms (default 5),
+``--depth=N`` limits nesting (default 4).
+"""
+
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_RSS_MARKER = "__startup_rss_kb__"
+
+
+@dataclass
+class ImportNode:
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: List["ImportNode"] = field(default_factory=list)
+
+
+def parse_importtime(stderr: str) -> List[ImportNode]:
+    """Build the import tree from ``-X importtime`` output.
+
+    Lines come in post-order (children before their parent), indented two
+    spaces per level, so a node adopts the pending nodes one level deeper.
+    """
+    pending: Dict[int, List[ImportNode]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        raw_name = parts[2]
+        name = raw_name.lstrip()
+        depth = (len(raw_name) - len(name) - 1) // 2
+        node = ImportNode(name, self_us, cumulative_us, pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+def _print_tree(nodes: List[ImportNode], min_us: int, max_depth: int, depth: int = 0) -> None:
+    for node in sorted(nodes, key=lambda n: n.cumulative_us, reverse=True):
+        if node.cumulative_us < min_us:
+            break
+        print(f"{node.cumulative_us / 1000:9.1f} ms {node.self_us / 1000:8.1f} ms  {'  ' * depth}{node.name}")
+        if depth + 1 < max_depth:
+            _print_tree(node.children, min_us, max_depth, depth + 1)
+
+
+def _count(nodes: List[ImportNode]) -> int:
+    return sum(1 + _count(n.children) for n in nodes)
+
+
+def profile(full: bool = False) -> Optional[dict]:
+    code = ["import bot"]
+    if full:
+        code += [
+            "import importlib, src.handlers as h",
+            "for m in sorted(set(h._EXPORTS.values()) | set(h.HOT_MODULES)): importlib.import_module(m)",
+            "import src.ai_client as a; a.ai_client._resolve()",
+        ]
+    code += [
+        "import resource, sys",
+        f"sys.stderr.write('{_RSS_MARKER} %d\\n' % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)",
+    ]
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(code)],
+        cwd=_PROJECT_ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        print("\n".join(errors[-20:]), file=sys.stderr)
+        return None
+
+    rss_kb = 0
+    for line in proc.stderr.splitlines():
+        if line.startswith(_RSS_MARKER):
+            rss_kb = int(line.split()[1])
+    roots = parse_importtime(proc.stderr)
+    return {
+        "roots": roots,
+        "wall_s": wall,
+        "import_us": sum(n.cumulative_us for n in roots),
+        "modules": _count(roots),
+        "rss_mb": rss_kb / 1024,
+    }
+
+
+def main(argv: List[str]) -> int:
+    full = "--profile-startup=full" in argv
+    min_ms, max_depth = 5.0, 4
+    for arg in argv:
+        if arg.startswith("--min-ms="):
+            min_ms = float(arg.split("=", 1)[1])
+        elif arg.startswith("--depth="):
+            max_depth = int(arg.split("=", 1)[1])
+
+    result = profile(full=full)
+    if result is None:
+        print("Startup profile failed: the profiled interpreter exited with an error", file=sys.stderr)
+        return 1
+
+    print(f"{'cumulative':>12} {'self':>11}  module ({'full' if full else 'startup'} import of bot.py)")
+    _print_tree(result["roots"], int(min_ms * 1000), max_depth)
+    print()
+    print(f"Modules imported: {result['modules']}")
+    print(f"Import time:      {result['import_us'] / 1000:.1f} ms")
+    print(f"Wall time:        {result['wall_s'] * 1000:.1f} ms (interpreter start to exit)")
+    print(f"Peak RSS:         {result['rss_mb']:.1f} MB")
+    return 0
@@ -0,0 +1,294 @@
+"""Lightweight per-update tracing for the reply pipeline.
+
+A trace is opened per handled update (message, voice, photo, callback) and
+stages inside it are recorded as nested spans through a context variable, so
+spans opened in helpers, awaited coroutines and ``asyncio.to_thread`` calls
+attach to the right parent without passing anything around.
+
+Finished traces go to:
+  - an in-memory ring buffer (``/traces`` admin command)
+  - the metrics registry (``stage_duration_seconds{stage=...}``)
+  - an optional JSON-lines file (TRACE_LOG_PATH)
+  - an optional OpenTelemetry exporter (TRACE_OTEL=1, needs opentelemetry-sdk)
+"""
+
+import html
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH")
+TRACE_OTEL = os.environ.get("TRACE_OTEL", "").lower() in ("1", "true", "yes")
+RECENT_TRACES_LIMIT = 300
+MAX_SPANS_PER_TRACE = 200
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_recent_traces: deque = deque(maxlen=RECENT_TRACES_LIMIT)
+
+
+class Span:
+    __slots__ = ("name", "trace", "parent", "start", "end", "attrs", "error", "depth")
+
+    def __init__(self, name: str, trace: Optional["Trace"], parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.depth = parent.depth + 1 if parent else 0
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.trace.root.start if self.trace else self.start
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "depth": self.depth,
+            "offset_ms": round((self.start - origin) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "root", "spans", "started_at", "dropped")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.root = Span(name, self, None, attrs)
+        self.spans: List[Span] = [self.root]
+        self.dropped = 0
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def stage_breakdown(self) -> Dict[str, float]:
+        """Total seconds per span name (excluding the root)."""
+        totals: Dict[str, float] = {}
+        for s in self.spans[1:]:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 1),
+            "attrs": self.root.attrs,
+            "error": self.root.error,
+            "dropped_spans": self.dropped,
+            "spans": [s.to_dict() for s in self.spans[1:]],
+        }
+
+
+class span:
+    """Context manager (sync and async) recording a stage of the current trace.
+
+    Outside of a trace it only measures time, so helpers can be instrumented
+    unconditionally.
+    """
+
+    __slots__ = ("_name", "_attrs", "_span", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self._name = name
+        self._attrs = attrs
+        self._span: Optional[Span] = None
+        self._token = None
+
+    def __enter__(self) -> Span:
+        parent = _current_span.get()
+        trace = parent.trace if parent else None
+        s = Span(self._name, trace, parent, self._attrs)
+        if trace is not None:
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append(s)
+            else:
+                trace.dropped += 1
+        self._span = s
+        self._token = _current_span.set(s)
+        return s
+
+    def __exit__(self, exc_type, exc, tb):
+        s = self._span
+        s.end = time.perf_counter()
+        if exc_type is not None:
+            s.error = exc_type.__name__
+        _current_span.reset(self._token)
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class start_trace:
+    """Open a new root trace; finished traces are recorded and exported."""
+
+    __slots__ = ("_name", "_attrs", "_trace", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self._name = name
+        self._attrs = attrs
+        self._trace: Optional[Trace] = None
+        self._token = None
+
+    def __enter__(self) -> Trace:
+        self._trace = Trace(self._name, self._attrs)
+        self._token = _current_span.set(self._trace.root)
+        return self._trace
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self._trace
+        trace.root.end = time.perf_counter()
+        if exc_type is not None:
+            trace.root.error = exc_type.__name__
+        _current_span.reset(self._token)
+        _finish_trace(trace)
+        return False
+
+    async def __aenter__(self) -> Trace:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    current = _current_span.get()
+    if current is not None:
+        current.set(key, value)
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current_span.get()
+    return current.trace if current else None
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: run an async function inside a span named after it."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_handler(name: str):
+    """Decorator for telegram handlers: one root trace per update."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(update, context, *args, **kwargs):
+            user = getattr(update, "effective_user", None)
+            with start_trace(name, user_id=user.id if user else None):
+                return await func(update, context, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _finish_trace(trace: Trace) -> None:
+    _recent_traces.append(trace)
+    registry.observe("trace_duration_seconds", trace.duration, handler=trace.root.name)
+    for stage, seconds in trace.stage_breakdown().items():
+        registry.observe("stage_duration_seconds", seconds, handler=trace.root.name, stage=stage)
+
+    if TRACE_LOG_PATH:
+        try:
+            with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+        except Exception as e:
+            logger.debug(f"Trace sink write failed: {e}")
+
+    if TRACE_OTEL:
+        _export_otel(trace)
+
+
+_otel_tracer = None
+
+
+def _export_otel(trace: Trace) -> None:
+    global _otel_tracer
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        return
+    try:
+        if _otel_tracer is None:
+            _otel_tracer = otel_trace.get_tracer("web4tg.bot")
+
+        wall_origin_ns = int(trace.started_at * 1e9)
+        perf_origin = trace.root.start
+        otel_spans: Dict[int, Any] = {}
+        for s in trace.spans:
+            parent = otel_spans.get(id(s.parent)) if s.parent else None
+            ctx = otel_trace.set_span_in_context(parent) if parent else None
+            start_ns = wall_origin_ns + int((s.start - perf_origin) * 1e9)
+            otel_span = _otel_tracer.start_span(s.name, context=ctx, start_time=start_ns,
+                                                attributes={k: str(v) for k, v in s.attrs.items()})
+            otel_spans[id(s)] = otel_span
+
+        for s in reversed(trace.spans):
+            end = s.end if s.end is not None else s.start
+            otel_spans[id(s)].end(end_time=wall_origin_ns + int((end - perf_origin) * 1e9))
+    except Exception as e:
+        logger.debug(f"OpenTelemetry export failed: {e}")
+
+
+def get_slowest_traces(limit: int = 5, name: Optional[str] = None,
+                       window_seconds: float = 3600) -> List[Trace]:
+    cutoff = time.time() - window_seconds
+    candidates = [t for t in list(_recent_traces)
+                  if t.started_at >= cutoff and (name is None or t.root.name == name)]
+    candidates.sort(key=lambda t: t.duration, reverse=True)
+    return candidates[:limit]
+
+
+def _html(text: object, limit: int = 200) -> str:
+    """Cut before escaping, so the cut never lands inside an entity."""
+    text = str(text)
+    return html.escape(text if len(text) <= limit else text[:limit] + "…")
+
+
+def format_trace(trace: Trace, max_spans: int = 15) -> str:
+    """HTML summary of a trace; names and errors are escaped."""
+    lines = [
+        f"<b>{_html(trace.root.name)}</b> {trace.duration:.2f}s "
+        f"(user {_html(trace.root.attrs.get('user_id', '—'))}, "
+        f"{time.strftime('%H:%M:%S', time.localtime(trace.started_at))})"
+        + (f" ❌{_html(trace.root.error)}" if trace.root.error else "")
+    ]
+    slowest = sorted(trace.spans[1:], key=lambda s: s.duration, reverse=True)[:max_spans]
+    for s in sorted(slowest, key=lambda s: s.start):
+        indent = "  " * s.depth
+        offset = s.start - trace.root.start
+        err = f" ❌{_html(s.error)}" if s.error else ""
+        lines.append(f"{indent}• {_html(s.name)}: {s.duration * 1000:.0f}ms (+{offset * 1000:.0f}ms){err}")
+    return "\n".join(lines)
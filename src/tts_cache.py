@@ -0,0 +1,288 @@
+"""Persistent, content-addressed cache for synthesized voice clips.
+
+A clip is stored under the hash of everything that determines the audio:
+the normalized text sent to ElevenLabs, the voice settings, the output
+format, the voice and the model. Identical requests therefore hit the cache
+no matter which code path (broadcast, follow-up, proactive supplement,
+greeting, bridge) produced them.
+
+Phrase keys map a caller's *input* phrase (before the AI enhance step,
+which is not deterministic) to the clip it produced, so a repeated phrase
+skips both the enhance call and synthesis.
+
+Clips live as files under TTS_CACHE_DIR with a small SQLite index that keeps
+last-use times for LRU eviction once TTS_CACHE_MAX_MB is exceeded. After the
+first upload the Telegram ``file_id`` is recorded against the audio digest,
+and ``send_voice`` reuses it instead of uploading the bytes again.
+
+Every method does SQLite and file I/O under one lock; async callers run
+them with ``asyncio.to_thread``.
+
+Metrics: ``tts_cache_lookups_total{result}``, ``tts_cache_hit_ratio``,
+``tts_cache_bytes``, ``tts_voice_send_total{source}``.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Awaitable, Callable, Optional
+
+from src.lazy import LazySingleton
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(_PROJECT_ROOT, ".cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(float(os.environ.get("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+_EVICT_TO = 0.9
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def audio_digest(audio: bytes) -> str:
+    return hashlib.sha256(audio).hexdigest()
+
+
+def clip_key(text: str, profile: dict, output_format: str, voice_id: str, model_id: str) -> str:
+    """Key of the audio ElevenLabs returns for exactly these inputs."""
+    return _digest("clip", normalize_text(text), json.dumps(profile, sort_keys=True),
+                   output_format, voice_id or "", model_id)
+
+
+def phrase_key(text: str, voice_profile: Optional[str], enhance: bool) -> str:
+    """Key of a caller's input phrase, before enhancement and normalization."""
+    return _digest("phrase", normalize_text(text), voice_profile or "", "enhance" if enhance else "raw")
+
+
+class TTSCache:
+    def __init__(self, root: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        try:
+            os.makedirs(root, exist_ok=True)
+            db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_clips_used_at ON clips(used_at)")
+            db.execute("CREATE TABLE IF NOT EXISTS phrases (key TEXT PRIMARY KEY, clip TEXT NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS file_ids (digest TEXT PRIMARY KEY, file_id TEXT NOT NULL)")
+            self._total_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+            self._db = db
+            registry.set_gauge("tts_cache_bytes", self._total_bytes)
+            logger.info(f"TTS cache at {root}: {self._total_bytes / 1048576:.1f} MB")
+        except Exception as e:
+            logger.warning(f"TTS cache disabled, cannot open {root}: {e}")
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".bin")
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        registry.inc("tts_cache_lookups_total", result="hit" if hit else "miss")
+        registry.set_gauge("tts_cache_hit_ratio", self._hits / (self._hits + self._misses))
+
+    def _load(self, key: str) -> Optional[bytes]:
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+                self._db.execute("UPDATE clips SET used_at = ? WHERE key = ?", (time.time(), key))
+            return audio
+        except FileNotFoundError:
+            self._forget(key)
+        except Exception as e:
+            logger.warning(f"TTS cache read failed: {e}")
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self._db is None:
+            return None
+        audio = self._load(key)
+        self._record(audio is not None)
+        return audio
+
+    def get_phrase(self, phrase: str) -> Optional[bytes]:
+        """Clip last produced for this input phrase.
+
+        Only hits are counted: a miss here is followed by a clip lookup,
+        which records the request's outcome.
+        """
+        if self._db is None:
+            return None
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT clip FROM phrases WHERE key = ?", (phrase,)).fetchone()
+        except Exception as e:
+            logger.warning(f"TTS cache phrase lookup failed: {e}")
+            return None
+        audio = self._load(row[0]) if row else None
+        if audio is not None:
+            self._record(True)
+        return audio
+
+    def put(self, key: str, audio: bytes, phrase: Optional[str] = None) -> None:
+        if self._db is None or not audio:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+            with self._lock:
+                old = self._db.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO clips (key, digest, size, used_at) VALUES (?, ?, ?, ?)",
+                    (key, audio_digest(audio), len(audio), time.time())
+                )
+                if phrase:
+                    self._db.execute("INSERT OR REPLACE INTO phrases (key, clip) VALUES (?, ?)", (phrase, key))
+                self._total_bytes += len(audio) - (old[0] if old else 0)
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+            registry.set_gauge("tts_cache_bytes", self._total_bytes)
+        except Exception as e:
+            logger.warning(f"TTS cache write failed: {e}")
+
+    def link_phrase(self, phrase: str, key: str) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO phrases (key, clip) VALUES (?, ?)", (phrase, key))
+        except Exception as e:
+            logger.warning(f"TTS cache phrase link failed: {e}")
+
+    def _evict(self) -> None:
+        """Drop least recently used clips down to _EVICT_TO of the limit. Caller holds the lock."""
+        target = self.max_bytes * _EVICT_TO
+        evicted = 0
+        for key, size in self._db.execute("SELECT key, size FROM clips ORDER BY used_at").fetchall():
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+            self._total_bytes -= size
+            evicted += 1
+        self._db.execute("DELETE FROM phrases WHERE clip NOT IN (SELECT key FROM clips)")
+        self._db.execute("DELETE FROM file_ids WHERE digest NOT IN (SELECT digest FROM clips)")
+        registry.inc("tts_cache_evictions_total", evicted)
+        logger.info(f"TTS cache evicted {evicted} clips, {self._total_bytes / 1048576:.1f} MB left")
+
+    def _forget(self, key: str) -> None:
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT size FROM clips WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+                    self._total_bytes -= row[0]
+        except Exception as e:
+            logger.warning(f"TTS cache cleanup failed: {e}")
+
+    def file_id(self, audio: bytes) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT file_id FROM file_ids WHERE digest = ?", (audio_digest(audio),)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.warning(f"TTS cache file_id lookup failed: {e}")
+            return None
+
+    def set_file_id(self, audio: bytes, file_id: Optional[str]) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._lock:
+                if file_id:
+                    self._db.execute("INSERT OR REPLACE INTO file_ids (digest, file_id) VALUES (?, ?)",
+                                     (audio_digest(audio), file_id))
+                else:
+                    self._db.execute("DELETE FROM file_ids WHERE digest = ?", (audio_digest(audio),))
+        except Exception as e:
+            logger.warning(f"TTS cache file_id update failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "bytes": self._total_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+        }
+
+
+tts_cache = LazySingleton(TTSCache)
+
+
+async def send_voice(send: Callable[..., Awaitable], audio: bytes, **kwargs):
+    """Send a voice note through ``send`` (``bot.send_voice`` or
+    ``message.reply_voice``), reusing a known Telegram file_id for this audio.
+
+    A stale file_id falls back to uploading the bytes. The index lookups run
+    in a worker thread.
+    """
+    file_id = await asyncio.to_thread(tts_cache.file_id, audio)
+    if file_id:
+        try:
+            message = await send(voice=file_id, **kwargs)
+            registry.inc("tts_voice_send_total", source="file_id")
+            return message
+        except Exception as e:
+            from telegram.error import BadRequest
+            if not isinstance(e, BadRequest):
+                raise
+            logger.info(f"Cached voice file_id rejected ({e}), uploading again")
+            await asyncio.to_thread(tts_cache.set_file_id, audio, None)
+
+    message = await send(voice=audio, **kwargs)
+    registry.inc("tts_voice_send_total", source="upload")
+    voice = getattr(message, "voice", None)
+    if voice is not None:
+        await asyncio.to_thread(tts_cache.set_file_id, audio, voice.file_id)
+    return message
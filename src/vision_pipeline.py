@@ -0,0 +1,197 @@
+"""Image preparation, dedup and the single-call vision analysis.
+
+``prepare_image`` downscales a photo so its long side is at most
+VISION_MAX_SIDE and re-encodes it as JPEG, in a worker thread: Gemini bills
+images by 768 px tiles, so a 1280 px Telegram photo costs two tiles where
+the downscaled copy costs one. It also computes a 64-bit difference hash
+(dHash) of the image.
+
+``analysis_cache`` keeps recent analyses per user keyed by that hash, so the
+same screenshot sent again (re-sent, forwarded, re-compressed) with the same
+caption is answered without another upload.
+
+``analyze_image`` classifies and analyzes in one structured-output call
+when the caption does not already tell the image type.
+
+Metrics: ``vision_photo_seconds{cached}``, ``vision_tokens_total{kind}``,
+``vision_image_bytes{stage}``, ``vision_cache_total{result}``.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+VISION_MAX_SIDE = int(os.environ.get("VISION_MAX_SIDE", "768"))
+VISION_JPEG_QUALITY = int(os.environ.get("VISION_JPEG_QUALITY", "85"))
+VISION_CACHE_SIZE = int(os.environ.get("VISION_CACHE_SIZE", "512"))
+VISION_CACHE_TTL = int(os.environ.get("VISION_CACHE_TTL", str(6 * 3600)))
+VISION_HASH_MAX_DISTANCE = 6
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    phash: Optional[int]
+    original_bytes: int
+
+
+@dataclass
+class VisionResult:
+    image_type: str
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+def pick_photo_size(sizes: Sequence):
+    """Smallest Telegram PhotoSize whose long side still reaches VISION_MAX_SIDE."""
+    ordered = sorted(sizes, key=lambda s: max(s.width, s.height))
+    for size in ordered:
+        if max(size.width, size.height) >= VISION_MAX_SIDE:
+            return size
+    return ordered[-1]
+
+
+def _dhash(image) -> int:
+    from PIL import Image
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def prepare_image(data: bytes) -> PreparedImage:
+    """Downscaled JPEG copy of ``data`` plus its dHash; the original bytes if Pillow is missing."""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow not installed, sending images at full size")
+        return PreparedImage(data, "image/jpeg", 0, 0, None, len(data))
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        phash = _dhash(image)
+        width, height = image.size
+        if max(width, height) > VISION_MAX_SIDE:
+            image.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+        elif image.format == "JPEG":
+            return PreparedImage(data, "image/jpeg", width, height, phash, len(data))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        return PreparedImage(out.getvalue(), "image/jpeg", image.width, image.height, phash, len(data))
+
+
+async def prepare_image_async(data: bytes) -> PreparedImage:
+    prepared = await asyncio.to_thread(prepare_image, bytes(data))
+    registry.observe("vision_image_bytes", prepared.original_bytes, stage="original")
+    registry.observe("vision_image_bytes", len(prepared.data), stage="sent")
+    return prepared
+
+
+class AnalysisCache:
+    """Recent analyses per user, matched by dHash distance and caption."""
+
+    def __init__(self, max_size: int = VISION_CACHE_SIZE, ttl: int = VISION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    @staticmethod
+    def _caption_key(caption: str) -> str:
+        return " ".join(caption.lower().split())
+
+    def get(self, user_id: int, phash: Optional[int], caption: str) -> Optional[VisionResult]:
+        if phash is None:
+            return None
+        now = time.monotonic()
+        caption_key = self._caption_key(caption)
+        for key, (stored_at, result) in reversed(self._entries.items()):
+            entry_user, entry_hash, entry_caption = key
+            if entry_user != user_id or entry_caption != caption_key or now - stored_at > self.ttl:
+                continue
+            if bin(entry_hash ^ phash).count("1") <= VISION_HASH_MAX_DISTANCE:
+                self._entries.move_to_end(key)
+                registry.inc("vision_cache_total", result="hit")
+                return result
+        registry.inc("vision_cache_total", result="miss")
+        return None
+
+    def put(self, user_id: int, phash: Optional[int], caption: str, result: VisionResult) -> None:
+        if phash is None:
+            return
+        key = (user_id, phash, self._caption_key(caption))
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+analysis_cache = AnalysisCache()
+
+
+def _parse_structured(text: str, fallback_type: str) -> tuple:
+    from src.vision_sales import ImageType
+    try:
+        payload = json.loads(text)
+        image_type = str(payload.get("image_type", "")).strip().lower()
+        reply = str(payload.get("reply", "")).strip()
+    except (ValueError, AttributeError):
+        logger.warning("Vision response is not valid JSON, using it as plain text")
+        return fallback_type, text.strip()
+    if image_type not in {t.value for t in ImageType}:
+        image_type = fallback_type
+    return image_type, reply
+
+
+async def analyze_image(model: str, prepared: PreparedImage, prompt_text: str,
+                        system_prompt: str, image_type: Optional[str]) -> VisionResult:
+    """One Gemini call for the image.
+
+    With ``image_type=None`` the response is JSON with ``image_type`` and
+    ``reply``; otherwise it is the plain reply for the given type.
+    """
+    from google.genai import types as genai_types
+    from src.ai_scheduler import ai_scheduler
+    from src.vision_sales import ImageType, VISION_RESPONSE_SCHEMA
+
+    config_kwargs = {"system_instruction": system_prompt, "max_output_tokens": 2000, "temperature": 0.7}
+    if image_type is None:
+        config_kwargs.update(response_mime_type="application/json", response_schema=VISION_RESPONSE_SCHEMA)
+
+    response = await ai_scheduler.generate(
+        model,
+        [
+            genai_types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type),
+            genai_types.Part(text=prompt_text),
+        ],
+        genai_types.GenerateContentConfig(**config_kwargs),
+    )
+
+    text = response.text or ""
+    if image_type is None:
+        image_type, text = _parse_structured(text, ImageType.GENERAL.value) if text else (ImageType.GENERAL.value, "")
+
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    registry.inc("vision_tokens_total", prompt_tokens, kind="prompt")
+    registry.inc("vision_tokens_total", output_tokens, kind="output")
+    return VisionResult(image_type, text, prompt_tokens, output_tokens)
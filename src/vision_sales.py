@@ -366,8 +366,44 @@ def get_image_type_from_caption(caption: str) -> Optional[str]:
     return None
 
 
-def build_vision_system_prompt(image_type: str, client_context: Optional[str] = None) -> str:
-    type_prompt = IMAGE_TYPE_PROMPTS.get(image_type, IMAGE_TYPE_PROMPTS[ImageType.GENERAL.value])
+VISION_AUTO_TYPE_PROMPT = """Сначала определи тип изображения и запиши его в поле image_type.
+Затем напиши ответ клиенту в поле reply, следуя установке для этого типа:
+
+{type_guide}"""
+
+VISION_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "image_type": {"type": "STRING", "enum": [t.value for t in ImageType]},
+        "reply": {"type": "STRING"},
+    },
+    "required": ["image_type", "reply"],
+    "property_ordering": ["image_type", "reply"],
+}
+
+
+def _auto_type_prompt() -> str:
+    guide = []
+    for line in VISION_CLASSIFICATION_PROMPT.splitlines():
+        if not line.startswith("- "):
+            continue
+        type_value = line[2:].split(" ", 1)[0]
+        hint = get_vision_analysis_context(type_value).split("\n", 1)[-1]
+        guide.append(f"{line}\n  {hint}")
+    return VISION_AUTO_TYPE_PROMPT.format(type_guide="\n".join(guide))
+
+
+def build_vision_system_prompt(image_type: Optional[str], client_context: Optional[str] = None) -> str:
+    """System prompt for the sales analysis of an image.
+
+    With ``image_type=None`` the model classifies the image itself in the
+    same call (see VISION_RESPONSE_SCHEMA) and gets the short per-type
+    guidance for every type instead of the full prompt of one.
+    """
+    if image_type is None:
+        type_prompt = _auto_type_prompt()
+    else:
+        type_prompt = IMAGE_TYPE_PROMPTS.get(image_type, IMAGE_TYPE_PROMPTS[ImageType.GENERAL.value])
     ctx = client_context or "Нет дополнительного контекста о клиенте."
     return VISION_SALES_SYSTEM.format(
         image_type_prompt=type_prompt,
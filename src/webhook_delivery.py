@@ -0,0 +1,344 @@
+"""Durable CRM webhook delivery: outbox table, pooled HTTP, batched retries.
+
+Producers call ``enqueue()``, which writes one outbox row per subscribed
+endpoint and returns immediately. A single background worker claims due
+rows, groups them per endpoint, posts each group concurrently over a shared
+``httpx.AsyncClient`` connection pool and reschedules failures with
+exponential backoff.
+
+Wire format: a single event is posted as ``{"event", "timestamp", "data"}``
+(unchanged from the previous direct sender); several due events for the same
+endpoint are posted together as ``{"event": "batch", "timestamp", "events": [...]}``.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.database import get_connection, DATABASE_URL
+from src.lazy import LazySingleton
+from src.migrations import register_schema
+from src.metrics import registry
+from src.monitoring import monitor
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_CACHE_TTL = 60
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+CLAIM_LIMIT = 200
+MAX_BATCH_SIZE = 20
+MAX_CONCURRENT_ENDPOINTS = 8
+REQUEST_TIMEOUT = 10.0
+# A claimed round can take CLAIM_LIMIT sequential requests that all time out;
+# the lease must outlast that or rows are re-claimed while still in flight.
+CLAIM_LEASE_SECONDS = int(CLAIM_LIMIT * REQUEST_TIMEOUT) + 60
+IDLE_POLL_SECONDS = 15
+
+
+def _backoff_delay(attempts: int) -> float:
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _endpoint_label(url: str) -> str:
+    try:
+        return urlsplit(url).netloc or url[:50]
+    except Exception:
+        return url[:50]
+
+
+def build_request_body(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if len(events) == 1:
+        return events[0]
+    return {
+        "event": "batch",
+        "timestamp": datetime.now().isoformat(),
+        "events": events,
+    }
+
+
+class WebhookDeliveryService:
+    def __init__(self, client_factory: Optional[Callable[[], Any]] = None):
+        self._client_factory = client_factory
+        self._client = None
+        self._subscribers: Dict[str, Tuple[float, List[Dict]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _init_db():
+        if not DATABASE_URL:
+            return
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS crm_webhook_outbox (
+                            id BIGSERIAL PRIMARY KEY,
+                            webhook_id INT,
+                            webhook_url TEXT NOT NULL,
+                            event_type VARCHAR(100) NOT NULL,
+                            payload JSONB NOT NULL,
+                            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                            attempts INT NOT NULL DEFAULT 0,
+                            last_error TEXT,
+                            next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                            delivered_at TIMESTAMP
+                        )
+                    """)
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due
+                        ON crm_webhook_outbox(next_attempt_at)
+                        WHERE status = 'pending'
+                    """)
+        except Exception as e:
+            logger.error(f"Failed to init webhook outbox: {e}")
+
+    def _get_client(self):
+        if self._client is None:
+            if self._client_factory:
+                self._client = self._client_factory()
+            else:
+                import httpx
+                self._client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(REQUEST_TIMEOUT),
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                    headers={"User-Agent": "WEB4TG-Webhooks/1.0"},
+                )
+        return self._client
+
+    def get_subscribers(self, event_type: str) -> List[Dict]:
+        cached = self._subscribers.get(event_type)
+        if cached and time.time() - cached[0] < SUBSCRIBER_CACHE_TTL:
+            return cached[1]
+        if not DATABASE_URL:
+            return []
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT id, webhook_url FROM crm_webhooks
+                        WHERE event_type = %s AND active = TRUE
+                    """, (event_type,))
+                    subscribers = [{"id": r[0], "webhook_url": r[1]} for r in cur.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to load webhook subscribers: {e}")
+            return cached[1] if cached else []
+        self._subscribers[event_type] = (time.time(), subscribers)
+        return subscribers
+
+    def invalidate_subscribers(self):
+        self._subscribers.clear()
+
+    def _insert_outbox(self, event_type: str, payload: Dict[str, Any], subscribers: List[Dict]) -> int:
+        body = json.dumps(payload, ensure_ascii=False, default=str)
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                values = ",".join(
+                    cur.mogrify("(%s, %s, %s, %s::jsonb)",
+                                (wh["id"], wh["webhook_url"], event_type, body)).decode("utf-8")
+                    for wh in subscribers
+                )
+                cur.execute(
+                    "INSERT INTO crm_webhook_outbox (webhook_id, webhook_url, event_type, payload) VALUES "
+                    + values
+                )
+                return cur.rowcount
+
+    async def enqueue(self, event_type: str, data: dict) -> int:
+        """Persist the event for every active subscriber; delivery happens in the background."""
+        subscribers = await asyncio.to_thread(self.get_subscribers, event_type)
+        if not subscribers:
+            return 0
+
+        payload = {
+            "event": event_type,
+            "timestamp": datetime.now().isoformat(),
+            "data": data,
+        }
+        try:
+            queued = await asyncio.to_thread(self._insert_outbox, event_type, payload, subscribers)
+        except Exception as e:
+            logger.error(f"Failed to enqueue webhook {event_type}: {e}")
+            return 0
+
+        registry.inc("webhook_enqueued_total", queued, event=event_type)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return queued
+
+    def _claim_due(self) -> List[Tuple[int, str, str, Dict, int, float]]:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE crm_webhook_outbox o
+                    SET next_attempt_at = NOW() + %s * INTERVAL '1 second'
+                    FROM (
+                        SELECT id FROM crm_webhook_outbox
+                        WHERE status = 'pending' AND next_attempt_at <= NOW()
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ) due
+                    WHERE o.id = due.id
+                    RETURNING o.id, o.webhook_url, o.event_type, o.payload, o.attempts,
+                              EXTRACT(EPOCH FROM o.created_at)
+                """, (CLAIM_LEASE_SECONDS, CLAIM_LIMIT))
+                return cur.fetchall()
+
+    def _mark_results(self, delivered: List[int], failed: List[Tuple[int, int, str]]):
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                if delivered:
+                    cur.execute("""
+                        UPDATE crm_webhook_outbox
+                        SET status = 'delivered', delivered_at = NOW(), attempts = attempts + 1
+                        WHERE id = ANY(%s)
+                    """, (delivered,))
+                for row_id, attempts, error in failed:
+                    if attempts >= MAX_ATTEMPTS:
+                        cur.execute("""
+                            UPDATE crm_webhook_outbox
+                            SET status = 'failed', attempts = %s, last_error = %s
+                            WHERE id = %s
+                        """, (attempts, error[:500], row_id))
+                    else:
+                        cur.execute("""
+                            UPDATE crm_webhook_outbox
+                            SET attempts = %s, last_error = %s,
+                                next_attempt_at = NOW() + %s * INTERVAL '1 second'
+                            WHERE id = %s
+                        """, (attempts, error[:500], _backoff_delay(attempts), row_id))
+
+    async def post_batch(self, url: str, events: List[Dict[str, Any]]) -> Optional[str]:
+        """POST one batch; returns None on success or an error string."""
+        started = time.perf_counter()
+        endpoint = _endpoint_label(url)
+        error = None
+        try:
+            resp = await asyncio.wait_for(
+                self._get_client().post(url, json=build_request_body(events)), REQUEST_TIMEOUT
+            )
+            if resp.status_code >= 400:
+                error = f"HTTP {resp.status_code}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        registry.observe("webhook_request_seconds", elapsed, endpoint=endpoint)
+        monitor.track_external("crm_webhook", elapsed, success=error is None, operation=endpoint)
+        return error
+
+    async def _deliver_endpoint(self, url: str, rows: List[Tuple], semaphore: asyncio.Semaphore,
+                                delivered: List[int], failed: List[Tuple[int, int, str]]):
+        endpoint = _endpoint_label(url)
+        async with semaphore:
+            for i in range(0, len(rows), MAX_BATCH_SIZE):
+                batch = rows[i:i + MAX_BATCH_SIZE]
+                error = await self.post_batch(url, [r[3] for r in batch])
+                now = time.time()
+                if error is None:
+                    delivered.extend(r[0] for r in batch)
+                    registry.inc("webhook_delivered_total", len(batch), endpoint=endpoint)
+                    for r in batch:
+                        registry.observe("webhook_delivery_lag_seconds", now - float(r[5]), endpoint=endpoint)
+                else:
+                    logger.warning(f"Webhook delivery to {endpoint} failed ({len(batch)} events): {error}")
+                    registry.inc("webhook_failed_attempts_total", len(batch), endpoint=endpoint)
+                    failed.extend((r[0], r[4] + 1, error) for r in batch)
+
+    async def process_due(self) -> int:
+        """Deliver one round of due outbox rows. Returns the number of rows claimed."""
+        if not DATABASE_URL:
+            return 0
+        rows = await asyncio.to_thread(self._claim_due)
+        if not rows:
+            return 0
+
+        by_endpoint: Dict[str, List[Tuple]] = {}
+        for row in rows:
+            by_endpoint.setdefault(row[1], []).append(row)
+
+        delivered: List[int] = []
+        failed: List[Tuple[int, int, str]] = []
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_ENDPOINTS)
+        await asyncio.gather(*(
+            self._deliver_endpoint(url, endpoint_rows, semaphore, delivered, failed)
+            for url, endpoint_rows in by_endpoint.items()
+        ))
+
+        await asyncio.to_thread(self._mark_results, delivered, failed)
+        return len(rows)
+
+    async def _run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                claimed = await self.process_due()
+                if claimed >= CLAIM_LIMIT:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=IDLE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            logger.info("Webhook delivery worker started")
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        if not DATABASE_URL:
+            return {}
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT status, COUNT(*),
+                               EXTRACT(EPOCH FROM NOW() - MIN(created_at))
+                        FROM crm_webhook_outbox
+                        WHERE status = 'pending' OR created_at > NOW() - INTERVAL '1 day'
+                        GROUP BY status
+                    """)
+                    rows = cur.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to get webhook stats: {e}")
+            return {}
+
+        stats: Dict[str, Any] = {r[0]: int(r[1]) for r in rows}
+        oldest_pending = next((float(r[2]) for r in rows if r[0] == "pending" and r[2] is not None), 0.0)
+        stats["oldest_pending_seconds"] = round(oldest_pending, 1)
+        registry.set_gauge("webhook_outbox_pending", stats.get("pending", 0))
+        registry.set_gauge("webhook_oldest_pending_seconds", oldest_pending)
+        lag = [h for _, h in registry.series("webhook_delivery_lag_seconds")]
+        if lag:
+            stats["lag_p95_seconds"] = round(max(h.quantile(0.95) for h in lag), 2)
+        return stats
+
+
+webhook_delivery = LazySingleton(WebhookDeliveryService)
+register_schema("webhook_delivery", 1, WebhookDeliveryService._init_db)
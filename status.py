@@ -53,6 +53,15 @@ def check_status():
     else:
         print("\n  All modules loaded successfully.")
 
+    try:
+        from src.migrations import get_schema_status
+        schema = get_schema_status()
+        pending = [row["name"] for row in schema if row["pending"]]
+        print(f"  Schema migrations: {len(schema)} registered, {len(pending)} pending"
+              + (f" ({', '.join(pending)})" if pending else ""))
+    except Exception as e:
+        print(f"  [FAIL] Schema migrations: {e}")
+
     print("\n")
     run_vision_demo()
     print("\n")